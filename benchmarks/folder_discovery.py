@@ -0,0 +1,105 @@
+"""Compare finding folders by matching every folder path against every folder to find, and with a folder path trie.
+
+A stand-in store is built with a wide, deep tree of folders (10,000 by default), and a handful of folders spread over
+it are looked for, as the account config's inbox and test folders are:
+
+    linear: the search before helpers.folder_trie; for each folder it checks whether any folder to find starts with its
+        path, and after each folder found whether all the folders to find are in the found folders.
+    trie: map_folder_structure_to_flat_dict; sub folders are checked by name in the trie, and the search stops once no
+        folders to find remain.
+
+The best time of each and the number of folders each looked into are reported.
+
+usage, from the repository root:
+    python -m benchmarks.folder_discovery [--folders 10000] [--targets 8] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from helpers.outlook_helpers import map_folder_structure_to_flat_dict
+from helpers.stand_in_outlook import StandInFolder, StandInOutlook
+
+
+def make_store(n_folders: int, fan_out: int = 12, seed: int = 0) -> Tuple[StandInFolder, List[str]]:
+    """Get a stand-in store's root folder with about n_folders folders, fan_out sub folders per folder, breadth first.
+
+    :return: the root folder and the paths of all its folders.
+    """
+    rng = random.Random(seed)
+    root = StandInOutlook().add_store('account').GetRootFolder()
+    folder_paths, parents, n_made = [], [root], 0
+    while n_made < n_folders:
+        next_parents = []
+        for parent in parents:
+            for n in range(rng.randint(fan_out // 2, fan_out)):
+                folder = parent.Folders.Add(f'folder {n}')
+                folder_paths.append(folder.FolderPath)
+                next_parents.append(folder)
+                n_made += 1
+                if n_made == n_folders:
+                    return root, folder_paths
+        parents = next_parents
+    return root, folder_paths
+
+
+def map_folders_linear(parent_folder: Any, must_find_list: List[str]) -> Dict[str, Any]:
+    """The folder search before the folder path trie, for comparison."""
+    folders_dict = {'error_folders': []}
+    folders_stack = [parent_folder]
+    while folders_stack:
+        current_folder = folders_stack.pop()
+        current_folder_path = current_folder.FolderPath
+        if any([x.startswith(current_folder_path) for x in must_find_list]):
+            for olFolder in current_folder.Folders:
+                folders_dict[olFolder.FolderPath] = olFolder
+                if must_find_list:
+                    if all(mfitem in folders_dict.keys() for mfitem in must_find_list):
+                        return folders_dict
+                folders_stack.append(olFolder)
+    return folders_dict
+
+
+def count_folders_opened(search: Callable[..., Dict[str, Any]], root: StandInFolder, targets: List[str]) -> int:
+    """The number of folders whose sub folders the search listed."""
+    opened = 0
+    folders_class = type(root.Folders)
+    original_iter = folders_class.__iter__
+
+    def counting_iter(folders):
+        nonlocal opened
+        opened += 1
+        return original_iter(folders)
+
+    folders_class.__iter__ = counting_iter
+    try:
+        search(root, targets)
+    finally:
+        folders_class.__iter__ = original_iter
+    return opened
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--folders', type=int, default=10000, help='how many folders the store has')
+    parser.add_argument('--targets', type=int, default=8, help='how many folders to find')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times to time each search')
+    args = parser.parse_args()
+
+    root, all_paths = make_store(args.folders)
+    deepest = max(path.count('\\') for path in all_paths)
+    deep_paths = [path for path in all_paths if path.count('\\') == deepest]
+    targets = random.Random(1).sample(deep_paths, min(args.targets, len(deep_paths)))
+    print(f'{len(all_paths):,} folders, {deepest - 2} levels deep, finding {len(targets)} folders')
+
+    for name, search in (('linear', map_folders_linear), ('trie', map_folder_structure_to_flat_dict)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            found = search(root, targets)
+            best = min(best, time.perf_counter() - start)
+        assert all(target in found for target in targets)
+        opened = count_folders_opened(search, root, targets)
+        print(f'{name:>7}: {best * 1000:8.2f} ms, listed the sub folders of {opened:,} folders')
@@ -0,0 +1,105 @@
+"""Measure the import time of the program's entry points against a startup budget.
+
+Each entry point in startup_budget.json is imported in a fresh interpreter with `python -X importtime`, and its total
+import time is compared with its budget. Modules listed as forbidden must not be imported at all, e.g. the NBE report
+parser must only be imported when the incoming reports task runs (see tasks.registry).
+
+The registry only defers the tasks' own dependencies. main_process still imports pandas, the mail fetch
+(tasks.clean_foam_inbox) and its helpers at module level, as every run that isn't skipped needs them to build the
+folders' frames; making those imports lazy is out of scope, so main_process's budget includes them.
+
+usage, from the repository root:
+    python -m benchmarks.import_time_budget [--top 15]
+
+The exit code is 1 if any entry point is over its budget or imports a forbidden module.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+BUDGET_FILE_PATH = os.path.join(os.path.dirname(__file__), 'startup_budget.json')
+
+# one line of -X importtime output: "import time: self [us] | cumulative | imported package", nested imports indented
+_importtime_line_ptn = re.compile(r'^import time:\s+(?P<self_us>\d+) \|\s+(?P<cumulative_us>\d+) \| (?P<indent> *)'
+                                  r'(?P<module>\S+)$')
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime_output(stderr_text: str) -> List[ImportTiming]:
+    """Parse the stderr of a `python -X importtime` run.
+
+    :param stderr_text: str, the captured stderr.
+    :return: list, an ImportTiming for each imported module, in the order the imports finished.
+    """
+    timings = []
+    for line in stderr_text.splitlines():
+        match = _importtime_line_ptn.match(line)
+        if match:
+            timings.append(ImportTiming(match['module'], int(match['self_us']), int(match['cumulative_us']),
+                                        len(match['indent']) // 2))
+    return timings
+
+
+def total_import_ms(timings: List[ImportTiming]) -> float:
+    """The total import time in milliseconds; the sum of the top-level imports' cumulative times."""
+    return sum(t.cumulative_us for t in timings if t.depth == 0) / 1000
+
+
+def measure_import(module_name: str) -> List[ImportTiming]:
+    """Import a module in a fresh interpreter with -X importtime and get its import timings.
+
+    :param module_name: str, the module to import.
+    :return: list, the ImportTiming of every module imported.
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+    if completed.returncode:
+        raise RuntimeError(f'Importing {module_name} failed:\n{completed.stderr[-2000:]}')
+    return parse_importtime_output(completed.stderr)
+
+
+def check_budget(module_name: str, budget: Dict, top: int = 15) -> bool:
+    """Measure a module's import time, print a report and check it against its budget.
+
+    :param module_name: str, the module to import.
+    :param budget: dict, with 'budget_ms' and 'forbidden_modules'.
+    :param top: int, how many of the slowest imports to list.
+    :return: bool, True if the module is within budget and imports nothing forbidden.
+    """
+    timings = measure_import(module_name)
+    total_ms = total_import_ms(timings)
+    imported = {t.module for t in timings}
+    forbidden = [m for m in budget.get('forbidden_modules', []) if m in imported]
+    within_budget = total_ms <= budget['budget_ms']
+
+    print(f'{module_name}: {total_ms:.0f} ms of {budget["budget_ms"]} ms budget '
+          f'({"OK" if within_budget else "OVER BUDGET"}), {len(imported)} modules')
+    for timing in sorted(timings, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+        print(f'    {timing.cumulative_us / 1000:9.1f} ms cumulative {timing.self_us / 1000:8.1f} ms self  '
+              f'{"  " * timing.depth}{timing.module}')
+    if forbidden:
+        print(f'    FORBIDDEN imports: {", ".join(forbidden)}')
+    return within_budget and not forbidden
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--top', type=int, default=15, help='how many of the slowest imports to list')
+    parser.add_argument('--budget-file', default=BUDGET_FILE_PATH)
+    args = parser.parse_args()
+
+    with open(args.budget_file, 'r') as bf:
+        budgets = json.load(bf)
+    results = [check_budget(module_name, budget, args.top) for module_name, budget in budgets.items()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,73 @@
+"""Compare the memory and groupby speed of a mail frame with object columns and with the mail frame schema.
+
+A synthetic frame of cert emails, with about as many distinct customers, products, sales orders and lots per row as a
+busy inbox, is built with every column as object dtype (as the frames were before helpers.mail_schema) and converted
+with apply_mail_schema. The memory per row (deep, counting the strings) and the time to group on the dedupe-style key
+columns are reported for each.
+
+usage, from the repository root:
+    python -m benchmarks.mail_frame_schema [--rows 1000000] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from helpers.mail_schema import apply_mail_schema
+
+GROUP_COLUMNS = ['product_number', 'so_number', 'c_number']
+
+
+def make_object_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Get a synthetic mail frame with every column as object dtype, like pd.DataFrame(list of row dicts)."""
+    rng = np.random.default_rng(seed)
+    customers = np.array([f'customer {n} inc' for n in range(200)], dtype=object)
+    customer_index = rng.integers(0, len(customers), n_rows)
+    so_numbers = rng.integers(100000, 100000 + max(n_rows // 20, 1), n_rows)
+    lot_numbers = rng.integers(23010100, 23010100 + max(n_rows // 5, 1), n_rows)
+    received = pd.Timestamp('2023-05-01') + pd.to_timedelta(np.sort(rng.integers(0, 5 * 86400, n_rows)), unit='s')
+    columns = {
+        'received_time': received.to_pydatetime(),
+        'subject': [f'CofC {n}' for n in range(n_rows)],
+        'entry_id': [f'{n:048X}' for n in range(n_rows)],
+        'store_id': ['0' * 48] * n_rows,
+        'c_type': ['CofC'] * n_rows,
+        'cert_number': [str(n) for n in range(n_rows)],
+        'product_number': [f'{p:04d}-56' for p in rng.integers(0, 500, n_rows)],
+        'so_number': [str(so) for so in so_numbers],
+        'lot_number': [str(lot) for lot in lot_numbers],
+        'customer': customers[customer_index],
+        'c_number': [str(10000 + c) for c in customer_index],
+        'loc_number': [str(b) for b in rng.integers(1, 20, n_rows)],
+    }
+    return pd.DataFrame({name: pd.Series(values, dtype=object) for name, values in columns.items()})
+
+
+def time_groupby(df: pd.DataFrame, repeat: int, **groupby_kwargs) -> float:
+    """The best time in seconds of grouping on GROUP_COLUMNS and counting the groups' rows."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df.groupby(GROUP_COLUMNS, **groupby_kwargs).size()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help='how many mail items the frame holds')
+    parser.add_argument('--repeat', type=int, default=3, help='how many times to time each groupby')
+    args = parser.parse_args()
+
+    object_df = make_object_frame(args.rows)
+    start = time.perf_counter()
+    schema_df = apply_mail_schema(object_df)
+    convert_seconds = time.perf_counter() - start
+
+    for name, df, groupby_kwargs in (('object', object_df, {}), ('schema', schema_df, {'observed': True})):
+        bytes_per_row = df.memory_usage(deep=True).sum() / len(df)
+        groupby_seconds = time_groupby(df, args.repeat, **groupby_kwargs)
+        print(f'{name:>7}: {bytes_per_row:7.0f} bytes per row, groupby {groupby_seconds * 1000:8.1f} ms')
+    print(f'applying the schema took {convert_seconds:.2f} s for {args.rows:,} rows')
@@ -0,0 +1,85 @@
+"""Compare composing the NBE test report summary bodies with DataFrame.to_html and with the precompiled templates.
+
+Reports are made up with the parser's frame layout: the lot info and a results frame of text columns with
+results_per_lot results for each of n_lots lots (dates of manufacture). Each report's summary is composed, one
+report at a time as the NBE report pipeline composes them:
+
+    to_html: the composition before tasks.filing_test_reports.nbe_summary_html; a to_html of the transposed lot info
+        frame and of each lot's group of the results frame, concatenated.
+    templates: render_nbe_summary.
+
+Both must give the same HTML. The best time of each over all the reports is reported.
+
+usage, from the repository root:
+    python -m benchmarks.nbe_summary_render [--reports 20] [--lots 12] [--results 15] [--repeat 5]
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from tasks.filing_test_reports.nbe_summary_html import render_nbe_summary
+
+
+def make_report(n_lots: int, results_per_lot: int, seed: int = 0) -> Dict[str, dict]:
+    """Get made up report data as extract_nbe_report_data gives it, with results_per_lot results for each of n_lots."""
+    lot_info = {'po_number_nbe': f'{123456 + seed}', 'po_date_nbe': '31.01.2023', 'order_number_nbe': '321123 / 000250',
+                'order_date_nbe': '31.01.2023', 'product_number_nbe': 'CGP123_321_123,123456_ABC',
+                'tabcode_lw': 'T8675309', 'product_name': 'Tape-y-tape 9001 <wide> & thin',
+                'customer_number_nbe': '1234',
+                'delivery_number_nbe': f'{87654321 + seed:016d}', 'delivery_date_nbe': '31.05.2023',
+                'judgement_nbe': 'Passed'}
+    rows = [dict(characteristic_col=f'Characteristic {result} ( 3 points )', unit_col='µm',
+                 value_col=f'{50 + (lot * result + seed) % 7}', lower_limit_col='0' if result % 3 else '',
+                 upper_limit_col='100', date_of_manufacture=f'202301{(n_lots - lot) % 28 + 1:02d}{lot // 28}')
+            for lot in range(n_lots) for result in range(results_per_lot)]
+    results_df = pd.DataFrame(rows, columns=['characteristic_col', 'unit_col', 'value_col', 'lower_limit_col',
+                                             'upper_limit_col', 'date_of_manufacture'], dtype='object')
+    return {'lot_info': lot_info, 'test_results': {'results_df': results_df}}
+
+
+def compose_with_to_html(nbe_data: Dict[str, dict]) -> Tuple[str, str]:
+    """The composition before the precompiled templates, for comparison."""
+    lot_data = nbe_data['lot_info']
+    results_df = nbe_data['test_results']['results_df']
+    mfr_dates = results_df['date_of_manufacture']
+    new_subj = f"{lot_data['product_name']} {lot_data['tabcode_lw']} " \
+               f"DN: {lot_data['delivery_number_nbe']} lots: {' '.join(mfr_dates)}"
+    body_text_template = '''<html><body>{}</body></html>'''
+    mf_grps = results_df.groupby('date_of_manufacture')
+    results_df_html = '<br><br>'.join([f"Lot: {md}<br>{df.to_html(index=False)}" for md, df in mf_grps])
+    html_body = body_text_template.format(
+        pd.DataFrame.from_dict({k: [v] for k, v in lot_data.items()}).T.to_html(
+            header=False) + '<br><br>' + results_df_html)
+    return new_subj, html_body
+
+
+def compose_each(compose: Callable[[Dict[str, dict]], Tuple[str, str]],
+                 reports: List[Dict[str, dict]]) -> List[Tuple[str, str]]:
+    return [compose(nbe_data) for nbe_data in reports]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--reports', type=int, default=20, help='how many reports to compose')
+    parser.add_argument('--lots', type=int, default=12, help='how many lots each report has')
+    parser.add_argument('--results', type=int, default=15, help='how many results each lot has')
+    parser.add_argument('--repeat', type=int, default=5, help='how many times to time each composition')
+    args = parser.parse_args()
+
+    reports = [make_report(args.lots, args.results, seed) for seed in range(args.reports)]
+    print(f'{args.reports} reports of {args.lots} lots with {args.results} results each')
+    expected = compose_each(compose_with_to_html, reports)
+    timings = {}
+    for name, compose in (('to_html', compose_with_to_html), ('templates', render_nbe_summary)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            composed = compose_each(compose, reports)
+            best = min(best, time.perf_counter() - start)
+        assert composed == expected, f'{name} composed different summaries'
+        timings[name] = best
+        print(f'{name:>9}: {best * 1000:8.2f} ms, {best * 1000 / args.reports:6.2f} ms per report')
+    print(f'speed up: {timings["to_html"] / timings["templates"]:.1f}x')
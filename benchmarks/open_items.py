@@ -0,0 +1,126 @@
+"""Measure how many mail items a folder run keeps open, with items in the frames and with item IDs in the frames.
+
+A stand-in mailbox of cert emails is read into a frame and every item is flagged, as the priority customers task does:
+
+    items: the frame holds each mail item, as process_mail_items used to; the flags are set through the frame's items.
+    handles: the frame holds each item's EntryID and StoreID; the flags are set on items opened by an ItemResolver.
+
+Each mail item handed out counts as open until it is garbage, like a COM object holding its MAPI object. The peak open
+count and the peak Python memory (tracemalloc) of reading and flagging are reported for each.
+
+usage, from the repository root:
+    python -m benchmarks.open_items [--items 5000]
+"""
+
+import argparse
+import datetime
+import gc
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator
+
+from helpers.item_handles import ItemResolver, get_item_ids
+from helpers.outlook_helpers import set_follow_up_on_list
+from helpers.stand_in_outlook import StandInFolder, StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import process_mail_items, sort_mail_items_to_dataframes
+
+
+class OpenItemCounter:
+    """Counts the mail items handed out and not yet garbage."""
+
+    def __init__(self):
+        self.open_count = 0
+        self.peak_open = 0
+
+    def wrap(self, item: StandInMailItem) -> 'CountedItem':
+        self.open_count += 1
+        self.peak_open = max(self.peak_open, self.open_count)
+        return CountedItem(item, self)
+
+
+class CountedItem:
+    """A mail item that counts as open until it is garbage."""
+    __slots__ = ('_item', '_counter')
+
+    def __init__(self, item: StandInMailItem, counter: OpenItemCounter):
+        object.__setattr__(self, '_item', item)
+        object.__setattr__(self, '_counter', counter)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._item, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._item, name, value)
+
+    def __del__(self):
+        self._counter.open_count -= 1
+
+
+class CountedSession:
+    """The stand-in MAPI namespace, handing out counted items."""
+
+    def __init__(self, outlook: StandInOutlook, counter: OpenItemCounter):
+        self._outlook = outlook
+        self._counter = counter
+
+    def GetItemFromID(self, entry_id: str, store_id: Any = None) -> CountedItem:
+        return self._counter.wrap(self._outlook.GetItemFromID(entry_id, store_id))
+
+
+def make_mailbox(n_items: int) -> StandInFolder:
+    """Get a stand-in inbox holding n_items cert emails."""
+    outlook = StandInOutlook()
+    inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+    received = datetime.datetime(2023, 5, 1, tzinfo=datetime.timezone.utc)
+    for n in range(n_items):
+        inbox.deliver(StandInMailItem(f'CofC {n} 1234-56 SO 777 LOT {23010100 + n} company-a inc 12345 BP 1',
+                                      received + datetime.timedelta(seconds=n)))
+    return inbox
+
+
+def run_with_items(inbox: StandInFolder, counter: OpenItemCounter) -> None:
+    """Read the items into a frame holding the items and flag them through it."""
+    results, _ = process_mail_items(counted_items(inbox, counter), store_id=inbox.StoreID)
+    for row, item in zip(results, counted_items(inbox, counter)):
+        row['o_item'] = item
+    df = sort_mail_items_to_dataframes(results)
+    set_follow_up_on_list(df['o_item'], overwrite_if_set=True)
+
+
+def run_with_handles(inbox: StandInFolder, counter: OpenItemCounter) -> None:
+    """Read the item IDs into a frame and flag the items opened from them."""
+    results, _ = process_mail_items(counted_items(inbox, counter), store_id=inbox.StoreID)
+    df = sort_mail_items_to_dataframes(results)
+    resolver = ItemResolver(CountedSession(inbox.Session, counter))
+    set_follow_up_on_list(resolver.iter_items(get_item_ids(df)), overwrite_if_set=True)
+
+
+def counted_items(inbox: StandInFolder, counter: OpenItemCounter) -> Iterator[CountedItem]:
+    """Iterate a folder's items as counted items, like iterating a COM Items collection."""
+    for item in inbox.Items:
+        yield counter.wrap(item)
+
+
+def measure(run: Callable[[StandInFolder, OpenItemCounter], None], n_items: int) -> Dict[str, float]:
+    """Run one way of reading and flagging a fresh mailbox, measuring its open items and memory.
+
+    :return: dict, the 'peak_open_items' and the 'peak_memory_mb' above the mailbox itself.
+    """
+    inbox = make_mailbox(n_items)
+    counter = OpenItemCounter()
+    gc.collect()
+    tracemalloc.start()
+    run(inbox, counter)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_open_items': counter.peak_open, 'peak_memory_mb': peak_bytes / 2 ** 20}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--items', type=int, default=5000, help='how many cert emails the mailbox holds')
+    args = parser.parse_args()
+
+    for mode, run_mode in (('items', run_with_items), ('handles', run_with_handles)):
+        result = measure(run_mode, args.items)
+        print(f'{mode:>8}: {result["peak_open_items"]:6d} items open at most, '
+              f'{result["peak_memory_mb"]:7.1f} MB peak memory')
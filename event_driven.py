@@ -0,0 +1,221 @@
+"""Process new cert mail as it arrives instead of waiting for the next scheduler tick.
+
+This subscribes to the ItemAdd event of each inbox folder's Items collection and collects the arrivals into short,
+debounced micro-batches. Each batch runs its new mail through the usual main_process tasks (priority flags, foam
+dedupe, NBE reports). Outlook doesn't raise ItemAdd for every item when many arrive at once, so the
+scheduled polling run should be kept as a safety net, at a longer interval.
+
+The event source is pluggable: live Outlook uses win32com's DispatchWithEvents and a message pump, the stand-in
+backend (helpers.stand_in_outlook) raises the same OnItemAdd calls directly.
+
+Classes:
+    MicroBatcher: Collects arrivals and releases them as debounced batches.
+    ArrivalSubscription: Holds the ItemAdd subscriptions for a set of folders.
+
+Functions:
+    is_actionable_subject: Whether an arrival's subject is one of the cert/report mails the tasks act on.
+    run_event_loop: Subscribe to the inbox folders and process arrivals in micro-batches until stopped.
+    process_batch_with_main_tasks: Run a batch's new mail through the main_process tasks.
+
+"""
+
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from log_setup import lg
+from untracked_config.scheduling_data import EVENT_DRIVEN_PARAMETERS
+from untracked_config.subject_regex import subject_pattern
+
+# NBE report emails are acted on too; the subject pattern only covers the cert emails
+nbe_subject_ptn = re.compile(r'Certificate for Delivery:\d{16}')
+
+
+def is_actionable_subject(subject: str) -> bool:
+    """Whether an arrival's subject is one of the cert/report mails the tasks act on.
+
+    Filtering arrivals on this also keeps the program's own mail (e.g. composed NBE summaries) from triggering more
+    batches.
+
+    :param subject: str, the subject line of the arrival.
+    :return: bool, True if the mail should trigger a batch.
+    """
+    return bool(subject_pattern.match(subject) or nbe_subject_ptn.search(subject))
+
+
+class MicroBatcher:
+    """Collects arrivals and releases them as debounced batches.
+
+    A batch is released once no arrival has come in for `debounce_seconds`, or once the oldest arrival has waited
+    `max_batch_wait_seconds`, or once it holds `max_batch_items` arrivals, whichever comes first.
+    """
+
+    def __init__(self, debounce_seconds: float = 5.0, max_batch_wait_seconds: float = 30.0,
+                 max_batch_items: int = 200, clock: Callable[[], float] = time.monotonic):
+        self.debounce_seconds = debounce_seconds
+        self.max_batch_wait_seconds = max_batch_wait_seconds
+        self.max_batch_items = max_batch_items
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._arrivals: List[Tuple[str, str]] = []  # (folder path, EntryID)
+        self._first_arrival: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+
+    def add(self, folder_path: str, entry_id: str) -> None:
+        """Add an arrival to the current batch.
+
+        :param folder_path: str, the path of the folder the mail arrived in.
+        :param entry_id: str, the EntryID of the new mail.
+        """
+        with self._lock:
+            now = self._clock()
+            if not self._arrivals:
+                self._first_arrival = now
+            self._last_arrival = now
+            self._arrivals.append((folder_path, entry_id))
+
+    def pending_count(self) -> int:
+        """The number of arrivals waiting in the current batch."""
+        with self._lock:
+            return len(self._arrivals)
+
+    def take_due_batch(self) -> Dict[str, List[str]]:
+        """Take the current batch if it is due.
+
+        :return: dict, EntryIDs keyed by folder path, in arrival order; empty if no batch is due.
+        """
+        with self._lock:
+            if not self._arrivals:
+                return {}
+            now = self._clock()
+            quiet = now - self._last_arrival >= self.debounce_seconds
+            waited_too_long = now - self._first_arrival >= self.max_batch_wait_seconds
+            if not (quiet or waited_too_long or len(self._arrivals) >= self.max_batch_items):
+                return {}
+            batch: Dict[str, List[str]] = {}
+            for folder_path, entry_id in self._arrivals:
+                batch.setdefault(folder_path, []).append(entry_id)
+            self._arrivals = []
+            self._first_arrival = self._last_arrival = None
+            return batch
+
+
+class ArrivalSubscription:
+    """Holds the ItemAdd subscriptions for a set of folders.
+
+    The Items collections and the event handler objects are kept referenced; Outlook stops raising events for a
+    collection once its last reference is released.
+    """
+
+    def __init__(self, folders: Dict[str, Any], batcher: MicroBatcher,
+                 dispatch_with_events: Optional[Callable[[Any, type], Any]] = None):
+        """
+        :param folders: dict, the folder objects to subscribe to, keyed by folder path.
+        :param batcher: MicroBatcher, where actionable arrivals are added.
+        :param dispatch_with_events: the DispatchWithEvents to subscribe with; win32com's by default.
+        """
+        if dispatch_with_events is None:
+            from win32com.client import DispatchWithEvents as dispatch_with_events
+        self._subscriptions: List[Tuple[Any, Any]] = []
+        for folder_path, ol_folder in folders.items():
+            items = ol_folder.Items
+            handler = dispatch_with_events(items, self._make_handler_class(folder_path, batcher))
+            self._subscriptions.append((items, handler))
+            lg.debug(f'Subscribed to new mail in {folder_path}')
+
+    @staticmethod
+    def _make_handler_class(folder_path: str, batcher: MicroBatcher) -> type:
+        """Make an Items event handler class that adds actionable arrivals in `folder_path` to the batcher."""
+
+        class ItemsEvents:
+            def OnItemAdd(self, item):
+                try:
+                    subject = item.Subject
+                    if is_actionable_subject(subject):
+                        batcher.add(folder_path, item.EntryID)
+                        lg.debug(f'New mail queued from {folder_path}: {subject}')
+                except Exception:  # an exception raised out of an event handler is lost inside COM
+                    lg.exception('Error handling new mail in %s', folder_path)
+
+        return ItemsEvents
+
+    def close(self) -> None:
+        """Drop the subscriptions."""
+        self._subscriptions = []
+
+
+def run_event_loop(found_folders_dict: Dict[str, Any], inbox_folders: List[str],
+                   process_batch: Callable[[Dict[str, List[str]]], None],
+                   dispatch_with_events: Optional[Callable[[Any, type], Any]] = None,
+                   pump_messages: Optional[Callable[[], None]] = None,
+                   should_stop: Callable[[], bool] = lambda: False,
+                   **event_parameters) -> None:
+    """Subscribe to the inbox folders and process arrivals in micro-batches until stopped.
+
+    :param found_folders_dict: dict, the found folder objects keyed by folder path.
+    :param inbox_folders: list, the paths of the folders to watch.
+    :param process_batch: callable, called with each due batch (EntryIDs keyed by folder path). An error in a batch is
+        logged and the loop goes on.
+    :param dispatch_with_events: the DispatchWithEvents to subscribe with; win32com's by default.
+    :param pump_messages: callable that delivers pending events; pythoncom.PumpWaitingMessages by default.
+    :param should_stop: callable, the loop ends once this returns True.
+    :param event_parameters: overrides for EVENT_DRIVEN_PARAMETERS.
+    """
+    params = EVENT_DRIVEN_PARAMETERS | event_parameters
+    if pump_messages is None:
+        import pythoncom
+        pump_messages = pythoncom.PumpWaitingMessages
+
+    batcher = MicroBatcher(params['debounce_seconds'], params['max_batch_wait_seconds'], params['max_batch_items'])
+    watched = {fp: found_folders_dict[fp] for fp in inbox_folders if fp in found_folders_dict}
+    subscription = ArrivalSubscription(watched, batcher, dispatch_with_events)
+    lg.info('Watching %s folders for new mail.', len(watched))
+    try:
+        while not should_stop():
+            pump_messages()
+            batch = batcher.take_due_batch()
+            if batch:
+                arrivals = sum(len(entry_ids) for entry_ids in batch.values())
+                lg.info('Processing a batch of %s new mails from %s folders.', arrivals, len(batch))
+                batch_start = time.perf_counter()
+                try:
+                    process_batch(batch)
+                except Exception:  # keep watching; the scheduled polling run picks up the batch's mail
+                    lg.exception('Error processing the batch of %s new mails.', arrivals)
+                else:
+                    lg.info('Processed the batch in %.2f seconds.', time.perf_counter() - batch_start)
+            time.sleep(params['pump_interval_seconds'])
+    finally:
+        subscription.close()
+
+
+def process_batch_with_main_tasks(outlook: Any, found_folders_dict: Dict[str, Any], batch: Dict[str, List[str]],
+                                  acct: Optional[Dict[str, Any]] = None) -> None:
+    """Run a batch's new mail through the main_process tasks.
+
+    The batch is run by main_process.run_main_process, like a scheduled run: it holds the account's run lock (if a
+    scheduled run holds it past RUN_LOCK_PARAMETERS['wait_seconds'], the batch is skipped and that run, or the next,
+    picks up its mail), starts from a reset watchdog, run metrics and COM tracer, and alerts on errors. Only the batch's
+    EntryIDs are processed; the duplicates of older mail are left to the scheduled runs.
+
+    :param outlook: OutlookSingleton, the Outlook instance the folders were found in.
+    :param found_folders_dict: dict, the found folder objects keyed by folder path.
+    :param batch: dict, EntryIDs keyed by folder path.
+    :param acct: dict, the account config; acct_path_dct by default.
+    """
+    import main_process
+
+    _, run_report = main_process.run_main_process(outlook, found_folders_dict, acct, entry_ids=batch)
+    if run_report.get('lock_skipped'):
+        lg.warning('Skipped the batch; another run holds the lock.')
+
+
+if __name__ == '__main__':
+    import main_process
+    from outlook_interface import wc_outlook
+
+    event_found_folders, event_inbox_folders = main_process.get_process_ol_folders(wc_outlook)
+    run_event_loop(event_found_folders, event_inbox_folders,
+                   functools.partial(process_batch_with_main_tasks, wc_outlook, event_found_folders))
@@ -0,0 +1,64 @@
+"""Pace scheduled runs by how much mail has been arriving.
+
+Classes:
+    AdaptiveInterval: Widens the interval between runs while nothing arrives and narrows it when mail does.
+
+"""
+
+import time
+from typing import Callable, Optional
+
+from log_setup import lg
+
+
+class AdaptiveInterval:
+    """Widens the interval between runs while nothing arrives and narrows it when mail does.
+
+    The scheduler's trigger should fire at `min_seconds`; ticks that come before the current interval has passed since
+    the last run are skipped. Any arrival drops the interval back to `min_seconds` so a burst is handled promptly; each
+    run without arrivals widens it by `widen_factor`, up to `max_seconds`. A smoothed arrival rate is kept for logging.
+    """
+
+    def __init__(self, min_seconds: float = 60.0, max_seconds: float = 900.0, widen_factor: float = 1.5,
+                 smoothing: float = 0.3, clock: Callable[[], float] = time.monotonic):
+        """
+        :param min_seconds: float, the shortest interval, used while mail is arriving.
+        :param max_seconds: float, the longest interval, reached after enough quiet runs.
+        :param widen_factor: float, what the interval is multiplied by after a run without arrivals.
+        :param smoothing: float, the weight of the latest run in the smoothed arrival rate.
+        :param clock: callable returning the current time in seconds.
+        """
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.widen_factor = widen_factor
+        self.smoothing = smoothing
+        self.interval_seconds = min_seconds
+        self.arrivals_per_hour = 0.0
+        self._clock = clock
+        self._last_run: Optional[float] = None
+
+    def is_due(self) -> bool:
+        """Whether the current interval has passed since the last run."""
+        return self._last_run is None or self._clock() - self._last_run >= self.interval_seconds
+
+    def mark_run(self) -> None:
+        """Record that a run is starting now."""
+        self._last_run = self._clock()
+
+    def observe(self, arrivals: Optional[int]) -> float:
+        """Update the interval from the number of arrivals a run found.
+
+        :param arrivals: int, the arrivals found by the run, or None if the run couldn't tell (the interval is kept).
+        :return: float, the new interval in seconds.
+        """
+        if arrivals is None:
+            return self.interval_seconds
+        run_rate = arrivals * 3600 / self.interval_seconds
+        self.arrivals_per_hour += self.smoothing * (run_rate - self.arrivals_per_hour)
+        if arrivals:
+            self.interval_seconds = self.min_seconds
+        else:
+            self.interval_seconds = min(self.interval_seconds * self.widen_factor, self.max_seconds)
+        lg.debug('%s arrivals (%.1f per hour smoothed); next run in %.0f seconds.', arrivals, self.arrivals_per_hour,
+                 self.interval_seconds)
+        return self.interval_seconds
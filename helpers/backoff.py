@@ -0,0 +1,78 @@
+"""Wait for something to become ready by probing it, with exponential backoff and jitter, up to a deadline.
+
+Recovering Outlook used to sleep for fixed times long enough for the slowest case; probing returns as soon as Outlook
+answers. The delay between probes starts at initial_delay and doubles up to max_delay, each randomly shortened by up to
+the jitter fraction so that several processes recovering at once don't probe in step.
+
+example:
+    result = wait_until_ready(lambda: outlook_answers(), deadline_seconds=30.0)
+    if not result.ready:
+        restart_outlook()
+
+Classes:
+    ReadinessResult: Whether the probe succeeded, after how many probes and how long.
+
+Functions:
+    backoff_delays: The delays between probes.
+    wait_until_ready: Probe until ready or the deadline passes.
+
+"""
+
+import random
+import time
+from typing import Callable, Iterator, NamedTuple, Optional
+
+
+class ReadinessResult(NamedTuple):
+    """Whether the probe succeeded, after how many probes and how long."""
+    ready: bool
+    attempts: int
+    seconds: float
+
+
+def backoff_delays(initial_delay: float = 0.5, max_delay: float = 5.0, jitter: float = 0.5,
+                   rng: Optional[random.Random] = None) -> Iterator[float]:
+    """Get the delays between probes: initial_delay doubling up to max_delay, each shortened by up to jitter of it.
+
+    :param initial_delay: float, the seconds before the second probe.
+    :param max_delay: float, the most seconds between probes.
+    :param jitter: float, from 0 to 1, the largest fraction a delay may be randomly shortened by.
+    :param rng: random.Random, for repeatable delays.
+    :return: an endless iterator of delays in seconds.
+    """
+    rng = rng or random.Random()
+    delay = initial_delay
+    while True:
+        yield delay * (1 - jitter * rng.random())
+        delay = min(delay * 2, max_delay)
+
+
+def wait_until_ready(probe: Callable[[], bool], deadline_seconds: float, initial_delay: float = 0.5,
+                     max_delay: float = 5.0, jitter: float = 0.5, sleep: Callable[[float], None] = time.sleep,
+                     clock: Callable[[], float] = time.monotonic,
+                     rng: Optional[random.Random] = None) -> ReadinessResult:
+    """Probe until ready or the deadline passes.
+
+    The probe is called at once and then after each backoff delay; the last delay is cut short so the last probe is at
+    the deadline.
+
+    :param probe: callable returning True once ready; it should catch its own errors.
+    :param deadline_seconds: float, how long to keep probing.
+    :param initial_delay: float, see backoff_delays.
+    :param max_delay: float, see backoff_delays.
+    :param jitter: float, see backoff_delays.
+    :param sleep: callable sleeping for the given seconds.
+    :param clock: callable returning the current time in seconds.
+    :param rng: random.Random, for repeatable delays.
+    :return: ReadinessResult, whether the probe succeeded, the number of probes and the seconds waited.
+    """
+    start = clock()
+    attempts = 0
+    for delay in backoff_delays(initial_delay, max_delay, jitter, rng):
+        attempts += 1
+        if probe():
+            return ReadinessResult(True, attempts, clock() - start)
+        remaining = deadline_seconds - (clock() - start)
+        if remaining <= 0:
+            return ReadinessResult(False, attempts, clock() - start)
+        sleep(min(delay, remaining))
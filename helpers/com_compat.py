@@ -0,0 +1,47 @@
+"""The pywin32 names this program uses, with fallbacks where pywin32 isn't installed.
+
+Outlook automation needs Windows and pywin32, but the mail processing itself doesn't: a recorded Outlook session can be
+replayed through main_process on any machine (see helpers.com_replay). Modules get pywin32 from here so that they still
+import without it; anything that actually needs Outlook raises when called.
+
+Variables:
+    HAVE_PYWIN32: Whether pywin32 is installed.
+    pythoncom: The pythoncom module, or None.
+    com_error: pywintypes.com_error, or a stand-in exception class with the same hresult attribute.
+    CDispatch: The win32com Dispatch object type, for type hints.
+
+Functions:
+    dispatch: win32com.client.Dispatch.
+
+"""
+
+from typing import Any
+
+try:
+    import pythoncom
+    import pywintypes
+    from win32com import client as wclient
+
+    HAVE_PYWIN32 = True
+    com_error = pywintypes.com_error
+    CDispatch = wclient.CDispatch
+    dispatch = wclient.Dispatch
+
+except ImportError:
+    pythoncom = None
+    HAVE_PYWIN32 = False
+    CDispatch = Any
+
+    class com_error(Exception):
+        """Stand-in for pywintypes.com_error, e.g. for errors replayed from a recorded session."""
+
+        def __init__(self, hresult: int = 0, strerror: str = '', excepinfo: Any = None, argerror: Any = None):
+            super().__init__(hresult, strerror, excepinfo, argerror)
+            self.hresult = hresult
+            self.strerror = strerror
+            self.excepinfo = excepinfo
+            self.argerror = argerror
+
+    def dispatch(prog_id: str) -> Any:
+        """Stand-in for win32com.client.Dispatch; Outlook can't be dispatched without pywin32."""
+        raise RuntimeError(f'pywin32 is needed to dispatch {prog_id}.')
@@ -0,0 +1,266 @@
+"""Play back an Outlook session recorded by helpers.com_tracing, without Outlook.
+
+A ReplaySession reads a trace file and hands out ReplayObjects in place of the recorded COM objects. Each property get,
+method call and iteration step on a ReplayObject is answered with what the recorded object returned for it, so
+main_process can run against the shape of a real mailbox on any machine, e.g. to profile a change. Property sets and
+mutating calls (Move, Save, ...) change nothing; attachments saved with SaveAsFile are written from the trace.
+
+All the recorded sessions (OutlookSingleton's and the folder pool's per-thread ones) are of the same mailbox, so their
+Outlook applications and MAPI namespaces are merged into one. Accesses are matched to the recording by object, member,
+kind and arguments. When the arguments differ (e.g. a Restrict filter with today's date), a call with the same
+arguments on another object is tried, then the next unused recording of that member on that object. Once a member's
+recordings are used up, the last is repeated.
+
+example:
+    replay = ReplaySession('./logs/outlook_session_account.trace.jsonl.gz')
+    found_folders, inbox_folders = get_process_ol_folders(replay.outlook, acct)
+    main_process_function(found_folders, inbox_folders, session_factory=replay.thread_session)
+
+The folders must be processed the way they were recorded: a recording made with the folder pool has each folder's
+items under the folder as opened in its worker's session, so it must be replayed with the folder pool too.
+
+Classes:
+    ReplaySession: A recorded Outlook session, read from a trace file.
+    ReplayObject: Stands in for one recorded COM object.
+    ReplayOutlook: Stands in for OutlookSingleton, handing out the recorded session.
+
+"""
+
+import base64
+import collections
+import contextlib
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from helpers.com_compat import com_error
+from helpers.com_tracing import TRACE_FORMAT, encode_trace_value
+
+
+class ReplaySession:
+    """A recorded Outlook session, read from a trace file.
+    """
+
+    def __init__(self, trace_path: str, replay_latency: bool = False):
+        """
+        :param trace_path: str, the path of the trace file written by ComTracer.start_recording.
+        :param replay_latency: bool, whether to sleep for each access' recorded latency, to reproduce the wall time of
+            the recorded run rather than just its calls.
+        """
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._objects: Dict[int, ReplayObject] = {}
+        self._root_ref: Optional[int] = None
+        self._namespace_ref: Optional[int] = None
+        self._aliases: Dict[int, int] = {}  # merged roots and namespaces to the first ones
+        # each index maps a key to [events, the index of the first one that may be unused]
+        self._exact: Dict[Tuple, List] = {}
+        self._by_arguments: Dict[Tuple, List] = {}
+        self._by_member: Dict[Tuple, List] = {}
+        self.unmatched: collections.Counter = collections.Counter()  # (member, kind) accesses with no recording
+
+        with gzip.open(trace_path, 'rt', encoding='utf-8') as tf:
+            header = json.loads(tf.readline())
+            if header.get('format') != TRACE_FORMAT:
+                raise ValueError(f'{trace_path} is not an Outlook session trace.')
+            for line in tf:
+                event = json.loads(line)
+                if 'root' in event:
+                    if self._root_ref is None:
+                        self._root_ref = event['root']
+                    else:
+                        self._aliases[event['root']] = self._root_ref
+                    continue
+                self._merge_sessions(event)
+                event['used'] = False
+                arguments = json.dumps(event['a'])
+                self._exact.setdefault((event['o'], event['m'], event['k'], arguments), [[], 0])[0].append(event)
+                if event['a']:
+                    self._by_arguments.setdefault((event['m'], event['k'], arguments), [[], 0])[0].append(event)
+                self._by_member.setdefault((event['o'], event['m'], event['k']), [[], 0])[0].append(event)
+
+    def _merge_sessions(self, event: Dict[str, Any]) -> None:
+        """Point an event's references to merged objects at the objects they were merged into, and merge the
+        namespaces the Outlook applications return."""
+        event['o'] = self._aliases.get(event['o'], event['o'])
+        event['a'] = [self._alias(arg) for arg in event['a']]
+        if 'r' not in event:
+            return
+        if event['o'] == self._root_ref and event['m'] == 'GetNamespace' and isinstance(event['r'], dict):
+            if self._namespace_ref is None:
+                self._namespace_ref = event['r']['ref']
+            elif event['r']['ref'] != self._namespace_ref:
+                self._aliases[event['r']['ref']] = self._namespace_ref
+        event['r'] = self._alias(event['r'])
+
+    def _alias(self, value: Any) -> Any:
+        """Point an encoded reference to a merged object at the object it was merged into."""
+        if isinstance(value, dict) and 'ref' in value:
+            return {'ref': self._aliases.get(value['ref'], value['ref'])}
+        if isinstance(value, dict) and 'seq' in value:
+            return {'seq': [self._alias(v) for v in value['seq']]}
+        return value
+
+    @property
+    def outlook(self) -> 'ReplayOutlook':
+        """A stand-in for OutlookSingleton that hands out the recorded session."""
+        return ReplayOutlook(self)
+
+    @property
+    def root(self) -> 'ReplayObject':
+        """The recorded Outlook application."""
+        if self._root_ref is None:
+            raise LookupError('No Outlook session in the trace.')
+        return self.get_object(self._root_ref)
+
+    @contextlib.contextmanager
+    def thread_session(self) -> Iterator['ReplayObject']:
+        """Replay a folder pool session's MAPI namespace; use as main_process_function's session_factory."""
+        yield self.root.GetNamespace('MAPI')
+
+    def get_object(self, ref: int) -> 'ReplayObject':
+        """Get the stand-in for a recorded object."""
+        with self._lock:
+            replay_object = self._objects.get(ref)
+            if replay_object is None:
+                replay_object = self._objects[ref] = ReplayObject(self, ref)
+        return replay_object
+
+    def has_calls(self, ref: int, member: str) -> bool:
+        """Whether the recorded object's member was called as a method (rather than read as a property)."""
+        return (ref, member, 'call') in self._by_member
+
+    def answer(self, ref: int, member: str, kind: str, args: tuple = ()) -> Any:
+        """Answer an access with the recorded result, raising the recorded error if it raised.
+
+        :param ref: int, the recorded object's ID.
+        :param member: str, the property or method name.
+        :param kind: str, 'get', 'call', 'iter', 'len' or 'bool'.
+        :param args: tuple, the call's arguments.
+        :return: the decoded result; COM objects are ReplayObjects.
+        :raises AttributeError: if the trace has nothing for the access.
+        """
+        arguments = json.dumps([encode_trace_value(arg) for arg in args])
+        with self._lock:
+            event = self._take(self._exact.get((ref, member, kind, arguments)))
+            if event is None and args:
+                event = self._take(self._by_arguments.get((member, kind, arguments)))
+            if event is None:
+                event = self._take(self._by_member.get((ref, member, kind)))
+            if event is None:
+                self.unmatched[(member, kind)] += 1
+        if event is None:
+            raise AttributeError(f'The trace has no {kind} of {member} on object {ref}.')
+        if self.replay_latency:
+            time.sleep(event['t'])
+        if 'f' in event and args:
+            save_dir = os.path.dirname(args[0])
+            if save_dir and not os.path.exists(save_dir):
+                os.makedirs(save_dir)
+            with open(args[0], 'wb') as sf:
+                sf.write(base64.b64decode(event['f']))
+        if 'e' in event:
+            error = event['e']
+            if error['hresult'] is not None:
+                raise com_error(error['hresult'], error['message'], None, None)
+            raise RuntimeError(f"{error['type']}: {error['message']}")
+        return self._decode(event['r'])
+
+    @staticmethod
+    def _take(index: Optional[List]) -> Optional[Dict[str, Any]]:
+        """Take the first unused event of an index entry, or repeat its last event if all are used."""
+        if index is None:
+            return None
+        events, start = index
+        for position in range(start, len(events)):
+            if not events[position]['used']:
+                events[position]['used'] = True
+                index[1] = position + 1
+                return events[position]
+        index[1] = len(events)
+        return events[-1]
+
+    def _decode(self, value: Any) -> Any:
+        """Decode a value from the trace file."""
+        if not isinstance(value, dict):
+            return value
+        if 'ref' in value:
+            return self.get_object(value['ref'])
+        if 'stop' in value:
+            return StopIteration
+        if 'datetime' in value:
+            return datetime.datetime.fromisoformat(value['datetime'])
+        if 'bytes' in value:
+            return base64.b64decode(value['bytes'])
+        if 'seq' in value:
+            return tuple(self._decode(v) for v in value['seq'])
+        return value['repr']
+
+
+class ReplayObject:
+    """Stands in for one recorded COM object.
+    """
+    __slots__ = ('_session', 'replay_ref')
+
+    def __init__(self, session: ReplaySession, ref: int):
+        object.__setattr__(self, '_session', session)
+        object.__setattr__(self, 'replay_ref', ref)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._session.has_calls(self.replay_ref, name):
+            return lambda *args: self._session.answer(self.replay_ref, name, 'call', args)
+        return self._session.answer(self.replay_ref, name, 'get')
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass  # the replay doesn't change the recorded mailbox
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            value = self._session.answer(self.replay_ref, '__iter__', 'iter')
+            if value is StopIteration:
+                return
+            yield value
+
+    def __len__(self) -> int:
+        return self._session.answer(self.replay_ref, '__len__', 'len')
+
+    def __bool__(self) -> bool:
+        try:
+            return self._session.answer(self.replay_ref, '__bool__', 'bool')
+        except AttributeError:
+            return True  # COM objects are truthy
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, ReplayObject) and other.replay_ref == self.replay_ref
+
+    def __hash__(self) -> int:
+        return hash(self.replay_ref)
+
+    def __repr__(self) -> str:
+        return f'ReplayObject({self.replay_ref})'
+
+
+class ReplayOutlook:
+    """Stands in for OutlookSingleton, handing out the recorded session.
+    """
+
+    def __init__(self, session: ReplaySession):
+        self._session = session
+
+    def get_outlook(self) -> ReplayObject:
+        """Get the recorded Outlook application."""
+        return self._session.root
+
+    def get_outlook_folders(self) -> ReplayObject:
+        """Get the recorded MAPI namespace."""
+        return self.get_outlook().GetNamespace('MAPI')
+
+    def reset_outlook(self) -> ReplayObject:
+        """There's no Outlook to reset; get the recorded Outlook application."""
+        return self.get_outlook()
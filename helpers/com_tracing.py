@@ -0,0 +1,325 @@
+"""An opt-in proxy that counts and times every COM property get/set and method call, and can record them.
+
+Each run talks to Outlook through thousands of small COM calls (a property get per mail item per field, and so on), and
+that chattiness is easy to suspect and hard to see. When tracing is on, the Outlook objects handed out by
+OutlookSingleton and by the folder pool's per-thread sessions are wrapped in a ComProxy. Every object a proxy returns
+(folders, item collections, mail items) is wrapped too, so every get, set, call and iteration step below it is timed
+and attributed to the line of this program's code that made it. At the end of the run the tracer reports the members
+that took the most time:
+
+    Subject get: 4,812 calls, 9.3 s (clean_foam_inbox.py:41 process_mail_items)
+
+While recording, every access is also written to a trace file (gzipped JSON lines) with its arguments, its return
+value (objects by reference), its latency, and the bytes of any attachment saved, so that helpers.com_replay can play
+the session back without Outlook.
+
+Classes:
+    ComTracer: Collects the calls made through its proxies, reports on them and records them.
+    ComProxy: Wraps a COM object, recording each access to it with a ComTracer.
+
+Functions:
+    encode_trace_value: Encode a value for the trace file.
+
+Variables:
+    com_tracer: The tracer for this process.
+
+"""
+
+import base64
+import collections
+import datetime
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import types
+from typing import Any, Dict, List, Optional, Tuple
+
+from untracked_config.performance_settings import COM_TRACING_PARAMETERS
+
+# values returned as they are; everything else that isn't a method is assumed to be a COM object and is wrapped
+_PLAIN_TYPES = (str, bytes, int, float, bool, type(None), datetime.date, datetime.time, datetime.timedelta)
+_METHOD_TYPES = (types.MethodType, types.FunctionType, types.BuiltinFunctionType, types.BuiltinMethodType)
+_THIS_FILE = sys._getframe().f_code.co_filename  # as the interpreter names this module's frames
+_STOP = object()  # the result of the iteration step that finds the end of a collection
+
+TRACE_FORMAT = 'outlook-session-trace'
+TRACE_VERSION = 1
+
+
+class ComTracer:
+    """Collects the calls made through its proxies, reports on them and records them.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: bool, whether wrap() wraps objects; when False (and not recording) it returns them as they are.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], List] = {}  # (member, kind): [calls, seconds, call site Counter]
+        self._trace_file = None
+        self._next_trace_id = 0
+
+    @property
+    def recording(self) -> bool:
+        """Whether the accesses are being recorded to a trace file."""
+        return self._trace_file is not None
+
+    def wrap(self, com_object: Any) -> Any:
+        """Wrap a COM object so the calls made through it are recorded, if tracing is enabled or recording.
+
+        :param com_object: the COM object.
+        :return: the proxy, or the object itself when tracing is disabled or it's already wrapped.
+        """
+        if not (self.enabled or self.recording) or isinstance(com_object, ComProxy):
+            return com_object
+        proxy = ComProxy(com_object, self)
+        if self.recording:
+            self._write(dict(root=proxy._trace_id))
+        return proxy
+
+    def record(self, member: str, kind: str, seconds: float) -> None:
+        """Record one access in the statistics.
+
+        :param member: str, the property or method name.
+        :param kind: str, 'get', 'set', 'call', 'iter', 'len' or 'bool'.
+        :param seconds: float, how long the access took.
+        """
+        call_site = _find_call_site()
+        with self._lock:
+            stats = self._stats.get((member, kind))
+            if stats is None:
+                stats = self._stats[(member, kind)] = [0, 0.0, collections.Counter()]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2][call_site] += 1
+
+    def record_access(self, proxy: 'ComProxy', member: str, kind: str, seconds: float, args: tuple = (),
+                      result: Any = None, error: Optional[BaseException] = None) -> None:
+        """Record one access in the statistics and, while recording, in the trace file.
+
+        :param proxy: ComProxy, the proxy the access was made through.
+        :param member: str, the property or method name.
+        :param kind: str, 'get', 'set', 'call', 'iter', 'len' or 'bool'.
+        :param seconds: float, how long the access took.
+        :param args: tuple, the call's arguments, or the value set.
+        :param result: the value returned, with COM objects wrapped.
+        :param error: the exception raised, if any.
+        """
+        self.record(member, kind, seconds)
+        if not self.recording:
+            return
+        event = dict(o=proxy._trace_id, m=member, k=kind, t=seconds,
+                     a=[encode_trace_value(arg) for arg in args])
+        if error is not None:
+            event['e'] = dict(type=type(error).__name__, hresult=getattr(error, 'hresult', None), message=str(error))
+        else:
+            event['r'] = encode_trace_value(result)
+            if member == 'SaveAsFile' and kind == 'call' and args and os.path.exists(args[0]):
+                with open(args[0], 'rb') as sf:  # keep the saved attachment so the replay can save it too
+                    event['f'] = base64.b64encode(sf.read()).decode('ascii')
+        self._write(event)
+
+    def new_trace_id(self) -> Optional[int]:
+        """Get an ID for a new proxy while recording; None otherwise."""
+        if not self.recording:
+            return None
+        with self._lock:
+            self._next_trace_id += 1
+            return self._next_trace_id
+
+    def start_recording(self, trace_path: str) -> None:
+        """Start recording the accesses made through proxies created from now on to a trace file.
+
+        :param trace_path: str, the path of the gzipped JSON lines trace file to write.
+        """
+        trace_dir = os.path.dirname(trace_path)
+        if trace_dir and not os.path.exists(trace_dir):
+            os.makedirs(trace_dir)
+        self._trace_file = gzip.open(trace_path, 'wt', encoding='utf-8')
+        self._write(dict(format=TRACE_FORMAT, version=TRACE_VERSION, started=datetime.datetime.now().isoformat()))
+
+    def stop_recording(self) -> None:
+        """Stop recording and close the trace file."""
+        with self._lock:
+            trace_file, self._trace_file = self._trace_file, None
+        if trace_file is not None:
+            trace_file.close()
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        """Write an event to the trace file as a JSON line."""
+        line = json.dumps(event, separators=(',', ':'))
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.write(line + '\n')
+
+    def reset(self) -> None:
+        """Forget the recorded calls; call at the start of each run."""
+        with self._lock:
+            self._stats = {}
+
+    def summary(self, top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the recorded members, the slowest in total first.
+
+        :param top_n: int, how many members to include; all if None.
+        :return: list, dicts of 'member', 'kind', 'calls', 'seconds' and 'call_sites' (call site: calls, most first).
+        """
+        with self._lock:
+            rows = [dict(member=member, kind=kind, calls=calls, seconds=seconds,
+                         call_sites=dict(call_sites.most_common()))
+                    for (member, kind), (calls, seconds, call_sites) in self._stats.items()]
+        rows.sort(key=lambda row: row['seconds'], reverse=True)
+        return rows[:top_n] if top_n is not None else rows
+
+    def report(self, top_n: int = 20) -> str:
+        """Format the slowest members as text, one per line, with their busiest call site.
+
+        :param top_n: int, how many members to include.
+        :return: str, the report.
+        """
+        rows = self.summary()
+        total_calls = sum(row['calls'] for row in rows)
+        total_seconds = sum(row['seconds'] for row in rows)
+        lines = [f'COM calls: {total_calls:,} calls, {total_seconds:.1f} s']
+        for row in rows[:top_n]:
+            top_site = next(iter(row['call_sites']), '')
+            lines.append(f"{row['member']} {row['kind']}: {row['calls']:,} calls, {row['seconds']:.1f} s ({top_site})")
+        return '\n'.join(lines)
+
+
+class ComProxy:
+    """Wraps a COM object, recording each access to it with a ComTracer.
+
+    Arguments passed to the wrapped object's methods and property sets are unwrapped first, so proxies can be passed
+    wherever the COM objects themselves would be (e.g. mail_item.Move(folder)).
+    """
+    __slots__ = ('_com_object', '_tracer', '_trace_id')
+
+    def __init__(self, com_object: Any, tracer: ComTracer):
+        object.__setattr__(self, '_com_object', com_object)
+        object.__setattr__(self, '_tracer', tracer)
+        object.__setattr__(self, '_trace_id', tracer.new_trace_id())
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('_'):  # e.g. probes for __array__; not Outlook properties
+            return getattr(self._com_object, name)
+        start = time.perf_counter()
+        try:
+            value = getattr(self._com_object, name)
+        except Exception as err:
+            self._tracer.record_access(self, name, 'get', time.perf_counter() - start, error=err)
+            raise
+        if isinstance(value, _METHOD_TYPES):
+            return self._traced_method(name, value)
+        seconds = time.perf_counter() - start
+        result = self._wrap_result(value)
+        self._tracer.record_access(self, name, 'get', seconds, result=result)
+        return result
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        start = time.perf_counter()
+        setattr(self._com_object, name, _unwrap(value))
+        self._tracer.record_access(self, name, 'set', time.perf_counter() - start, args=(value,))
+
+    def __iter__(self):
+        iterator = iter(self._com_object)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                self._tracer.record_access(self, '__iter__', 'iter', time.perf_counter() - start, result=_STOP)
+                return
+            seconds = time.perf_counter() - start
+            result = self._wrap_result(value)
+            self._tracer.record_access(self, '__iter__', 'iter', seconds, result=result)
+            yield result
+
+    def __len__(self) -> int:
+        start = time.perf_counter()
+        length = len(self._com_object)
+        self._tracer.record_access(self, '__len__', 'len', time.perf_counter() - start, result=length)
+        return length
+
+    def __bool__(self) -> bool:
+        start = time.perf_counter()
+        truth = bool(self._com_object)
+        self._tracer.record_access(self, '__bool__', 'bool', time.perf_counter() - start, result=truth)
+        return truth
+
+    def __eq__(self, other: Any) -> bool:
+        return self._com_object == _unwrap(other)
+
+    def __hash__(self) -> int:
+        return hash(self._com_object)
+
+    def __repr__(self) -> str:
+        return f'ComProxy({self._com_object!r})'
+
+    def _traced_method(self, name: str, method: Any) -> Any:
+        """Wrap a method of the COM object so its calls are timed and its result wrapped."""
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*[_unwrap(arg) for arg in args], **{k: _unwrap(v) for k, v in kwargs.items()})
+            except Exception as err:
+                self._tracer.record_access(self, name, 'call', time.perf_counter() - start, args=args, error=err)
+                raise
+            seconds = time.perf_counter() - start
+            result = self._wrap_result(result)
+            self._tracer.record_access(self, name, 'call', seconds, args=args, result=result)
+            return result
+        return traced
+
+    def _wrap_result(self, value: Any) -> Any:
+        """Wrap a returned value if it's a COM object."""
+        if isinstance(value, _PLAIN_TYPES) or isinstance(value, ComProxy):
+            return value
+        if isinstance(value, tuple):
+            return tuple(self._wrap_result(v) for v in value)
+        return ComProxy(value, self._tracer)
+
+
+def _unwrap(value: Any) -> Any:
+    """Get the COM object behind a proxy; other values are returned as they are."""
+    return object.__getattribute__(value, '_com_object') if isinstance(value, ComProxy) else value
+
+
+def encode_trace_value(value: Any) -> Any:
+    """Encode a value for the trace file; JSON types as they are, others as a single-key dict.
+
+    :param value: the value; COM objects must be wrapped (or be replayed objects) to be encoded as references.
+    :return: the JSON serializable encoding.
+    """
+    if value is _STOP:
+        return {'stop': True}
+    if isinstance(value, ComProxy):
+        return {'ref': value._trace_id}
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, datetime.datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (tuple, list)):
+        return {'seq': [encode_trace_value(v) for v in value]}
+    replay_ref = getattr(value, 'replay_ref', None)  # an object from helpers.com_replay passed back in
+    if replay_ref is not None:
+        return {'ref': replay_ref}
+    return {'repr': repr(value)}
+
+
+def _find_call_site() -> str:
+    """Get 'file.py:line function' for the first frame outside this module."""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == _THIS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return '?'
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}'
+
+
+com_tracer = ComTracer(COM_TRACING_PARAMETERS['enabled'])
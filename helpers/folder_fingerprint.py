@@ -0,0 +1,127 @@
+"""Cheap fingerprints of Outlook folders, for skipping runs when nothing has changed.
+
+A fingerprint is the folder's item count and the newest ReceivedTime and LastModificationTime among its items, plus the
+folder's EntryID and StoreID so the next run can open the folder directly (Namespace.GetFolderFromID) instead of
+walking the folder tree. Given the folder's previous fingerprint, the newest times are looked for only among the items
+restricted to those at or after the previous newest times, usually none or a few, so getting one costs a handful of COM
+calls however large the folder is; only a folder's first fingerprint sorts its items.
+
+Functions:
+    get_folder_fingerprint: Get the fingerprint of an Outlook folder.
+    fingerprint_changed: Whether a folder's fingerprint differs from its previous one.
+    count_arrivals: Estimate how many items arrived between two fingerprints of a folder.
+    load_fingerprints: Load the saved fingerprints.
+    save_fingerprints: Save fingerprints for the next run.
+
+"""
+
+import datetime
+import json
+import os
+from typing import Any, Dict, Optional
+
+from helpers.restrict_filter import Comparison, to_restriction, to_utc
+
+# the fingerprint values compared between runs; the IDs only locate the folder
+compared_keys = ('item_count', 'newest_received', 'newest_modified')
+
+
+def _newest_value(items: Any, property_name: str, previous_newest: Optional[str] = None) -> Optional[str]:
+    """Get the newest value of a date property among a folder's items, as an ISO format string.
+
+    :param items: The folder's Items collection.
+    :param property_name: str, the name of the date property, e.g. 'ReceivedTime'.
+    :param previous_newest: str, the newest value in the folder's previous fingerprint; only the items at or after it
+        are looked at. If None, the items are sorted newest first.
+    :return: str, the newest value; None if the folder is empty, `previous_newest` if no item is at or after it (e.g.
+        the newest item was moved out, which the item count shows).
+    """
+    if previous_newest is None:
+        items.Sort(f'[{property_name}]', True)  # newest first
+        newest_item = items.GetFirst()
+        return None if newest_item is None else getattr(newest_item, property_name).isoformat()
+
+    # pywin32 marks Outlook's local times as UTC, see restrict_filter; DASL compares to the minute, so >= keeps the
+    # previous newest item in the window
+    since = to_utc(datetime.datetime.fromisoformat(previous_newest).replace(tzinfo=None))
+    window = items.Restrict(to_restriction(Comparison(property_name, '>=', since)))
+    newest = None
+    item = window.GetFirst()
+    while item is not None:
+        value = getattr(item, property_name)
+        newest = value if newest is None or value > newest else newest
+        item = window.GetNext()
+    return previous_newest if newest is None else newest.isoformat()
+
+
+def get_folder_fingerprint(ol_folder: Any, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Get the fingerprint of an Outlook folder.
+
+    :param ol_folder: The Outlook folder.
+    :param previous: dict, the folder's previous fingerprint, if any; see _newest_value.
+    :return: dict, the folder's IDs, item count and newest received and modified times.
+    """
+    previous = previous or {}
+    items = ol_folder.Items
+    return {'entry_id': ol_folder.EntryID,
+            'store_id': ol_folder.StoreID,
+            'item_count': items.Count,
+            'newest_received': _newest_value(items, 'ReceivedTime', previous.get('newest_received')),
+            'newest_modified': _newest_value(items, 'LastModificationTime', previous.get('newest_modified')),
+            }
+
+
+def fingerprint_changed(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> bool:
+    """Whether a folder's fingerprint differs from its previous one.
+
+    :param previous: dict, the previous fingerprint, or None if there wasn't one.
+    :param current: dict, the current fingerprint.
+    :return: bool, True if the folder changed or there is nothing to compare with.
+    """
+    if previous is None:
+        return True
+    return any(previous.get(key) != current.get(key) for key in compared_keys)
+
+
+def count_arrivals(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> int:
+    """Estimate how many items arrived between two fingerprints of a folder.
+
+    Items moved out of the folder hide arrivals, so this is a lower bound; it is only used to pace the scheduler.
+
+    :param previous: dict, the previous fingerprint, or None if there wasn't one.
+    :param current: dict, the current fingerprint.
+    :return: int, the estimated number of arrivals.
+    """
+    if previous is None:
+        return 0
+    arrivals = max(current['item_count'] - previous['item_count'], 0)
+    if not arrivals and current['newest_received'] != previous['newest_received']:
+        arrivals = 1  # something new arrived, but as many items left
+    return arrivals
+
+
+def load_fingerprints(fingerprints_path: str) -> Dict[str, Any]:
+    """Load the saved fingerprints.
+
+    :param fingerprints_path: str, the path of the fingerprints JSON file.
+    :return: dict, with 'saved_at' and the 'folders' fingerprints keyed by folder path; empty if none were saved.
+    """
+    try:
+        with open(fingerprints_path, 'r') as ff:
+            return json.load(ff)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprints(fingerprints_path: str, folder_fingerprints: Dict[str, Dict[str, Any]], saved_at: str) -> None:
+    """Save fingerprints for the next run.
+
+    :param fingerprints_path: str, the path of the fingerprints JSON file.
+    :param folder_fingerprints: dict, the fingerprints keyed by folder path.
+    :param saved_at: str, ISO format time of the run that took the fingerprints.
+    """
+    fingerprints_dir = os.path.dirname(fingerprints_path)
+    if fingerprints_dir and not os.path.exists(fingerprints_dir):
+        os.makedirs(fingerprints_dir)
+    with open(fingerprints_path, 'w') as ff:
+        json.dump({'saved_at': saved_at, 'folders': folder_fingerprints}, ff, indent=4)
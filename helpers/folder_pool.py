@@ -0,0 +1,80 @@
+"""Process Outlook folders concurrently, each on a thread with its own COM apartment and Outlook session.
+
+COM objects belong to the apartment (thread) that created them, so a worker thread must not use the main thread's
+folder objects. Instead, the folders are passed to the workers by EntryID and StoreID, and each worker opens its own
+session and gets its folders from it with Namespace.GetFolderFromID.
+
+Functions:
+    get_folder_ids: Get the (EntryID, StoreID) of Outlook folders so they can be opened in another session.
+    map_folders_in_sessions: Run a function on each folder on a thread pool, each thread with its own Outlook session.
+
+"""
+
+import concurrent.futures
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple, TypeVar
+
+from log_setup import lg
+
+T = TypeVar('T')
+FolderIds = Tuple[str, str]  # (EntryID, StoreID)
+
+
+def get_folder_ids(folders: Dict[str, Any]) -> Dict[str, FolderIds]:
+    """Get the (EntryID, StoreID) of Outlook folders so they can be opened in another session.
+
+    :param folders: dict, the folder objects keyed by folder path.
+    :return: dict, the (EntryID, StoreID) tuples keyed by folder path.
+    """
+    return {folder_path: (ol_folder.EntryID, ol_folder.StoreID) for folder_path, ol_folder in folders.items()}
+
+
+def _run_in_session(work: Callable[[str, Any, Dict[str, Any]], T], folder_path: str, folder_ids: FolderIds,
+                    shared_folder_ids: Dict[str, FolderIds], session_factory: Callable[[], ContextManager]) -> T:
+    """Open a session on this thread, get the folders from it and run the work on them."""
+    with session_factory() as namespace:
+        ol_folder = namespace.GetFolderFromID(*folder_ids)
+        shared_folders = {path: namespace.GetFolderFromID(*ids) for path, ids in shared_folder_ids.items()}
+        del namespace  # the session's objects must be released before its apartment is closed
+        try:
+            return work(folder_path, ol_folder, shared_folders)
+        finally:
+            del ol_folder, shared_folders
+
+
+def map_folders_in_sessions(work: Callable[[str, Any, Dict[str, Any]], T], folder_ids: Dict[str, FolderIds],
+                            shared_folder_ids: Optional[Dict[str, FolderIds]] = None, max_workers: int = 2,
+                            session_factory: Optional[Callable[[], ContextManager]] = None
+                            ) -> List[Tuple[str, T]]:
+    """Run a function on each folder on a thread pool, each thread with its own Outlook session.
+
+    `work(folder_path, ol_folder, shared_folders)` is called on a worker thread with the folder, and the shared folders
+    (e.g. the folder duplicates are moved to) keyed by path, all opened in that thread's session. It must not return
+    COM objects, as they can't be used once the session is closed.
+
+    :param work: callable, the work to do for each folder.
+    :param folder_ids: dict, the (EntryID, StoreID) of the folders to work on, keyed by folder path.
+    :param shared_folder_ids: dict, the (EntryID, StoreID) of folders every worker needs, keyed by folder path.
+    :param max_workers: int, the most folders worked on at once; keep this low, Outlook limits concurrent sessions.
+    :param session_factory: callable returning a context manager that opens a session on the current thread and
+        gives its MAPI namespace; outlook_interface.outlook_thread_session by default.
+    :return: list, (folder path, work result) tuples in the order of `folder_ids`, however the work finished.
+    :raises Exception: the first exception raised by the work, in folder order, once all folders are done.
+    """
+    if session_factory is None:
+        from outlook_interface import outlook_thread_session as session_factory
+    shared_folder_ids = shared_folder_ids or {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='folder') as pool:
+        futures = {folder_path: pool.submit(_run_in_session, work, folder_path, ids, shared_folder_ids,
+                                            session_factory)
+                   for folder_path, ids in folder_ids.items()}
+        concurrent.futures.wait(futures.values())
+
+    results = []
+    for folder_path, future in futures.items():  # merged in the given folder order
+        error = future.exception()
+        if error is not None:
+            lg.error('Error processing %s: %s', folder_path, error)
+            raise error
+        results.append((folder_path, future.result()))
+    return results
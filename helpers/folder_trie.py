@@ -0,0 +1,69 @@
+"""A trie of Outlook folder paths, to guide the folder search to the folders it must find.
+
+Each node is a folder name; the path from the root to a node is a folder path split on its backslashes, so the nodes
+are the folders that are, or contain, a folder to find. The search only goes into the sub folders of folders with a
+node, and checks a sub folder by its name in its parent's node instead of comparing its path with every folder to find.
+
+example:
+    trie = FolderPathTrie([r'\\\\account\\Inbox\\Foam', r'\\\\account\\Inbox\\NBE'])
+    inbox_node = trie.node_for(r'\\\\account\\Inbox')
+    inbox_node.children.keys()  # {'Foam', 'NBE'}
+
+Classes:
+    FolderPathTrie: The folder paths to find, as a trie of folder names.
+    TrieNode: A folder in the trie.
+
+Functions:
+    split_folder_path: Split a folder path into its folder names.
+
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+
+def split_folder_path(folder_path: str) -> List[str]:
+    """Split a folder path into its folder names, e.g. '\\\\\\\\account\\\\Inbox' into ['account', 'Inbox'].
+
+    :param folder_path: str, an Outlook FolderPath.
+    :return: list, the store's name and the folder names.
+    """
+    return folder_path.lstrip('\\').split('\\')
+
+
+class TrieNode:
+    """A folder in the trie.
+    """
+    __slots__ = ('children', 'is_target')
+
+    def __init__(self):
+        self.children: Dict[str, TrieNode] = {}
+        self.is_target = False  # whether the folder is one to find, not only the parent of one
+
+
+class FolderPathTrie:
+    """The folder paths to find, as a trie of folder names.
+    """
+
+    def __init__(self, folder_paths: Iterable[str]):
+        """
+        :param folder_paths: the paths of the folders to find.
+        """
+        self.root = TrieNode()
+        for folder_path in folder_paths:
+            node = self.root
+            for name in split_folder_path(folder_path):
+                node = node.children.setdefault(name, TrieNode())
+            node.is_target = True
+
+    def node_for(self, folder_path: str) -> Optional[TrieNode]:
+        """Get a folder's node, if it is or contains a folder to find.
+
+        :param folder_path: str, the folder's path.
+        :return: TrieNode, or None if no folder to find is in the folder.
+        """
+        node = self.root
+        for name in split_folder_path(folder_path):
+            node = node.children.get(name)
+            if node is None:
+                return None
+        return node
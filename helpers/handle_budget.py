@@ -0,0 +1,177 @@
+"""Keep the number of Outlook folders and items a session holds open under a budget.
+
+Every COM reference to a folder or item keeps its MAPI object open, and Exchange limits how many of each a session may
+have open (by default 500 folders and 250 messages); past that, Outlook fails to open more, which is why the folder
+search only goes into the sub folders of the folders it looks for. A HandleBudget tracks the folders and items it hands
+out as HandleRefs. A HandleRef keeps the object's EntryID and StoreID; the object itself is held by the budget, which
+releases the least recently used objects once more than its limit are open and re-opens them from their IDs when they
+are used again.
+
+example:
+    budget = HandleBudget(outlook_folders, max_open_folders=100)
+    folder = budget.track(ol_folder, 'folder')  # use in place of ol_folder
+    folder.Items  # re-opens the folder if it was released
+
+A budget belongs to one Outlook session, so it's used on the thread that owns the session.
+
+Classes:
+    HandleBudget: Holds open folders and items up to a limit, releasing the least recently used.
+    HandleRef: Stands in for a folder or item held by a HandleBudget.
+
+"""
+
+import collections
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from helpers.com_compat import CDispatch
+
+HANDLE_KINDS: Tuple[str, str] = ('folder', 'item')
+
+
+class HandleBudget:
+    """Holds open folders and items up to a limit, releasing the least recently used.
+    """
+
+    def __init__(self, session: CDispatch, max_open_folders: int = 100, max_open_items: int = 200):
+        """
+        :param session: CDispatch, the MAPI namespace the folders and items are re-opened from.
+        :param max_open_folders: int, the most folders held open at once.
+        :param max_open_items: int, the most items held open at once.
+        """
+        if min(max_open_folders, max_open_items) < 1:
+            raise ValueError('The budget must allow at least one open folder and one open item.')
+        self._session = session
+        self._limits = {'folder': max_open_folders, 'item': max_open_items}
+        self._open: Dict[str, collections.OrderedDict] = {kind: collections.OrderedDict() for kind in HANDLE_KINDS}
+        self.stats: Dict[str, Dict[str, int]] = {kind: {'opened': 0, 'reopened': 0, 'released': 0, 'peak_open': 0}
+                                                 for kind in HANDLE_KINDS}
+        self._ever_opened: Set[Tuple[str, str, str]] = set()  # to count re-opens
+
+    def track(self, com_object: CDispatch, kind: str = 'folder', label: Optional[str] = None) -> 'HandleRef':
+        """Hold an open folder or item under the budget.
+
+        :param com_object: CDispatch, the folder or item; don't keep other references to it.
+        :param kind: str, 'folder' or 'item'.
+        :param label: str, a name for logs, e.g. the folder path; a folder's FolderPath by default.
+        :return: HandleRef, to use in place of the object.
+        """
+        entry_id = com_object.EntryID
+        store_id = com_object.StoreID if kind == 'folder' else com_object.Parent.StoreID
+        if label is None and kind == 'folder':
+            label = com_object.FolderPath
+        ref = HandleRef(self, kind, entry_id, store_id, label)
+        self._hold(ref.key, com_object)
+        self.stats[kind]['opened'] += 1
+        self._ever_opened.add(ref.key)
+        return ref
+
+    def open_item(self, entry_id: str, store_id: str) -> 'HandleRef':
+        """Get a HandleRef for an item by its IDs; the item is opened when it's first used.
+
+        :param entry_id: str, the item's EntryID.
+        :param store_id: str, the item's StoreID.
+        :return: HandleRef, to use in place of the item.
+        """
+        return HandleRef(self, 'item', entry_id, store_id)
+
+    def get(self, ref: 'HandleRef') -> CDispatch:
+        """Get a HandleRef's object, re-opening it if it was released.
+
+        :param ref: HandleRef, from this budget.
+        :return: CDispatch, the open folder or item.
+        """
+        held = self._open[ref.kind]
+        com_object = held.get(ref.key)
+        if com_object is not None:
+            held.move_to_end(ref.key)
+            return com_object
+        if ref.kind == 'folder':
+            com_object = self._session.GetFolderFromID(ref.entry_id, ref.store_id)
+        else:
+            com_object = self._session.GetItemFromID(ref.entry_id, ref.store_id)
+        self.stats[ref.kind]['reopened' if ref.key in self._ever_opened else 'opened'] += 1
+        self._ever_opened.add(ref.key)
+        self._hold(ref.key, com_object)
+        return com_object
+
+    def _hold(self, key: Tuple[str, str, str], com_object: CDispatch) -> None:
+        """Hold an open object, releasing the least recently used of its kind if that goes over the limit."""
+        kind = key[0]
+        held = self._open[kind]
+        held[key] = com_object
+        held.move_to_end(key)
+        while len(held) > self._limits[kind]:
+            held.popitem(last=False)
+            self.stats[kind]['released'] += 1
+        self.stats[kind]['peak_open'] = max(self.stats[kind]['peak_open'], len(held))
+
+    def release(self, ref: 'HandleRef') -> None:
+        """Release a HandleRef's object now; it's re-opened if the ref is used again."""
+        if self._open[ref.kind].pop(ref.key, None) is not None:
+            self.stats[ref.kind]['released'] += 1
+
+    def release_all(self) -> None:
+        """Release all the held objects, e.g. at the end of a run."""
+        for kind, held in self._open.items():
+            self.stats[kind]['released'] += len(held)
+            held.clear()
+
+    def open_counts(self) -> Dict[str, int]:
+        """The number of folders and items held open now."""
+        return {kind: len(held) for kind, held in self._open.items()}
+
+
+class HandleRef:
+    """Stands in for a folder or item held by a HandleBudget.
+
+    Attribute gets, sets and iteration go to the object, re-opened if the budget released it. The EntryID and StoreID
+    (and a folder's FolderPath) are answered without opening it. Passing a HandleRef as a COM method argument works
+    as pywin32 unwraps arguments by their _oleobj_, which comes from the open object.
+    """
+    __slots__ = ('_budget', 'kind', 'entry_id', 'store_id', 'label')
+
+    def __init__(self, budget: HandleBudget, kind: str, entry_id: str, store_id: str, label: Optional[str] = None):
+        object.__setattr__(self, '_budget', budget)
+        object.__setattr__(self, 'kind', kind)
+        object.__setattr__(self, 'entry_id', entry_id)
+        object.__setattr__(self, 'store_id', store_id)
+        object.__setattr__(self, 'label', label)
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.kind, self.entry_id, self.store_id
+
+    @property
+    def EntryID(self) -> str:
+        return self.entry_id
+
+    @property
+    def StoreID(self) -> str:
+        return self.store_id
+
+    @property
+    def com_object(self) -> CDispatch:
+        """The open folder or item."""
+        return self._budget.get(self)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in HandleRef.__slots__:
+            raise AttributeError(name)  # not set yet, e.g. while copying
+        if name == 'FolderPath' and self.kind == 'folder' and self.label is not None:
+            return self.label
+        return getattr(self._budget.get(self), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._budget.get(self), name, value)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._budget.get(self))
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, HandleRef) and other.key == self.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f'HandleRef({self.kind}, {self.label or self.entry_id})'
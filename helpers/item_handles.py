@@ -0,0 +1,101 @@
+"""Open mail items from their EntryID and StoreID only when they are needed.
+
+The mail DataFrames carry each item's 'entry_id' and 'store_id' rather than the item itself, so a run doesn't keep a
+MAPI object open for every row it has read. The tasks that change items open them through an ItemResolver just before
+the change and drop them right after, so at most a few items are open at once.
+
+example:
+    resolver = ItemResolver(ol_folder.Session)
+    set_follow_up_on_list(resolver.iter_items(get_item_ids(flag_df)))
+
+Classes:
+    ItemResolver: Opens mail items by their IDs in one Outlook session and counts how many are open.
+
+Functions:
+    get_item_ids: Get the (EntryID, StoreID) of each row of a mail item DataFrame.
+
+"""
+
+import contextlib
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from helpers.com_compat import CDispatch
+from helpers.handle_budget import HandleBudget
+
+ITEM_ID_COLUMNS: Tuple[str, str] = ('entry_id', 'store_id')
+
+ItemId = Tuple[str, str]  # (EntryID, StoreID)
+
+
+def get_item_ids(df: pd.DataFrame) -> List[ItemId]:
+    """Get the (EntryID, StoreID) of each row of a mail item DataFrame.
+
+    :param df: pd.DataFrame, with 'entry_id' and 'store_id' columns.
+    :return: list, the item IDs in row order.
+    """
+    if df.empty:
+        return []
+    return list(zip(df[ITEM_ID_COLUMNS[0]], df[ITEM_ID_COLUMNS[1]]))
+
+
+class ItemResolver:
+    """Opens mail items by their IDs in one Outlook session and counts how many are open.
+
+    The items must be opened on the thread that owns the session, like any other COM object from it.
+    """
+
+    def __init__(self, session: CDispatch, budget: Optional[HandleBudget] = None):
+        """
+        :param session: CDispatch, the MAPI namespace the items are opened in, e.g. a folder's Session.
+        :param budget: HandleBudget, if given, items are kept open under it between uses, so the tasks that change the
+            same items don't each re-open them; otherwise each item is released right after its use.
+        """
+        self._session = session
+        self._budget = budget
+        self._lock = threading.Lock()
+        self.opened = 0  # items opened so far
+        self.open_count = 0  # items open now
+        self.peak_open = 0  # the most items open at once
+
+    @contextlib.contextmanager
+    def open(self, item_id: ItemId) -> Iterator[CDispatch]:
+        """Open a mail item for the duration of the with block.
+
+        :param item_id: tuple, the item's EntryID and StoreID.
+        :return: the mail item; don't keep references to it after the block.
+        """
+        entry_id, store_id = item_id
+        if self._budget is not None:
+            item = self._budget.open_item(entry_id, store_id).com_object
+        else:
+            item = self._session.GetItemFromID(entry_id, store_id)
+        with self._lock:
+            self.opened += 1
+            self.open_count += 1
+            self.peak_open = max(self.peak_open, self.open_count)
+        try:
+            yield item
+        finally:
+            del item
+            with self._lock:
+                self.open_count -= 1
+
+    def iter_items(self, item_ids: Iterable[ItemId]) -> Iterator[CDispatch]:
+        """Open mail items one at a time, each released when the next is opened.
+
+        Use it where a list of mail items used to be passed, e.g. to move_mail_items_to_folder.
+
+        :param item_ids: the (EntryID, StoreID) of each item.
+        :return: the mail items, opened as they are iterated.
+        """
+        for item_id in item_ids:
+            with self.open(item_id) as item:
+                yield item
+            del item
+
+    def counts(self) -> dict:
+        """The items opened so far and the most open at once."""
+        return {'items_opened': self.opened, 'peak_open_items': self.peak_open}
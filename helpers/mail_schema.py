@@ -0,0 +1,57 @@
+"""The column types of the mail item DataFrames.
+
+The frames are built from one dict per mail item, which leaves every column as object dtype. Most columns repeat a
+handful of values across a folder (the customers, their customer numbers, products, sales orders), so they're stored as
+categoricals: one small integer code per row plus the distinct values once, which is less memory and faster to group
+on. The received time is a datetime64, and the per-item keys (cert and lot numbers, subjects, EntryIDs) are strings.
+
+The schema is applied where the frames are built (tasks.clean_foam_inbox.sort_mail_items_to_dataframes), so every task
+sees the same types. Group on the categorical columns with observed=True; otherwise pandas also makes a group for each
+combination of categories that doesn't occur.
+
+Variables:
+    MAIL_FRAME_SCHEMA: The dtype of each mail frame column.
+
+Functions:
+    apply_mail_schema: Convert a mail frame's columns to their schema dtypes.
+
+"""
+
+from typing import Dict, Final
+
+import pandas as pd
+
+MAIL_FRAME_SCHEMA: Final[Dict[str, str]] = {
+    'received_time': 'datetime64[ns]',
+    'subject': 'string',
+    'entry_id': 'string',
+    'store_id': 'category',  # one per folder
+    # parsed from the subject by the subject regex
+    'c_type': 'category',
+    'cert_number': 'string',
+    'product_number': 'category',
+    'so_number': 'category',
+    'lot_number': 'string',
+    'customer': 'category',
+    'c_number': 'category',
+    'loc_number': 'category',
+}
+
+
+def apply_mail_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert a mail frame's columns to their schema dtypes.
+
+    Columns not in the schema are left as they are, and schema columns the frame doesn't have aren't added.
+
+    :param df: pd.DataFrame, a mail item frame.
+    :return: pd.DataFrame, the frame with its columns converted.
+    :raises ValueError: if a column's values can't be converted, e.g. a received_time that isn't a date.
+    """
+    dtypes = {column: dtype for column, dtype in MAIL_FRAME_SCHEMA.items()
+              if column in df.columns and str(df[column].dtype) != dtype}
+    if not dtypes:
+        return df
+    try:
+        return df.astype(dtypes)
+    except (TypeError, ValueError) as schema_error:
+        raise ValueError(f'The mail frame does not match the schema: {schema_error}') from schema_error
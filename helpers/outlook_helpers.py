@@ -1,10 +1,13 @@
-from typing import Any, Dict, Final, List, Optional, Tuple, Union
+from typing import Any, Dict, Final, Iterable, List, Optional, Tuple, Union
 
 import pandas as pd
-import pywintypes
-from win32com import client as wclient
 
-from outlook_interface import wc_outlook
+from helpers.com_compat import CDispatch, com_error
+from helpers.folder_trie import FolderPathTrie
+from helpers.handle_budget import HandleBudget
+from helpers.item_handles import ItemResolver
+from helpers.session_cache import SessionCache
+from helpers.watchdog import call_deadline
 
 # a dictionary relating string names of colors to their Outlook color category proper strings
 color_map: Final[dict] = {'red': 'Red Category',
@@ -23,7 +26,7 @@ valid_categories = color_map.values()  # valid category strings
 default_follow_up_text = 'Follow up'  # default text mail's FollowupRequest property will be set to
 
 
-def add_categories_to_mail(mail: wclient.CDispatch, categories: Union[str, List[str]]) -> None:
+def add_categories_to_mail(mail: CDispatch, categories: Union[str, List[str]]) -> None:
     """Add categories to an Outlook mail item.
 
     :param mail: Outlook mail item to add categories to.
@@ -45,7 +48,7 @@ def add_categories_to_mail(mail: wclient.CDispatch, categories: Union[str, List[
     mail.Save()
 
 
-def remove_categories_from_mail(mail: wclient.CDispatch, categories: Union[str, List[str]]) -> None:
+def remove_categories_from_mail(mail: CDispatch, categories: Union[str, List[str]]) -> None:
     """Remove categories from an Outlook mail item.
 
     :param mail: Outlook mail item to remove categories from.
@@ -67,7 +70,7 @@ def remove_categories_from_mail(mail: wclient.CDispatch, categories: Union[str,
     mail.Save()
 
 
-def get_actionable_categories(action_text: str, categories: Union[str, List[str]], mail: wclient.CDispatch) -> Tuple[List[str], List[str]]:
+def get_actionable_categories(action_text: str, categories: Union[str, List[str]], mail: CDispatch) -> Tuple[List[str], List[str]]:
     """Normalize and validate color categories for use in an Outlook mail item.
 
     :param action_text: A string indicating the action being taken (e.g., "added" or "removed").
@@ -119,7 +122,7 @@ def normalize_color_categories_list(categories: list):
     return normalized_categories
 
 
-def get_store_by_name(store_name_filter: str, outlook_obj: wclient.CDispatch) -> Optional[object]:
+def get_store_by_name(store_name_filter: str, outlook_obj: CDispatch) -> Optional[object]:
     """Searches for an Outlook store with a display name that contains the given filter string and returns the first
     store that matches. If no matching store is found, returns None.
 
@@ -138,11 +141,13 @@ def get_store_by_name(store_name_filter: str, outlook_obj: wclient.CDispatch) ->
     return None
 
 
-def map_folder_structure_to_flat_dict(parent_folder: wclient.CDispatch,
-                                      must_find_list: List[str]) -> dict[Any, Any]:
+def map_folder_structure_to_flat_dict(parent_folder: CDispatch,
+                                      must_find_list: List[str],
+                                      budget: Optional[HandleBudget] = None) -> dict[Any, Any]:
     """Iteratively searches for all folders within the specified parent_folder object and updates the
     folders_dict dictionary with the folder paths and olFolder objects. Stops searching as soon as all
-    folders in must_find_list have been found.
+    folders in must_find_list have been found. Only the folders that are, or are in, a parent of a must_find_list folder
+    are searched; a FolderPathTrie of the must_find_list paths is used to check sub folders by name.
 
     :param folders_dict: A dictionary to store the folder paths and olFolder objects.
     :type folders_dict: Dict[str, any]
@@ -150,69 +155,92 @@ def map_folder_structure_to_flat_dict(parent_folder: wclient.CDispatch,
     :type parent_folder: any
     :param must_find_list: A list of folder paths that must be found. If not all are found, continue searching.
     :type must_find_list: List[str]
+    :param budget: If given, the folders are held under this HandleBudget as HandleRefs, so that searching a large
+        folder tree doesn't keep every folder open.
+    :type budget: Optional[HandleBudget]
     :return: None
     :rtype: None
     """
     folders_dict = {}
     folders_dict['error_folders'] = []
-    folders_stack = [parent_folder]
+    # only go into a folder's sub folders if it is, or is in, one of the must_find_list folders' parents; too many
+    # folders open at once and Outlook balks
+    trie = FolderPathTrie(must_find_list)
+    remaining = set(must_find_list)
+    parent_node = trie.node_for(parent_folder.FolderPath)
+    folders_stack = [(parent_folder, parent_node)] if parent_node is not None else []
 
     while folders_stack:
-        current_folder = folders_stack.pop()
-        current_folder_path = current_folder.FolderPath
-        # only go into a folder's sub folders if it is part of the root of one of the must_find_list items; too many
-        if any([x.startswith(current_folder_path) for x in must_find_list]):  # folders open at once and Outlook balks
-            for olFolder in current_folder.Folders:
-                try:
-                    folder_path = olFolder.FolderPath
-                except pywintypes.com_error as pwe:
-                    folders_dict['error_folders'].append((olFolder, pwe))
-                    continue
-                folders_dict[folder_path] = olFolder
-                if must_find_list:
-                    # stop looking once all the must find list folders are found
-                    if all(mfitem in folders_dict.keys() for mfitem in must_find_list):
-                        return folders_dict
-                folders_stack.append(olFolder)
+        current_folder, current_node = folders_stack.pop()
+        for olFolder in current_folder.Folders:
+            try:
+                folder_path = olFolder.FolderPath
+            except com_error as pwe:
+                folders_dict['error_folders'].append((olFolder, pwe))
+                continue
+            if budget is not None:
+                olFolder = budget.track(olFolder, 'folder', folder_path)
+            folders_dict[folder_path] = olFolder
+            remaining.discard(folder_path)
+            if not remaining:  # stop looking once all the must find list folders are found
+                return folders_dict
+            child_node = current_node.children.get(folder_path.rsplit('\\', 1)[-1])
+            if child_node is not None and child_node.children:
+                folders_stack.append((olFolder, child_node))
     return folders_dict
 
 
-def find_folders_in_outlook(outlook_obj: wclient.CDispatch, store_name_filter: str, must_find_list: List[str] = '',
-                            map_all=False, tries: int = 2) -> Dict[str, any]:
+def find_folders_in_outlook(outlook_obj: CDispatch, store_name_filter: str, must_find_list: List[str] = '',
+                            map_all=False, tries: int = 2, budget: Optional[HandleBudget] = None,
+                            cache: Optional[SessionCache] = None) -> Dict[str, any]:
     """Get outlook folders in a dictionary from an Outlook object for a specified account.
 
     Searches for all folders within Outlook stores whose display names contain the specified
     store_name_filter string, and returns a dictionary where the keys are the folder paths and the values
     are the corresponding olFolder objects. Raises a custom exception if any of the folders in must_find_list
-    are not found.
+    are not found. With a HandleBudget, the folders are HandleRefs held under it. With a SessionCache, the store is
+    looked up in its index and the folders it found earlier in the session are returned without searching, if they all
+    still answer.
     """
     must_find_list = must_find_list if (must_find_list and not map_all) else ''
-    target_store = get_store_by_name(store_name_filter, outlook_obj)
+    if cache is not None and must_find_list:
+        cached_folders = cache.get_folders(store_name_filter, must_find_list)
+        if cached_folders is not None:
+            return cached_folders
+    target_store = (cache.get_store(store_name_filter, outlook_obj) if cache is not None
+                    else get_store_by_name(store_name_filter, outlook_obj))
     parent_folder = target_store.GetRootFolder()
-    folders_dict = map_folder_structure_to_flat_dict(parent_folder, must_find_list)
+    folders_dict = map_folder_structure_to_flat_dict(parent_folder, must_find_list, budget)
 
     for folder in must_find_list:
         if folder not in folders_dict.keys():
             if tries:
                 tries -= 1
-                folders_dict = find_folders_in_outlook(outlook_obj, store_name_filter, must_find_list, map_all, tries)
+                if cache is not None:
+                    cache.invalidate(f'{folder} not found')  # look the store up again too
+                folders_dict = find_folders_in_outlook(outlook_obj, store_name_filter, must_find_list, map_all, tries,
+                                                       budget, cache)
             else:
+                from outlook_interface import wc_outlook  # imported here so importing the helpers doesn't start COM
+
                 wc_outlook.reset_outlook()
                 raise Exception(f"Required folder '{folder}' not found!")
+    if cache is not None and must_find_list:
+        cache.put_folders(store_name_filter, folders_dict)
     return folders_dict
 
 
-def colorize_outlook_email_list(mail_items: list, color: str):
+def colorize_outlook_email_list(mail_items: Iterable[CDispatch], color: str):
     """Add the color category to all the mail items in the list.
 
-    :param mail_items: list, list of w32com.CDispatch.client Outlook mail items.
+    :param mail_items: list, list of w32com.CDispatch.client Outlook mail items, or ItemResolver.iter_items.
     :param color: str, the color categories to set on the mail items.
     """
     for mail_item in mail_items:
         add_categories_to_mail(mail_item, color)
 
 
-def clear_all_category_colors(o_item: wclient.CDispatch) -> None:
+def clear_all_category_colors(o_item: CDispatch) -> None:
     """Removes all categories from the mail items in the given DataFrameGroupBy object.
 
     :param o_item: The mail item to remove the categories from.
@@ -221,18 +249,19 @@ def clear_all_category_colors(o_item: wclient.CDispatch) -> None:
     o_item.Save()
 
 
-def clear_all_category_colors_foam(dfg: List[Tuple[str, pd.DataFrame]]) -> None:
+def clear_all_category_colors_foam(dfg: List[Tuple[str, pd.DataFrame]], resolver: ItemResolver) -> None:
     """Removes all categories from the mail items in the given DataFrameGroupBy object.
 
     :param dfg: The DataFrameGroupBy object containing the mail items to remove the categories from.
+    :param resolver: ItemResolver, opens the mail items from the rows' 'entry_id' and 'store_id'.
     """
     for group_name, group_df in dfg:
         for _, row in group_df.iterrows():
-            o_item = row['o_item']
-            clear_all_category_colors(o_item)
+            with resolver.open((row['entry_id'], row['store_id'])) as o_item:
+                clear_all_category_colors(o_item)
 
 
-def clear_of_all_category_colors_from_list(o_items: List[wclient.CDispatch]) -> None:
+def clear_of_all_category_colors_from_list(o_items: List[CDispatch]) -> None:
     """Removes all categories from the given list of mail items.
 
     :param o_items: A list of mail items to remove the categories from.
@@ -240,21 +269,22 @@ def clear_of_all_category_colors_from_list(o_items: List[wclient.CDispatch]) ->
     for item in o_items:
         try:
             clear_all_category_colors(item)
-        except pywintypes.com_error as pycom_err:
+        except com_error as pycom_err:
             print('Item "has been deleted" probably moved.')
 
 
-def move_mail_items_to_folder(mail_items_list: List[wclient.CDispatch], destination_folder: wclient.Dispatch):
+def move_mail_items_to_folder(mail_items_list: Iterable[CDispatch], destination_folder: CDispatch):
     """Moves the given list of mail items to the specified destination folder.
 
     :param mail_items_list: The list of mail items to be moved.
     :param destination_folder: The CDispatch object of the destination folder.
     """
     for mail in mail_items_list:
-        mail.move(destination_folder)
+        with call_deadline('Move'):
+            mail.move(destination_folder)
 
 
-def set_follow_up_on_list(item_list: List[wclient.CDispatch], follow_up_text: str = default_follow_up_text,
+def set_follow_up_on_list(item_list: Iterable[CDispatch], follow_up_text: str = default_follow_up_text,
                           overwrite_if_set: bool = False) -> None:
     """Sets a follow-up flag on the given list of mail items. By default, will not overwrite any existing follow-up.
 
@@ -272,11 +302,11 @@ def set_follow_up_on_list(item_list: List[wclient.CDispatch], follow_up_text: st
         if change_setting:
             try:
                 set_follow_up(item, follow_up_text)
-            except pywintypes.com_error as pycom_err:
+            except com_error as pycom_err:
                 print('Item "has been deleted" probably moved.')
 
 
-def set_follow_up(mail_item: wclient.CDispatch, follow_up_text: str = default_follow_up_text):
+def set_follow_up(mail_item: CDispatch, follow_up_text: str = default_follow_up_text):
     """Sets a follow-up flag on the given mail item.
 
     :param mail_item: The mail item to set the follow-up flag on.
@@ -286,7 +316,7 @@ def set_follow_up(mail_item: wclient.CDispatch, follow_up_text: str = default_fo
     mail_item.save()
 
 
-def reset_testing_mods(mail_list: List[wclient.CDispatch]):
+def reset_testing_mods(mail_list: List[CDispatch]):
     """Resets any testing modifications made to the given list of mail items.
 
     This function clears all color categories and removes any follow-up flags.
@@ -297,7 +327,7 @@ def reset_testing_mods(mail_list: List[wclient.CDispatch]):
     set_follow_up_on_list(mail_list, '')
 
 
-def is_follow_up_set(outlook_mail_item: wclient.CDispatch) -> bool:
+def is_follow_up_set(outlook_mail_item: CDispatch) -> bool:
     """Returns True if the given Outlook mail item has a follow-up flag set; otherwise, returns False.
 
     :param outlook_mail_item: The Outlook mail item to check for a follow-up flag.
@@ -0,0 +1,48 @@
+"""Get the memory use of the current process without extra dependencies.
+
+Functions:
+    get_rss_bytes: Get the resident set size (working set on Windows) of the current process in bytes.
+
+"""
+
+import ctypes
+import sys
+from typing import Optional
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    """The PROCESS_MEMORY_COUNTERS structure filled by psapi.GetProcessMemoryInfo."""
+    _fields_ = [('cb', ctypes.c_ulong),
+                ('PageFaultCount', ctypes.c_ulong),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+
+
+def get_rss_bytes() -> Optional[int]:
+    """Get the resident set size (working set on Windows) of the current process in bytes.
+
+    On non-Windows systems this is the peak resident set size, which is what the standard library exposes.
+
+    :return: int, the memory use in bytes, or None if it could not be determined.
+    """
+    try:
+        if sys.platform == 'win32':
+            counters = _ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process_handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process_handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return None
+
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024  # linux reports kilobytes
+    except (AttributeError, ImportError, OSError):
+        return None
@@ -0,0 +1,150 @@
+"""A ledger of the actions completed on mail items, kept between runs, so each item's actions are done once.
+
+Tasks that act on every matching item in the date window (e.g. summarizing the NBE test report emails) would redo their
+work on each run. They record each action completed on an item, keyed by the item's EntryID and the action's name,
+with the hash of the file it produced (a saved PDF) and a result (e.g. where it was saved); on the next run, or on a
+re-run after a crash, they skip what's recorded and resume the rest.
+
+The ledger is an SQLite database in the account's state directory; records older than the retention are pruned when
+it's opened.
+
+example:
+    ledger = ProcessedLedger(os.path.join(STATE_DIR_PATH, account_name, 'processed_ledger.sqlite3'))
+    new_ids = [entry_id for entry_id in entry_ids if entry_id not in ledger.completed(entry_ids, 'summary_added')]
+    ...
+    ledger.record(entry_id, 'summary_added', pdf_hash)
+
+Classes:
+    ProcessedLedger: The actions completed on mail items, in an SQLite database.
+
+Functions:
+    file_hash: Get the SHA-256 hash of a file.
+
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, Optional, Set, Tuple
+
+from log_setup import lg
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS processed (
+    entry_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    file_hash TEXT,
+    result TEXT,
+    completed REAL NOT NULL,
+    PRIMARY KEY (entry_id, action)
+);
+CREATE INDEX IF NOT EXISTS processed_file_hash ON processed (file_hash, action);
+CREATE INDEX IF NOT EXISTS processed_completed ON processed (completed);
+'''
+
+
+def file_hash(file_path: str) -> str:
+    """Get the SHA-256 hash of a file.
+
+    :param file_path: str, the file's path.
+    :return: str, the hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as ff:
+        for block in iter(lambda: ff.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ProcessedLedger:
+    """The actions completed on mail items, in an SQLite database.
+
+    One connection is shared by the threads of a run (the task graph's workers); its calls are serialized.
+    """
+
+    def __init__(self, db_path: str, retention_days: Optional[float] = None, clock: Callable[[], float] = time.time):
+        """
+        :param db_path: str, the database's path; its directory is made if needed.
+        :param retention_days: float, records older than this are pruned; None keeps them all.
+        :param clock: callable returning the current time in seconds since the epoch.
+        """
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_schema)
+        if retention_days is not None:
+            self.prune(retention_days)
+
+    def completed(self, entry_ids: Iterable[str], action: str) -> Set[str]:
+        """Get which of the items have the action recorded.
+
+        :param entry_ids: the items' EntryIDs.
+        :param action: str, the action's name.
+        :return: set, the EntryIDs with the action recorded.
+        """
+        entry_ids = list(entry_ids)
+        done = set()
+        with self._lock:
+            for start in range(0, len(entry_ids), 500):  # under SQLite's limit on query parameters
+                chunk = entry_ids[start:start + 500]
+                rows = self._connection.execute(
+                    f'SELECT entry_id FROM processed WHERE action = ? AND entry_id IN ({",".join("?" * len(chunk))})',
+                    [action, *chunk])
+                done.update(entry_id for entry_id, in rows)
+        return done
+
+    def get(self, entry_id: str, action: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Get an item's record of an action.
+
+        :param entry_id: str, the item's EntryID.
+        :param action: str, the action's name.
+        :return: tuple, the recorded file hash and result, or None if the action isn't recorded.
+        """
+        with self._lock:
+            return self._connection.execute('SELECT file_hash, result FROM processed WHERE entry_id = ? AND action = ?',
+                                            (entry_id, action)).fetchone()
+
+    def has_file_hash(self, hash_value: str, action: str) -> bool:
+        """Whether the action is recorded for any item with the given file hash, e.g. the same PDF sent twice.
+
+        :param hash_value: str, the file hash.
+        :param action: str, the action's name.
+        """
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM processed WHERE file_hash = ? AND action = ? LIMIT 1',
+                                            (hash_value, action)).fetchone() is not None
+
+    def record(self, entry_id: str, action: str, hash_value: Optional[str] = None, result: Optional[str] = None
+               ) -> None:
+        """Record an action completed on an item, replacing an earlier record of it.
+
+        :param entry_id: str, the item's EntryID.
+        :param action: str, the action's name.
+        :param hash_value: str, the hash of the file the action produced or used, if any.
+        :param result: str, what the action produced, e.g. a saved file's path.
+        """
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?)',
+                                     (entry_id, action, hash_value, result, self._clock()))
+
+    def prune(self, retention_days: float) -> int:
+        """Delete the records older than the retention.
+
+        :param retention_days: float, the age in days of the oldest records kept.
+        :return: int, how many records were deleted.
+        """
+        with self._lock:
+            deleted = self._connection.execute('DELETE FROM processed WHERE completed < ?',
+                                               (self._clock() - retention_days * 86400.0,)).rowcount
+        if deleted:
+            lg.debug('Pruned %s records from the processed ledger.', deleted)
+        return deleted
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
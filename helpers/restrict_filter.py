@@ -0,0 +1,338 @@
+"""Build Items.Restrict filters as one DASL query, so the store does the filtering.
+
+A filter is a small tree of clauses: comparisons, LIKE patterns and NULL checks on mail item properties, joined with
+AND, OR and NOT. The tree renders to a DASL ('@SQL=') restriction for Outlook, and the same tree can check an item
+itself, which is what the stand-in Outlook backend does with the restrictions it is given (see parse_restriction).
+
+Outlook compares DASL dates in UTC, so a time in a filter is held, rendered and compared as a naive UTC time; a local
+time given to received_since is converted, as are the local times of the items checked.
+
+example:
+    restriction = all_of(flag_not('Follow up'), received_since(five_days_ago),
+                         subject_starts_with(['CofC', 'Certificate for Delivery:']))
+    items = ol_folder.Items.Restrict(to_restriction(restriction))
+
+Classes:
+    Clause: A node of a filter tree.
+    Comparison: A property compared with a value.
+    Like: A property matching a LIKE pattern, case-insensitively.
+    IsNull: A property that's not set.
+    Not, And, Or: Clauses combined.
+
+Functions:
+    all_of, any_of: Join clauses with AND / OR.
+    received_since: Items received at or after a time.
+    to_utc: A local (naive) or time zone aware time as a naive UTC time.
+    flag_not: Items not flagged with the given flag text.
+    subject_starts_with: Items whose subject starts with one of the prefixes, optionally after a reply/forward prefix.
+    sender_in: Items from one of the sender addresses.
+    to_restriction: Render a filter tree as a DASL restriction for Items.Restrict.
+    parse_restriction: Parse a DASL restriction rendered by to_restriction back into its filter tree.
+
+"""
+
+import datetime
+import re
+from typing import Any, Callable, Dict, Final, Iterable, List, Optional, Sequence, Tuple
+
+DASL_PREFIX: Final[str] = '@SQL='
+
+# the DASL names of the item properties the filters use
+PROPERTY_SCHEMAS: Final[Dict[str, str]] = {
+    'Subject': 'urn:schemas:httpmail:subject',
+    'ReceivedTime': 'urn:schemas:httpmail:datereceived',
+    'FlagRequest': 'urn:schemas:httpmail:messageflag',
+    'SenderEmailAddress': 'urn:schemas:httpmail:fromemail',
+    'LastModificationTime': 'http://schemas.microsoft.com/mapi/proptag/0x30080040',
+}
+_schema_properties = {schema: prop for prop, schema in PROPERTY_SCHEMAS.items()}
+DATE_PROPERTIES: Final[Tuple[str, ...]] = ('ReceivedTime', 'LastModificationTime')
+
+DASL_DATE_FORMAT: Final[str] = '%m/%d/%Y %I:%M %p'  # DASL date comparisons are evaluated in UTC
+
+_operators: Dict[str, Callable[[Any, Any], bool]] = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+}
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    """A local (naive) or time zone aware time as a naive UTC time, as DASL dates are compared."""
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _item_value(item: Any, prop: str) -> Any:
+    """Get an item's property value, with unset strings as None and times in UTC, as DASL compares them.
+
+    pywin32 marks the local times Outlook gives as UTC, so the time zone is dropped and the local time converted.
+    """
+    value = getattr(item, prop, None)
+    if value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        value = to_utc(value.replace(tzinfo=None))
+    return value
+
+
+class Clause:
+    """A node of a filter tree."""
+
+    def to_dasl(self) -> str:
+        raise NotImplementedError
+
+    def matches(self, item: Any) -> bool:
+        raise NotImplementedError
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and vars(other) == vars(self)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({", ".join(f"{k}={v!r}" for k, v in vars(self).items())})'
+
+
+class Comparison(Clause):
+    """A property compared with a value, a time as a naive UTC time; an unset property matches no comparison, as in
+    DASL."""
+
+    def __init__(self, prop: str, operator: str, value: Any):
+        if operator not in _operators:
+            raise ValueError(f'Unsupported operator: {operator}')
+        self.prop = prop
+        self.operator = operator
+        self.value = value.replace(second=0, microsecond=0) if isinstance(value, datetime.datetime) else value
+
+    def to_dasl(self) -> str:
+        value = self.value.strftime(DASL_DATE_FORMAT) if isinstance(self.value, datetime.datetime) else str(self.value)
+        return f'"{PROPERTY_SCHEMAS[self.prop]}" {self.operator} {_quote(value)}'
+
+    def matches(self, item: Any) -> bool:
+        item_value = _item_value(item, self.prop)
+        if item_value is None:
+            return False
+        if isinstance(self.value, str):
+            return _operators[self.operator](str(item_value).lower(), self.value.lower())
+        return _operators[self.operator](item_value, self.value)
+
+
+class Like(Clause):
+    """A property matching a LIKE pattern ('%' for any text), case-insensitively."""
+
+    def __init__(self, prop: str, pattern: str):
+        self.prop = prop
+        self.pattern = pattern
+
+    def to_dasl(self) -> str:
+        return f'"{PROPERTY_SCHEMAS[self.prop]}" LIKE {_quote(self.pattern)}'
+
+    def matches(self, item: Any) -> bool:
+        item_value = _item_value(item, self.prop)
+        if item_value is None:
+            return False
+        regex = '.*'.join(re.escape(part) for part in self.pattern.split('%'))
+        return re.fullmatch(regex, str(item_value), re.IGNORECASE | re.DOTALL) is not None
+
+
+class IsNull(Clause):
+    """A property that's not set."""
+
+    def __init__(self, prop: str):
+        self.prop = prop
+
+    def to_dasl(self) -> str:
+        return f'"{PROPERTY_SCHEMAS[self.prop]}" IS NULL'
+
+    def matches(self, item: Any) -> bool:
+        return _item_value(item, self.prop) is None
+
+
+class Not(Clause):
+    def __init__(self, clause: Clause):
+        self.clause = clause
+
+    def to_dasl(self) -> str:
+        return f'NOT ({self.clause.to_dasl()})'
+
+    def matches(self, item: Any) -> bool:
+        return not self.clause.matches(item)
+
+
+class And(Clause):
+    def __init__(self, clauses: Sequence[Clause]):
+        self.clauses = list(clauses)
+
+    def to_dasl(self) -> str:
+        return ' AND '.join(f'({clause.to_dasl()})' for clause in self.clauses)
+
+    def matches(self, item: Any) -> bool:
+        return all(clause.matches(item) for clause in self.clauses)
+
+
+class Or(Clause):
+    def __init__(self, clauses: Sequence[Clause]):
+        self.clauses = list(clauses)
+
+    def to_dasl(self) -> str:
+        return ' OR '.join(f'({clause.to_dasl()})' for clause in self.clauses)
+
+    def matches(self, item: Any) -> bool:
+        return any(clause.matches(item) for clause in self.clauses)
+
+
+def all_of(*clauses: Optional[Clause]) -> Clause:
+    """Join clauses with AND, leaving out None; a single clause is returned as is."""
+    clauses = [clause for clause in clauses if clause is not None]
+    if not clauses:
+        raise ValueError('A filter needs at least one clause.')
+    return clauses[0] if len(clauses) == 1 else And(clauses)
+
+
+def any_of(*clauses: Optional[Clause]) -> Clause:
+    """Join clauses with OR, leaving out None; a single clause is returned as is."""
+    clauses = [clause for clause in clauses if clause is not None]
+    if not clauses:
+        raise ValueError('A filter needs at least one clause.')
+    return clauses[0] if len(clauses) == 1 else Or(clauses)
+
+
+def received_since(since: datetime.datetime) -> Clause:
+    """Items received at or after a time, local if naive; it's converted to UTC, as Outlook compares it."""
+    return Comparison('ReceivedTime', '>=', to_utc(since))
+
+
+def flag_not(flag_text: str) -> Clause:
+    """Items not flagged with the given flag text, including items with no flag."""
+    return Or([IsNull('FlagRequest'), Comparison('FlagRequest', '<>', flag_text)])
+
+
+def subject_starts_with(prefixes: Iterable[str], reply_prefixes: Iterable[str] = ()) -> Optional[Clause]:
+    """Items whose subject starts with one of the prefixes, directly or after one of the reply/forward prefixes.
+
+    :param prefixes: e.g. ['CofC', 'Certificate for Delivery:'].
+    :param reply_prefixes: e.g. ['RE: ', 'FW: '].
+    :return: the clause, or None if there are no prefixes (any subject).
+    """
+    prefixes = list(prefixes)
+    if not prefixes:
+        return None
+    patterns = [f'{reply}{prefix}%' for reply in [''] + list(reply_prefixes) for prefix in prefixes]
+    return any_of(*[Like('Subject', pattern) for pattern in patterns])
+
+
+def sender_in(addresses: Iterable[str]) -> Optional[Clause]:
+    """Items from one of the sender addresses, or None if there are none (any sender)."""
+    addresses = list(addresses)
+    if not addresses:
+        return None
+    return any_of(*[Comparison('SenderEmailAddress', '=', address) for address in addresses])
+
+
+def to_restriction(clause: Clause) -> str:
+    """Render a filter tree as a DASL restriction for Items.Restrict."""
+    return DASL_PREFIX + clause.to_dasl()
+
+
+# tokens of the DASL rendered by to_restriction
+_token_ptn = re.compile(r"""\s*(?:(?P<paren>[()])|(?P<schema>"[^"]+")|(?P<string>'(?:[^']|'')*')"""
+                        r"""|(?P<operator><>|>=|<=|=|>|<)|(?P<word>[A-Za-z]+))""")
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens, position = [], 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _token_ptn.match(text, position)
+        if match is None:
+            raise ValueError(f'Unsupported restriction at: {text[position:position + 30]}')
+        kind = match.lastgroup
+        value = match[kind]
+        tokens.append((kind, value.upper() if kind == 'word' else value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over: expr := term (OR term)*; term := factor (AND factor)*;
+    factor := NOT factor | '(' expr ')' | "schema" operator 'value' | "schema" LIKE 'pattern' | "schema" IS NULL."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind: str, value: Optional[str] = None) -> str:
+        token_kind, token_value = self.peek()
+        if token_kind != kind or (value is not None and token_value != value):
+            raise ValueError(f'Expected {value or kind} in the restriction, got {token_value}.')
+        self.position += 1
+        return token_value
+
+    def expr(self) -> Clause:
+        clauses = [self.term()]
+        while self.peek() == ('word', 'OR'):
+            self.position += 1
+            clauses.append(self.term())
+        return clauses[0] if len(clauses) == 1 else Or(clauses)
+
+    def term(self) -> Clause:
+        clauses = [self.factor()]
+        while self.peek() == ('word', 'AND'):
+            self.position += 1
+            clauses.append(self.factor())
+        return clauses[0] if len(clauses) == 1 else And(clauses)
+
+    def factor(self) -> Clause:
+        kind, value = self.peek()
+        if (kind, value) == ('word', 'NOT'):
+            self.position += 1
+            return Not(self.factor())
+        if (kind, value) == ('paren', '('):
+            self.position += 1
+            clause = self.expr()
+            self.take('paren', ')')
+            return clause
+        schema = self.take('schema').strip('"')
+        if schema not in _schema_properties:
+            raise ValueError(f'Unsupported property in the restriction: {schema}')
+        prop = _schema_properties[schema]
+        kind, value = self.peek()
+        if (kind, value) == ('word', 'IS'):
+            self.position += 1
+            self.take('word', 'NULL')
+            return IsNull(prop)
+        if (kind, value) == ('word', 'LIKE'):
+            self.position += 1
+            return Like(prop, self.string())
+        operator = self.take('operator')
+        text = self.string()
+        if prop in DATE_PROPERTIES:
+            return Comparison(prop, operator, datetime.datetime.strptime(text, DASL_DATE_FORMAT))
+        return Comparison(prop, operator, text)
+
+    def string(self) -> str:
+        return self.take('string')[1:-1].replace("''", "'")
+
+
+def parse_restriction(restriction: str) -> Clause:
+    """Parse a DASL restriction rendered by to_restriction back into its filter tree.
+
+    :param restriction: str, the '@SQL=' restriction.
+    :return: Clause, the filter tree.
+    :raises ValueError: if the restriction isn't one to_restriction renders.
+    """
+    if not restriction.startswith(DASL_PREFIX):
+        raise ValueError('Not a DASL restriction.')
+    parser = _Parser(_tokenize(restriction[len(DASL_PREFIX):]))
+    clause = parser.expr()
+    if parser.position != len(parser.tokens):
+        raise ValueError(f'Unexpected {parser.peek()[1]} in the restriction.')
+    return clause
@@ -0,0 +1,206 @@
+"""Keep runs from overlapping: a lock file shared between processes, and coalescing of the ticks that come during a run.
+
+The scheduler starts main_process.py in a new process and returns, so APScheduler's max_instances doesn't stop a run
+from starting while the last one is still going; two runs would use the same Outlook session and move the same items.
+
+A RunLock is a lock file created exclusively, holding the owner's process ID, host and start time. Each run holds its
+account's lock; a run that can't get it within its wait is skipped. A lock left behind by a process that died (on
+this host), or older than stale_seconds, is taken over.
+
+example:
+    run_lock = RunLock(os.path.join(STATE_DIR_PATH, account_name, 'run.lock'))
+    if run_lock.acquire(wait_seconds=30.0):
+        try:
+            ...
+        finally:
+            run_lock.release()
+
+A RunCoalescer is the scheduler's side: a tick that comes while a run is going doesn't start another, it asks for one
+follow-up run once the current one ends, however many ticks came.
+
+Classes:
+    RunLock: A lock file shared between processes, with stale lock detection.
+    RunCoalescer: Turns the ticks that come during a run into a single follow-up run.
+
+Functions:
+    is_process_alive: Whether a process with the given ID is running on this host.
+
+"""
+
+import ctypes
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from log_setup import lg
+
+
+def is_process_alive(pid: int) -> bool:
+    """Whether a process with the given ID is running on this host.
+
+    :param pid: int, the process ID.
+    :return: bool, False if there's no such process; True if there is, or if it can't be told.
+    """
+    if sys.platform == 'win32':
+        process_query_limited_information, still_active = 0x1000, 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return kernel32.GetLastError() == 5  # access denied: it exists
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RunLock:
+    """A lock file shared between processes, with stale lock detection.
+    """
+
+    def __init__(self, lock_path: str, stale_seconds: float = 1800.0, poll_seconds: float = 1.0,
+                 clock: Callable[[], float] = time.time):
+        """
+        :param lock_path: str, the lock file's path; its directory is made if needed.
+        :param stale_seconds: float, the age after which a lock is taken over even if its owner seems to be running;
+            longer than any run.
+        :param poll_seconds: float, how often a held lock is checked while waiting for it.
+        :param clock: callable returning the current time in seconds since the epoch.
+        """
+        self.lock_path = lock_path
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+        self._clock = clock
+        self.held = False
+        self.stats: Dict[str, Any] = dict(acquired=0, skipped=0, stale_taken_over=0, wait_seconds=0.0)
+
+    def owner(self) -> Optional[Dict[str, Any]]:
+        """The holder of the lock as written in the lock file, or None if it isn't held."""
+        try:
+            with open(self.lock_path) as lf:
+                return json.load(lf)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return {}  # being written, or damaged; judged by the file's age
+
+    def _is_stale(self, owner: Dict[str, Any]) -> bool:
+        """Whether a lock was left behind by a process that died, or is older than stale_seconds."""
+        if owner.get('host') == socket.gethostname() and owner.get('pid') is not None \
+                and not is_process_alive(owner['pid']):
+            return True
+        try:
+            started = owner.get('started', os.path.getmtime(self.lock_path))
+        except OSError:
+            return False  # released meanwhile
+        return self._clock() - started > self.stale_seconds
+
+    def _try_create(self) -> bool:
+        """Create the lock file if there isn't one."""
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        try:
+            lock_file = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(lock_file, 'w') as lf:
+            json.dump(dict(pid=os.getpid(), host=socket.gethostname(), started=self._clock()), lf)
+        return True
+
+    def acquire(self, wait_seconds: float = 0.0) -> bool:
+        """Take the lock, waiting up to wait_seconds for its holder to release it.
+
+        :param wait_seconds: float, how long to wait for a held lock.
+        :return: bool, whether the lock was taken; if not, it's counted as a skip.
+        """
+        start = time.monotonic()
+        while True:
+            if self._try_create():
+                self.held = True
+                self.stats['acquired'] += 1
+                self.stats['wait_seconds'] += time.monotonic() - start
+                return True
+            owner = self.owner()
+            if owner is not None and self._is_stale(owner):
+                self._take_over(owner)
+                continue
+            waited = time.monotonic() - start
+            if waited >= wait_seconds:
+                self.stats['skipped'] += 1
+                self.stats['wait_seconds'] += waited
+                return False
+            time.sleep(min(self.poll_seconds, wait_seconds - waited))
+
+    def _take_over(self, owner: Dict[str, Any]) -> None:
+        """Remove a stale lock, unless another process already replaced it."""
+        if self.owner() != owner:
+            return
+        lg.warning('Taking over the stale run lock %s from %s.', self.lock_path, owner)
+        try:
+            os.remove(self.lock_path)
+            self.stats['stale_taken_over'] += 1
+        except FileNotFoundError:
+            pass
+
+    def release(self) -> None:
+        """Release the lock, if this process holds it."""
+        if not self.held:
+            return
+        self.held = False
+        owner = self.owner()
+        if owner and owner.get('pid') == os.getpid() and owner.get('host') == socket.gethostname():
+            os.remove(self.lock_path)
+
+
+class RunCoalescer:
+    """Turns the ticks that come during a run into a single follow-up run.
+
+    start_tick() is called on each tick; only when it returns True does the caller start a run, and when that run ends
+    it calls finish_run(), which says whether to run once more for the ticks that came meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.pending = False
+        self.stats: Dict[str, int] = dict(runs=0, coalesced_ticks=0, follow_up_runs=0)
+
+    def start_tick(self) -> bool:
+        """A tick: whether to start a run now; if one is going, a follow-up run is asked for instead.
+
+        :return: bool, True if the caller should start a run.
+        """
+        with self._lock:
+            if self.running:
+                self.pending = True
+                self.stats['coalesced_ticks'] += 1
+                return False
+            self.running = True
+            self.stats['runs'] += 1
+            return True
+
+    def finish_run(self) -> bool:
+        """A run ended: whether to start the follow-up run for the ticks that came during it.
+
+        :return: bool, True if the caller should run once more (and call finish_run again after).
+        """
+        with self._lock:
+            if self.pending:
+                self.pending = False
+                self.stats['runs'] += 1
+                self.stats['follow_up_runs'] += 1
+                return True
+            self.running = False
+            return False
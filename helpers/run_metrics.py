@@ -0,0 +1,164 @@
+"""Named timing spans for the stages of a run, exported per run as JSON and as a Prometheus textfile.
+
+Wrap each stage of a run in a span, with the number of items it handled:
+
+example:
+    with run_metrics.span('fetch', folder=folder_path) as span:
+        results = process_mail_items(items)
+        span['items'] = len(results)
+
+Spans may be recorded from several threads (the folder pool and the task graph). At the end of a run, the spans are
+summed per stage (seconds, calls, items and items per second) and written as JSON and in the Prometheus text format,
+for node_exporter's textfile collector to pick up.
+
+Classes:
+    RunMetrics: Records the spans of a run and exports them.
+
+Variables:
+    run_metrics: The spans of the current run in this process.
+
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+METRIC_PREFIX = 'certs_inbox'
+
+
+class RunMetrics:
+    """Records the spans of a run and exports them.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        """
+        :param clock: callable returning the current time in seconds.
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self._run_start = clock()
+
+    def reset(self) -> None:
+        """Forget the recorded spans; call at the start of each run."""
+        with self._lock:
+            self.spans = []
+        self._run_start = self._clock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, items: Optional[int] = None, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Time a stage of the run.
+
+        The span is recorded when the block ends, even if it raises. Its 'items' can be set inside the block once the
+        count is known.
+
+        :param name: str, the stage's name.
+        :param items: int, the number of items the stage handles, if known up front.
+        :param labels: other details to record with the span, e.g. the folder path.
+        :return: the span's dictionary.
+        """
+        span = dict(name=name, items=items, **labels)
+        start = self._clock()
+        try:
+            yield span
+        finally:
+            span['seconds'] = self._clock() - start
+            span['started'] = start - self._run_start
+            with self._lock:
+                self.spans.append(span)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Sum the spans per stage.
+
+        :return: dict, 'seconds', 'calls', 'items' and 'items_per_second' per stage name, in first-seen order. Items
+            and the rate are None for stages that didn't count any.
+        """
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in sorted(spans, key=lambda s: s['started']):
+            stage = stages.setdefault(span['name'], dict(seconds=0.0, calls=0, items=None, items_per_second=None))
+            stage['seconds'] += span['seconds']
+            stage['calls'] += 1
+            if span['items'] is not None:
+                stage['items'] = (stage['items'] or 0) + span['items']
+        for stage in stages.values():
+            if stage['items'] is not None and stage['seconds'] > 0:
+                stage['items_per_second'] = stage['items'] / stage['seconds']
+        return stages
+
+    def to_dict(self, **run_info: Any) -> Dict[str, Any]:
+        """Get the run's spans and per-stage summary.
+
+        :param run_info: details of the run to include, e.g. the account name and whether it succeeded.
+        :return: dict, the run info, 'stages' (see summary) and the individual 'spans'.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['started'])
+        return dict(run_info, stages=self.summary(), spans=spans)
+
+    def to_prometheus(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """Format the per-stage summary in the Prometheus text format.
+
+        :param labels: dict, labels added to every sample, e.g. the account name.
+        :return: str, the metrics text.
+        """
+        labels = labels or {}
+        stages = self.summary()
+        metrics = [('stage_seconds', 'Seconds spent in the stage during the last run.', 'seconds'),
+                   ('stage_calls', 'Times the stage ran during the last run.', 'calls'),
+                   ('stage_items', 'Items the stage handled during the last run.', 'items'),
+                   ('stage_items_per_second', 'Items per second through the stage during the last run.',
+                    'items_per_second'),
+                   ]
+        lines = []
+        for metric, help_text, key in metrics:
+            lines += [f'# HELP {METRIC_PREFIX}_{metric} {help_text}', f'# TYPE {METRIC_PREFIX}_{metric} gauge']
+            for name, stage in stages.items():
+                if stage[key] is not None:
+                    lines.append(f'{METRIC_PREFIX}_{metric}{_format_labels(dict(labels, stage=name))} {stage[key]}')
+        lines += [f'# HELP {METRIC_PREFIX}_last_run_timestamp_seconds When the last run finished.',
+                  f'# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge',
+                  f'{METRIC_PREFIX}_last_run_timestamp_seconds{_format_labels(labels)} {time.time()}']
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: str, prometheus_path: str, labels: Optional[Dict[str, str]] = None,
+              **run_info: Any) -> None:
+        """Write the run's metrics as JSON and as a Prometheus textfile.
+
+        Both files are replaced atomically, so a collector never reads a half-written file.
+
+        :param json_path: str, the path of the JSON file.
+        :param prometheus_path: str, the path of the Prometheus textfile; it must end with '.prom' for the
+            textfile collector.
+        :param labels: dict, labels added to every Prometheus sample, e.g. the account name.
+        :param run_info: details of the run to include in the JSON.
+        """
+        _write_atomically(json_path, json.dumps(self.to_dict(**dict(labels or {}, **run_info)), indent=4,
+                                                default=str))
+        _write_atomically(prometheus_path, self.to_prometheus(labels))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Format labels for a Prometheus sample, escaping the values."""
+    if not labels:
+        return ''
+    escaped = {k: str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for k, v in labels.items()}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped.items()) + '}'
+
+
+def _write_atomically(path: str, text: str) -> None:
+    """Write a file through a temporary file and a rename."""
+    file_dir = os.path.dirname(path)
+    if file_dir and not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as tf:
+        tf.write(text)
+    os.replace(temp_path, path)
+
+
+run_metrics = RunMetrics()
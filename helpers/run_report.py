@@ -0,0 +1,71 @@
+"""Read and write the small JSON report a main_process run leaves for the scheduler.
+
+The scheduler doesn't import main_process (it would pay pandas/win32com import costs it doesn't need), so a finished run
+writes its timings to a file the scheduler can read to work out how much of each tick was overhead rather than work.
+
+Functions:
+    write_run_report: Write a run report dictionary to a JSON file.
+    read_run_report: Read a run report dictionary from a JSON file.
+    remove_run_report: Remove a run report file, so a run that doesn't write one isn't credited with an older report.
+    get_run_overhead: Get the seconds of a run's wall time that were not spent processing mail.
+
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+# where main_process leaves the report of its last run, relative to the main process directory
+RUN_REPORT_PATH: str = './logs/last_run_report.json'
+
+
+def write_run_report(run_report: Dict[str, Any], report_path: str = RUN_REPORT_PATH) -> None:
+    """Write a run report dictionary to a JSON file.
+
+    :param run_report: dict, the run report; values must be JSON serializable.
+    :param report_path: str, the path of the file to write.
+    """
+    report_dir = os.path.dirname(report_path)
+    if report_dir and not os.path.exists(report_dir):
+        os.makedirs(report_dir)
+    with open(report_path, 'w') as rf:
+        json.dump(run_report, rf, indent=4)
+
+
+def read_run_report(report_path: str = RUN_REPORT_PATH) -> Optional[Dict[str, Any]]:
+    """Read a run report dictionary from a JSON file.
+
+    :param report_path: str, the path of the file to read.
+    :return: dict, the run report, or None if there is no readable report.
+    """
+    try:
+        with open(report_path, 'r') as rf:
+            return json.load(rf)
+    except (OSError, ValueError):
+        return None
+
+
+def remove_run_report(report_path: str = RUN_REPORT_PATH) -> None:
+    """Remove a run report file, so a run that doesn't write one isn't credited with an older report.
+
+    :param report_path: str, the path of the file to remove; a missing file is fine.
+    """
+    try:
+        os.remove(report_path)
+    except FileNotFoundError:
+        pass
+
+
+def get_run_overhead(wall_seconds: float, run_report: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Get the seconds of a run's wall time that were not spent processing mail.
+
+    Overhead is everything but `work_seconds`: interpreter start-up, imports, dispatching Outlook, walking the folder
+    tree and, for the warm worker, passing the request to the worker process.
+
+    :param wall_seconds: float, the wall time of the run as seen by the scheduler.
+    :param run_report: dict, the report written by the run.
+    :return: float, the overhead in seconds, or None if the run did not report its work time.
+    """
+    if not run_report or run_report.get('work_seconds') is None:
+        return None
+    return max(wall_seconds - run_report['work_seconds'], 0.0)
@@ -0,0 +1,126 @@
+"""Cache the MAPI namespace, the stores by name and the found folders for as long as an Outlook session lasts.
+
+Every run used to get the namespace again, scan the Stores for the account's store by display name, and walk the
+folder tree for the folders it needs; in a process that does many runs (the warm worker, event_driven.py) those are the
+same objects each time. A SessionCache keeps them, checking each with a cheap COM property get (a store's StoreID, a
+folder's EntryID) before handing it out, and drops everything when the Outlook application it was filled from is
+replaced, i.e. when OutlookSingleton reconnects or resets Outlook. Each drop starts a new generation.
+
+example:
+    namespace = session_cache.namespace(outlook_application)
+    store = session_cache.get_store('account', namespace)
+
+The cached objects belong to the thread that owns the Outlook session, like the session itself.
+
+Classes:
+    SessionCache: The namespace, stores and found folders of one Outlook session.
+
+"""
+
+from typing import Any, Dict, Iterable, Optional
+
+from helpers.com_compat import CDispatch, com_error
+from helpers.handle_budget import HandleRef
+from log_setup import lg
+
+
+def _is_alive(com_object: Any, property_name: str) -> bool:
+    """Whether a cached object still answers a property get; a HandleRef is checked on its (re-)opened object."""
+    try:
+        getattr(com_object.com_object if isinstance(com_object, HandleRef) else com_object, property_name)
+        return True
+    except (com_error, KeyError, AttributeError):
+        return False
+
+
+class SessionCache:
+    """The namespace, stores and found folders of one Outlook session.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._application: Optional[CDispatch] = None
+        self._namespace: Optional[CDispatch] = None
+        self._store_index: Optional[Dict[str, CDispatch]] = None  # by display name, in the Stores' order
+        self._folders: Dict[str, Dict[str, Any]] = {}  # found folders by path, per store name filter
+        self.stats: Dict[str, int] = dict(hits=0, misses=0, invalidations=0)
+
+    def invalidate(self, reason: str = '') -> None:
+        """Drop everything cached and start a new generation.
+
+        :param reason: str, why, for the log.
+        """
+        self.generation += 1
+        self._application = None
+        self._namespace = None
+        self._store_index = None
+        self._folders = {}
+        self.stats['invalidations'] += 1
+        lg.debug('Session cache invalidated (generation %s): %s', self.generation, reason)
+
+    def _count(self, hit: bool) -> None:
+        self.stats['hits' if hit else 'misses'] += 1
+
+    def namespace(self, application: CDispatch) -> CDispatch:
+        """Get the application's MAPI namespace; a different application than last time invalidates the cache.
+
+        :param application: CDispatch, the Outlook application.
+        :return: CDispatch, its MAPI namespace.
+        """
+        if application is not self._application:
+            if self._application is not None:
+                self.invalidate('new Outlook application')
+            self._application = application
+        self._count(self._namespace is not None)
+        if self._namespace is None:
+            self._namespace = application.GetNamespace("MAPI")
+        return self._namespace
+
+    def get_store(self, store_name_filter: str, namespace: CDispatch) -> Optional[CDispatch]:
+        """Get the first store whose display name contains the filter, like outlook_helpers.get_store_by_name.
+
+        The stores are indexed by display name on the first lookup; the index is rebuilt if the store found in it no
+        longer answers.
+
+        :param store_name_filter: str, part of the store's display name.
+        :param namespace: CDispatch, the MAPI namespace to index the stores of.
+        :return: CDispatch, the store, or None if none matches.
+        """
+        indexed = False
+        for rebuild in (self._store_index is None, True):
+            if rebuild:
+                self._store_index = {store.DisplayName: store for store in namespace.Stores}
+                indexed = True
+            store = next((store for name, store in self._store_index.items() if store_name_filter in name), None)
+            if store is None or _is_alive(store, 'StoreID'):
+                self._count(not indexed and store is not None)
+                return store
+        return None
+
+    def get_folders(self, store_name_filter: str, folder_paths: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Get the cached folders of a store, if all the given folders are cached and still answer.
+
+        :param store_name_filter: str, the store name filter they were found with.
+        :param folder_paths: the paths of the folders needed.
+        :return: dict, a copy of the cached folders by path, or None if any needed folder isn't usable.
+        """
+        folders = self._folders.get(store_name_filter)
+        usable = folders is not None and all(path in folders and _is_alive(folders[path], 'EntryID')
+                                             for path in folder_paths)
+        self._count(usable)
+        if not usable:
+            self._folders.pop(store_name_filter, None)
+            return None
+        return dict(folders)
+
+    def put_folders(self, store_name_filter: str, folders: Dict[str, Any]) -> None:
+        """Cache the folders found in a store.
+
+        :param store_name_filter: str, the store name filter they were found with.
+        :param folders: dict, the found folders by path.
+        """
+        self._folders[store_name_filter] = dict(folders)
+
+    def forget_folders(self) -> None:
+        """Drop the cached folders, e.g. after a run failed, so they're found again."""
+        self._folders = {}
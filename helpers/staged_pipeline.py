@@ -0,0 +1,153 @@
+"""A three stage pipeline: fetch and finish on the calling (Outlook) thread, the work in between on an executor.
+
+COM objects belong to the thread that opened them, so getting an item's data out of Outlook and writing results back
+must happen on the Outlook thread, while CPU-bound work in between (e.g. parsing a PDF) can go to worker processes. Run
+one after another per item, each side idles while the other works. A StagedPipeline keeps both busy: the calling
+thread fetches the next items while the workers work on the last ones, and finishes each item as soon as its work
+is done.
+
+At most max_in_flight items are between fetch and finish; when that many are, the calling thread finishes items
+(waiting for the first to be done) before fetching more, so a slow worker stage holds back the fetching instead of
+queueing every fetched item (backpressure).
+
+example:
+    pipeline = StagedPipeline(save_attachment, parse_pdf, add_summary_email, get_process_pool(2), max_in_flight=4)
+    stats = pipeline.run(rows)
+
+Classes:
+    StagedPipeline: Fetch, work on an executor, finish, with at most max_in_flight items in between.
+
+Functions:
+    get_process_pool: Get the process pool with the given number of workers, shared by the runs of this process.
+
+"""
+
+import concurrent.futures
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from log_setup import lg
+
+_process_pools: Dict[int, concurrent.futures.ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: int) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    """Get the process pool with the given number of workers, shared by the runs of this process.
+
+    The workers are started once, on first use, rather than per run, and again if one died; they end with the process.
+
+    :param max_workers: int, the number of worker processes; 0 for none.
+    :return: ProcessPoolExecutor, or None for 0 workers, meaning the work is done on the calling thread.
+    """
+    if max_workers < 1:
+        return None
+    with _process_pools_lock:
+        pool = _process_pools.get(max_workers)
+        if pool is None or getattr(pool, '_broken', False):  # a worker died, e.g. killed; start new ones
+            pool = _process_pools[max_workers] = concurrent.futures.ProcessPoolExecutor(max_workers)
+        return pool
+
+
+def _log_error(stage: str, fetched: Any, error: BaseException) -> None:
+    lg.error(f'ERROR in the {stage} stage for {fetched}: {error}')
+
+
+class StagedPipeline:
+    """Fetch, work on an executor, finish, with at most max_in_flight items in between.
+    """
+
+    def __init__(self, fetch: Callable[[Any], Any], work: Callable[[Any], Any], finish: Callable[[Any, Any], None],
+                 executor: Optional[concurrent.futures.Executor] = None, max_in_flight: int = 4,
+                 on_error: Callable[[str, Any, BaseException], None] = _log_error):
+        """
+        :param fetch: callable, gets an item's input for the work on the calling thread; None skips the item.
+        :param work: callable, does the work on the fetched input; with a process pool it must be picklable (a module
+            level function) and so must its input and result.
+        :param finish: callable, called on the calling thread with the fetched input and the work's result.
+        :param executor: Executor, where the work is done; None does it on the calling thread, one item at a time.
+        :param max_in_flight: int, the most items fetched but not yet finished.
+        :param on_error: callable, called with the stage name ('work' or 'finish'), the fetched input and the error
+            when the work or the finish of an item fails; the other items go on, unless it raises. Errors fetching are
+            raised.
+        """
+        self.fetch = fetch
+        self.work = work
+        self.finish = finish
+        self.executor = executor
+        self.max_in_flight = max(1, max_in_flight)
+        self.on_error = on_error
+        self.stats: Dict[str, Any] = {}
+
+    def _finish(self, fetched: Any, future: 'concurrent.futures.Future') -> None:
+        """Finish an item whose work is done."""
+        try:
+            result = future.result()
+        except Exception as work_error:
+            self.stats['failed'] += 1
+            self.on_error('work', fetched, work_error)
+            return
+        start = time.perf_counter()
+        try:
+            self.finish(fetched, result)
+            self.stats['finished'] += 1
+        except Exception as finish_error:
+            self.stats['failed'] += 1
+            self.on_error('finish', fetched, finish_error)
+        self.stats['finish_seconds'] += time.perf_counter() - start
+
+    def _finish_done(self, in_flight: Dict['concurrent.futures.Future', Any], wait_stat: Optional[str] = None) -> None:
+        """Finish the items whose work is done; with a wait_stat, first wait for at least one, adding up the wait."""
+        if wait_stat is not None:
+            start = time.perf_counter()
+            concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            self.stats[wait_stat] += time.perf_counter() - start
+        done = [future for future in in_flight if future.done()]
+        self.stats['peak_finish_queue'] = max(self.stats['peak_finish_queue'], len(done))
+        for future in done:
+            self._finish(in_flight.pop(future), future)
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Any]:
+        """Run the items through the pipeline; returns when all are finished.
+
+        :param items: the items to fetch.
+        :return: dict, the run's stats: items 'fetched', 'finished' and 'failed', 'fetch_seconds' and
+            'finish_seconds' spent on the calling thread, the 'peak_work_queue' and 'mean_work_queue' depth (items
+            fetched but not done, sampled at each fetch), the 'peak_finish_queue' depth (items done but not finished),
+            the 'backpressure_waits' and 'backpressure_seconds' spent waiting with max_in_flight items in flight, and
+            the 'drain_seconds' spent waiting for the last items' work after the last fetch.
+        """
+        self.stats = dict(fetched=0, finished=0, failed=0, fetch_seconds=0.0, finish_seconds=0.0, peak_work_queue=0,
+                          mean_work_queue=0.0, peak_finish_queue=0, backpressure_waits=0, backpressure_seconds=0.0,
+                          drain_seconds=0.0)
+        in_flight: Dict[concurrent.futures.Future, Any] = {}
+        depth_total = 0
+        for item in items:
+            if len(in_flight) >= self.max_in_flight:
+                self.stats['backpressure_waits'] += 1
+                self._finish_done(in_flight, 'backpressure_seconds')
+            start = time.perf_counter()
+            fetched = self.fetch(item)
+            self.stats['fetch_seconds'] += time.perf_counter() - start
+            if fetched is None:
+                continue
+            self.stats['fetched'] += 1
+            if self.executor is None:
+                future = concurrent.futures.Future()
+                try:
+                    future.set_result(self.work(fetched))
+                except Exception as work_error:
+                    future.set_exception(work_error)
+            else:
+                future = self.executor.submit(self.work, fetched)
+            in_flight[future] = fetched
+            work_queue = sum(not future.done() for future in in_flight)
+            depth_total += work_queue
+            self.stats['peak_work_queue'] = max(self.stats['peak_work_queue'], work_queue)
+            self._finish_done(in_flight)
+        while in_flight:
+            self._finish_done(in_flight, 'drain_seconds')
+        if self.stats['fetched']:
+            self.stats['mean_work_queue'] = depth_total / self.stats['fetched']
+        return self.stats
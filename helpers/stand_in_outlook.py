@@ -0,0 +1,359 @@
+r"""A pure-python stand-in for the parts of the Outlook object model this program uses.
+
+The stand-in lets the folder, item and event handling be exercised without Windows, Outlook or a live mailbox. Only the
+members the program touches are implemented, with the same names as their COM counterparts so the stand-in objects can
+be passed anywhere a win32com Dispatch object is expected.
+
+example:
+    outlook = StandInOutlook()
+    store = outlook.add_store('account')
+    inbox = store.add_folder_path(r'\\account\Inbox')
+    inbox.deliver(StandInMailItem('CofC 123 ...', datetime.datetime.now()))
+    mapi = outlook.GetNamespace('MAPI')
+
+Classes:
+    StandInOutlook: The application object; also returned as its own MAPI namespace.
+    StandInStore: A store (mailbox) with a root folder.
+    StandInFolder: A mail folder with sub-folders and items.
+    StandInFolders: The Folders collection of a folder.
+    StandInItems: The Items collection of a folder, or a restricted view of it.
+    StandInMailItem: A mail item.
+    StandInAttachments: The Attachments collection of a mail item.
+    StandInAttachment: An attachment.
+
+Functions:
+    DispatchWithEvents: Stand-in for win32com.client.DispatchWithEvents, for subscribing to Items events.
+
+"""
+
+import datetime
+import itertools
+import re
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from helpers.restrict_filter import DASL_PREFIX, parse_restriction
+
+_entry_id_counter = itertools.count(1)
+
+
+def _new_entry_id() -> str:
+    """Get a new unique EntryID-like hex string."""
+    return f'{next(_entry_id_counter):048X}'
+
+
+class StandInAttachment:
+    """An attachment, holding its content in memory."""
+
+    def __init__(self, file_name: str, data: bytes = b''):
+        self.FileName = file_name
+        self.data = data
+
+    def SaveAsFile(self, path: str) -> None:
+        with open(path, 'wb') as af:
+            af.write(self.data)
+
+
+class StandInAttachments:
+    """The Attachments collection of a mail item; Item() is 1-based like COM."""
+
+    def __init__(self, attachments: Optional[List[StandInAttachment]] = None):
+        self._attachments: List[StandInAttachment] = list(attachments or [])
+
+    @property
+    def Count(self) -> int:
+        return len(self._attachments)
+
+    def Item(self, index: int) -> StandInAttachment:
+        return self._attachments[index - 1]
+
+    def Add(self, source: Union[str, 'StandInMailItem']) -> StandInAttachment:
+        if isinstance(source, StandInMailItem):
+            attachment = StandInAttachment(f'{source.Subject}.msg')
+        else:
+            with open(source, 'rb') as sf:
+                attachment = StandInAttachment(source.replace('\\', '/').rsplit('/', 1)[-1], sf.read())
+        self._attachments.append(attachment)
+        return attachment
+
+    def __iter__(self) -> Iterator[StandInAttachment]:
+        return iter(list(self._attachments))
+
+
+class StandInMailItem:
+    """A mail item. Lower-case save/move aliases exist because COM member names are case-insensitive."""
+
+    def __init__(self, subject: str = '', received_time: Optional[datetime.datetime] = None,
+                 flag_request: str = '', flag_status: int = 0, categories: str = '',
+                 attachments: Optional[List[StandInAttachment]] = None, sender_email_address: str = ''):
+        self.Subject = subject
+        self.ReceivedTime = received_time or datetime.datetime.now(datetime.timezone.utc)
+        self.FlagRequest = flag_request
+        self.FlagStatus = flag_status
+        self.Categories = categories
+        self.SenderEmailAddress = sender_email_address
+        self.HTMLBody = ''
+        self.Attachments = StandInAttachments(attachments)
+        self.EntryID = _new_entry_id()
+        self.LastModificationTime = self.ReceivedTime
+        self.Parent: Optional['StandInFolder'] = None
+        self.saved = False
+
+    def Save(self) -> None:
+        self.saved = True
+        self.LastModificationTime = datetime.datetime.now(datetime.timezone.utc)
+
+    def Move(self, destination_folder: 'StandInFolder') -> 'StandInMailItem':
+        if self.Parent is not None:
+            self.Parent.Items._remove(self)
+        destination_folder.deliver(self)
+        return self
+
+    def Delete(self) -> None:
+        if self.Parent is not None:
+            self.Parent.Items._remove(self)
+        self.Parent = None
+
+    def Copy(self) -> 'StandInMailItem':
+        copied = StandInMailItem(self.Subject, self.ReceivedTime, self.FlagRequest, self.FlagStatus, self.Categories,
+                                 list(self.Attachments), self.SenderEmailAddress)
+        if self.Parent is not None:
+            self.Parent.deliver(copied)
+        return copied
+
+    save = Save
+    move = Move
+
+
+class StandInItems:
+    """The Items collection of a folder, or a restricted view of it.
+
+    A restricted view is a snapshot of the matching items, which is close enough to COM's live filtered collection for a
+    single run. Only the folder's own collection raises ItemAdd events.
+    """
+
+    def __init__(self, folder: 'StandInFolder', items: Optional[List[StandInMailItem]] = None, is_view: bool = False):
+        self._folder = folder
+        self._items: List[StandInMailItem] = items if items is not None else []
+        self._is_view = is_view
+        self._cursor = 0
+        self._item_add_handlers: List[Callable[[StandInMailItem], None]] = []
+
+    @property
+    def Count(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[StandInMailItem]:
+        return iter(list(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def Item(self, index: int) -> StandInMailItem:
+        return self._items[index - 1]
+
+    def GetFirst(self) -> Optional[StandInMailItem]:
+        self._cursor = 0
+        return self.GetNext()
+
+    def GetNext(self) -> Optional[StandInMailItem]:
+        if self._cursor >= len(self._items):
+            return None
+        item = self._items[self._cursor]
+        self._cursor += 1
+        return item
+
+    def Sort(self, property_name: str, descending: bool = False) -> None:
+        attribute = property_name.strip('[]')
+        self._items.sort(key=lambda item: getattr(item, attribute), reverse=descending)
+
+    def Restrict(self, filter_string: str) -> 'StandInItems':
+        if filter_string.startswith(DASL_PREFIX):
+            predicate = parse_restriction(filter_string).matches
+        else:
+            predicate = parse_jet_filter(filter_string)
+        return StandInItems(self._folder, [item for item in self._items if predicate(item)], is_view=True)
+
+    def Add(self) -> StandInMailItem:
+        item = StandInMailItem()
+        self._folder.deliver(item, raise_events=False)  # new drafts are saved before they show up in a folder
+        return item
+
+    def add_item_add_handler(self, handler: Callable[[StandInMailItem], None]) -> None:
+        """Register a callable to be called with each item added to this collection."""
+        self._item_add_handlers.append(handler)
+
+    def _add(self, item: StandInMailItem, raise_events: bool = True) -> None:
+        self._items.append(item)
+        if raise_events and not self._is_view:
+            for handler in list(self._item_add_handlers):
+                handler(item)
+
+    def _remove(self, item: StandInMailItem) -> None:
+        self._items.remove(item)
+
+
+class StandInFolders:
+    """The Folders collection of a folder."""
+
+    def __init__(self, parent: 'StandInFolder'):
+        self._parent = parent
+        self._folders: List['StandInFolder'] = []
+
+    @property
+    def Count(self) -> int:
+        return len(self._folders)
+
+    def __iter__(self) -> Iterator['StandInFolder']:
+        return iter(list(self._folders))
+
+    def Item(self, key: Union[int, str]) -> 'StandInFolder':
+        if isinstance(key, int):
+            return self._folders[key - 1]
+        for folder in self._folders:
+            if folder.Name == key:
+                return folder
+        raise KeyError(key)
+
+    def Add(self, name: str) -> 'StandInFolder':
+        folder = StandInFolder(name, self._parent.FolderPath + '\\' + name, self._parent.store, self._parent)
+        self._folders.append(folder)
+        return folder
+
+
+class StandInFolder:
+    """A mail folder with sub-folders and items."""
+
+    def __init__(self, name: str, folder_path: str, store: 'StandInStore', parent: Optional['StandInFolder'] = None):
+        self.Name = name
+        self.FolderPath = folder_path
+        self.store = store
+        self.Parent = parent
+        self.EntryID = _new_entry_id()
+        self.StoreID = store.StoreID
+        self.Folders = StandInFolders(self)
+        self.Items = StandInItems(self)
+        store.namespace._register_folder(self)
+
+    @property
+    def Session(self) -> 'StandInOutlook':
+        return self.store.namespace
+
+    def deliver(self, item: StandInMailItem, raise_events: bool = True) -> StandInMailItem:
+        """Put a mail item in this folder, raising ItemAdd like a new arrival or a move into the folder would."""
+        item.Parent = self
+        self.store.namespace._register_item(item)
+        self.Items._add(item, raise_events)
+        return item
+
+
+class StandInStore:
+    """A store (mailbox) with a root folder."""
+
+    def __init__(self, display_name: str, namespace: 'StandInOutlook'):
+        self.DisplayName = display_name
+        self.StoreID = _new_entry_id()
+        self.namespace = namespace
+        self._root_folder = StandInFolder(display_name, '\\\\' + display_name, self)
+
+    def GetRootFolder(self) -> StandInFolder:
+        return self._root_folder
+
+    def add_folder_path(self, folder_path: str) -> StandInFolder:
+        """Get the folder at the given full folder path, creating any missing folders on the way."""
+        folder = self._root_folder
+        for name in folder_path.lstrip('\\').split('\\')[1:]:
+            try:
+                folder = folder.Folders.Item(name)
+            except KeyError:
+                folder = folder.Folders.Add(name)
+        return folder
+
+
+class StandInOutlook:
+    """The application object; also returned as its own MAPI namespace."""
+
+    def __init__(self):
+        self.Stores: List[StandInStore] = []
+        self._folders_by_id: Dict[str, StandInFolder] = {}
+        self._items_by_id: Dict[str, StandInMailItem] = {}
+
+    @property
+    def Session(self) -> 'StandInOutlook':
+        return self
+
+    def GetNamespace(self, name: str) -> 'StandInOutlook':
+        return self
+
+    def add_store(self, display_name: str) -> StandInStore:
+        store = StandInStore(display_name, self)
+        self.Stores.append(store)
+        return store
+
+    def GetFolderFromID(self, entry_id: str, store_id: Any = None) -> StandInFolder:
+        return self._folders_by_id[entry_id]
+
+    def GetItemFromID(self, entry_id: str, store_id: Any = None) -> StandInMailItem:
+        return self._items_by_id[entry_id]
+
+    def _register_folder(self, folder: StandInFolder) -> None:
+        self._folders_by_id[folder.EntryID] = folder
+
+    def _register_item(self, item: StandInMailItem) -> None:
+        self._items_by_id[item.EntryID] = item
+
+
+def DispatchWithEvents(items: StandInItems, user_event_class: type) -> Any:
+    """Stand-in for win32com.client.DispatchWithEvents, for subscribing to Items events.
+
+    Like the win32com version, the returned object is an instance of the user event class whose On<Event> methods are
+    called when the collection raises the event.
+
+    :param items: StandInItems, the collection to subscribe to.
+    :param user_event_class: type, a class with an OnItemAdd(self, item) method.
+    :return: The event class instance.
+    """
+    handler = user_event_class()
+    items.add_item_add_handler(handler.OnItemAdd)
+    return handler
+
+
+# matches one "[Property] op 'value'" comparison in a Jet restriction string
+_jet_comparison_ptn = re.compile(r"\[(?P<prop>\w+)\]\s*(?P<op><>|>=|<=|=|>|<)\s*'(?P<value>[^']*)'")
+_jet_operators: Dict[str, Callable[[Any, Any], bool]] = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    }
+
+
+def parse_jet_filter(filter_string: str) -> Callable[[StandInMailItem], bool]:
+    """Get a predicate for a Jet restriction string made of comparisons joined by AND.
+
+    Date values are compared as dates in 'mm/dd/YYYY' form; everything else is compared as strings.
+
+    :param filter_string: str, the restriction, e.g. "[FlagRequest] <> 'Follow up' AND [ReceivedTime] >= '01/31/2023'"
+    :return: A callable that returns True for items that pass the restriction.
+    """
+    comparisons = []
+    for clause in re.split(r'\s+AND\s+', filter_string.strip(), flags=re.IGNORECASE):
+        match = _jet_comparison_ptn.fullmatch(clause.strip())
+        if match is None:
+            raise ValueError(f'Unsupported restriction clause: {clause}')
+        comparisons.append((match['prop'], _jet_operators[match['op']], match['value']))
+
+    def predicate(item: StandInMailItem) -> bool:
+        for prop, operator, value in comparisons:
+            item_value = getattr(item, prop)
+            if isinstance(item_value, datetime.datetime):
+                item_value = item_value.replace(tzinfo=None)
+                value = datetime.datetime.strptime(value, '%m/%d/%Y')
+            elif not isinstance(item_value, str):
+                item_value = str(item_value)
+            if not operator(item_value, value):
+                return False
+        return True
+
+    return predicate
@@ -0,0 +1,175 @@
+"""Deadlines for Outlook calls and run stages, enforced by a watchdog thread.
+
+A COM call into Outlook can hang indefinitely, e.g. behind a modal dialog, on a stuck Move or on a SaveAsFile of a
+huge attachment, and Python can't interrupt it. Wrap the calls and stages that may hang in a deadline:
+
+example:
+    with call_deadline('Move'):
+        mail_item.Move(destination_folder)
+
+The watchdog thread checks the open deadlines every poll_seconds. When a call's deadline passes, it logs it and calls
+its on_timeout callback with the call's name; outlook_interface sets that to kill this session's Outlook process,
+which makes the hung call fail. When the block then ends (with that failure or otherwise) a WatchdogTimeout is raised
+in its place, once the callback has returned, so the run ends cleanly; run_main_process alerts and, if the callback
+reported Outlook killed, resets the Outlook session.
+
+A stage (e.g. processing a folder) that outlives its deadline may be slow rather than hung, e.g. planning the moves
+of a very large folder, so Outlook isn't killed for it: the run is cancelled instead. The next call deadline, or the
+next item boundary that checks (Watchdog.check), raises a WatchdogTimeout for the stage, as does the stage's block
+when it ends.
+
+The call and stage deadlines are in WATCHDOG_PARAMETERS; names without a deadline there, or a disabled watchdog, get
+no deadline.
+
+Classes:
+    Watchdog: Holds the open deadlines and watches them on a thread.
+    WatchdogTimeout: Raised when a block outlives its deadline.
+
+Functions:
+    call_deadline: The configured deadline for an Outlook call.
+    stage_deadline: The configured deadline for a stage of the run.
+
+Variables:
+    watchdog: The watchdog for this process.
+
+"""
+
+import contextlib
+import itertools
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+from log_setup import lg
+from untracked_config.performance_settings import WATCHDOG_PARAMETERS
+
+
+class WatchdogTimeout(Exception):
+    """Raised when a block outlives its deadline."""
+
+    def __init__(self, name: str, seconds: float):
+        super().__init__(f'{name} did not finish within {seconds} seconds.')
+        self.name = name
+        self.seconds = seconds
+
+
+class Watchdog:
+    """Holds the open deadlines and watches them on a thread.
+    """
+
+    def __init__(self, on_timeout: Optional[Callable[[str], bool]] = None, poll_seconds: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param on_timeout: callable, called on the watchdog's thread with the name of each call deadline that passes;
+            returns True if it ended the call (killed Outlook), which the timeout records as 'killed'.
+        :param poll_seconds: float, how often the deadlines are checked.
+        :param clock: callable returning the current time in seconds.
+        """
+        self.on_timeout = on_timeout
+        self.poll_seconds = poll_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._deadlines: Dict[int, Dict[str, Any]] = {}
+        self._tokens = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+        self.timeouts: List[Dict[str, Any]] = []
+        self._cancelled: Optional[Dict[str, Any]] = None
+
+    def reset(self) -> None:
+        """Forget the timeouts and the cancellation; call at the start of each run."""
+        with self._lock:
+            self.timeouts = []
+            self._cancelled = None
+
+    def check(self) -> None:
+        """Raise if a stage outlived its deadline during this run; call between items of slow work.
+
+        :raises WatchdogTimeout: for the stage whose deadline passed.
+        """
+        cancelled = self._cancelled
+        if cancelled is not None:
+            raise WatchdogTimeout(cancelled['name'], cancelled['seconds'])
+
+    @contextlib.contextmanager
+    def deadline(self, name: str, seconds: Optional[float], blocking_call: bool = True) -> Iterator[None]:
+        """Give a block a deadline.
+
+        :param name: str, the call or stage, for the logs and the on_timeout callback.
+        :param seconds: float, how long the block may run; None for no deadline.
+        :param blocking_call: bool, True if the block is a single call that can only be ended by killing Outlook
+            (on_timeout is called when it passes); False for a stage, which cancels the run instead.
+        :raises WatchdogTimeout: when the block ends after its deadline passed, or when a call starts after a stage
+            outlived its deadline.
+        """
+        if blocking_call:
+            self.check()
+        if seconds is None:
+            yield
+            return
+        token = next(self._tokens)
+        entry = dict(name=name, seconds=seconds, expires=self._clock() + seconds, expired=False,
+                     thread=threading.current_thread().name, blocking_call=blocking_call, handled=threading.Event())
+        with self._lock:
+            self._deadlines[token] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._watch, name='watchdog', daemon=True)
+                self._thread.start()
+        try:
+            yield
+        except WatchdogTimeout:
+            raise  # a deadline inside this one passed first
+        except Exception as err:
+            if entry['expired']:
+                raise WatchdogTimeout(name, seconds) from err
+            raise
+        finally:
+            with self._lock:
+                self._deadlines.pop(token, None)
+            if entry['expired']:
+                entry['handled'].wait()  # until the timeout records whether Outlook was killed
+        if entry['expired']:
+            raise WatchdogTimeout(name, seconds)
+
+    def _watch(self) -> None:
+        """Check the open deadlines every poll_seconds, until there are none."""
+        while True:
+            with self._lock:
+                if not self._deadlines:
+                    self._thread = None
+                    return
+                now = self._clock()
+                expired = [entry for entry in self._deadlines.values()
+                           if not entry['expired'] and entry['expires'] <= now]
+                for entry in expired:
+                    entry['expired'] = True
+                    entry['timeout'] = dict(name=entry['name'], seconds=entry['seconds'], thread=entry['thread'],
+                                            killed=False)
+                    self.timeouts.append(entry['timeout'])
+                    if not entry['blocking_call'] and self._cancelled is None:
+                        self._cancelled = entry
+            for entry in expired:
+                lg.error('%s on %s did not finish within its %s s deadline.', entry['name'], entry['thread'],
+                         entry['seconds'])
+                if entry['blocking_call'] and self.on_timeout is not None:
+                    try:
+                        entry['timeout']['killed'] = bool(self.on_timeout(entry['name']))
+                    except Exception as callback_error:
+                        lg.error('The watchdog could not handle the %s timeout: %s', entry['name'], callback_error)
+                entry['handled'].set()
+            time.sleep(self.poll_seconds)
+
+
+watchdog = Watchdog(poll_seconds=WATCHDOG_PARAMETERS['poll_seconds'])
+
+
+def call_deadline(member: str) -> ContextManager[None]:
+    """The configured deadline for an Outlook call, e.g. 'Move'."""
+    enabled = WATCHDOG_PARAMETERS['enabled']
+    return watchdog.deadline(member, WATCHDOG_PARAMETERS['call_seconds'].get(member) if enabled else None)
+
+
+def stage_deadline(stage: str) -> ContextManager[None]:
+    """The configured deadline for a stage of the run, e.g. 'folder_discovery'."""
+    enabled = WATCHDOG_PARAMETERS['enabled']
+    return watchdog.deadline(stage, WATCHDOG_PARAMETERS['stage_seconds'].get(stage) if enabled else None,
+                             blocking_call=False)
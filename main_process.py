@@ -8,24 +8,36 @@ modifications:
 """
 import datetime
 import os
-import re
+import time
 import traceback
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
 
 import pandas as pd
-import pypdf
 
+from helpers.com_tracing import com_tracer
+from helpers.folder_fingerprint import count_arrivals, fingerprint_changed, get_folder_fingerprint, \
+    load_fingerprints, save_fingerprints
+from helpers.folder_pool import get_folder_ids, map_folders_in_sessions
+from helpers.handle_budget import HandleBudget
+from helpers.item_handles import ItemResolver
 from helpers.json_help import df_json_handler
 from helpers.outlook_helpers import find_folders_in_outlook, valid_colors
+from helpers.processed_ledger import ProcessedLedger
+from helpers.run_lock import RunLock
+from helpers.run_metrics import run_metrics
+from helpers.run_report import write_run_report
+from helpers.watchdog import stage_deadline, watchdog
 from log_setup import lg
 from outlook_interface import OutlookSingleton, wc_outlook
-from tasks.clean_foam_inbox import get_process_folders_dfs, process_foam_groups
-from tasks.filing_test_reports.read_nbe_test_report_data import extract_nbe_report_data
-from tasks.mark_priority_emails import set_priority_customer_category
+from tasks.clean_foam_inbox import get_process_folders_dfs
+from tasks.external_dedupe import ExternalDedupe
+from tasks.registry import task_registry
+from tasks.task_graph import TaskGraph
 from untracked_config.accounts_and_folder_paths import acct_path_dct, process_configuration_dct
-from untracked_config.auto_dedupe_cust_ids import dedupe_cnums
 from untracked_config.development_node import ON_DEV_NODE, UNIT_TESTING
-from untracked_config.priority_shipment_customers import priority_flag_dict
+from untracked_config.performance_settings import CHANGE_PROBE_PARAMETERS, COM_TRACING_PARAMETERS, \
+    FOLDER_POOL_PARAMETERS, HANDLE_BUDGET_PARAMETERS, PROCESSED_LEDGER_PARAMETERS, RUN_LOCK_PARAMETERS, \
+    RUN_METRICS_PARAMETERS, SESSION_CACHE_PARAMETERS, STATE_DIR_PATH, TASK_GRAPH_PARAMETERS
 
 if ON_DEV_NODE:
     # pandas display settings for development
@@ -34,9 +46,53 @@ if ON_DEV_NODE:
     pd.set_option('display.width', 1000)
 
 
+def get_fingerprints_path(account_name: str) -> str:
+    """Get where an account's processed folders' fingerprints are saved between runs.
+
+    Args:
+        account_name (str): The account's name; each account keeps its state in its own directory.
+
+    Returns:
+        str: The path of the account's fingerprints JSON file.
+    """
+    return os.path.join(STATE_DIR_PATH, account_name, 'folder_fingerprints.json')
+
+
+def get_run_lock(account_name: str) -> Optional[RunLock]:
+    """Get the lock that keeps an account's runs from overlapping, if enabled.
+
+    Args:
+        account_name (str): The account's name; each account has its own lock.
+
+    Returns:
+        Optional[RunLock]: The lock, or None if RUN_LOCK_PARAMETERS aren't enabled.
+    """
+    if not RUN_LOCK_PARAMETERS['enabled']:
+        return None
+    return RunLock(os.path.join(STATE_DIR_PATH, account_name, 'run.lock'), RUN_LOCK_PARAMETERS['stale_seconds'])
+
+
+def get_processed_ledger(account_name: str, state_dir_path: str = STATE_DIR_PATH) -> Optional[ProcessedLedger]:
+    """Open the ledger of the actions completed on an account's mail items, if enabled.
+
+    Args:
+        account_name (str): The account's name; each account has its own ledger.
+        state_dir_path (str): The directory the accounts keep their state in; replay_session.py passes a temporary one.
+
+    Returns:
+        Optional[ProcessedLedger]: The ledger, or None if PROCESSED_LEDGER_PARAMETERS aren't enabled.
+    """
+    if not PROCESSED_LEDGER_PARAMETERS['enabled']:
+        return None
+    return ProcessedLedger(os.path.join(state_dir_path, account_name, 'processed_ledger.sqlite3'),
+                           PROCESSED_LEDGER_PARAMETERS['retention_days'])
+
+
 def main_process_function(found_folders_dict: Dict[str, Any], production_inbox_folders: List[str],
                           process_incoming_reports: bool = True, process_priority_customers: bool = True,
-                          process_duplicate_foam_certs: bool = True,
+                          process_duplicate_foam_certs: bool = True, acct: Optional[Dict[str, Any]] = None,
+                          session_factory: Optional[Callable[[], ContextManager]] = None,
+                          entry_ids: Optional[Dict[str, List[str]]] = None,
                           ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     """Perform the main processing of mail items.
 
@@ -44,9 +100,21 @@ def main_process_function(found_folders_dict: Dict[str, Any], production_inbox_f
     `production_inbox_folders`. It processes mail items in each folder, sets follow-up flags on priority customer items,
     and performs additional processing tasks. It also generates a summary dictionary containing debug information.
 
+    The tasks come from `tasks.registry.task_registry`; only the enabled tasks' modules are imported. With
+    FOLDER_POOL_PARAMETERS['max_workers'] above 1, the folders are fetched and processed concurrently, each on a thread
+    with its own Outlook session, and their results are merged in `production_inbox_folders` order.
+
     Args:
         found_folders_dict (Dict[str, Any]): A dictionary containing the found folders.
         production_inbox_folders (List[str]): A list of production inbox folders.
+        process_incoming_reports (bool): Whether to summarize incoming NBE test report emails.
+        process_priority_customers (bool): Whether to set follow-up flags on priority customer items.
+        process_duplicate_foam_certs (bool): Whether to move duplicate foam certs.
+        acct (Optional[Dict[str, Any]]): The account config; `acct_path_dct` by default.
+        session_factory (Optional[Callable[[], ContextManager]]): Opens the folder pool workers' Outlook sessions;
+            `outlook_interface.outlook_thread_session` by default. replay_session.py passes its replayed sessions.
+        entry_ids (Optional[Dict[str, List[str]]]): An event-driven batch's new EntryIDs by folder path; if given, only
+            these items are processed instead of each folder's fetched items.
 
     Returns:
         Tuple[Dict[str, Any], Dict[str, Any]]: A tuple containing the updated `found_folders_dict` and the summary dictionary.
@@ -59,30 +127,40 @@ def main_process_function(found_folders_dict: Dict[str, Any], production_inbox_f
         smry = dict()
         lg.info('Running on a PRODUCTION system.')
 
-    # config data
-    pfdfs: List[Tuple[Any, str]] = get_process_folders_dfs(production_inbox_folders, found_folders_dict)
-    found_folders_keys = found_folders_dict.keys()
-    move_folder_com = found_folders_dict[acct_path_dct['target_folder_path']]
-
-    # process mail items
-    for this_folder_path, df, other_emails_df in pfdfs:
-        lg.info('Processing %s', this_folder_path)
-        if this_folder_path in found_folders_keys:
-            if process_priority_customers:
-                lg.info('Setting follow up flags on priority customer items.')
-                set_priority_customer_category(df, priority_flag_dict, True)
-            if process_duplicate_foam_certs:
-                lg.info('Checking for duplicate foam reports for single-report customers.')
-                process_foam_groups(df[df.c_number.isin(dedupe_cnums)], this_folder_path,
-                                    move_folder_com, smry)
-            if process_incoming_reports:
-                lg.info('Checking for incoming reports.')
-                folder_path = acct_path_dct['local_save_folder_path']
-                nbe_cert_emails = get_nbe_emails(other_emails_df)
-                process_nbe_test_reports(folder_path, nbe_cert_emails)
+    enabled_tasks = task_registry.get_enabled_tasks(dict(process_incoming_reports=process_incoming_reports,
+                                                         process_priority_customers=process_priority_customers,
+                                                         process_duplicate_foam_certs=process_duplicate_foam_certs))
+    smry['task_timings'] = {}
+
+    acct = acct_path_dct if acct is None else acct
+    target_folder_path = acct['target_folder_path']
+    move_folder_com = found_folders_dict[target_folder_path]
+    folder_paths = []
+    for this_folder_path in production_inbox_folders:
+        if this_folder_path in found_folders_dict:
+            folder_paths.append(this_folder_path)
         else:
             lg.warn(f'Missing {this_folder_path} in checked folders!')
 
+    # fetch and process the folders concurrently, each in its own Outlook session, or one after another
+    max_folder_workers = min(FOLDER_POOL_PARAMETERS['max_workers'], len(folder_paths))
+    if max_folder_workers > 1:
+        def work(folder_path: str, ol_folder: Any, shared_folders: Dict[str, Any]) -> Optional[Dict[str, float]]:
+            return process_folder(folder_path, ol_folder, shared_folders[target_folder_path], enabled_tasks, smry,
+                                  acct, entry_ids)
+
+        folder_results = map_folders_in_sessions(
+            work, get_folder_ids({path: found_folders_dict[path] for path in folder_paths}),
+            get_folder_ids({target_folder_path: move_folder_com}), max_folder_workers, session_factory)
+    else:
+        folder_results = [(path, process_folder(path, found_folders_dict[path], move_folder_com, enabled_tasks, smry,
+                                                acct, entry_ids))
+                          for path in folder_paths]
+
+    for this_folder_path, task_timings in folder_results:  # in production_inbox_folders order
+        if task_timings is not None:
+            smry['task_timings'][this_folder_path] = task_timings
+
     if ON_DEV_NODE:  # write the smry dictionary to a file to make it easier to look at
         import json
         with open('./last_smry.json', 'w') as jf:
@@ -90,68 +168,97 @@ def main_process_function(found_folders_dict: Dict[str, Any], production_inbox_f
     return found_folders_dict, smry
 
 
-def get_nbe_emails(other_emails_df):
-    nbe_re_ptn = re.compile('Certificate for Delivery:\d{16}')
-    nbe_mask = other_emails_df['subject'].str.contains(nbe_re_ptn)
-    nbe_cert_emails = other_emails_df[nbe_mask].copy()
-    return nbe_cert_emails
+def process_folder(folder_path: str, ol_folder: Any, move_folder_com: Any,
+                   enabled_tasks: List[Tuple[str, Callable]], smry: Dict[str, Any], acct: Dict[str, Any],
+                   entry_ids: Optional[Dict[str, List[str]]] = None) -> Optional[Dict[str, float]]:
+    """Fetch a folder's mail items and run the enabled tasks' graph on them.
 
+    This runs on whichever thread owns `ol_folder` and `move_folder_com`, the main thread or a folder pool worker,
+    under the watchdog's 'process_folder' stage deadline.
 
-def process_nbe_test_reports(folder_path, nbe_cert_emails):
-    for rn, row in nbe_cert_emails.iterrows():
-        original_email = row['o_item']
-        # if there's only one attachment (there should be)
-        if original_email.Attachments.Count == 1:
-            attachment = original_email.Attachments.Item(1)
-            lg.debug(attachment)
-            # Check if the attachment is a PDF file
-            if attachment.FileName.lower().endswith(".pdf"):
-                # Save the attachment to the folder
-                try:
-                    save_loc = os.path.join(folder_path, attachment.FileName)
-                    lg.debug(f'Saving to {save_loc}')
-                    attachment.SaveAsFile(save_loc)
-
-                    # get the data from the PDF
-                    rdr = pypdf.PdfReader(save_loc)
-                    nbe_data = extract_nbe_report_data(rdr)
-                    lot_data = nbe_data['lot_info']
-                    results_df = nbe_data['test_results']['results_df']
-
-                    # create a new subject with useful info
-                    mfr_dates = results_df['date_of_manufacture']
-                    new_subj = f"{lot_data['product_name']} {lot_data['tabcode_lw']} " \
-                               f"DN: {lot_data['delivery_number_nbe']} lots: {' '.join(mfr_dates)}"
-
-                    # set the html body
-                    body_text_template = '''<html><body>{}</body></html>'''
-                    # add a lot header and html table for each lot
-                    mf_grps = results_df.groupby('date_of_manufacture')
-                    results_df_html = '<br><br>'.join([f"Lot: {md}<br>{df.to_html(index=False)}" for md, df in mf_grps])
-
-                    # create a new email to populate with the desired subject/body
-                    email = original_email.Parent.Items.Add()
-                    email.Subject = new_subj
-                    email.HTMLBody = body_text_template.format(
-                        pd.DataFrame.from_dict({k: [v] for k, v in lot_data.items()}).T.to_html(
-                            header=False) + '<br><br>' + results_df_html)
-
-                    # attach the PDF and the original email as attachments
-                    email.Attachments.Add(save_loc)
-                    email.Attachments.Add(original_email)
-
-                    # finalize the email and move it to the folder
-                    email.Save()
-                    email.Move(original_email.Parent)
-                    lg.debug(f'{email.Subject=} {email.HTMLBody=}')
-
-                    # todo: delete/temp file the PDF downloads; in-memory might be the most efficient
-                    # todo: save the data to a database for future use
-                except Exception as e:
-                    lg.error(f"ERROR saving attachment from email with subject '{email.Subject}': {e}")
-
-
-def get_process_ol_folders(wc_outlook: OutlookSingleton) -> Tuple[Dict[str, Any], List[str]]:
+    Args:
+        folder_path (str): The folder's path.
+        ol_folder (Any): The folder.
+        move_folder_com (Any): The folder duplicates are moved to, from the same Outlook session as `ol_folder`.
+        enabled_tasks (List[Tuple[str, Callable]]): The enabled tasks' names and node functions.
+        smry (Dict[str, Any]): The summary dictionary.
+        acct (Dict[str, Any]): The account config.
+        entry_ids (Optional[Dict[str, List[str]]]): An event-driven batch's new EntryIDs by folder path, if only these
+            items are processed.
+
+    Returns:
+        Optional[Dict[str, float]]: Each task node's run time in seconds, or None if the folder had no cert emails.
+    """
+    lg.info('Processing %s', folder_path)
+    with stage_deadline('process_folder'):
+        return process_folder_items(folder_path, ol_folder, move_folder_com, enabled_tasks, smry, acct, entry_ids)
+
+
+def process_folder_items(folder_path: str, ol_folder: Any, move_folder_com: Any,
+                         enabled_tasks: List[Tuple[str, Callable]], smry: Dict[str, Any], acct: Dict[str, Any],
+                         entry_ids: Optional[Dict[str, List[str]]] = None) -> Optional[Dict[str, float]]:
+    """Fetch a folder's mail items and run the enabled tasks' graph on them; see `process_folder`."""
+    # with the dedupe enabled, a large folder's dedupe candidates are added to an ExternalDedupe as they are fetched
+    external_dedupes = {} if any(name == 'duplicate_foam_certs' for name, _ in enabled_tasks) else None
+    try:
+        pfdfs: List[Tuple[Any, str]] = get_process_folders_dfs([folder_path], {folder_path: ol_folder},
+                                                               external_dedupes=external_dedupes,
+                                                               entry_ids=entry_ids)
+        if not pfdfs:
+            return None
+        return run_folder_tasks(folder_path, pfdfs[0], ol_folder, move_folder_com, enabled_tasks, smry, acct,
+                                (external_dedupes or {}).get(folder_path))
+    finally:
+        for dedupe in (external_dedupes or {}).values():
+            dedupe.cleanup()  # the run files of a plan that didn't run
+
+
+def run_folder_tasks(folder_path: str, folder_frames: Tuple[str, Any, Any], ol_folder: Any, move_folder_com: Any,
+                     enabled_tasks: List[Tuple[str, Callable]], smry: Dict[str, Any], acct: Dict[str, Any],
+                     external_dedupe: Optional[ExternalDedupe]) -> Dict[str, float]:
+    """Run the enabled tasks' graph on a folder's fetched frames; see `process_folder`."""
+    _, df, other_emails_df = folder_frames
+
+    # the frames hold the items' IDs; the tasks open the items they change through the resolver, one at a time
+    session = ol_folder.Session
+    item_budget = get_handle_budget(session)
+    resolver = ItemResolver(session, item_budget)
+    ledger = get_processed_ledger(acct['account_name'], acct.get('state_dir_path', STATE_DIR_PATH))
+    task_graph = TaskGraph(node for _, task_nodes in enabled_tasks for node in task_nodes())
+    context = dict(folder_path=folder_path, cert_df=df, other_df=other_emails_df, move_folder=move_folder_com,
+                   smry=smry, local_save_folder_path=acct['local_save_folder_path'], resolver=resolver, ledger=ledger,
+                   external_dedupe=external_dedupe)
+    try:
+        _, task_timings = task_graph.run(context, TASK_GRAPH_PARAMETERS['max_workers'])
+    finally:
+        if ledger is not None:
+            ledger.close()
+    lg.info('Task timings for %s: %s', folder_path,
+            ', '.join(f'{name} {seconds:.2f}s' for name, seconds in task_timings.items()))
+    lg.debug('Opened %s items in %s, at most %s at once.', resolver.opened, folder_path, resolver.peak_open)
+    if item_budget is not None:
+        lg.debug('Item handle budget for %s: %s', folder_path, item_budget.stats['item'])
+        item_budget.release_all()
+    return task_timings
+
+
+def get_handle_budget(session: Any) -> Optional[HandleBudget]:
+    """Get a budget for the folders and items open in an Outlook session, if enabled.
+
+    Args:
+        session (Any): The MAPI namespace.
+
+    Returns:
+        Optional[HandleBudget]: The budget, or None if HANDLE_BUDGET_PARAMETERS aren't enabled.
+    """
+    if not HANDLE_BUDGET_PARAMETERS['enabled']:
+        return None
+    return HandleBudget(session, HANDLE_BUDGET_PARAMETERS['max_open_folders'],
+                        HANDLE_BUDGET_PARAMETERS['max_open_items'])
+
+
+def get_process_ol_folders(wc_outlook: OutlookSingleton, acct: Optional[Dict[str, Any]] = None
+                           ) -> Tuple[Dict[str, Any], List[str]]:
     """Retrieve Outlook folders for processing.
 
     Retrieves the Outlook folders for processing based on the provided `wc_outlook` instance. It gets the current folder
@@ -160,51 +267,287 @@ def get_process_ol_folders(wc_outlook: OutlookSingleton) -> Tuple[Dict[str, Any]
 
     Args:
         wc_outlook (OutlookSingleton): An instance of the `OutlookSingleton` class representing the Outlook application.
+        acct (Optional[Dict[str, Any]]): The account config; `acct_path_dct` by default.
 
     Returns:
         Tuple[Dict[str, Any], List[str]]: A tuple containing a dictionary of found folders and a list of production
         inbox folders.
     """
-    inbox_folders = acct_path_dct['inbox_folders']
-    must_find_folders = get_must_find_folders()
+    acct = acct_path_dct if acct is None else acct
+    inbox_folders = acct['inbox_folders']
+    must_find_folders = get_must_find_folders(acct)
     ol_folders = wc_outlook.get_outlook_folders()
-    account_name = acct_path_dct['account_name']
-    found_folders: Dict[str, Any] = find_folders_in_outlook(ol_folders, account_name, must_find_folders)
+    account_name = acct['account_name']
+    session_cache = getattr(wc_outlook, 'session_cache', None) if SESSION_CACHE_PARAMETERS['enabled'] else None
+    found_folders: Dict[str, Any] = find_folders_in_outlook(ol_folders, account_name, must_find_folders,
+                                                            budget=get_handle_budget(ol_folders), cache=session_cache)
     return found_folders, inbox_folders
 
 
-def get_must_find_folders():
-    inbox_folders = acct_path_dct['inbox_folders']
+def get_must_find_folders(acct: Optional[Dict[str, Any]] = None):
+    acct = acct_path_dct if acct is None else acct
+    inbox_folders = acct['inbox_folders']
     # get current folder data
     find_folder_keys = ['target_folder_path']
     if UNIT_TESTING:
         find_folder_keys += ['known_good_final_state_inbox_folder', 'known_good_final_state_inbox_folder',
                              'test_file_origin']
-    test_keys = [acct_path_dct[k] for k in find_folder_keys]
+    test_keys = [acct[k] for k in find_folder_keys]
     must_find_folders = inbox_folders + test_keys
     return must_find_folders
 
 
-if __name__ == '__main__':  # this is what is run by the scheduler
+def probe_folder_changes(outlook: OutlookSingleton, folder_paths: List[str], fingerprints_path: str,
+                         found_folders_dict: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fingerprint the processed folders and compare them with the fingerprints saved by the last run.
+
+    Folders are opened directly by their saved IDs when `found_folders_dict` isn't available, so an unchanged mailbox
+    costs a few COM calls per folder instead of a folder walk, a Restrict and a DataFrame build.
+
+    Args:
+        outlook (OutlookSingleton): The Outlook instance to use.
+        folder_paths (List[str]): The paths of the processed folders.
+        fingerprints_path (str): The path of the account's saved fingerprints.
+        found_folders_dict (Optional[Dict[str, Any]]): Folders found by an earlier run in this process, if any.
+
+    Returns:
+        Dict[str, Any]: 'changed_folders' (paths), 'arrivals' (an estimate) and the current 'fingerprints'. A folder
+        without a previous fingerprint counts as changed.
+    """
+    previous = load_fingerprints(fingerprints_path).get('folders', {})
+    namespace = None
+    probe = dict(changed_folders=[], arrivals=0, fingerprints={})
+    for folder_path in folder_paths:
+        previous_fingerprint = previous.get(folder_path)
+        ol_folder = (found_folders_dict or {}).get(folder_path)
+        if ol_folder is None and previous_fingerprint is not None:
+            namespace = namespace or outlook.get_outlook_folders()
+            ol_folder = namespace.GetFolderFromID(previous_fingerprint['entry_id'], previous_fingerprint['store_id'])
+        if ol_folder is None:
+            probe['changed_folders'].append(folder_path)
+            continue
+        fingerprint = get_folder_fingerprint(ol_folder, previous_fingerprint)
+        probe['fingerprints'][folder_path] = fingerprint
+        probe['arrivals'] += count_arrivals(previous_fingerprint, fingerprint)
+        if fingerprint_changed(previous_fingerprint, fingerprint):
+            probe['changed_folders'].append(folder_path)
+    return probe
+
+
+def is_skip_allowed(now: datetime.datetime, fingerprints_path: str) -> bool:
+    """Whether a run may be skipped, i.e. the change probe is on and the last full run isn't too long ago.
+
+    Args:
+        now (datetime.datetime): The start time of this run.
+        fingerprints_path (str): The path of the account's saved fingerprints.
+
+    Returns:
+        bool: True if an unchanged mailbox may be skipped.
+    """
+    if not CHANGE_PROBE_PARAMETERS['enabled']:
+        return False
+    saved_at = load_fingerprints(fingerprints_path).get('saved_at')
+    if saved_at is None:
+        return False
+    since_full_run = (now - datetime.datetime.fromisoformat(saved_at)).total_seconds()
+    return since_full_run < CHANGE_PROBE_PARAMETERS['max_skip_seconds']
+
+
+def save_folder_fingerprints(outlook: OutlookSingleton, folder_paths: List[str], fingerprints_path: str,
+                             found_folders_dict: Dict[str, Any], saved_at: datetime.datetime) -> None:
+    """Fingerprint the processed folders after a full run, so the next run can tell if anything changed since.
+
+    This is done after the run, not before, because the run's own flags, moves and new emails change the folders.
+
+    Args:
+        outlook (OutlookSingleton): The Outlook instance to use.
+        folder_paths (List[str]): The paths of the processed folders.
+        fingerprints_path (str): The path of the account's saved fingerprints.
+        found_folders_dict (Dict[str, Any]): The found folders.
+        saved_at (datetime.datetime): The start time of the run.
+
+    Returns:
+        None
+    """
+    probe = probe_folder_changes(outlook, folder_paths, fingerprints_path, found_folders_dict)
+    save_fingerprints(fingerprints_path, probe['fingerprints'], saved_at.isoformat())
+
+
+def run_main_process(outlook: OutlookSingleton, found_folders_dict: Optional[Dict[str, Any]] = None,
+                     acct: Optional[Dict[str, Any]] = None, entry_ids: Optional[Dict[str, List[str]]] = None
+                     ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Run one pass of the main process, logging and alerting on unhandled exceptions.
+
+    This is what each scheduler tick runs, either in a new subprocess or in the resident warm worker. The warm worker
+    passes back the folders found on its previous run so that the folder tree doesn't have to be walked again. The run
+    holds the account's run lock (see `get_run_lock`); if another run holds it past RUN_LOCK_PARAMETERS['wait_seconds'],
+    this run is skipped and reported with 'lock_skipped'.
+
+    event_driven.py runs each micro-batch of new mail through here too, with the batch's `entry_ids`, so a batch gets
+    the same lock, reset watchdog, metrics and COM tracer, alerts and Outlook reset as a scheduled run. A batch only
+    processes its new items: there is no change probe, and the folders' fingerprints aren't saved, so the next
+    scheduled run still checks the folders whole, e.g. deduplicating the new certs against the older ones.
+
+    Args:
+        outlook (OutlookSingleton): The Outlook instance to use.
+        found_folders_dict (Optional[Dict[str, Any]]): Folders found by an earlier run in this process. If None, the
+            folders are found again.
+        acct (Optional[Dict[str, Any]]): The account config; `acct_path_dct` by default. multi_account_runner passes
+            each account's config to its own worker process.
+        entry_ids (Optional[Dict[str, List[str]]]): An event-driven batch's new EntryIDs by folder path; if given, only
+            these items, in these folders, are processed.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], Dict[str, Any]]: The found folders (None if the run failed, so that they are
+        found again next time) and a run report with the run's timings in seconds.
+    """
     now = datetime.datetime.now()
     lg.debug(f'Starting at {now}')
-    try:
-        found_folders_dict, production_inbox_folders = get_process_ol_folders(wc_outlook)
-        main_process_function(found_folders_dict, production_inbox_folders, **process_configuration_dct)
-
-    # log and alert on unhandled exceptions
-    except Exception as err:
-        stack_trace_str = traceback.format_exc()
-        lg.error(stack_trace_str)
-        if not ON_DEV_NODE and not UNIT_TESTING:
+    acct = acct_path_dct if acct is None else acct
+    run_report = dict(account_name=acct['account_name'], started=now.isoformat(), ok=False,
+                      reused_folders=found_folders_dict is not None, skipped=False, arrivals=None, folder_seconds=0.0,
+                      work_seconds=0.0)
+    if entry_ids is not None:
+        run_report['batch_items'] = sum(len(folder_entry_ids) for folder_entry_ids in entry_ids.values())
+    inbox_folders = acct['inbox_folders'] if entry_ids is None else list(entry_ids)
+    fingerprints_path = get_fingerprints_path(acct['account_name'])
+    run_metrics.reset()
+    com_tracer.reset()
+    watchdog.reset()
+    run_lock = get_run_lock(acct['account_name'])
+    if run_lock is not None:
+        with run_metrics.span('run_lock_wait'):
+            locked = run_lock.acquire(RUN_LOCK_PARAMETERS['wait_seconds'])
+        run_report.update(lock_wait_seconds=run_lock.stats['wait_seconds'], lock_skipped=not locked)
+        if not locked:
+            lg.warning('Skipping the run; another run holds the lock: %s', run_lock.owner())
+            run_report.update(skipped=True, total_seconds=(datetime.datetime.now() - now).total_seconds())
+            write_run_metrics(acct['account_name'], run_report)
+            return found_folders_dict, run_report
+    try:  # the lock is released however the run ends, including when the probe skips it
+        if COM_TRACING_PARAMETERS['record']:
+            com_tracer.start_recording(os.path.join(COM_TRACING_PARAMETERS['trace_dir'],
+                                                    f'outlook_session_{acct["account_name"]}.trace.jsonl.gz'))
+        try:
+            if entry_ids is None and is_skip_allowed(now, fingerprints_path):
+                probe_start = time.perf_counter()
+                with run_metrics.span('change_probe', items=len(inbox_folders)), stage_deadline('change_probe'):
+                    probe = probe_folder_changes(outlook, inbox_folders, fingerprints_path, found_folders_dict)
+                run_report.update(arrivals=probe['arrivals'], probe_seconds=time.perf_counter() - probe_start)
+                if not probe['changed_folders']:
+                    lg.info('No changes in the processed folders since the last run, skipping.')
+                    run_report.update(ok=True, skipped=True,
+                                      total_seconds=(datetime.datetime.now() - now).total_seconds())
+                    write_run_metrics(acct['account_name'], run_report)
+                    return found_folders_dict, run_report
+
+            folders_start = time.perf_counter()
+            if found_folders_dict is None:
+                with run_metrics.span('folder_discovery') as discovery_span, stage_deadline('folder_discovery'):
+                    found_folders_dict, _ = get_process_ol_folders(outlook, acct)
+                    discovery_span['items'] = len(found_folders_dict)
+            run_report['folder_seconds'] = time.perf_counter() - folders_start
+
+            work_start = time.perf_counter()
+            _, smry = main_process_function(found_folders_dict, inbox_folders, **process_configuration_dct, acct=acct,
+                                            entry_ids=entry_ids)
+            run_report['work_seconds'] = time.perf_counter() - work_start
+            run_report['task_timings'] = smry['task_timings']
+            if CHANGE_PROBE_PARAMETERS['enabled'] and entry_ids is None:
+                with run_metrics.span('fingerprint_save', items=len(inbox_folders)), stage_deadline('fingerprint_save'):
+                    save_folder_fingerprints(outlook, inbox_folders, fingerprints_path, found_folders_dict, now)
+            run_report['ok'] = True
+
+        # log and alert on unhandled exceptions
+        except Exception as err:
+            found_folders_dict = None  # the folder handles may be what failed; find them again next run
+            if getattr(outlook, 'session_cache', None) is not None:
+                outlook.session_cache.forget_folders()
+            stack_trace_str = traceback.format_exc()
+            lg.error(stack_trace_str)
+            if watchdog.timeouts:
+                what_failed = f'timed out ({", ".join(timeout["name"] for timeout in watchdog.timeouts)})'
+            else:
+                what_failed = 'has encountered an unhandled error'
+            if not ON_DEV_NODE and not UNIT_TESTING:
+                try:
+                    from development_files.email_alert import send_alert
+
+                    send_alert(subject=f'Certs_inbox_automation {what_failed} in the {acct["account_name"]} account!',
+                               body=stack_trace_str)
+                except Exception as em_exc:
+                    lg.error(traceback.format_exc())
+        finally:
+            com_tracer.stop_recording()
+        if watchdog.timeouts:
+            run_report['timeouts'] = list(watchdog.timeouts)
+            found_folders_dict = None
+        if any(timeout['killed'] for timeout in watchdog.timeouts):
+            # the watchdog killed Outlook to end a hung call; start a new session for the next run
             try:
-                from development_files.email_alert import send_alert
+                outlook.reset_outlook()
+            except Exception as reset_error:
+                lg.error('Could not reset Outlook after the timeout: %s', reset_error)
+    finally:
+        if run_lock is not None:
+            run_lock.release()
+    run_report['total_seconds'] = (datetime.datetime.now() - now).total_seconds()
+    write_run_metrics(acct['account_name'], run_report)
+    if com_tracer.enabled:
+        write_com_trace(acct['account_name'])
+    lg.info('Completed main_process for %s in %s seconds', acct['account_name'], run_report['total_seconds'])
+    return found_folders_dict, run_report
+
+
+def write_run_metrics(account_name: str, run_report: Dict[str, Any]) -> None:
+    """Add the run's per-stage timings to its report and write them as JSON and as a Prometheus textfile.
+
+    Args:
+        account_name (str): The account's name; each account's metrics get their own files.
+        run_report (Dict[str, Any]): The run report.
+
+    Returns:
+        None
+    """
+    stages = run_metrics.summary()
+    run_report['stages'] = stages
+    lg.info('Stage timings: %s', ', '.join(
+        f'{name} {stage["seconds"]:.2f}s' + (f' ({stage["items"]} items)' if stage['items'] is not None else '')
+        for name, stage in stages.items()))
+    if not RUN_METRICS_PARAMETERS['enabled']:
+        return
+    try:
+        metrics_dir = RUN_METRICS_PARAMETERS['metrics_dir']
+        run_metrics.write(os.path.join(metrics_dir, f'run_metrics_{account_name}.json'),
+                          os.path.join(metrics_dir, f'certs_inbox_{account_name}.prom'),
+                          labels=dict(account=account_name), started=run_report['started'], ok=run_report['ok'],
+                          skipped=run_report['skipped'], total_seconds=run_report.get('total_seconds'))
+    except OSError as err:  # metrics are not worth failing a run over
+        lg.error('Could not write the run metrics: %s', err)
+
+
+def write_com_trace(account_name: str) -> None:
+    """Log the COM members the run spent the most time in and write all the recorded COM calls as JSON.
+
+    Args:
+        account_name (str): The account's name; each account's trace gets its own file.
+
+    Returns:
+        None
+    """
+    lg.info('Slowest COM members:\n%s', com_tracer.report(COM_TRACING_PARAMETERS['top_n']))
+    try:
+        write_run_report(dict(account_name=account_name, com_calls=com_tracer.summary()),
+                         os.path.join(RUN_METRICS_PARAMETERS['metrics_dir'], f'com_trace_{account_name}.json'))
+    except OSError as err:
+        lg.error('Could not write the COM trace: %s', err)
 
-                send_alert(subject='Certs_inbox_automation has encountered an unhandled error!', body=stack_trace_str)
-            except Exception as em_exc:
-                lg.error(traceback.format_exc())
+
+if __name__ == '__main__':  # this is what is run by the scheduler
+    try:
+        _, main_run_report = run_main_process(wc_outlook)
+        write_run_report(main_run_report)  # lets the scheduler report this run's start-up overhead
     finally:
         lg.debug('Deleting Outlook com instance.')
         del (wc_outlook)
-    lg.info('Completed main_process in %s seconds', (datetime.datetime.now() - now).total_seconds())
     pass  # for breakpoint
@@ -0,0 +1,152 @@
+"""Run main_process for several accounts at once, each in its own worker process.
+
+Each account (see `acct_path_dcts`) gets its own process, so its own Outlook session, and its own state directory.
+Accounts are sharded across up to `max_workers` processes; an account that fails, crashes its process or runs past
+its timeout is reported as failed without delaying or failing the others. The workers share their Windows session's
+Outlook, so they don't kill it on a hung call; the hung account runs into its timeout instead. Each account's run
+report is written next to the combined report the scheduler reads, so this file can be used as the scheduler's
+MAIN_PROCESS_FILENAME.
+
+Functions:
+    account_worker: A worker process' work; runs main_process for one account.
+    run_accounts: Run main_process for each account in worker processes and collect their run reports.
+    combine_run_reports: Combine the accounts' run reports into one report for the scheduler.
+
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List
+
+from helpers.run_report import RUN_REPORT_PATH, write_run_report
+from log_setup import lg
+
+
+def account_worker(conn: Connection, acct: Dict[str, Any]) -> None:
+    """A worker process' work; runs main_process for one account and sends back its run report.
+
+    The watchdog doesn't kill Outlook in the workers (see helpers.watchdog): a hung Outlook call is ended by the
+    account's timeout instead, and Outlook is left running for the other accounts.
+
+    :param conn: Connection, the worker's end of the pipe to the coordinator.
+    :param acct: dict, the account config.
+    """
+    import main_process
+    from helpers.watchdog import watchdog
+    from outlook_interface import wc_outlook
+
+    # the workers share their Windows session's one Outlook process; killing it to end this account's hung call would
+    # end every account's run, so the hung call is left to the coordinator's timeout, which fails this account only
+    watchdog.on_timeout = None
+    _, run_report = main_process.run_main_process(wc_outlook, acct=acct)
+    conn.send(run_report)
+    conn.close()
+
+
+def _failed_report(account_name: str, error: str, started: float) -> Dict[str, Any]:
+    """A run report for an account whose worker didn't report back."""
+    return dict(account_name=account_name, ok=False, error=error, total_seconds=time.perf_counter() - started)
+
+
+def run_accounts(accounts: List[Dict[str, Any]], max_workers: int = 4, account_timeout_seconds: float = 900.0,
+                 worker: Callable[[Connection, Dict[str, Any]], None] = account_worker) -> Dict[str, Dict[str, Any]]:
+    """Run main_process for each account in worker processes and collect their run reports.
+
+    Up to `max_workers` accounts run at once; as soon as one finishes, the next account starts, so a slow mailbox only
+    holds up its own worker.
+
+    :param accounts: list, the account configs; their 'account_name' values must be unique.
+    :param max_workers: int, the most accounts run at once.
+    :param account_timeout_seconds: float, how long an account may run before its worker is terminated.
+    :param worker: callable, the worker process' target, called with the pipe and the account config.
+    :return: dict, each account's run report keyed by account name, in `accounts` order.
+    """
+    account_names = [acct['account_name'] for acct in accounts]
+    if len(set(account_names)) != len(account_names):
+        raise ValueError(f'Account names must be unique: {account_names}')
+
+    pending = list(accounts)
+    running: Dict[Connection, Dict[str, Any]] = {}  # the coordinator's pipe ends, to the account being run
+    reports: Dict[str, Dict[str, Any]] = {}
+
+    def finish(conn: Connection, run_report: Dict[str, Any]) -> None:
+        job = running.pop(conn)
+        conn.close()
+        job['process'].join(timeout=30)
+        if job['process'].is_alive():
+            job['process'].terminate()
+            job['process'].join()
+        reports[job['account_name']] = run_report
+        lg.info('Account %s finished (ok=%s) in %.2f seconds.', job['account_name'], run_report.get('ok'),
+                time.perf_counter() - job['started'])
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            acct = pending.pop(0)
+            conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=worker, args=(child_conn, acct), daemon=True,
+                                              name=f'account_{acct["account_name"]}')
+            process.start()
+            child_conn.close()  # the worker holds the only other end now
+            running[conn] = dict(account_name=acct['account_name'], process=process, started=time.perf_counter())
+            lg.info('Started account %s in process %s.', acct['account_name'], process.pid)
+
+        for conn in multiprocessing.connection.wait(list(running), timeout=1.0):
+            job = running[conn]
+            try:
+                run_report = conn.recv()
+            except (OSError, EOFError):
+                lg.error('The worker for account %s died without a report.', job['account_name'])
+                run_report = _failed_report(job['account_name'], 'worker process died', job['started'])
+            finish(conn, run_report)
+
+        for conn, job in list(running.items()):
+            if time.perf_counter() - job['started'] > account_timeout_seconds:
+                lg.error('Account %s ran past %s seconds, terminating its worker.', job['account_name'],
+                         account_timeout_seconds)
+                job['process'].terminate()
+                finish(conn, _failed_report(job['account_name'], 'timed out', job['started']))
+
+    return {name: reports[name] for name in account_names}
+
+
+def combine_run_reports(reports: Dict[str, Dict[str, Any]], total_seconds: float) -> Dict[str, Any]:
+    """Combine the accounts' run reports into one report for the scheduler.
+
+    The accounts run concurrently, so the combined work time is the longest account's, not the sum.
+
+    :param reports: dict, each account's run report keyed by account name.
+    :param total_seconds: float, the coordinator's wall time.
+    :return: dict, the combined run report, with the accounts' reports under 'accounts'.
+    """
+    arrivals = [report.get('arrivals') for report in reports.values()]
+    return dict(ok=all(report.get('ok') for report in reports.values()),
+                skipped=all(report.get('skipped') for report in reports.values()),
+                arrivals=None if None in arrivals else sum(arrivals),
+                work_seconds=max((report.get('work_seconds') or 0.0 for report in reports.values()), default=0.0),
+                total_seconds=total_seconds, accounts=reports)
+
+
+def get_account_report_path(account_name: str, report_path: str = RUN_REPORT_PATH) -> str:
+    """Get where an account's own run report is written, next to the combined report.
+
+    :param account_name: str, the account's name.
+    :param report_path: str, the path of the combined report.
+    :return: str, the path of the account's report.
+    """
+    root, ext = os.path.splitext(report_path)
+    return f'{root}_{account_name}{ext}'
+
+
+if __name__ == '__main__':  # guarded; the worker processes import this module when spawned
+    from untracked_config.accounts_and_folder_paths import acct_path_dcts
+    from untracked_config.performance_settings import MULTI_ACCOUNT_PARAMETERS
+
+    run_start = time.perf_counter()
+    account_reports = run_accounts(acct_path_dcts, **MULTI_ACCOUNT_PARAMETERS)
+    for name, account_report in account_reports.items():
+        write_run_report(account_report, get_account_report_path(name))
+    write_run_report(combine_run_reports(account_reports, time.perf_counter() - run_start))
@@ -9,6 +9,9 @@ Classes:
         several issues.
 
 Functions:
+    outlook_thread_session: Open an Outlook session for the current thread, in its own COM apartment.
+    get_outlook_pid: Get the process ID of the Outlook in this process's Windows session.
+    kill_outlook_process: Kill the Outlook process, so that COM calls waiting on it fail instead of hanging.
     get_outlook_installation_path: Retrieve the installation path of Microsoft Outlook from the registry.
     start_outlook: Start Microsoft Outlook using the specified application path.
 
@@ -17,15 +20,24 @@ Variables:
 
 """
 
+import contextlib
+import csv
+import ctypes
+import gc
+import io
+import os
 import subprocess
-import time
-import winreg
-from typing import Union
-
-import pythoncom
-import win32com.client
-
+import sys
+from typing import Callable, Iterator, Optional, Union
+
+from helpers.backoff import ReadinessResult, wait_until_ready
+from helpers.com_compat import CDispatch, HAVE_PYWIN32, com_error, dispatch, pythoncom
+from helpers.com_tracing import com_tracer
+from helpers.run_metrics import run_metrics
+from helpers.session_cache import SessionCache
+from helpers.watchdog import watchdog
 from log_setup import lg
+from untracked_config.performance_settings import OUTLOOK_RECOVERY_PARAMETERS, SESSION_CACHE_PARAMETERS
 
 
 class OutlookSingleton:
@@ -38,9 +50,10 @@ class OutlookSingleton:
             lg.debug('Initializing Outlook instance.')
             cls._instance = super().__new__(cls)
             cls._instance._outlook = None
+            cls._instance.session_cache = SessionCache()
         return cls._instance
 
-    def _get_outlook(self) -> win32com.client.Dispatch:
+    def _get_outlook(self) -> CDispatch:
         """Gets a working instance of Outlook.
 
         Returns the instance of the Outlook application and checks if the Outlook session is still valid.
@@ -51,21 +64,18 @@ class OutlookSingleton:
         """
         if self._outlook is None:
             pythoncom.CoInitialize()
-            self._outlook = win32com.client.Dispatch("Outlook.Application")
+            self._outlook = dispatch("Outlook.Application")
         try:
             self._outlook.Session
-        except win32com.client.pywintypes.com_error as py_win_err:
+        except com_error as py_win_err:
             if py_win_err.hresult == -2147023174:
                 # Outlook session has expired, reopen Outlook
                 lg.warning("Outlook session expired, reopening")
                 self._reset_coinitialize()
-                self._outlook = win32com.client.Dispatch("Outlook.Application")
+                self._outlook = dispatch("Outlook.Application")
             elif py_win_err.hresult == -2147220995:
                 lg.debug('Not connected to the server, may still be loading.')
-                time.sleep(15)
-                try:
-                    self._outlook.Session  # try one more time
-                except Exception:
+                if not self._wait_until_ready(self._session_answers, 'not_connected').ready:
                     lg.info('Could not connect to Outlook server, restarting Outlook application.')
                     self.reset_outlook()
             else:
@@ -74,29 +84,80 @@ class OutlookSingleton:
                 raise
         return self._outlook
 
-    def get_outlook(self) -> win32com.client.Dispatch:
+    def get_outlook(self) -> CDispatch:
         """Returns the instance of the Outlook application.
 
          Checks if the Outlook session is still valid. If not, the method reopens the application using
-          win32com.client.Dispatch. This will reset CoInitialized resources.
+          win32com.client.Dispatch. This will reset CoInitialized resources. With COM tracing enabled, the instance is
+         wrapped so the calls made through it are counted and timed (see helpers.com_tracing).
 
         :return: The win32com Dispatch object representing the Outlook application instance.
         """
-        return self._get_outlook()
+        return com_tracer.wrap(self._get_outlook())
 
-    def get_outlook_folders(self) -> win32com.client.Dispatch:
+    def get_outlook_folders(self) -> CDispatch:
         """Get the MAPI namespace of the Outlook application.
 
         The MAPI namespace is a hierarchy of folders that represent different Outlook data stores, such as email
         accounts, calendars, contacts, and tasks. The MAPI namespace is represented by a win32com Dispatch object that
         can be used to access and manipulate the Outlook data stores.
 
+        With the session cache enabled, the namespace is got once per Outlook instance; a new instance (a reconnect or
+        a reset) invalidates the cache.
+
         :return: The win32com Dispatch object representing the MAPI namespace of the Outlook application.
         """
+        if SESSION_CACHE_PARAMETERS['enabled']:
+            return com_tracer.wrap(self.session_cache.namespace(self._get_outlook()))
         outlook = self.get_outlook()
         mapi_namespace = outlook.GetNamespace("MAPI")
         return mapi_namespace
 
+    def _session_answers(self) -> bool:
+        """Probe whether Outlook answers, dispatching it if there's no instance.
+
+        :return: True if the Outlook session could be got.
+        """
+        try:
+            if self._outlook is None:
+                self._outlook = dispatch("Outlook.Application")
+            self._outlook.Session
+            return True
+        except com_error as probe_error:
+            lg.debug(f'Outlook is not ready: {probe_error}')
+            return False
+
+    @staticmethod
+    def _outlook_exited() -> bool:
+        """Probe whether the Outlook application has left the running object table, i.e. has shut down."""
+        try:
+            pythoncom.GetActiveObject("Outlook.Application")
+        except com_error:
+            return True
+        return False
+
+    @staticmethod
+    def _wait_until_ready(probe: Callable[[], bool], reason: str, deadline_key: str = 'deadline_seconds'
+                          ) -> ReadinessResult:
+        """Probe until ready, with backoff, up to the configured deadline, recording the wait as a recovery span.
+
+        Args:
+            probe (Callable[[], bool]): Returns True once ready.
+            reason (str): Why Outlook is being waited for, the span's 'reason' label.
+            deadline_key (str): The OUTLOOK_RECOVERY_PARAMETERS key of the deadline in seconds.
+
+        Returns:
+            ReadinessResult: Whether the probe succeeded, after how many probes and how long.
+        """
+        settings = OUTLOOK_RECOVERY_PARAMETERS
+        with run_metrics.span('outlook_recovery', reason=reason) as span:
+            result = wait_until_ready(probe, settings[deadline_key], settings['initial_delay_seconds'],
+                                      settings['max_delay_seconds'], settings['jitter'])
+            span.update(ready=result.ready, attempts=result.attempts)
+        lg.info(f'Outlook {"ready" if result.ready else "not ready"} after {result.seconds:.1f} s and '
+                f'{result.attempts} probes ({reason}).')
+        return result
+
     @staticmethod
     def _reset_coinitialize() -> None:
         """Reset the COM library resources.
@@ -115,38 +176,49 @@ class OutlookSingleton:
 
     def __del__(self):
         """Uninitializes the COM library when the object is destroyed."""
-        pythoncom.CoUninitialize()
+        if HAVE_PYWIN32:  # without pywin32 (e.g. replaying a recorded session) COM was never initialized
+            pythoncom.CoUninitialize()
 
     def terminate_outlook(self) -> None:
         """Terminate the existing instance of the Outlook application.
 
-        This method closes the existing Outlook process and waits for 5 seconds before returning. This allows time for
-        the process to fully shut down before starting a new process.
+        This method closes the existing Outlook process and waits until it has shut down (up to the configured
+        shutdown deadline) before returning, so that a new process isn't started while the old one is closing.
 
         Returns:
             None
         """
         # Close the existing Outlook process
         lg.info('Terminating existing Outlook Application.')
-        self._outlook.Quit()
-        pythoncom.CoUninitialize()
+        try:
+            self._outlook.Quit()
+        except com_error as quit_error:  # e.g. the watchdog already killed it
+            lg.info(f'Outlook did not quit: {quit_error}')
         self._outlook = None
+        self.session_cache.invalidate('Outlook terminated')
+        gc.collect()  # release the COM objects still referring to the old instance
 
-        # Wait for 5 seconds before starting a new process
-        time.sleep(5)
+        self._wait_until_ready(self._outlook_exited, 'shutdown', 'shutdown_deadline_seconds')
+        pythoncom.CoUninitialize()
 
-    def reset_outlook(self) -> win32com.client.Dispatch:
+    def reset_outlook(self) -> CDispatch:
         """Reset the instance of the Outlook application.
 
-        This method closes the existing instance of the Outlook application and returns a new instance.
+        This method closes the existing instance of the Outlook application, starts a new one and returns it as soon as
+        its session answers.
 
         Returns:
             The Dispatch object representing the new instance of the Outlook application.
+
+        Raises:
+            TimeoutError: If the new instance doesn't answer within the configured deadline.
         """
-        lg.info('Restarting Outlook Application, this will take at least 15 seconds.')
+        lg.info('Restarting Outlook Application.')
         self.terminate_outlook()
         start_outlook()
-        time.sleep(10)
+        pythoncom.CoInitialize()
+        if not self._wait_until_ready(self._session_answers, 'restart').ready:
+            raise TimeoutError('Outlook did not answer after restarting.')
 
         try:
             return self.get_outlook()
@@ -155,12 +227,96 @@ class OutlookSingleton:
             raise e
 
 
+@contextlib.contextmanager
+def outlook_thread_session() -> Iterator[CDispatch]:
+    """Open an Outlook session for the current thread, in its own COM apartment.
+
+    COM objects can only be used on the thread (apartment) that created them, so worker threads can't share the
+    OutlookSingleton's objects. Each worker opens its own session with this and gets its folders from it by ID
+    (Namespace.GetFolderFromID). All of the session's objects must be released before the block ends.
+
+    example:
+        with outlook_thread_session() as namespace:
+            folder = namespace.GetFolderFromID(entry_id, store_id)
+
+    Yields:
+        The win32com Dispatch object representing this thread's MAPI namespace.
+    """
+    pythoncom.CoInitialize()
+    try:
+        yield com_tracer.wrap(dispatch("Outlook.Application")).GetNamespace("MAPI")
+    finally:
+        gc.collect()  # release COM objects held in reference cycles while the apartment is still open
+        pythoncom.CoUninitialize()
+
+
+def get_outlook_pid() -> Optional[int]:
+    """Get the process ID of the Outlook in this process's Windows session.
+
+    Outlook runs one process per Windows session, so that is the Outlook this process's COM calls go to; the Outlook
+    processes of other users' sessions on the same machine are left out.
+
+    Returns:
+        Optional[int]: The process ID, or None if there's no such process or it can't be told (e.g. not on Windows).
+    """
+    if sys.platform != 'win32':
+        return None
+    session_id = ctypes.c_ulong()
+    if not ctypes.windll.kernel32.ProcessIdToSessionId(os.getpid(), ctypes.byref(session_id)):
+        return None
+    try:
+        listing = subprocess.run(['tasklist', '/FI', 'IMAGENAME eq OUTLOOK.EXE', '/FI',
+                                  f'SESSION eq {session_id.value}', '/FO', 'CSV', '/NH'],
+                                 capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError) as list_error:
+        lg.error(f'Could not list the Outlook processes: {list_error}')
+        return None
+    for row in csv.reader(io.StringIO(listing)):
+        if len(row) > 1 and row[0].lower() == 'outlook.exe':
+            return int(row[1])
+    return None
+
+
+def kill_outlook_process(reason: str = '') -> bool:
+    """Kill the Outlook process, so that COM calls waiting on it fail instead of hanging.
+
+    This is the watchdog's handler for a hung Outlook call (see helpers.watchdog; stages that outlive their deadline
+    don't kill Outlook); it runs on the watchdog's thread, so it doesn't use COM. Only the Outlook of this process's
+    Windows session is killed (see `get_outlook_pid`). The hung thread resets the session with
+    `OutlookSingleton.reset_outlook` once its call fails.
+
+    Args:
+        reason (str): The call that timed out, for the log.
+
+    Returns:
+        bool: True if Outlook was killed; False if its process wasn't found or couldn't be killed.
+    """
+    pid = get_outlook_pid()
+    if pid is None:
+        lg.error(f'Could not find the Outlook process to abandon a hung call ({reason}); it was not killed.')
+        return False
+    lg.warning(f'Killing Outlook (process {pid}) to abandon a hung call ({reason}).')
+    try:
+        completed = subprocess.run(['taskkill', '/F', '/PID', str(pid)], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError) as kill_error:
+        lg.error(f'Could not kill Outlook: {kill_error}')
+        return False
+    if completed.returncode:
+        lg.error(f'Could not kill Outlook: {completed.stderr.strip() or completed.returncode}')
+        return False
+    return True
+
+
 def get_outlook_installation_path() -> Union[str, None]:
     """Retrieve the installation path of Microsoft Outlook from the registry.
 
     Returns:
         Union[str, None]: The installation path of Microsoft Outlook or None if it is not found.
     """
+    try:
+        import winreg
+    except ImportError:  # not on Windows
+        return None
     try:
         reg_path = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\OUTLOOK.EXE"
         with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, reg_path) as key:
@@ -183,5 +339,5 @@ def start_outlook(application_path: Union[str, None] = None) -> None:
     subprocess.Popen(application_path)
 
 
-
 wc_outlook = OutlookSingleton()
+watchdog.on_timeout = kill_outlook_process
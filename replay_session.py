@@ -0,0 +1,76 @@
+"""Replay a recorded Outlook session through main_process, without Outlook.
+
+Record a production run with COM_TRACING_PARAMETERS['record'], copy the trace file to any machine with this program's
+Python dependencies (pywin32 isn't needed) and run:
+
+    python replay_session.py ./logs/traces/outlook_session_account.trace.jsonl.gz
+
+The folders are found and processed from the trace exactly as main_process would, mutations are not applied, and the
+run's stage timings and the accesses missing from the trace are reported. With --latency, each access takes as long
+as it did when recorded, to compare wall times with the recorded run. The replay keeps its processed ledger and saved
+attachments in a temporary directory, so it leaves the account's state alone and each replay does the same work.
+
+Functions:
+    replay_main_process: Find the folders and run main_process_function against a recorded session.
+
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from helpers.com_replay import ReplaySession
+from helpers.run_metrics import run_metrics
+from helpers.watchdog import watchdog
+from log_setup import lg
+
+
+def replay_main_process(trace_path: str, acct: Optional[Dict[str, Any]] = None, replay_latency: bool = False
+                        ) -> Dict[str, Any]:
+    """Find the folders and run main_process_function against a recorded session.
+
+    The run's processed ledger and saved attachments go to a temporary directory, removed afterward, and the watchdog
+    starts from a reset and doesn't kill Outlook.
+
+    :param trace_path: str, the path of the trace file.
+    :param acct: dict, the config of the recorded account; `acct_path_dct` by default.
+    :param replay_latency: bool, whether each access takes as long as it did when recorded.
+    :return: dict, the replay's 'seconds', per-stage timings ('stages', see helpers.run_metrics), 'task_timings' and
+        'unmatched' accesses (member and kind: count) that weren't in the trace.
+    """
+    import main_process
+    from untracked_config.accounts_and_folder_paths import process_configuration_dct
+
+    acct = main_process.acct_path_dct if acct is None else acct
+    replay = ReplaySession(trace_path, replay_latency)
+    run_metrics.reset()
+    watchdog.reset()
+    on_timeout, watchdog.on_timeout = watchdog.on_timeout, None  # there's no hung Outlook call to kill
+    try:
+        with tempfile.TemporaryDirectory(prefix='replay_') as replay_dir:
+            acct = dict(acct, state_dir_path=replay_dir, local_save_folder_path=os.path.join(replay_dir, 'local_files'))
+            os.makedirs(acct['local_save_folder_path'])
+            start = time.perf_counter()
+            with run_metrics.span('folder_discovery'):
+                found_folders_dict, inbox_folders = main_process.get_process_ol_folders(replay.outlook, acct)
+            _, smry = main_process.main_process_function(found_folders_dict, inbox_folders, **process_configuration_dct,
+                                                         acct=acct, session_factory=replay.thread_session)
+            seconds = time.perf_counter() - start
+    finally:
+        watchdog.on_timeout = on_timeout
+    return dict(seconds=seconds, stages=run_metrics.summary(), task_timings=smry['task_timings'],
+                unmatched={f'{member} {kind}': count for (member, kind), count in replay.unmatched.items()})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded Outlook session through main_process.')
+    parser.add_argument('trace_path', help='the trace file recorded with COM_TRACING_PARAMETERS["record"]')
+    parser.add_argument('--latency', action='store_true', help='take as long per access as the recorded session')
+    cli_args = parser.parse_args()
+
+    replay_result = replay_main_process(cli_args.trace_path, replay_latency=cli_args.latency)
+    lg.info('Replayed in %.2f seconds.', replay_result['seconds'])
+    print(json.dumps(replay_result, indent=4))
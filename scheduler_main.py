@@ -1,30 +1,140 @@
 import datetime
+import os
 import subprocess
 import threading
 import time
+from typing import Any, Dict, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from pytz import timezone
 
+from helpers.adaptive_interval import AdaptiveInterval
+from helpers.run_lock import RunCoalescer
+from helpers.run_report import RUN_REPORT_PATH, get_run_overhead, read_run_report, remove_run_report
 from log_setup import lg
-from untracked_config.scheduling_data import MAIN_PROCESS_DIR_PATH, MAIN_PROCESS_FILENAME, PYTHON_EXE_PATH, \
-    SCHEDULING_PARAMETERS
+from untracked_config.scheduling_data import ADAPTIVE_INTERVAL_PARAMETERS, MAIN_PROCESS_DIR_PATH, \
+    MAIN_PROCESS_FILENAME, MAIN_PROCESS_MODE, PYTHON_EXE_PATH, SCHEDULING_PARAMETERS, WARM_WORKER_PARAMETERS
+from warm_worker import WarmWorkerClient
 
-lg.info('Scheduler start at %s', datetime.datetime.now())
+# the resident worker used when MAIN_PROCESS_MODE is 'warm_worker'
+warm_worker_client = WarmWorkerClient(**WARM_WORKER_PARAMETERS)
+
+# paces the runs by the arrival rate when enabled; the trigger then fires at its min_seconds
+adaptive_interval = AdaptiveInterval(**{k: v for k, v in ADAPTIVE_INTERVAL_PARAMETERS.items() if k != 'enabled'})
+
+# one run at a time; the ticks that come during a run are coalesced into one follow-up run
+run_coalescer = RunCoalescer()
+lock_stats = dict(skipped_runs=0, wait_seconds=0.0)  # the runs' waits for, and skips on, the account run lock
 
 
 # define the job function to run main_process.py in a new process
 def run_main_process() -> None:
-    """Run the main process.
+    """Start a run of the main process, unless one is going.
+
+    The run is done on its own thread (see `run_until_caught_up`), so the scheduler job returns at once. A tick that
+    comes while a run is going doesn't start another run; however many such ticks come, one follow-up run is done once
+    the current run ends.
+
+    With adaptive pacing enabled (`ADAPTIVE_INTERVAL_PARAMETERS`), ticks that come before the current interval has
+    passed are skipped.
+
+    Returns:
+        None
+    """
+    if ADAPTIVE_INTERVAL_PARAMETERS['enabled']:
+        if not adaptive_interval.is_due():
+            lg.debug('Skipping tick; the next run is due %.0f seconds after the last.',
+                     adaptive_interval.interval_seconds)
+            return
+        adaptive_interval.mark_run()
+
+    if not run_coalescer.start_tick():
+        lg.info('A run is still going; a follow-up run will start when it ends (%s ticks coalesced so far).',
+                run_coalescer.stats['coalesced_ticks'])
+        return
+    threading.Thread(target=run_until_caught_up, daemon=True).start()
+
+
+def run_until_caught_up() -> None:
+    """Do a run, then one more if ticks came during it, until none did.
+
+    Returns:
+        None
+    """
+    while True:
+        try:
+            run_main_process_once()
+        except Exception:  # the next tick should still run
+            lg.exception('The main process run failed.')
+        if not run_coalescer.finish_run():
+            return
+        lg.info('Starting the follow-up run for the ticks that came during the last run.')
+
+
+def run_main_process_once() -> None:
+    """Run the main process and wait for it to finish.
+
+    With `MAIN_PROCESS_MODE` set to 'warm_worker', the run is requested from the resident warm worker process, which
+    keeps its imports, Outlook session and folder handles between runs.
+
+    Otherwise, this function executes the main process by spawning a new process using `subprocess.Popen()`. It runs
+    the main process file (`MAIN_PROCESS_FILENAME`) using the specified Python executable path (`PYTHON_EXE_PATH`) and
+    sets the current working directory to `MAIN_PROCESS_DIR_PATH`. The last run's report is removed first, so a run
+    that ends without writing one (e.g. it crashed) is reported as such rather than with the last run's timings.
+
+    Returns:
+        None
+    """
+    if MAIN_PROCESS_MODE == 'warm_worker':
+        record_run_report(warm_worker_client.request_run())
+        return
+
+    remove_run_report(os.path.join(MAIN_PROCESS_DIR_PATH, RUN_REPORT_PATH))
+    started = time.perf_counter()
+    main_proc = subprocess.Popen([PYTHON_EXE_PATH, MAIN_PROCESS_FILENAME], cwd=MAIN_PROCESS_DIR_PATH)
+    report_subprocess_overhead(main_proc, started)
+
+
+def report_subprocess_overhead(main_proc: subprocess.Popen, started: float) -> None:
+    """Wait for a main process subprocess to finish and log how much of its wall time was overhead.
+
+    Args:
+        main_proc (subprocess.Popen): The main process subprocess.
+        started (float): The `time.perf_counter()` value when the subprocess was started.
+
+    Returns:
+        None
+    """
+    main_proc.wait()
+    wall_seconds = time.perf_counter() - started
+    run_report = read_run_report(os.path.join(MAIN_PROCESS_DIR_PATH, RUN_REPORT_PATH))
+    overhead_seconds = get_run_overhead(wall_seconds, run_report)
+    if overhead_seconds is None:
+        lg.info('Subprocess run: %.2f seconds wall time, no run report.', wall_seconds)
+    else:
+        lg.info('Subprocess run: %.2f seconds wall time, %.2f seconds work, %.2f seconds overhead.',
+                wall_seconds, run_report['work_seconds'], overhead_seconds)
+    record_run_report(run_report)
+
+
+def record_run_report(run_report: Optional[Dict[str, Any]]) -> None:
+    """Update the adaptive pacing from a finished run's report.
+
+    The run's wait for the run lock, and whether it was skipped for it, are added to the scheduler's lock stats.
 
-    This function executes the main process by spawning a new process using `subprocess.Popen()`. It runs the main
-    process file (`MAIN_PROCESS_FILENAME`) using the specified Python executable path (`PYTHON_EXE_PATH`) and sets the
-    current working directory to `MAIN_PROCESS_DIR_PATH`.
+    Args:
+        run_report (Optional[Dict[str, Any]]): The run report, or None if the run didn't leave one.
 
     Returns:
         None
     """
-    subprocess.Popen([PYTHON_EXE_PATH, MAIN_PROCESS_FILENAME], cwd=MAIN_PROCESS_DIR_PATH)
+    if run_report:
+        lock_stats['skipped_runs'] += bool(run_report.get('lock_skipped'))
+        lock_stats['wait_seconds'] += run_report.get('lock_wait_seconds') or 0.0
+        lg.info('Runs: %s; run lock: %s skipped, %.1f seconds waited.', run_coalescer.stats,
+                lock_stats['skipped_runs'], lock_stats['wait_seconds'])
+    if ADAPTIVE_INTERVAL_PARAMETERS['enabled'] and run_report:
+        adaptive_interval.observe(run_report.get('arrivals'))
 
 
 # define a function to start the scheduler in a separate thread
@@ -44,7 +154,9 @@ def start_scheduler() -> None:
     # Add the job to the scheduler using the scheduling parameters from the configuration file
     scheduler.add_job(run_main_process, **SCHEDULING_PARAMETERS)
 
-    # Start the scheduler
+    # Start the scheduler, warming the worker up before the first tick
+    if MAIN_PROCESS_MODE == 'warm_worker':
+        warm_worker_client.start()
     scheduler.start()
 
     # Enter an infinite loop to keep the scheduler running
@@ -52,10 +164,12 @@ def start_scheduler() -> None:
         time.sleep(1)
 
 
+if __name__ == '__main__':  # guarded so a spawned warm worker process doesn't start a second scheduler
+    lg.info('Scheduler start at %s', datetime.datetime.now())
 
-# start the scheduler thread
-scheduler_thread = threading.Thread(target=start_scheduler)
-scheduler_thread.start()
+    # start the scheduler thread
+    scheduler_thread = threading.Thread(target=start_scheduler)
+    scheduler_thread.start()
 
-# wait for the scheduler thread to complete
-scheduler_thread.join()
+    # wait for the scheduler thread to complete
+    scheduler_thread.join()
@@ -1,29 +1,44 @@
 """Check Outlook inboxes for redundant cert e-mails."""
 
 import datetime
+import itertools
 import re
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import pandas as pd
-import win32com
-from win32com import client as wclient
 
+from helpers.com_compat import CDispatch
+from helpers.item_handles import ItemId, ItemResolver
+from helpers.mail_schema import apply_mail_schema
 from helpers.outlook_helpers import add_categories_to_mail, colorize_outlook_email_list, \
     move_mail_items_to_folder, \
     remove_categories_from_mail
+from helpers.restrict_filter import Clause, all_of, flag_not, received_since, sender_in, to_restriction
+from helpers.run_metrics import run_metrics
+from helpers.watchdog import call_deadline
 from log_setup import lg
-from untracked_config.auto_dedupe_cust_ids import dedupe_columns
+from tasks.external_dedupe import ExternalDedupe
+from tasks.mark_priority_emails import get_priority_customer_rows
+from tasks.task_graph import TaskNode
+from untracked_config.auto_dedupe_cust_ids import dedupe_cnums, dedupe_columns
 from untracked_config.development_node import ON_DEV_NODE, UNIT_TESTING
+from untracked_config.performance_settings import DEDUPE_PARAMETERS, INGESTION_PARAMETERS, RESTRICT_FILTER_PARAMETERS
+from untracked_config.priority_shipment_customers import priority_flag_dict
 from untracked_config.subject_regex import subject_pattern
 
 
-def process_mail_items(mail_items: list, summary_dict=None) -> tuple[List[dict[str, Any]], List[dict[str, Any]]]:
+def process_mail_items(mail_items: list, summary_dict=None,
+                       store_id: Optional[str] = None) -> tuple[List[dict[str, Any]], List[dict[str, Any]]]:
     """Processes the given mail items, extracting relevant information and returning a list of dictionaries.
 
+    The rows hold each item's EntryID and StoreID rather than the item, so that no item stays open after it is read;
+    see helpers.item_handles for opening them again.
+
     :param mail_items: A list of win32com CDispatch objects representing the mail items.
     :param summary_dict: dict, a dictionary for storing development/debugging information from the process.
+    :param store_id: str, the StoreID of the items' folder.
     :return: List[dict], A list of dictionaries representing the mail items, with keys for 'received_time',
-    'subject', and other
+    'subject', 'entry_id', 'store_id' and other
         extracted information.
     """
     # lists to populate
@@ -44,7 +59,8 @@ def process_mail_items(mail_items: list, summary_dict=None) -> tuple[List[dict[s
         if received_time is None:
             lg.debug(f'No received time on {subject}')
             continue
-        initial_row = {"received_time": received_time, "subject": subject, 'o_item': item}
+        initial_row = {"received_time": received_time, "subject": subject, 'entry_id': item.EntryID,
+                       'store_id': store_id}
 
         if match:
             matched_sub.append(subject)
@@ -58,31 +74,147 @@ def process_mail_items(mail_items: list, summary_dict=None) -> tuple[List[dict[s
     if summary_dict is not None:  # recording for development
         summary_dict['all_subj_lines'] += all_subj
         summary_dict['matched'] += matched_sub
-        summary_dict['non_regex_matching_emails']: List[Tuple[str, wclient.CDispatch]] = non_regex_matching_emails
+        summary_dict['non_regex_matching_emails']: List[dict[str, Any]] = non_regex_matching_emails
     return results, non_regex_matching_emails
 
 
 def sort_mail_items_to_dataframes(items: List[dict[str, Any]]) -> pd.DataFrame:
     """Get a dataframe sorted by received_time from a list of mail item dictionaries.
 
+    The columns get their dtypes from helpers.mail_schema.
+
     :param items: List[dict[str, Any]], A list of dictionaries, each representing a mail item.
     :return: A pandas DataFrame containing the sorted mail items.
     """
-    return pd.DataFrame(items).sort_values('received_time', axis=0, ascending=True).reset_index(drop=True)
+    df = apply_mail_schema(pd.DataFrame(items))
+    return df.sort_values('received_time', axis=0, ascending=True).reset_index(drop=True)
+
+
+def iter_mail_items(items: CDispatch) -> Iterator[CDispatch]:
+    """Page through an Items collection with GetFirst/GetNext, holding only the current item.
+
+    :param items: CDispatch, a folder's Items collection or a restricted view of it.
+    :return: the mail items, one at a time.
+    """
+    item = items.GetFirst()
+    while item is not None:
+        yield item
+        item = items.GetNext()
+
+
+def iter_mail_frames(items: CDispatch, chunk_size: int = INGESTION_PARAMETERS['chunk_size'],
+                     store_id: Optional[str] = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Read an Items collection into DataFrame chunks of at most chunk_size items.
+
+    Only one item is open at a time and only one chunk's row dictionaries are held, so the memory used to read a folder
+    is bounded by the chunk size plus the chunks' frames, however many items it has. The chunks are in the collection's
+    order and have the mail schema's dtypes; join them with concat_mail_frames or consume them one at a time, as
+    get_process_folders_dfs does for the out of memory dedupe of large folders.
+
+    :param items: CDispatch, a folder's Items collection or a restricted view of it.
+    :param chunk_size: int, the most mail items per chunk.
+    :param store_id: str, the StoreID of the items' folder.
+    :return: (cert emails, other emails) DataFrame tuples, one per chunk; either may be empty.
+    """
+    return iter_item_frames(iter_mail_items(items), chunk_size, store_id)
+
+
+def iter_item_frames(mail_items: Iterator[CDispatch], chunk_size: int = INGESTION_PARAMETERS['chunk_size'],
+                     store_id: Optional[str] = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """Read mail items into DataFrame chunks of at most chunk_size items; see iter_mail_frames.
+
+    :param mail_items: the mail items, one at a time, e.g. from iter_mail_items or open_arrived_items.
+    :param chunk_size: int, the most mail items per chunk.
+    :param store_id: str, the StoreID of the items' folder.
+    :return: (cert emails, other emails) DataFrame tuples, one per chunk; either may be empty.
+    """
+    while True:
+        first_item = next(mail_items, None)
+        if first_item is None:
+            return
+        chunk = itertools.chain([first_item], itertools.islice(mail_items, chunk_size - 1))
+        del first_item
+        results, other_emails = process_mail_items(chunk, store_id=store_id)
+        yield (apply_mail_schema(pd.DataFrame(results)) if results else pd.DataFrame(),
+               apply_mail_schema(pd.DataFrame(other_emails)) if other_emails else pd.DataFrame())
+
+
+def open_arrived_items(ol_folder: CDispatch, entry_ids: List[str], mail_filter: Clause) -> Iterator[CDispatch]:
+    """Open the new mail items of an event-driven batch by their EntryIDs, one at a time.
+
+    The items the folder's fetch would leave out (see build_mail_filter) are skipped, as are the items that are gone,
+    e.g. moved by the previous batch.
+
+    :param ol_folder: CDispatch, the folder the items arrived in.
+    :param entry_ids: list, the items' EntryIDs.
+    :param mail_filter: Clause, the folder fetch's filter.
+    :return: the mail items that pass the filter.
+    """
+    session, store_id = ol_folder.Session, ol_folder.StoreID
+    for entry_id in entry_ids:
+        try:
+            item = session.GetItemFromID(entry_id, store_id)
+        except Exception as open_error:
+            lg.debug(f'The new item {entry_id} in {ol_folder.FolderPath} could not be opened: {open_error}')
+            continue
+        if mail_filter.matches(item):
+            yield item
+
+
+def concat_mail_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Join mail frame chunks into one frame sorted by received_time.
+
+    The chunks' categoricals each have their own categories, so the schema is applied again to the joined frame.
+
+    :param frames: list, the non-empty chunks.
+    :return: pd.DataFrame, the mail items of all the chunks.
+    """
+    df = apply_mail_schema(pd.concat(frames, ignore_index=True))
+    return df.sort_values('received_time', axis=0, ascending=True).reset_index(drop=True)
+
 
+def build_mail_filter(now: Optional[datetime.datetime] = None) -> Clause:
+    """Get the filter for the mail items to fetch from each folder, from RESTRICT_FILTER_PARAMETERS.
 
-def get_process_folders_dfs(proc_folders: List[str], folders_dict: dict = None,
-                            summary_dict: dict = None) -> List[Tuple[pd.DataFrame, str]]:
+    The items already flagged 'Follow up' are left out, and on the dev node the date window isn't used; the test files
+    lag, and production doesn't need a year's worth of e-mails each time. The subjects aren't filtered: the one fetch
+    gets both the cert emails and the other emails the tasks read (other_df), and the certs are told apart by
+    subject_pattern.
+
+    :param now: datetime.datetime, the current local time, by default now; the window starts at local midnight
+        days_back days ago, converted to UTC for the restriction (received_since).
+    :return: Clause, the filter, for to_restriction.
+    """
+    settings = RESTRICT_FILTER_PARAMETERS
+    date_clause = None
+    if not ON_DEV_NODE:
+        window_start = (now or datetime.datetime.now()) - datetime.timedelta(days=settings['days_back'])
+        date_clause = received_since(window_start.replace(hour=0, minute=0, second=0, microsecond=0))
+    return all_of(flag_not('Follow up'), date_clause, sender_in(settings['sender_addresses']))
+
+
+def get_process_folders_dfs(proc_folders: List[str], folders_dict: dict = None, summary_dict: dict = None,
+                            external_dedupes: Optional[Dict[str, ExternalDedupe]] = None,
+                            entry_ids: Optional[Dict[str, List[str]]] = None) -> List[Tuple[pd.DataFrame, str]]:
     """Process mail items in a list of folders and returns a list of tuples, each containing a DataFrame with the mail
     items and the path of the folder it came from.
 
     :param proc_folders: List[str], the list of folder paths to process.
     :param folders_dict: dict, a dictionary containing the folders to process, indexed by their path.
     :param summary_dict: dict, a dictionary to store summary information about the mail items processed.
+    :param external_dedupes: dict, if given, the duplicate foam cert candidates of each folder with at least
+        DEDUPE_PARAMETERS['external_min_rows'] items to fetch are added to an ExternalDedupe chunk by chunk as they are
+        fetched, stored here by folder path; their moves are then planned without the folder's frame, see
+        plan_foam_moves_external. The cert frame of such a folder only has its priority customer rows, for the
+        priority flags; the whole frame is never built.
+    :param entry_ids: dict, if given, an event-driven batch's new EntryIDs by folder path; only these items are read,
+        opened by their IDs (see open_arrived_items), instead of fetching each folder's items.
     :return: List[Tuple[pd.DataFrame, str]], a list of tuples, each containing a DataFrame with the mail items and
         the path of the folder it came from.
     """
     pf_dfs: List = []
+    mail_filter = build_mail_filter()
+    restriction = to_restriction(mail_filter)
     # get a dictionary of folders from the account
     for folder_path in proc_folders:
         olFolder = folders_dict.get(folder_path)
@@ -91,20 +223,39 @@ def get_process_folders_dfs(proc_folders: List[str], folders_dict: dict = None,
             continue
         lg.debug(f'Processing folder: {folder_path}')
 
-        items = olFolder.Items.Restrict('[FlagRequest] <> \'Follow up\'')  # exclude those already flagged
-        if not ON_DEV_NODE:  # don't need a year's worth of e-mails each time in production, but test files will lag
-            five_days_ago = datetime.datetime.now() - datetime.timedelta(days=5)
-            date_filter = five_days_ago.strftime('%m/%d/%Y')
-            filter_string = f'[ReceivedTime] >= \'{date_filter}\''
-            items: List[wclient.CDispatch] = items.Restrict(filter_string)
-        results, other_emails = process_mail_items(items)
-        if results:
-            df = sort_mail_items_to_dataframes(results)
-            dfc = df.columns
-            # in case there are no other emails, just use an empty dataframe
-            other_emails_df = sort_mail_items_to_dataframes(other_emails) if other_emails else pd.DataFrame(columns=dfc)
-
-            if not df.empty:
+        dedupe = None
+        if entry_ids is None:
+            with run_metrics.span('restrict', folder=folder_path), call_deadline('Restrict'):
+                items: CDispatch = olFolder.Items.Restrict(restriction)
+            if external_dedupes is not None and items.Count >= DEDUPE_PARAMETERS['external_min_rows']:
+                dedupe = external_dedupes[folder_path] = new_external_dedupe()
+            mail_frames = iter_mail_frames(items, INGESTION_PARAMETERS['chunk_size'], olFolder.StoreID)
+        else:  # an event-driven batch; only its new items
+            mail_frames = iter_item_frames(open_arrived_items(olFolder, entry_ids.get(folder_path, []), mail_filter),
+                                           INGESTION_PARAMETERS['chunk_size'], olFolder.StoreID)
+        with run_metrics.span('fetch', folder=folder_path, external_dedupe=dedupe is not None) as fetch_span:
+            cert_chunks, other_chunks, empty_cert_df, n_items = [], [], None, 0
+            for cert_chunk, other_chunk in mail_frames:
+                n_items += len(cert_chunk) + len(other_chunk)
+                if not cert_chunk.empty:
+                    if dedupe is not None:  # the folder's cert frame isn't built, only the rows other tasks need
+                        add_dedupe_candidates(dedupe, cert_chunk)
+                        empty_cert_df = cert_chunk.iloc[:0].copy() if empty_cert_df is None else empty_cert_df
+                        cert_chunk = get_priority_customer_rows(cert_chunk, priority_flag_dict)
+                    if not cert_chunk.empty:
+                        cert_chunks.append(cert_chunk)
+                if not other_chunk.empty:
+                    other_chunks.append(other_chunk)
+            fetch_span['items'] = n_items
+        if cert_chunks or empty_cert_df is not None:
+            with run_metrics.span('parse', items=n_items, folder=folder_path):
+                df = concat_mail_frames(cert_chunks) if cert_chunks else empty_cert_df
+                dfc = df.columns
+                # in case there are no other emails, just use an empty dataframe
+                other_emails_df = concat_mail_frames(other_chunks) if other_chunks \
+                    else apply_mail_schema(pd.DataFrame(columns=dfc))
+
+            if not df.empty or dedupe is not None:
                 df['lot8'] = df['lot_number'].str[:8]
                 pf_dfs.append((folder_path, df, other_emails_df))
             else:
@@ -129,7 +280,7 @@ def group_foam_mail(df: pd.DataFrame, folder_path: str, summary_dict: dict = Non
         containing the mail items grouped by the specified columns.
     :rtype: Tuple[List[Tuple[pd.Series]], List[Tuple[pd.Series]], pd.core.groupby.generic.DataFrameGroupBy]
     """
-    dfg: pd.DataFrame.groupby = df.groupby(dedupe_columns)
+    dfg: pd.DataFrame.groupby = df.groupby(dedupe_columns, observed=True)  # only the groups that occur
     keep_item_rows: list = []  # rows to keep in the mailbox
     move_item_rows: list = []  # rows to move from the mailbox
 
@@ -140,7 +291,8 @@ def group_foam_mail(df: pd.DataFrame, folder_path: str, summary_dict: dict = Non
         keep_item_rows.append([item_row for item_row in grp.iloc[:1].iterrows()])  # the first row (mail)
         move_item_rows.append([item_row for item_row in grp.iloc[1:].iterrows()])  # the rest of the rows
 
-    if summary_dict:  # if working on development, store results for later examination
+    # if working on development, store results for later examination; production summaries only hold timings
+    if summary_dict and summary_dict.get('checked_folders') is not None:
         if summary_dict['checked_folders'].get(folder_path) is None:
             summary_dict['checked_folders'][folder_path]: dict = {}
         summary_dict['checked_folders'][folder_path]['ibdf']: pd.DataFrame = df
@@ -163,23 +315,23 @@ def series_to_df(srs: pd.Series) -> pd.DataFrame:
     return frm1
 
 
-def get_mail_items_from_results(list_of_series, o_item_col='o_item') -> list:
-    """Extract the w32com.CDispatch.client Outlook mail item from the list of Pandas' series."""
-    mail_items = []
+def get_item_ids_from_results(list_of_series) -> List[ItemId]:
+    """Extract the (EntryID, StoreID) of the Outlook mail items from the list of Pandas' series."""
+    item_ids = []
     for p_row in list_of_series:
         for rlist in p_row:
-            mail_items.append(rlist[1][o_item_col])
-    return mail_items
+            item_ids.append((rlist[1]['entry_id'], rlist[1]['store_id']))
+    return item_ids
 
 
-def clear_testing_colors(testing_series: pd.Series, testing_colors: list) -> None:
+def clear_testing_colors(testing_series: pd.Series, testing_colors: list, resolver: ItemResolver) -> None:
     """Remove the color categories from the mail items used in testing.
 
     :param testing_series: series, the series that includes the mail items.
     :param testing_colors: list, the colors to remove from the mail items.
+    :param resolver: ItemResolver, opens the mail items.
     """
-    mitems = get_mail_items_from_results(testing_series)
-    for mi in mitems:
+    for mi in resolver.iter_items(get_item_ids_from_results(testing_series)):
         remove_categories_from_mail(mi, testing_colors)
 
 
@@ -210,16 +362,16 @@ def compare_keep_and_move(mirs, kirs):
     return unmatched
 
 
-def color_foam_groups(dfg, move_items, move_item_color, valid_colors):
-    colorize_outlook_email_list(move_items, move_item_color)
+def color_foam_groups(dfg, move_item_ids, move_item_color, valid_colors, resolver: ItemResolver):
+    colorize_outlook_email_list(resolver.iter_items(move_item_ids), move_item_color)
     for color, (group_name, group_df) in zip(valid_colors, dfg):
         for _, row in group_df.iterrows():
-            o_item = row['o_item']
-            add_categories_to_mail(o_item, color)
+            with resolver.open((row['entry_id'], row['store_id'])) as o_item:
+                add_categories_to_mail(o_item, color)
 
 
 def process_foam_groups(df: pd.DataFrame, current_folder_path: str,
-                        destination_folder: win32com.client.Dispatch, smry: Optional[dict] = None) -> None:
+                        destination_folder: CDispatch, resolver: ItemResolver, smry: Optional[dict] = None) -> None:
     """Move duplicate emails within a dataframe to a destination folder.
 
     This function groups the emails and identifies duplicates
@@ -229,27 +381,116 @@ def process_foam_groups(df: pd.DataFrame, current_folder_path: str,
     :param df: The DataFrame containing the emails to process.
     :param current_folder_path: The path of the folder to process.
     :param destination_folder: The destination folder to which duplicates will be moved.
+    :param resolver: ItemResolver, opens the mail items to move.
     :param smry: A dictionary containing additional information for development purposes.
                  If provided, the function will color code the groups and items to move.
     :return: None.
     """
+    items_to_move, dfg = plan_foam_moves(df, current_folder_path, smry)
+    apply_foam_moves(items_to_move, dfg, destination_folder, resolver, smry)
+
+
+def plan_foam_moves(df: pd.DataFrame, current_folder_path: str, smry: Optional[dict] = None) -> \
+        Tuple[list, pd.core.groupby.generic.DataFrameGroupBy]:
+    """Find the duplicate emails within a dataframe that should be moved; no Outlook calls are made.
+
+    :param df: The DataFrame containing the emails to process.
+    :param current_folder_path: The path of the folder to process.
+    :param smry: A dictionary containing additional information for development purposes.
+    :return: tuple, the (EntryID, StoreID) of the mail items to move and the DataFrameGroupBy of the emails grouped as
+        duplicates.
+    :raises RuntimeError: If a mail to move has no matching mail to keep.
+    """
+    with run_metrics.span('dedupe_plan', items=len(df), folder=current_folder_path):
+        # get lists of mail to move and leave and a pandas.DataFrame.GroupBy
+        item_rows_to_move, item_rows_to_keep, dfg = group_foam_mail(df, current_folder_path, smry)
+
+        # check for move mail without a keep
+        unmatched_foam_rows: list = compare_keep_and_move(item_rows_to_move, item_rows_to_keep)
+        if unmatched_foam_rows:
+            lg.warn('Unmatched rows: %s', unmatched_foam_rows)
+            raise RuntimeError(f'Unmatched rows found in {current_folder_path}')
+
+        # get the mail item IDs from the dataframe
+        items_to_move: List[ItemId] = get_item_ids_from_results(item_rows_to_move)
+    return items_to_move, dfg
+
+
+def new_external_dedupe() -> ExternalDedupe:
+    """Get an ExternalDedupe for a folder's duplicate foam certs, with the DEDUPE_PARAMETERS run size and spill dir."""
+    return ExternalDedupe(dedupe_columns, DEDUPE_PARAMETERS['run_rows'], DEDUPE_PARAMETERS['spill_dir'])
+
+
+def add_dedupe_candidates(dedupe: ExternalDedupe, cert_df: pd.DataFrame) -> None:
+    """Add the duplicate foam cert candidates (the single-report customers' certs) of a cert email chunk to a dedupe.
+
+    :param dedupe: ExternalDedupe, the folder's dedupe.
+    :param cert_df: pd.DataFrame, cert emails, e.g. a chunk from iter_mail_frames.
+    """
+    candidates = cert_df[cert_df.c_number.isin(dedupe_cnums)]
+    dedupe.add(candidates.assign(lot8=candidates['lot_number'].str[:8]))
 
-    # get lists of mail to move and leave and a pandas.DataFrame.GroupBy
-    item_rows_to_move, item_rows_to_keep, dfg = group_foam_mail(df, current_folder_path, smry)
 
-    # check for move mail without a keep
-    unmatched_foam_rows: list = compare_keep_and_move(item_rows_to_move, item_rows_to_keep)
-    if unmatched_foam_rows:
-        lg.warn('Unmatched rows: %s', unmatched_foam_rows)
-        raise RuntimeError(f'Unmatched rows found in {current_folder_path}')
+def plan_foam_moves_external(dedupe: ExternalDedupe, current_folder_path: str) -> List[ItemId]:
+    """Find the duplicate emails to move with sorted runs spilled to disk, for folders too large to group in memory.
 
-    # get the mail items from the dataframe
-    items_to_move: list = get_mail_items_from_results(item_rows_to_move)
+    The decisions are the same as plan_foam_moves'; see tasks.external_dedupe.
 
+    :param dedupe: ExternalDedupe, with the folder's candidates added while it was fetched, see add_dedupe_candidates.
+    :param current_folder_path: The path of the folder to process.
+    :return: list, the (EntryID, StoreID) of the mail items to move.
+    :raises RuntimeError: If a mail to move has no matching mail to keep.
+    """
+    with run_metrics.span('dedupe_plan', items=dedupe.rows, folder=current_folder_path, external=True):
+        try:
+            return dedupe.plan()
+        except RuntimeError as unmatched_error:
+            raise RuntimeError(f'Unmatched rows found in {current_folder_path}: {unmatched_error}') from unmatched_error
+
+
+def apply_foam_moves(items_to_move: List[ItemId], dfg: pd.core.groupby.generic.DataFrameGroupBy,
+                     destination_folder: CDispatch, resolver: ItemResolver, smry: Optional[dict] = None) -> None:
+    """Move the planned duplicate emails to the destination folder.
+
+    :param items_to_move: The (EntryID, StoreID) of the mail items to move.
+    :param dfg: The DataFrameGroupBy of the emails grouped as duplicates; used to color code the groups in development,
+        None if they were planned out of memory.
+    :param destination_folder: The destination folder to which duplicates will be moved.
+    :param resolver: ItemResolver, opens each mail item just before it is moved.
+    :param smry: A dictionary containing additional information for development purposes.
+    """
     # for development, color code the groups and items to move
-    if ON_DEV_NODE and not UNIT_TESTING:  # unit testing will put a copy in the unit test directory
+    if ON_DEV_NODE and not UNIT_TESTING and dfg is not None:  # unit testing will put a copy in the unit test directory
         color_foam_groups(dfg, items_to_move, move_item_color=smry['testing_colors_move'],
-                          valid_colors=smry['valid_colors'])
+                          valid_colors=smry['valid_colors'], resolver=resolver)
     # move the duplicates
-    move_mail_items_to_folder(items_to_move, destination_folder)
-    pass
+    with run_metrics.span('dedupe_moves', items=len(items_to_move)):
+        move_mail_items_to_folder(resolver.iter_items(items_to_move), destination_folder)
+
+
+def duplicate_foam_certs_nodes() -> List[TaskNode]:
+    """Get the task graph nodes that move duplicate foam certs for single-report customers out of a folder.
+
+    The moves come after the priority customer flags, as they did when the tasks ran one after another. A folder too
+    large to group in memory has its candidates added to an ExternalDedupe while it is fetched ('external_dedupe',
+    see get_process_folders_dfs), and its moves are planned from that.
+
+    :return: list, a node planning the moves and a node making them in Outlook.
+    """
+    def plan_dedupe(cert_df: pd.DataFrame, folder_path: str, smry: Optional[dict],
+                    external_dedupe: Optional[ExternalDedupe]) -> Tuple[list, Any]:
+        lg.info('Checking for duplicate foam reports for single-report customers.')
+        if external_dedupe is not None:  # no groupby, so the dev node's group coloring is skipped
+            return plan_foam_moves_external(external_dedupe, folder_path), None
+        return plan_foam_moves(cert_df[cert_df.c_number.isin(dedupe_cnums)], folder_path, smry)
+
+    def move_duplicates(foam_dedupe_plan: Tuple[list, Any], move_folder: CDispatch, resolver: ItemResolver,
+                        smry: Optional[dict]) -> None:
+        items_to_move, dfg = foam_dedupe_plan
+        apply_foam_moves(items_to_move, dfg, move_folder, resolver, smry)
+
+    return [TaskNode('foam_dedupe_plan', plan_dedupe, inputs=('cert_df', 'folder_path', 'smry', 'external_dedupe')),
+            TaskNode('foam_dedupe_moves', move_duplicates,
+                     inputs=('foam_dedupe_plan', 'move_folder', 'resolver', 'smry'),
+                     after=('priority_flags',), mutates_outlook=True),
+            ]
@@ -0,0 +1,154 @@
+"""Find duplicate cert emails without holding the whole folder in memory.
+
+group_foam_mail groups the folder's frame on the dedupe columns, keeps the lowest cert number of each group and moves
+the rest, which needs the whole frame in memory. For backfills over hundreds of thousands of certs, ExternalDedupe
+makes the same decisions with bounded memory: the rows' (dedupe key, cert number, received time, EntryID, StoreID) are
+added chunk by chunk, each run_rows of them are sorted and spilled to a temporary file, and the sorted runs are merged
+so each group's rows come out together, lowest cert number first.
+
+example:
+    dedupe = ExternalDedupe(dedupe_columns)
+    for cert_chunk, _ in iter_mail_frames(items, store_id=folder.StoreID):
+        dedupe.add(cert_chunk)
+    items_to_move = dedupe.plan()
+
+get_process_folders_dfs does this while it fetches a folder with at least DEDUPE_PARAMETERS['external_min_rows'] items,
+so the dedupe's memory is bounded by run_rows records however large the folder is.
+
+Like compare_keep_and_move, the plan checks that every email to move matches a kept email on the compare columns. Most
+do on their own group's kept email; the compare keys of the kept emails are held to check the others.
+
+Classes:
+    ExternalDedupe: Plans the duplicate moves from sorted runs spilled to disk.
+
+"""
+
+import heapq
+import os
+import pickle
+import tempfile
+from typing import Any, Iterator, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+
+from helpers.item_handles import ItemId
+from log_setup import lg
+
+COMPARE_COLUMNS: Tuple[str, ...] = ('product_number', 'so_number', 'lot8', 'c_number')  # see compare_keep_and_move
+
+# a run record: (dedupe key, cert number, received time ns, EntryID, StoreID, compare key); sorting the records sorts by
+# group, then cert number, with the received time and EntryID breaking ties
+_Record = Tuple[Tuple[Any, ...], str, int, str, str, Tuple[Any, ...]]
+
+
+class ExternalDedupe:
+    """Plans the duplicate moves from sorted runs spilled to disk.
+    """
+
+    def __init__(self, key_columns: Sequence[str], run_rows: int = 50000, spill_dir: Optional[str] = None,
+                 compare_columns: Sequence[str] = COMPARE_COLUMNS):
+        """
+        :param key_columns: the columns that make emails duplicates, like dedupe_columns.
+        :param run_rows: int, the most rows sorted in memory before they're spilled as a run.
+        :param spill_dir: str, where the run files are written; the system temporary folder by default.
+        :param compare_columns: the columns an email to move must share with a kept email.
+        """
+        self.key_columns = list(key_columns)
+        self.compare_columns = list(compare_columns)
+        self.run_rows = run_rows
+        self.spill_dir = spill_dir
+        self._buffer: List[_Record] = []
+        self._run_paths: List[str] = []
+        self.rows = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Add a chunk of cert email rows, spilling a sorted run each run_rows rows.
+
+        Rows missing a dedupe key value aren't grouped, as groupby drops them.
+
+        :param df: pd.DataFrame, cert email rows with the key and compare columns, 'cert_number', 'received_time',
+            'entry_id' and 'store_id'.
+        """
+        self.rows += len(df)
+        df = df[df[self.key_columns].notna().all(axis=1)]
+        if df.empty:
+            return
+        # the columns as lists of Python values, NaN compare values as None; the records are zipped from them
+        keys = zip(*(df[column].tolist() for column in self.key_columns))
+        compare_keys = zip(*(df[column].astype(object).where(df[column].notna(), None).tolist()
+                             for column in self.compare_columns))
+        received_ns = pd.to_datetime(df['received_time']).to_numpy('datetime64[ns]').astype('int64').tolist()
+        records = zip(keys, df['cert_number'].astype(str).tolist(), received_ns, df['entry_id'].tolist(),
+                      df['store_id'].tolist(), compare_keys)
+        for record in records:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.run_rows:
+                self._spill()
+
+    def _spill(self) -> None:
+        """Sort the buffered records and write them to a run file."""
+        self._buffer.sort()
+        run_file, run_path = tempfile.mkstemp(prefix='dedupe_run_', suffix='.pkl', dir=self.spill_dir)
+        with os.fdopen(run_file, 'wb') as rf:
+            pickler = pickle.Pickler(rf, pickle.HIGHEST_PROTOCOL)
+            for record in self._buffer:
+                pickler.dump(record)
+        self._run_paths.append(run_path)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(run_path: str) -> Iterator[_Record]:
+        """Read a run file's records in order."""
+        with open(run_path, 'rb') as rf:
+            unpickler = pickle.Unpickler(rf)
+            while True:
+                try:
+                    yield unpickler.load()
+                except EOFError:
+                    return
+
+    def plan(self) -> List[ItemId]:
+        """Merge the runs and get the emails to move: all but the lowest cert number of each group.
+
+        The run files are deleted afterwards.
+
+        :return: list, the (EntryID, StoreID) of the emails to move, by group.
+        :raises RuntimeError: if an email to move matches no kept email on the compare columns.
+        """
+        self._buffer.sort()
+        runs = [self._read_run(run_path) for run_path in self._run_paths] + [iter(self._buffer)]
+        items_to_move: List[ItemId] = []
+        kept_compare_keys: Set[Tuple[Any, ...]] = set()
+        unchecked: List[Tuple[ItemId, Tuple[Any, ...]]] = []  # moves that didn't match their own group's kept email
+        group_key, group_compare_key = None, None
+        try:
+            for key, _, _, entry_id, store_id, compare_key in heapq.merge(*runs):
+                if key != group_key:  # the first, lowest cert number, row of a group is kept
+                    group_key, group_compare_key = key, compare_key
+                    kept_compare_keys.add(compare_key)
+                    continue
+                items_to_move.append((entry_id, store_id))
+                if compare_key != group_compare_key:
+                    unchecked.append(((entry_id, store_id), compare_key))
+        finally:
+            n_runs = len(runs)
+            for run in runs[:-1]:
+                run.close()  # so the run files can be deleted on Windows too
+            self.cleanup()
+
+        unmatched = [item_id for item_id, compare_key in unchecked if compare_key not in kept_compare_keys]
+        if unmatched:
+            lg.warning('Unmatched items: %s', unmatched)
+            raise RuntimeError(f'{len(unmatched)} emails to move match no email to keep.')
+        lg.debug('Planned %s moves of %s rows from %s runs.', len(items_to_move), self.rows, n_runs)
+        return items_to_move
+
+    def cleanup(self) -> None:
+        """Delete the run files and drop the buffered rows."""
+        for run_path in self._run_paths:
+            try:
+                os.remove(run_path)
+            except OSError as remove_error:
+                lg.warning('Could not remove the dedupe run %s: %s', run_path, remove_error)
+        self._run_paths = []
+        self._buffer = []
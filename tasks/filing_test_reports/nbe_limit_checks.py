@@ -0,0 +1,98 @@
+"""Check the NBE test results against their limits, for all the results of a report at once.
+
+The report parser gives the results as text: 'value_col', 'lower_limit_col' and 'upper_limit_col', with the unit in
+'unit_col'. They're converted to numbers column-wise: a comparison sign ('<', '≤', ...) before the number is
+dropped, a comma decimal separator is read as a point ('0,5'), and a unit after the number ('0,05 mm') is converted to
+the row's unit when both units are known and of the same kind (UNIT_SCALES). A cell that isn't a number, or whose unit
+can't be converted, is NaN and isn't checked against; a result without a value, or without limits, isn't out of
+limits.
+
+The checks are array operations over the columns, without a Python loop per result.
+
+example:
+    checks = check_limits(nbe_data['test_results']['results_df'])
+    failing = out_of_limit_results(results_df, checks)
+
+Functions:
+    parse_result_numbers: Convert text result cells to numbers in the rows' units.
+    check_limits: Check each result's value against its lower and upper limit.
+    out_of_limit_results: Get the characteristics and lots of the results out of their limits.
+
+Variables:
+    UNIT_SCALES: The units that can be converted, with their kind and scale in the kind's base unit.
+
+"""
+
+from typing import Dict, Final, Tuple
+
+import numpy as np
+import pandas as pd
+
+UNIT_SCALES: Final[Dict[str, Tuple[str, float]]] = {
+    'nm': ('length', 1e-9), 'µm': ('length', 1e-6), 'μm': ('length', 1e-6), 'um': ('length', 1e-6),
+    'mm': ('length', 1e-3), 'cm': ('length', 1e-2), 'm': ('length', 1.0),
+    'mN': ('force', 1e-3), 'cN': ('force', 1e-2), 'N': ('force', 1.0), 'kN': ('force', 1e3),
+    'mg': ('mass', 1e-6), 'g': ('mass', 1e-3), 'kg': ('mass', 1.0),
+    'g/m²': ('areal_mass', 1e-3), 'g/m2': ('areal_mass', 1e-3), 'kg/m²': ('areal_mass', 1.0),
+    'kg/m2': ('areal_mass', 1.0),
+    'N/cm': ('force_per_width', 100.0), 'N/mm': ('force_per_width', 1000.0), 'N/m': ('force_per_width', 1.0),
+    'N/25mm': ('force_per_width', 40.0), 'N/25 mm': ('force_per_width', 40.0),
+    's': ('time', 1.0), 'min': ('time', 60.0), 'h': ('time', 3600.0),
+    '%': ('ratio', 1e-2),
+    '°C': ('temperature', 1.0),
+}
+_unit_kinds = {unit: kind for unit, (kind, _) in UNIT_SCALES.items()}
+_unit_scales = {unit: scale for unit, (_, scale) in UNIT_SCALES.items()}
+
+# an optional comparison sign, the number (comma or point decimals) and an optional unit
+_number_pattern = r'^\s*[<>≤≥=~]?\s*(?P<number>[-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+))\s*(?P<unit>\S.*?)?\s*$'
+_result_columns: Final[Dict[str, str]] = {'value_col': 'value', 'lower_limit_col': 'lower_limit',
+                                          'upper_limit_col': 'upper_limit'}
+
+
+def parse_result_numbers(cells: pd.Series, row_units: pd.Series) -> np.ndarray:
+    """Convert text result cells to numbers in the rows' units.
+
+    :param cells: pd.Series, the cells' text, e.g. '50', '0,5', '< 5', '0.05 mm'.
+    :param row_units: pd.Series, each row's unit, positionally aligned with cells.
+    :return: np.ndarray, float, NaN where the cell isn't a number or its unit can't be converted to the row's.
+    """
+    parts = cells.astype('string').str.extract(_number_pattern)
+    numbers = pd.to_numeric(parts['number'].str.replace(',', '.', regex=False), errors='coerce').to_numpy(float)
+    cell_units = parts['unit'].fillna('').str.strip()
+    row_units = pd.Series(row_units.to_numpy(), index=cells.index).astype('string').fillna('').str.strip()
+    same_unit = ((cell_units == '') | (cell_units == row_units)).to_numpy(bool)
+    same_kind = (cell_units.map(_unit_kinds) == row_units.map(_unit_kinds)).fillna(False).to_numpy(bool)
+    factors = (cell_units.map(_unit_scales) / row_units.map(_unit_scales)).to_numpy(float, na_value=np.nan)
+    return numbers * np.where(same_unit, 1.0, np.where(same_kind, factors, np.nan))
+
+
+def check_limits(results_df: pd.DataFrame) -> pd.DataFrame:
+    """Check each result's value against its lower and upper limit.
+
+    :param results_df: pd.DataFrame, a report's results, with the report parser's text columns.
+    :return: pd.DataFrame, with results_df's index: the 'value', 'lower_limit' and 'upper_limit' as numbers, and
+        whether each result is 'below_lower', 'above_upper' and 'out_of_limits'.
+    """
+    units = results_df['unit_col'] if 'unit_col' in results_df else pd.Series('', index=results_df.index)
+    checks = pd.DataFrame({name: parse_result_numbers(results_df[column], units)
+                           for column, name in _result_columns.items()}, index=results_df.index)
+    value, lower, upper = (checks[name].to_numpy() for name in _result_columns.values())
+    with np.errstate(invalid='ignore'):  # comparisons with NaN are False, i.e. not checked
+        checks['below_lower'] = value < lower
+        checks['above_upper'] = value > upper
+    checks['out_of_limits'] = checks['below_lower'] | checks['above_upper']
+    return checks
+
+
+def out_of_limit_results(results_df: pd.DataFrame, checks: pd.DataFrame) -> pd.DataFrame:
+    """Get the characteristics and lots of the results out of their limits.
+
+    :param results_df: pd.DataFrame, the checked results.
+    :param checks: pd.DataFrame, check_limits' result for them.
+    :return: pd.DataFrame, the failing results' 'date_of_manufacture', 'characteristic_col' and text value and limits.
+    """
+    failing = checks['out_of_limits'].to_numpy(bool)
+    columns = [column for column in ('date_of_manufacture', 'characteristic_col', 'unit_col', *_result_columns)
+               if column in results_df]
+    return results_df.loc[failing, columns] if failing.any() else results_df.iloc[:0][columns]
@@ -0,0 +1,278 @@
+"""Summarize incoming NBE test report emails.
+
+NBE test report emails ('Certificate for Delivery:' followed by the delivery number) carry a PDF test report. For each
+one, the PDF is saved and parsed, and a new email with a more useful subject and the lot info and test results as HTML
+tables is added to the same folder, with the PDF and the original email attached.
+
+The emails go through a StagedPipeline: the PDFs are saved on the Outlook thread and parsed in worker processes, and
+each summary is composed and added on the Outlook thread as soon as its PDF is parsed, so saving, parsing and adding
+overlap (see NBE_PIPELINE_PARAMETERS).
+
+With a ProcessedLedger, each email's saved PDF ('pdf_saved', with the PDF's hash and path) and added summary
+('summary_added') are recorded, so a run only handles the emails that arrived since the last one, and a run that
+stopped part way resumes from the last recorded step. A PDF already summarized for another email isn't summarized again.
+
+Each report's results are checked against their limits (nbe_limit_checks); the summary email of a report with results
+out of their limits gets a color category (see NBE_LIMIT_CHECK_PARAMETERS) and the failing results are logged.
+"""
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pypdf
+
+from helpers.item_handles import ItemId, ItemResolver
+from helpers.outlook_helpers import normalize_color_categories_list
+from helpers.processed_ledger import ProcessedLedger, file_hash
+from helpers.run_metrics import run_metrics
+from helpers.staged_pipeline import StagedPipeline, get_process_pool
+from helpers.watchdog import WatchdogTimeout, call_deadline, watchdog
+from log_setup import lg
+from tasks.filing_test_reports.nbe_limit_checks import check_limits, out_of_limit_results
+from tasks.filing_test_reports.nbe_summary_html import render_nbe_summary
+from tasks.filing_test_reports.read_nbe_test_report_data import extract_nbe_report_data
+from tasks.task_graph import TaskNode
+from untracked_config.performance_settings import NBE_LIMIT_CHECK_PARAMETERS, NBE_PIPELINE_PARAMETERS
+
+
+def incoming_reports_nodes() -> List[TaskNode]:
+    """Get the task graph nodes that summarize the NBE test report emails among a folder's non-cert emails.
+
+    The saving, parsing and adding overlap in the node's own pipeline, which runs on the Outlook thread after the
+    duplicate foam certs are moved.
+
+    :return: list, the node running the NBE report pipeline.
+    """
+    def summarize_reports(other_df: pd.DataFrame, local_save_folder_path: str, resolver: ItemResolver,
+                          ledger: Optional[ProcessedLedger]) -> Dict[str, Any]:
+        lg.info('Checking for incoming reports.')
+        return process_nbe_test_reports(local_save_folder_path, get_nbe_emails(other_df, ledger), resolver, ledger)
+
+    return [TaskNode('nbe_reports', summarize_reports,
+                     inputs=('other_df', 'local_save_folder_path', 'resolver', 'ledger'), after=('foam_dedupe_moves',),
+                     mutates_outlook=True),
+            ]
+
+
+def get_nbe_emails(other_emails_df, ledger: Optional[ProcessedLedger] = None):
+    nbe_re_ptn = re.compile(r'Certificate for Delivery:\d{16}')
+    nbe_mask = other_emails_df['subject'].str.contains(nbe_re_ptn)
+    nbe_cert_emails = other_emails_df[nbe_mask].copy()
+    if ledger is not None and len(nbe_cert_emails):  # only the emails not summarized by an earlier run
+        summarized = ledger.completed(nbe_cert_emails['entry_id'], 'summary_added')
+        nbe_cert_emails = nbe_cert_emails[~nbe_cert_emails['entry_id'].isin(summarized)]
+    return nbe_cert_emails
+
+
+def process_nbe_test_reports(folder_path, nbe_cert_emails, resolver: ItemResolver,
+                             ledger: Optional[ProcessedLedger] = None) -> Dict[str, Any]:
+    """Save, parse and summarize the NBE test report emails, adding a summary email for each.
+
+    The PDFs are saved and the summaries composed and added on the calling (Outlook) thread, the PDFs are parsed on
+    NBE_PIPELINE_PARAMETERS['parse_workers'] worker processes, at most 'max_in_flight' emails at a time; the pipeline's
+    stats, including its queue depths and backpressure waits, are recorded on its 'nbe_pipeline' run metrics span.
+
+    :param folder_path: str, the local folder to save the PDF attachments to.
+    :param nbe_cert_emails: pd.DataFrame, the NBE test report emails.
+    :param resolver: ItemResolver, opens the original emails.
+    :param ledger: ProcessedLedger, if given the steps already recorded for an email are skipped, and the completed
+        ones recorded.
+    :return: dict, the pipeline's stats, see StagedPipeline.run.
+    """
+    def save(row: pd.Series) -> Optional[Tuple[ItemId, str]]:
+        watchdog.check()  # the folder's stage outlived its deadline; stop fetching
+        with run_metrics.span('nbe_attachments', items=1):
+            return save_nbe_report(folder_path, row, resolver, ledger)
+
+    def summarize(saved_report: Tuple[ItemId, str], nbe_data: Dict[str, dict]) -> None:
+        original_id, save_loc = saved_report
+        with run_metrics.span('nbe_compose', items=1):
+            new_subj, html_body = compose_nbe_summary(nbe_data)
+        with run_metrics.span('nbe_limit_checks', items=1):
+            categories = get_limit_check_categories(save_loc, nbe_data)
+        with run_metrics.span('nbe_summary_emails', items=1):
+            add_nbe_summary(original_id, save_loc, new_subj, html_body, resolver, ledger, categories)
+
+    def on_error(stage: str, saved_report: Tuple[ItemId, str], error: BaseException) -> None:
+        if isinstance(error, WatchdogTimeout):
+            raise error  # end the run, Outlook is being reset
+        what = 'parsing report' if stage == 'work' else 'adding the summary email for'
+        lg.error(f"ERROR {what} {saved_report[1]}: {error}")
+
+    settings = NBE_PIPELINE_PARAMETERS
+    pipeline = StagedPipeline(save, parse_nbe_report, summarize, get_process_pool(settings['parse_workers']),
+                              settings['max_in_flight'], on_error)
+    with run_metrics.span('nbe_pipeline', items=len(nbe_cert_emails)) as span:
+        stats = pipeline.run(row for _, row in nbe_cert_emails.iterrows())
+        span.update(stats)
+    lg.debug('NBE report pipeline: %s', stats)
+    return stats
+
+
+def save_nbe_report(folder_path: str, row: pd.Series, resolver: ItemResolver,
+                    ledger: Optional[ProcessedLedger] = None) -> Optional[Tuple[ItemId, str]]:
+    """Save the PDF attachment of an NBE test report email.
+
+    :param folder_path: str, the local folder to save the PDF attachment to.
+    :param row: pd.Series, the email's row.
+    :param resolver: ItemResolver, opens the email while its attachment is saved.
+    :param ledger: ProcessedLedger, if given a PDF recorded as saved by an earlier run is used without opening the
+        email, if the file is still there unchanged; a PDF saved is recorded with its hash.
+    :return: tuple, the original email's EntryID and StoreID and the saved PDF path, or None if no PDF was saved.
+    """
+    item_id = (row['entry_id'], row['store_id'])
+    save_loc = get_saved_nbe_attachment(ledger, row['entry_id'])
+    if save_loc is None:
+        with resolver.open(item_id) as original_email:
+            save_loc = save_nbe_attachment(folder_path, original_email, row['subject'])
+        if save_loc is not None and ledger is not None:
+            ledger.record(row['entry_id'], 'pdf_saved', file_hash(save_loc), save_loc)
+    return (item_id, save_loc) if save_loc is not None else None
+
+
+def get_saved_nbe_attachment(ledger: Optional[ProcessedLedger], entry_id: str) -> Optional[str]:
+    """Get the PDF an earlier run saved from an NBE test report email, if it's still there unchanged.
+
+    :param ledger: ProcessedLedger, or None.
+    :param entry_id: str, the email's EntryID.
+    :return: str, the saved PDF path, or None if it has to be saved (again).
+    """
+    saved = ledger.get(entry_id, 'pdf_saved') if ledger is not None else None
+    if saved is None:
+        return None
+    saved_hash, save_loc = saved
+    if save_loc is None or not os.path.isfile(save_loc) or file_hash(save_loc) != saved_hash:
+        return None
+    return save_loc
+
+
+def save_nbe_attachment(folder_path: str, original_email: Any, subject: str) -> Optional[str]:
+    """Save the PDF attachment of an NBE test report email, if it has exactly one.
+
+    :param folder_path: str, the local folder to save the PDF attachment to.
+    :param original_email: the NBE test report email.
+    :param subject: str, the email's subject, for the error message.
+    :return: str, the saved PDF path, or None if no PDF was saved.
+    """
+    # if there's only one attachment (there should be)
+    if original_email.Attachments.Count == 1:
+        attachment = original_email.Attachments.Item(1)
+        lg.debug(attachment)
+        # Check if the attachment is a PDF file
+        if attachment.FileName.lower().endswith(".pdf"):
+            # Save the attachment to the folder
+            try:
+                save_loc = os.path.join(folder_path, attachment.FileName)
+                lg.debug(f'Saving to {save_loc}')
+                with call_deadline('SaveAsFile'):
+                    attachment.SaveAsFile(save_loc)
+                return save_loc
+            except WatchdogTimeout:
+                raise  # end the run, Outlook is being reset
+            except Exception as e:
+                lg.error(f"ERROR saving attachment from email with subject '{subject}': {e}")
+    return None
+
+
+def parse_nbe_report(saved_report: Tuple[ItemId, str]) -> Dict[str, dict]:
+    """Parse a saved NBE test report PDF; no Outlook calls are made, so it can run in a worker process.
+
+    :param saved_report: tuple, the original email's IDs and the saved PDF path.
+    :return: dict, the report data from extract_nbe_report_data.
+    """
+    return extract_nbe_report_data(pypdf.PdfReader(saved_report[1]))
+
+
+def compose_nbe_summary(nbe_data: Dict[str, dict]) -> Tuple[str, str]:
+    """Compose the subject and HTML body of the summary email for a parsed NBE test report.
+
+    The body has the lot info and a table of the test results of each lot, rendered by nbe_summary_html.
+
+    :param nbe_data: dict, the report data from extract_nbe_report_data.
+    :return: tuple, the new subject and the HTML body.
+    """
+    return render_nbe_summary(nbe_data)
+
+
+def get_limit_check_categories(save_loc: str, nbe_data: Dict[str, dict]) -> str:
+    """Get the categories of a report's summary email: the out of limits color's if any result is out of its limits.
+
+    The failing results are logged. With NBE_LIMIT_CHECK_PARAMETERS['enabled'] off, or if the results can't be
+    checked, there are none.
+
+    :param save_loc: str, the saved PDF path, for the log.
+    :param nbe_data: dict, the report data from extract_nbe_report_data.
+    :return: str, the categories, '' for none.
+    """
+    settings = NBE_LIMIT_CHECK_PARAMETERS
+    if not settings['enabled']:
+        return ''
+    try:
+        results_df = nbe_data['test_results']['results_df']
+        failing = out_of_limit_results(results_df, check_limits(results_df))
+    except Exception as e:
+        lg.error(f"ERROR checking the results of report {save_loc} against their limits: {e}")
+        return ''
+    if failing.empty:
+        return ''
+    lg.warning(f'{len(failing)} results out of their limits in report {save_loc}:\n{failing.to_string(index=False)}')
+    return ', '.join(normalize_color_categories_list([settings['out_of_limits_color']]))
+
+
+def add_nbe_summary(original_id: ItemId, save_loc: str, new_subj: str, html_body: str, resolver: ItemResolver,
+                    ledger: Optional[ProcessedLedger] = None, categories: str = '') -> None:
+    """Add the summary email of an NBE test report email, with the PDF and the original attached, unless its PDF was
+    already summarized.
+
+    :param original_id: tuple, the original email's EntryID and StoreID.
+    :param save_loc: str, the saved PDF path.
+    :param new_subj: str, the summary email's subject.
+    :param html_body: str, the summary email's HTML body.
+    :param resolver: ItemResolver, opens the original email while its summary is added.
+    :param ledger: ProcessedLedger, if given the summary added is recorded, and a PDF already summarized for another
+        email is recorded as a duplicate instead of being summarized again.
+    :param categories: str, the summary email's categories, e.g. for results out of their limits.
+    """
+    entry_id = original_id[0]
+    pdf_hash = (ledger.get(entry_id, 'pdf_saved') or (None,))[0] if ledger is not None else None
+    if pdf_hash is not None and ledger.has_file_hash(pdf_hash, 'summary_added'):
+        lg.info(f"The report of '{new_subj}' was already summarized.")
+        ledger.record(entry_id, 'summary_added', pdf_hash, 'duplicate')
+        return
+    with resolver.open(original_id) as original_email:
+        add_nbe_summary_email(original_email, save_loc, new_subj, html_body, categories)
+    if ledger is not None:
+        ledger.record(entry_id, 'summary_added', pdf_hash, new_subj)
+
+    # todo: delete/temp file the PDF downloads; in-memory might be the most efficient
+    # todo: save the data to a database for future use
+
+
+def add_nbe_summary_email(original_email: Any, save_loc: str, new_subj: str, html_body: str,
+                          categories: str = '') -> None:
+    """Add a summary email next to an original NBE test report email, with the PDF and the original attached.
+
+    :param original_email: the NBE test report email.
+    :param save_loc: str, the saved PDF path.
+    :param new_subj: str, the summary email's subject.
+    :param html_body: str, the summary email's HTML body.
+    :param categories: str, the summary email's categories, '' for none.
+    """
+    # create a new email to populate with the desired subject/body
+    email = original_email.Parent.Items.Add()
+    email.Subject = new_subj
+    email.HTMLBody = html_body
+    if categories:
+        email.Categories = categories
+
+    # attach the PDF and the original email as attachments
+    email.Attachments.Add(save_loc)
+    email.Attachments.Add(original_email)
+
+    # finalize the email and move it to the folder
+    email.Save()
+    with call_deadline('Move'):
+        email.Move(original_email.Parent)
+    lg.debug(f'{email.Subject=} {email.HTMLBody=}')
@@ -0,0 +1,133 @@
+"""Render the HTML bodies of the NBE test report summary emails from the report data's arrays.
+
+The summary body is the lot info as a two column table (the lot info keys as row headers) and a table of the test
+results for each lot, as DataFrame.to_html made them; to_html builds a formatter per table, which for a report of many
+lots costs more than the PDF parse. Here the markup is made from row templates built once per column count, and each
+results column is escaped once for the whole report, then split into the lots' tables. The output is the same as
+to_html's for text cells, which is what the report parser produces (None and NaN cells render as 'None' and 'NaN').
+
+example:
+    new_subj, html_body = render_nbe_summary(nbe_data)
+
+Functions:
+    escape_cells: Get the cell texts of an array of values, escaped like DataFrame.to_html escapes them.
+    render_table: Render a table with a header row, like DataFrame.to_html(index=False).
+    render_key_value_table: Render a table of keys and values, like a transposed one row DataFrame's
+        to_html(header=False).
+    render_nbe_summary: Render the subject and HTML body of the summary email for a parsed NBE test report.
+
+"""
+
+import functools
+import math
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+_escape_table = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_table_start = '<table border="1" class="dataframe">\n'
+_table_end = '  </tbody>\n</table>'
+_lot_separator = '<br><br>'
+
+
+def _cell_text(value: Any) -> str:
+    """Get a cell's escaped text."""
+    if isinstance(value, str):
+        return value.translate(_escape_table)
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    return str(value).translate(_escape_table)
+
+
+def escape_cells(values: Iterable[Any]) -> List[str]:
+    """Get the cell texts of an array of values, escaped like DataFrame.to_html escapes them.
+
+    :param values: the values, e.g. a column of an object array.
+    :return: list, the escaped texts.
+    """
+    return [_cell_text(value) for value in values]
+
+
+@functools.lru_cache(maxsize=None)
+def _row_template(n_columns: int, row_header: bool = False) -> str:
+    """Get the template of a table row with n_columns data cells, after a header cell if row_header."""
+    header_cell = '      <th>{}</th>\n' if row_header else ''
+    return '    <tr>\n' + header_cell + '      <td>{}</td>\n' * n_columns + '    </tr>\n'
+
+
+@functools.lru_cache(maxsize=None)
+def _head(columns: Tuple[str, ...]) -> str:
+    """Get the header rows of a table with the given columns."""
+    header_cells = ''.join(f'      <th>{_cell_text(column)}</th>\n' for column in columns)
+    return f'  <thead>\n    <tr style="text-align: right;">\n{header_cells}    </tr>\n  </thead>\n'
+
+
+def _render_rows(columns: Tuple[str, ...], escaped_columns: Sequence[Sequence[str]]) -> str:
+    """Render a table from its columns' escaped cell texts."""
+    body = ''.join(map(_row_template(len(columns)).format, *escaped_columns)) if escaped_columns else ''
+    return f'{_table_start}{_head(columns)}  <tbody>\n{body}{_table_end}'
+
+
+def render_table(columns: Sequence[str], values: np.ndarray) -> str:
+    """Render a table with a header row, like DataFrame.to_html(index=False).
+
+    :param columns: the column names.
+    :param values: np.ndarray, the cells, one row per table row.
+    :return: str, the table's HTML.
+    """
+    values = np.asarray(values, dtype=object).reshape(-1, len(columns))
+    return _render_rows(tuple(columns), [escape_cells(column) for column in values.T])
+
+
+def render_key_value_table(keys: Sequence[Any], values: Sequence[Any]) -> str:
+    """Render a table of keys and values, like a transposed one row DataFrame's to_html(header=False).
+
+    :param keys: the keys, rendered as row headers.
+    :param values: the values, one per key.
+    :return: str, the table's HTML.
+    """
+    body = ''.join(map(_row_template(1, row_header=True).format, escape_cells(keys), escape_cells(values)))
+    return f'{_table_start}  <tbody>\n{body}{_table_end}'
+
+
+def _render_lot_tables(columns: Sequence[str], values: np.ndarray, lot_column: str) -> str:
+    """Render a results table per lot, in lot order, like the to_html of each group of a groupby of the lot column.
+
+    :param columns: the results' column names.
+    :param values: np.ndarray, the results, one row per result.
+    :param lot_column: str, the column of the lot (date of manufacture) each result belongs to.
+    :return: str, the lots' headers and tables, separated by line breaks.
+    """
+    columns = tuple(columns)
+    lots = values[:, columns.index(lot_column)]
+    has_lot = np.array([lot is not None and not (isinstance(lot, float) and math.isnan(lot)) for lot in lots],
+                       dtype=bool)  # groupby leaves out the results without a lot
+    values, lots = values[has_lot], lots[has_lot]
+    if not len(values):
+        return ''
+    order = np.argsort(lots, kind='stable')  # lot order, the results of a lot in their order
+    values, lots = values[order], lots[order]
+    escaped_columns = [escape_cells(column) for column in values.T]
+    starts = [0] + [row for row in range(1, len(lots)) if lots[row] != lots[row - 1]] + [len(lots)]
+    return _lot_separator.join(
+        f'Lot: {lots[start]}<br>{_render_rows(columns, [column[start:end] for column in escaped_columns])}'
+        for start, end in zip(starts, starts[1:]))
+
+
+def render_nbe_summary(nbe_data: Dict[str, dict]) -> Tuple[str, str]:
+    """Render the subject and HTML body of the summary email for a parsed NBE test report.
+
+    :param nbe_data: dict, the report data from extract_nbe_report_data.
+    :return: tuple, the new subject and the HTML body.
+    """
+    lot_data = nbe_data['lot_info']
+    results_df = nbe_data['test_results']['results_df']
+    values = results_df.to_numpy(dtype=object)
+    mfr_dates = values[:, results_df.columns.get_loc('date_of_manufacture')]
+
+    # create a new subject with useful info
+    new_subj = f"{lot_data['product_name']} {lot_data['tabcode_lw']} " \
+               f"DN: {lot_data['delivery_number_nbe']} lots: {' '.join(mfr_dates)}"
+    lot_table = render_key_value_table(list(lot_data.keys()), list(lot_data.values()))
+    results_html = _render_lot_tables(results_df.columns, values, 'date_of_manufacture')
+    return new_subj, f'<html><body>{lot_table}{_lot_separator}{results_html}</body></html>'
@@ -1,4 +1,3 @@
-from turtle import delay
 from typing import Dict, List, Union, Final
 
 import numpy as np
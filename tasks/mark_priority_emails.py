@@ -1,23 +1,71 @@
+from typing import List
+
 import pandas as pd
 
+from helpers.item_handles import ItemResolver, get_item_ids
 from helpers.outlook_helpers import colorize_outlook_email_list, set_follow_up_on_list
+from helpers.run_metrics import run_metrics
+from log_setup import lg
+from tasks.task_graph import TaskNode
+from untracked_config.priority_shipment_customers import priority_flag_dict
+
+
+def priority_customers_nodes() -> List[TaskNode]:
+    """Get the task graph nodes that set follow-up flags on a folder's cert emails from priority customers.
+
+    :return: list, a node picking out the priority customer rows and a node flagging them in Outlook.
+    """
+    def plan_priority_flags(cert_df: pd.DataFrame) -> pd.DataFrame:
+        return get_priority_customer_rows(cert_df, priority_flag_dict)
+
+    def set_priority_flags(priority_plan: pd.DataFrame, resolver: ItemResolver) -> None:
+        lg.info('Setting follow up flags on priority customer items.')
+        apply_priority_customer_category(priority_plan, resolver, True)
+
+    return [TaskNode('priority_plan', plan_priority_flags, inputs=('cert_df',)),
+            TaskNode('priority_flags', set_priority_flags, inputs=('priority_plan', 'resolver'),
+                     mutates_outlook=True),
+            ]
+
 
+def get_priority_customer_rows(df: pd.DataFrame, priority_flag_dict: dict) -> pd.DataFrame:
+    """Get the rows of mail items from priority customers.
 
-def set_priority_customer_category(df: pd.DataFrame, priority_flag_dict: dict, follow_up=True, color_category: str = '') -> None:
+    :param df: The DataFrame containing the mail items to filter.
+    :param priority_flag_dict: A dictionary containing the customer names to flag as highest priority.
+    :return: The rows of the DataFrame from priority customers.
+    """
+    return df.loc[df.customer.str.match('|'.join(priority_flag_dict['highest'].keys()))]
+
+
+def set_priority_customer_category(df: pd.DataFrame, priority_flag_dict: dict, resolver: ItemResolver, follow_up=True,
+                                   color_category: str = '') -> None:
     """Sets the color category of mail items from priority customers in the given DataFrame to the specified color.
 
     :param df: The DataFrame containing the mail items to filter and colorize.
     :param priority_flag_dict: A dictionary containing the customer names to flag as highest priority.
+    :param resolver: ItemResolver, opens the mail items.
     :param follow_up: bool, whether to mark an e-mail with a follow-up flag
     :param color_category: The name of the color category to apply to the mail items (default is 'red').
     """
     # filter on priority customers
-    flag_df = df.loc[df.customer.str.match('|'.join(priority_flag_dict['highest'].keys()))]
-    if follow_up:
-        set_follow_up_on_list(flag_df['o_item'])
+    flag_df = get_priority_customer_rows(df, priority_flag_dict)
+    apply_priority_customer_category(flag_df, resolver, follow_up, color_category)
 
-    if color_category:
-        # set priority customer e-mails to color category
-        colorize_outlook_email_list(flag_df['o_item'], color_category)
 
+def apply_priority_customer_category(flag_df: pd.DataFrame, resolver: ItemResolver, follow_up=True,
+                                     color_category: str = '') -> None:
+    """Set the follow-up flag and/or color category on the priority customer mail items in the given DataFrame.
+
+    :param flag_df: The DataFrame containing the priority customer mail items.
+    :param resolver: ItemResolver, opens each mail item just before it is changed.
+    :param follow_up: bool, whether to mark an e-mail with a follow-up flag
+    :param color_category: The name of the color category to apply to the mail items, if any.
+    """
+    with run_metrics.span('priority_flags', items=len(flag_df)):
+        if follow_up:
+            set_follow_up_on_list(resolver.iter_items(get_item_ids(flag_df)))
 
+        if color_category:
+            # set priority customer e-mails to color category
+            colorize_outlook_email_list(resolver.iter_items(get_item_ids(flag_df)), color_category)
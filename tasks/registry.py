@@ -0,0 +1,84 @@
+"""A registry of the mail processing tasks, imported only when they are enabled.
+
+Tasks are registered by name with the import path of their function, as 'package.module:function'. A task's module,
+and with it its dependencies (e.g. pypdf and the NBE report parser for the incoming reports task), is imported only when
+the task is enabled in `process_configuration_dct`, whose keys are 'process_' + the task name.
+
+A task function takes no arguments and returns the task's nodes for the per-folder task graph (see tasks.task_graph).
+The nodes' inputs are the folder's run context: 'folder_path', 'cert_df' (the parsed cert emails), 'other_df' (the
+other emails), 'move_folder' (where duplicates are moved), 'smry' (the run summary), 'local_save_folder_path' (the
+account's folder for saved attachments), 'resolver' (opens the frames' mail items by their 'entry_id' and
+'store_id', see helpers.item_handles) and 'ledger' (the actions completed on the account's items by earlier runs, see
+helpers.processed_ledger; None if disabled) and 'external_dedupe' (a large folder's duplicate foam cert candidates,
+added to a tasks.external_dedupe.ExternalDedupe as they were fetched; None for other folders), or other nodes' outputs.
+
+Classes:
+    TaskRegistry: Task names mapped to the import paths of their functions.
+
+Variables:
+    task_registry: The registry of this program's tasks, in the order they run.
+
+"""
+
+import importlib
+from typing import Callable, Dict, List, Tuple
+
+from log_setup import lg
+
+
+class TaskRegistry:
+    """Task names mapped to the import paths of their functions.
+    """
+
+    def __init__(self):
+        self._targets: Dict[str, str] = {}  # insertion ordered; tasks run in the order they were registered
+
+    def register(self, name: str, target: str) -> None:
+        """Register a task.
+
+        :param name: str, the task's name; enabled by the 'process_<name>' configuration key.
+        :param target: str, the import path of the task's node function as 'package.module:function'.
+        """
+        if name in self._targets:
+            raise ValueError(f'Task {name} is already registered.')
+        self._targets[name] = target
+
+    @property
+    def names(self) -> List[str]:
+        """The registered task names, in run order."""
+        return list(self._targets.keys())
+
+    def load(self, name: str) -> Callable:
+        """Import a registered task's module and get its function.
+
+        :param name: str, the task's name.
+        :return: the task's node function.
+        """
+        module_name, function_name = self._targets[name].split(':')
+        return getattr(importlib.import_module(module_name), function_name)
+
+    def get_enabled_tasks(self, process_configuration: Dict[str, bool]) -> List[Tuple[str, Callable]]:
+        """Import and get the enabled tasks; disabled tasks' modules are not imported.
+
+        A task missing from the configuration is enabled.
+
+        :param process_configuration: dict, 'process_<name>' keys with whether to run that task.
+        :return: list, (name, node function) tuples for the enabled tasks, in run order.
+        """
+        unknown_keys = set(process_configuration) - {f'process_{name}' for name in self._targets}
+        if unknown_keys:
+            raise ValueError(f'Unknown tasks in the process configuration: {sorted(unknown_keys)}')
+
+        enabled_tasks = []
+        for name in self._targets:
+            if process_configuration.get(f'process_{name}', True):
+                enabled_tasks.append((name, self.load(name)))
+            else:
+                lg.debug(f'Task {name} is disabled.')
+        return enabled_tasks
+
+
+task_registry = TaskRegistry()
+task_registry.register('priority_customers', 'tasks.mark_priority_emails:priority_customers_nodes')
+task_registry.register('duplicate_foam_certs', 'tasks.clean_foam_inbox:duplicate_foam_certs_nodes')
+task_registry.register('incoming_reports', 'tasks.filing_test_reports.nbe_report_emails:incoming_reports_nodes')
@@ -0,0 +1,172 @@
+"""A small task graph for running a folder's processing tasks over its ingested frames.
+
+Each task is split into nodes. A node declares its inputs by name, either values from the run context (the parsed
+cert frame, the other-mail frame, the destination folder, ...) or the outputs of other nodes, and the nodes whose
+Outlook changes must come before its own. Nodes that only compute (e.g. dedupe planning, PDF parsing) run concurrently
+on a thread pool; nodes that call into Outlook run one at a time on the calling thread, which owns the COM objects.
+
+example:
+    graph = TaskGraph()
+    graph.add(TaskNode('plan', plan_moves, inputs=('cert_df',)))
+    graph.add(TaskNode('moves', apply_moves, inputs=('plan', 'move_folder'), mutates_outlook=True))
+    outputs, timings = graph.run({'cert_df': df, 'move_folder': folder})
+
+Classes:
+    TaskNode: One unit of work in a task graph.
+    TaskGraph: Validates and runs a set of TaskNodes.
+
+"""
+
+import concurrent.futures
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from helpers.watchdog import watchdog
+
+
+class TaskNode:
+    """One unit of work in a task graph.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Any], inputs: Iterable[str] = (), after: Iterable[str] = (),
+                 mutates_outlook: bool = False):
+        """
+        :param name: str, the node's name; its output is available to other nodes under this name.
+        :param func: callable, called with the inputs as keyword arguments.
+        :param inputs: the names of the context values and node outputs the node needs.
+        :param after: the names of nodes that must finish first; nodes not in the graph (e.g. from a disabled task)
+            are ignored.
+        :param mutates_outlook: bool, whether the node calls into Outlook; such nodes run serially on the calling
+            thread, all other nodes run on the thread pool and must not touch COM objects.
+        """
+        self.name = name
+        self.func = func
+        self.inputs: Tuple[str, ...] = tuple(inputs)
+        self.after: Tuple[str, ...] = tuple(after)
+        self.mutates_outlook = mutates_outlook
+
+    def __repr__(self) -> str:
+        return f'TaskNode({self.name!r}, inputs={self.inputs}, after={self.after}, ' \
+               f'mutates_outlook={self.mutates_outlook})'
+
+
+class TaskGraph:
+    """Validates and runs a set of TaskNodes.
+
+    When several Outlook nodes are ready, those whose output feeds compute nodes go first, so the compute work overlaps
+    the remaining Outlook work; otherwise Outlook nodes run in the order they were added.
+    """
+
+    def __init__(self, nodes: Iterable[TaskNode] = ()):
+        self._nodes: Dict[str, TaskNode] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: TaskNode) -> None:
+        """Add a node to the graph.
+
+        :param node: TaskNode, the node; its name must be unique in the graph.
+        """
+        if node.name in self._nodes:
+            raise ValueError(f'Task node {node.name} is already in the graph.')
+        self._nodes[node.name] = node
+
+    def _dependencies(self, node: TaskNode) -> Set[str]:
+        """The names of the nodes in the graph that must finish before the given node can start."""
+        return {name for name in node.inputs + node.after if name in self._nodes}
+
+    def validate(self, context_names: Iterable[str]) -> None:
+        """Check that every input is available and that there are no cycles.
+
+        :param context_names: the names of the values the run context provides.
+        :raises ValueError: if an input is missing or the nodes depend on each other in a cycle.
+        """
+        available = set(context_names) | set(self._nodes)
+        for node in self._nodes.values():
+            missing = [name for name in node.inputs if name not in available]
+            if missing:
+                raise ValueError(f'Task node {node.name} is missing inputs: {missing}')
+
+        done: Set[str] = set()
+        remaining = dict(self._nodes)
+        while remaining:
+            ready = [name for name, node in remaining.items() if self._dependencies(node) <= done]
+            if not ready:
+                raise ValueError(f'Task nodes have cyclic dependencies: {sorted(remaining)}')
+            for name in ready:
+                done.add(name)
+                del remaining[name]
+
+    def _feeds_compute(self, node: TaskNode) -> bool:
+        """Whether the node's output is an input of a compute (non-Outlook) node."""
+        return any(node.name in other.inputs and not other.mutates_outlook for other in self._nodes.values())
+
+    def run(self, context: Dict[str, Any], max_workers: int = 4
+            ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Run the graph.
+
+        If a node raises, no more nodes are started, the running ones are waited for, and the exception is re-raised.
+
+        :param context: dict, the values available to the nodes by name.
+        :param max_workers: int, the number of threads for the compute nodes.
+        :return: tuple, the node outputs by name and each node's run time in seconds by name.
+        """
+        self.validate(context.keys())
+        values: Dict[str, Any] = dict(context)
+        timings: Dict[str, float] = {}
+        done: Set[str] = set()
+        started: Set[str] = set()
+        running: Dict[concurrent.futures.Future, str] = {}
+        failure: Optional[BaseException] = None
+
+        def timed_call(node: TaskNode) -> Tuple[Any, float]:
+            watchdog.check()  # a stage outlived its deadline; don't start more work
+            node_start = time.perf_counter()
+            result = node.func(**{name: values[name] for name in node.inputs})
+            return result, time.perf_counter() - node_start
+
+        def finish(name: str, result: Any, seconds: float) -> None:
+            values[name] = result
+            timings[name] = seconds
+            done.add(name)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task_graph') as pool:
+            while failure is None and len(done) < len(self._nodes):
+                ready = [node for name, node in self._nodes.items()
+                         if name not in started and self._dependencies(node) <= done]
+                for node in ready:
+                    if not node.mutates_outlook:
+                        started.add(node.name)
+                        running[pool.submit(timed_call, node)] = node.name
+
+                outlook_ready = [node for node in ready if node.mutates_outlook]
+                if outlook_ready:
+                    node = sorted(outlook_ready, key=lambda n: not self._feeds_compute(n))[0]
+                    started.add(node.name)
+                    try:
+                        finish(node.name, *timed_call(node))
+                    except Exception as err:
+                        failure = err
+                    # collect any compute nodes that finished meanwhile before picking the next node
+                    finished = [future for future in running if future.done()]
+                elif running:
+                    finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                else:
+                    break  # nothing ready or running; validate() rules this out
+
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        finish(name, *future.result())
+                    except Exception as err:
+                        failure = failure or err
+
+            concurrent.futures.wait(running)  # let started nodes finish before leaving
+        if failure is not None:
+            raise failure
+        return {name: values[name] for name in done}, timings
+
+    @property
+    def names(self) -> List[str]:
+        """The node names, in the order they were added."""
+        return list(self._nodes)
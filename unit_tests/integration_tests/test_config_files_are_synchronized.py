@@ -11,6 +11,8 @@ import untracked_config.development_node as odn
 import untracked_config.development_node_template as odn_t
 import untracked_config.foam_clean_product_names as fcpn
 import untracked_config.foam_clean_product_names_template as fcpn_t
+import untracked_config.performance_settings as pfs
+import untracked_config.performance_settings_template as pfs_t
 import untracked_config.priority_shipment_customers as psc
 import untracked_config.priority_shipment_customers_template as psc_t
 import untracked_config.scheduling_data as schd
@@ -64,6 +66,9 @@ class TestSynchronization(unittest.TestCase):
     def test_foam_clean_product_names(self):
         test_sync(fcpn, fcpn_t)
 
+    def test_performance_settings(self):
+        test_sync(pfs, pfs_t)
+
     def test_priority_shipment_customers(self):
         test_sync(psc, psc_t)
 
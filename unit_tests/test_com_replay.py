@@ -0,0 +1,96 @@
+"""Tests for recording an Outlook session and replaying it, using the stand-in Outlook backend."""
+
+import datetime
+import gzip
+import os
+import tempfile
+import unittest
+
+from helpers.com_replay import ReplayObject, ReplaySession
+from helpers.com_tracing import ComTracer
+from helpers.stand_in_outlook import StandInAttachment, StandInMailItem, StandInOutlook
+
+
+class TestComReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.trace_path = os.path.join(self.temp_dir.name, 'session.trace.jsonl.gz')
+        outlook = StandInOutlook()
+        store = outlook.add_store('account')
+        inbox = store.add_folder_path(r'\\account\Inbox')
+        moved = store.add_folder_path(r'\\account\Inbox\Moved')
+        self.received = datetime.datetime(2023, 5, 1, 9, tzinfo=datetime.timezone.utc)
+        for n in range(3):
+            inbox.deliver(StandInMailItem(f'mail {n}', self.received,
+                                          attachments=[StandInAttachment(f'cert {n}.pdf', f'pdf {n}'.encode())]))
+        self.folder_ids = (inbox.EntryID, inbox.StoreID)
+
+        tracer = ComTracer(enabled=True)
+        tracer.start_recording(self.trace_path)
+        try:
+            self.recorded = self.run_session(tracer.wrap(outlook), os.path.join(self.temp_dir.name, 'recorded'))
+            mapi = tracer.wrap(outlook).GetNamespace('MAPI')
+            with self.assertRaises(KeyError):
+                mapi.GetFolderFromID('missing', 'missing')
+        finally:
+            tracer.stop_recording()
+        self.assertEqual(moved.Items.Count, 3)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_session(self, application, save_dir):
+        """Read each item and save its attachment, then move the items."""
+        mapi = application.GetNamespace('MAPI')
+        inbox = mapi.GetFolderFromID(*self.folder_ids)
+        moved = inbox.Folders.Item(1)
+        os.makedirs(save_dir, exist_ok=True)
+        items = list(inbox.Items)
+        subjects = []
+        for item in items:
+            subjects.append((item.Subject, item.ReceivedTime))
+            attachment = item.Attachments.Item(1)
+            attachment.SaveAsFile(os.path.join(save_dir, attachment.FileName))
+        for item in items:
+            item.Move(moved)
+        return subjects
+
+    def test_replay_answers_as_recorded(self):
+        replay = ReplaySession(self.trace_path)
+        save_dir = os.path.join(self.temp_dir.name, 'replayed')
+        self.assertEqual(self.run_session(replay.root, save_dir), self.recorded)
+        self.assertEqual(self.recorded[0], ('mail 0', self.received))
+        with open(os.path.join(save_dir, 'cert 2.pdf'), 'rb') as sf:
+            self.assertEqual(sf.read(), b'pdf 2')
+        self.assertFalse(replay.unmatched)
+
+    def test_sessions_merged(self):
+        replay = ReplaySession(self.trace_path)
+        self.assertIsInstance(replay.outlook.get_outlook_folders(), ReplayObject)
+        with replay.thread_session() as mapi:
+            self.assertEqual(mapi, replay.outlook.get_outlook_folders())
+
+    def test_recorded_errors_raised(self):
+        replay = ReplaySession(self.trace_path)
+        mapi = replay.outlook.get_outlook_folders()
+        mapi.GetFolderFromID(*self.folder_ids)
+        with self.assertRaisesRegex(RuntimeError, 'KeyError'):
+            mapi.GetFolderFromID('missing', 'missing')
+
+    def test_unmatched_access(self):
+        replay = ReplaySession(self.trace_path)
+        with self.assertRaises(AttributeError):
+            replay.root.Version
+        self.assertEqual(replay.unmatched[('Version', 'get')], 1)
+
+    def test_not_a_trace(self):
+        not_a_trace = os.path.join(self.temp_dir.name, 'not_a_trace.gz')
+        with gzip.open(not_a_trace, 'wt') as tf:
+            tf.write('{"format": "something else"}\n')
+        with self.assertRaises(ValueError):
+            ReplaySession(not_a_trace)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for the COM call-counting proxy, using the stand-in Outlook backend."""
+
+import datetime
+import unittest
+
+import pandas as pd
+
+from helpers.com_tracing import ComProxy, ComTracer
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+
+
+class TestComTracing(unittest.TestCase):
+
+    def setUp(self):
+        outlook = StandInOutlook()
+        store = outlook.add_store('account')
+        inbox = store.add_folder_path(r'\\account\Inbox')
+        self.moved = store.add_folder_path(r'\\account\Inbox\Moved')
+        received = datetime.datetime(2023, 5, 1, 9, tzinfo=datetime.timezone.utc)
+        for n in range(3):
+            inbox.deliver(StandInMailItem(f'mail {n}', received))
+        self.tracer = ComTracer(enabled=True)
+        self.namespace = self.tracer.wrap(outlook).GetNamespace('MAPI')
+        self.inbox = self.namespace.GetFolderFromID(inbox.EntryID, inbox.StoreID)
+
+    def test_gets_calls_and_iteration_recorded(self):
+        subjects = [item.Subject for item in self.inbox.Items]
+        self.assertEqual(subjects, ['mail 0', 'mail 1', 'mail 2'])
+
+        rows = {(row['member'], row['kind']): row for row in self.tracer.summary()}
+        self.assertEqual(rows[('Subject', 'get')]['calls'], 3)
+        self.assertEqual(rows[('Items', 'get')]['calls'], 1)
+        self.assertEqual(rows[('__iter__', 'iter')]['calls'], 4)  # three items and the end of the collection
+        self.assertEqual(rows[('GetFolderFromID', 'call')]['calls'], 1)
+        call_site, = rows[('Subject', 'get')]['call_sites']
+        self.assertTrue(call_site.startswith('test_com_tracing.py:'))
+        self.assertIn('Subject get: 3 calls', self.tracer.report())
+
+    def test_proxies_passed_to_methods_and_sets(self):
+        item = self.inbox.Items.Item(1)
+        self.assertIsInstance(item, ComProxy)
+        item.FlagRequest = 'Follow up'
+        item.Move(self.tracer.wrap(self.moved))
+        self.assertEqual(self.moved.Items.Count, 1)
+        self.assertEqual(self.moved.Items.Item(1).FlagRequest, 'Follow up')
+        rows = {(row['member'], row['kind']): row['calls'] for row in self.tracer.summary()}
+        self.assertEqual(rows[('FlagRequest', 'set')], 1)
+        self.assertEqual(rows[('Move', 'call')], 1)
+
+    def test_plain_values_not_wrapped(self):
+        item = self.inbox.Items.Item(1)
+        self.assertIsInstance(item.ReceivedTime, datetime.datetime)
+        self.assertNotIsInstance(item.Subject, ComProxy)
+
+    def test_proxies_in_dataframe(self):
+        df = pd.DataFrame([{'subject': item.Subject, 'o_item': item} for item in self.inbox.Items])
+        self.assertIsInstance(df['o_item'].iloc[0], ComProxy)
+
+    def test_disabled_tracer_does_not_wrap(self):
+        tracer = ComTracer(enabled=False)
+        self.assertIs(tracer.wrap(self.moved), self.moved)
+
+    def test_top_n(self):
+        [item.Subject for item in self.inbox.Items]
+        self.assertEqual(len(self.tracer.summary(top_n=2)), 2)
+        self.tracer.reset()
+        self.assertEqual(self.tracer.summary(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tests for the event-driven micro-batching, using the stand-in Outlook backend as the event source."""
+
+import datetime
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import main_process
+from event_driven import ArrivalSubscription, MicroBatcher, process_batch_with_main_tasks, run_event_loop
+from helpers.run_metrics import run_metrics
+from helpers.watchdog import watchdog
+from helpers.stand_in_outlook import DispatchWithEvents, StandInMailItem, StandInOutlook
+
+CERT_SUBJECT = 'CofC 1234 PROD-1 SO 555 LOT 20230101A COMPANY-A INC 12345 BP 1'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.batcher = MicroBatcher(debounce_seconds=5, max_batch_wait_seconds=30, max_batch_items=3,
+                                    clock=self.clock)
+
+    def test_batch_waits_for_quiet_period(self):
+        self.batcher.add('inbox', 'a')
+        self.clock.now = 4
+        self.assertEqual(self.batcher.take_due_batch(), {})
+        self.clock.now = 5
+        self.assertEqual(self.batcher.take_due_batch(), {'inbox': ['a']})
+        self.assertEqual(self.batcher.pending_count(), 0)
+
+    def test_steady_arrivals_released_after_max_wait(self):
+        self.batcher.max_batch_items = 100
+        for second in range(0, 31, 4):
+            self.clock.now = second
+            self.batcher.add('inbox', str(second))
+        self.clock.now = 30
+        self.assertEqual(len(self.batcher.take_due_batch()['inbox']), 8)
+
+    def test_full_batch_released_immediately(self):
+        for entry_id in 'abc':
+            self.batcher.add('inbox', entry_id)
+        self.assertEqual(self.batcher.take_due_batch(), {'inbox': ['a', 'b', 'c']})
+
+
+class TestArrivalSubscription(unittest.TestCase):
+
+    def setUp(self):
+        self.outlook = StandInOutlook()
+        store = self.outlook.add_store('account')
+        self.inbox = store.add_folder_path(r'\\account\Inbox')
+        self.batcher = MicroBatcher(debounce_seconds=0, clock=FakeClock())
+
+    def test_only_actionable_arrivals_are_batched(self):
+        subscription = ArrivalSubscription({self.inbox.FolderPath: self.inbox}, self.batcher, DispatchWithEvents)
+        cert = self.inbox.deliver(StandInMailItem(CERT_SUBJECT, datetime.datetime.now()))
+        self.inbox.deliver(StandInMailItem('Lunch on Friday?', datetime.datetime.now()))
+        nbe = self.inbox.deliver(StandInMailItem('Certificate for Delivery:0000123456789012'))
+        self.assertEqual(self.batcher.take_due_batch(), {self.inbox.FolderPath: [cert.EntryID, nbe.EntryID]})
+        subscription.close()
+
+    def test_event_loop_processes_batches(self):
+        batches = []
+        pumps = []
+
+        def pump():  # deliver a new mail on the first pump, like a message arriving between ticks
+            if not pumps:
+                self.inbox.deliver(StandInMailItem(CERT_SUBJECT))
+            pumps.append(1)
+
+        run_event_loop({self.inbox.FolderPath: self.inbox}, [self.inbox.FolderPath], batches.append,
+                       dispatch_with_events=DispatchWithEvents, pump_messages=pump,
+                       should_stop=lambda: len(pumps) >= 2, debounce_seconds=0.0, pump_interval_seconds=0.0)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(list(batches[0].keys()), [self.inbox.FolderPath])
+
+    def test_event_loop_goes_on_after_failed_batch(self):
+        batches = []
+        pumps = []
+
+        def process_batch(batch):
+            batches.append(batch)
+            if len(batches) == 1:
+                raise RuntimeError('the first batch fails')
+
+        def pump():  # deliver a new mail on each of the first two pumps
+            if len(pumps) < 2:
+                self.inbox.deliver(StandInMailItem(CERT_SUBJECT))
+            pumps.append(1)
+
+        with mock.patch('event_driven.lg') as lg:
+            run_event_loop({self.inbox.FolderPath: self.inbox}, [self.inbox.FolderPath], process_batch,
+                           dispatch_with_events=DispatchWithEvents, pump_messages=pump,
+                           should_stop=lambda: len(pumps) >= 3, debounce_seconds=0.0, pump_interval_seconds=0.0)
+        self.assertEqual(len(batches), 2)
+        lg.exception.assert_called_once()
+
+    def test_batch_after_timeout_runs_clean(self):
+        acct = dict(account_name='account', inbox_folders=[self.inbox.FolderPath, r'\\account\Other'])
+        batch = {self.inbox.FolderPath: [self.inbox.deliver(StandInMailItem(CERT_SUBJECT)).EntryID]}
+        runs = []
+
+        def main_process_function(found_folders_dict, inbox_folders, **kwargs):
+            watchdog.check()  # raises if the last batch's timeout is still set
+            runs.append(dict(inbox_folders=inbox_folders, entry_ids=kwargs['entry_ids'],
+                             timeouts=len(watchdog.timeouts), spans=len(run_metrics.spans)))
+            if len(runs) == 1:  # the first batch outlives a stage deadline
+                with watchdog.deadline('task_graph', 0.0, blocking_call=False):
+                    time.sleep(0.2)
+            return None, dict(task_timings={})
+
+        with tempfile.TemporaryDirectory() as state_dir, \
+                mock.patch('main_process.STATE_DIR_PATH', state_dir), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}), \
+                mock.patch('main_process.main_process_function', main_process_function), \
+                mock.patch('main_process.probe_folder_changes') as probe_folder_changes, \
+                mock.patch('main_process.save_folder_fingerprints') as save_folder_fingerprints:
+            for _ in range(2):
+                process_batch_with_main_tasks(mock.MagicMock(), {self.inbox.FolderPath: self.inbox}, batch, acct)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(runs[0], runs[1])  # the second batch starts from a reset watchdog and run metrics
+        self.assertEqual(runs[1]['timeouts'], 0)
+        self.assertEqual(runs[1]['inbox_folders'], [self.inbox.FolderPath])
+        self.assertEqual(runs[1]['entry_ids'], batch)
+        probe_folder_changes.assert_not_called()
+        save_folder_fingerprints.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
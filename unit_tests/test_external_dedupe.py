@@ -0,0 +1,114 @@
+"""Tests for planning the duplicate foam cert moves out of memory."""
+
+import datetime
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from helpers.mail_schema import apply_mail_schema
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import concat_mail_frames, get_process_folders_dfs, new_external_dedupe, \
+    plan_foam_moves, plan_foam_moves_external
+from tasks.external_dedupe import ExternalDedupe
+
+KEY_COLUMNS = ['product_number', 'so_number', 'lot8', 'c_number']
+
+
+def make_cert_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Get a cert email frame where most (product, SO, lot, customer) groups have several certs."""
+    rng = random.Random(seed)
+    rows = []
+    for n in range(n_rows):
+        rows.append({'received_time': pd.Timestamp('2023-05-01') + pd.Timedelta(seconds=rng.randrange(86400)),
+                     'subject': f'CofC {n}', 'entry_id': f'{n:048X}', 'store_id': 'store',
+                     'cert_number': str(rng.randrange(100000, 999999)),
+                     'product_number': f'{rng.randrange(2):04d}-56', 'so_number': str(rng.randrange(3)),
+                     'lot_number': f'2301010{rng.randrange(2)}', 'c_number': rng.choice(['1234', '4321'])})
+    df = apply_mail_schema(pd.DataFrame(rows))
+    df['lot8'] = df['lot_number'].str[:8]
+    return df
+
+
+class TestExternalDedupe(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.cert_df = make_cert_frame(60)
+        patches = [mock.patch('tasks.clean_foam_inbox.dedupe_columns', KEY_COLUMNS),
+                   mock.patch.dict('tasks.clean_foam_inbox.DEDUPE_PARAMETERS',
+                                   {'external_min_rows': 10 ** 9, 'run_rows': 16, 'spill_dir': self.spill_dir.name})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.spill_dir.cleanup()
+
+    def test_same_decisions_as_in_memory(self):
+        in_memory_moves, dfg = plan_foam_moves(self.cert_df, 'folder')
+        dedupe = new_external_dedupe()
+        for start in range(0, len(self.cert_df), 25):  # chunk by chunk, as fetched
+            dedupe.add(self.cert_df.iloc[start:start + 25])
+        external_moves = plan_foam_moves_external(dedupe, 'folder')
+        self.assertGreater(len(in_memory_moves), 30)
+        self.assertEqual(sorted(external_moves), sorted(in_memory_moves))
+        self.assertEqual(os.listdir(self.spill_dir.name), [])  # the runs are deleted
+
+    def test_large_folder_deduped_while_fetched(self):
+        inbox = StandInOutlook().add_store('account').add_folder_path(r'\\account\Inbox')
+        received = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        for n in range(40):
+            inbox.deliver(StandInMailItem(f'CofC {100 + n} 1234-56 SO 7{n % 3} LOT 2301010{n % 2} customer {n % 4} '
+                                          f'1234{n % 4} BP 1', received - datetime.timedelta(minutes=n)))
+        folders = {inbox.FolderPath: inbox}
+        with mock.patch('tasks.clean_foam_inbox.dedupe_cnums', ('12340', '12341')), \
+                mock.patch('tasks.clean_foam_inbox.priority_flag_dict', {'highest': {'customer 1': {}}}), \
+                mock.patch.dict('tasks.clean_foam_inbox.INGESTION_PARAMETERS', {'chunk_size': 7}):
+            external_dedupes = {}
+            with mock.patch.dict('tasks.clean_foam_inbox.DEDUPE_PARAMETERS', {'external_min_rows': 50}):
+                (_, cert_df, _), = get_process_folders_dfs([inbox.FolderPath], folders,
+                                                           external_dedupes=external_dedupes)
+            self.assertEqual(external_dedupes, {})  # a small folder is grouped in memory
+            self.assertEqual(len(cert_df), 40)
+            with mock.patch.dict('tasks.clean_foam_inbox.DEDUPE_PARAMETERS', {'external_min_rows': 40}), \
+                    mock.patch.object(ExternalDedupe, 'add', autospec=True, side_effect=ExternalDedupe.add) as add, \
+                    mock.patch('tasks.clean_foam_inbox.concat_mail_frames', wraps=concat_mail_frames) as concat:
+                (_, priority_df, _), = get_process_folders_dfs([inbox.FolderPath], folders,
+                                                               external_dedupes=external_dedupes)
+            self.assertEqual(add.call_count, 6)  # one call per fetched chunk
+            # the folder's cert frame is never built, only the priority customer rows the priority flags need
+            self.assertEqual(sum(len(frame) for call in concat.call_args_list for frame in call.args[0]), 10)
+            self.assertEqual(sorted(priority_df['entry_id']),
+                             sorted(cert_df.loc[cert_df['customer'] == 'customer 1', 'entry_id']))
+            dedupe = external_dedupes[inbox.FolderPath]
+            self.assertEqual(dedupe.rows, 20)
+            in_memory_moves, _ = plan_foam_moves(cert_df[cert_df.c_number.isin(('12340', '12341'))], 'folder')
+        self.assertGreater(len(in_memory_moves), 10)
+        self.assertEqual(sorted(plan_foam_moves_external(dedupe, 'folder')), sorted(in_memory_moves))
+
+    def test_runs_spilled_and_lowest_cert_kept(self):
+        dedupe = ExternalDedupe(['so_number'], run_rows=2, spill_dir=self.spill_dir.name,
+                                compare_columns=['so_number'])
+        dedupe.add(pd.DataFrame({'so_number': ['1', '1', '2', '1', '2'], 'cert_number': ['5', '3', '9', '4', '8'],
+                                 'received_time': pd.Timestamp('2023-05-01'), 'entry_id': list('abcde'),
+                                 'store_id': 'store'}))
+        self.assertEqual(len(os.listdir(self.spill_dir.name)), 2)
+        self.assertEqual(dedupe.plan(), [('d', 'store'), ('a', 'store'), ('c', 'store')])
+
+    def test_unmatched_move_raises(self):
+        dedupe = ExternalDedupe(['so_number'], run_rows=2, spill_dir=self.spill_dir.name,
+                                compare_columns=['lot8'])
+        dedupe.add(pd.DataFrame({'so_number': ['1', '1'], 'lot8': ['A', 'B'], 'cert_number': ['1', '2'],
+                                 'received_time': pd.Timestamp('2023-05-01'), 'entry_id': ['a', 'b'],
+                                 'store_id': 'store'}))
+        with self.assertRaises(RuntimeError):
+            dedupe.plan()
+        self.assertEqual(os.listdir(self.spill_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Tests for the folder change-detection fingerprints, using the stand-in Outlook backend."""
+
+import datetime
+import unittest
+
+from helpers.adaptive_interval import AdaptiveInterval
+from helpers.com_tracing import ComTracer
+from helpers.folder_fingerprint import count_arrivals, fingerprint_changed, get_folder_fingerprint
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+
+
+class TestFolderFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        outlook = StandInOutlook()
+        self.inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        self.start = datetime.datetime(2023, 5, 1, 9, tzinfo=datetime.timezone.utc)
+        for minutes in (0, 5, 10):
+            self.inbox.deliver(StandInMailItem(f'mail {minutes}', self.start + datetime.timedelta(minutes=minutes)))
+
+    def test_unchanged_folder(self):
+        first = get_folder_fingerprint(self.inbox)
+        self.assertEqual(first['item_count'], 3)
+        self.assertEqual(first['newest_received'], (self.start + datetime.timedelta(minutes=10)).isoformat())
+        self.assertFalse(fingerprint_changed(first, get_folder_fingerprint(self.inbox)))
+        self.assertFalse(fingerprint_changed(first, get_folder_fingerprint(self.inbox, first)))
+
+    def test_arrival_changes_fingerprint(self):
+        first = get_folder_fingerprint(self.inbox)
+        self.inbox.deliver(StandInMailItem('new mail', self.start + datetime.timedelta(minutes=20, seconds=30)))
+        second = get_folder_fingerprint(self.inbox, first)
+        self.assertTrue(fingerprint_changed(first, second))
+        self.assertEqual(count_arrivals(first, second), 1)
+        self.assertEqual(second, get_folder_fingerprint(self.inbox))
+
+    def test_modification_changes_fingerprint(self):
+        first = get_folder_fingerprint(self.inbox)
+        item = self.inbox.Items.Item(1)
+        item.FlagRequest = 'Follow up'
+        item.Save()
+        second = get_folder_fingerprint(self.inbox, first)
+        self.assertTrue(fingerprint_changed(first, second))
+        self.assertEqual(count_arrivals(first, second), 0)
+        self.assertEqual(second, get_folder_fingerprint(self.inbox))
+
+    def test_items_not_sorted_given_previous(self):
+        first = get_folder_fingerprint(self.inbox)
+        tracer = ComTracer(enabled=True)
+        get_folder_fingerprint(tracer.wrap(self.inbox), first)
+        calls = {row['member']: row['calls'] for row in tracer.summary()}
+        self.assertNotIn('Sort', calls)
+        self.assertEqual(calls['Restrict'], 2)
+        self.assertEqual(calls['GetNext'], 2)  # the newest item is the only one in each window
+
+    def test_no_previous_fingerprint_is_a_change(self):
+        self.assertTrue(fingerprint_changed(None, get_folder_fingerprint(self.inbox)))
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+
+    def test_widens_when_quiet_and_narrows_on_arrivals(self):
+        pacing = AdaptiveInterval(min_seconds=60, max_seconds=200, widen_factor=2, clock=lambda: 0.0)
+        self.assertEqual(pacing.observe(0), 120)
+        self.assertEqual(pacing.observe(0), 200)
+        self.assertEqual(pacing.observe(None), 200)
+        self.assertEqual(pacing.observe(3), 60)
+
+    def test_ticks_skipped_until_due(self):
+        now = [0.0]
+        pacing = AdaptiveInterval(min_seconds=60, clock=lambda: now[0])
+        self.assertTrue(pacing.is_due())
+        pacing.mark_run()
+        now[0] = 30
+        self.assertFalse(pacing.is_due())
+        now[0] = 60
+        self.assertTrue(pacing.is_due())
+
+
+if __name__ == '__main__':
+    unittest.main()
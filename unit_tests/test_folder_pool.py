@@ -0,0 +1,63 @@
+"""Tests for processing folders concurrently in per-thread sessions, using the stand-in Outlook backend."""
+
+import contextlib
+import threading
+import time
+import unittest
+
+from helpers.folder_pool import get_folder_ids, map_folders_in_sessions
+from helpers.stand_in_outlook import StandInOutlook
+
+
+class TestFolderPool(unittest.TestCase):
+
+    def setUp(self):
+        self.outlook = StandInOutlook()
+        store = self.outlook.add_store('account')
+        self.folders = {path: store.add_folder_path(path)
+                        for path in (r'\\account\Inbox\slow', r'\\account\Inbox\fast', r'\\account\Inbox\moved')}
+        self.sessions = []
+
+        @contextlib.contextmanager
+        def session_factory():
+            self.sessions.append(threading.get_ident())
+            yield self.outlook.GetNamespace('MAPI')
+
+        self.session_factory = session_factory
+
+    def test_folders_resolved_in_own_sessions_and_merged_in_order(self):
+        folder_ids = get_folder_ids({path: self.folders[path]
+                                     for path in (r'\\account\Inbox\slow', r'\\account\Inbox\fast')})
+        move_ids = get_folder_ids({r'\\account\Inbox\moved': self.folders[r'\\account\Inbox\moved']})
+
+        def work(folder_path, ol_folder, shared_folders):
+            time.sleep(0.1 if folder_path.endswith('slow') else 0)
+            return ol_folder.FolderPath, list(shared_folders), threading.get_ident()
+
+        results = map_folders_in_sessions(work, folder_ids, move_ids, max_workers=2,
+                                          session_factory=self.session_factory)
+        self.assertEqual([path for path, _ in results], list(folder_ids))
+        for folder_path, (resolved_path, shared_paths, thread_id) in results:
+            self.assertEqual(resolved_path, folder_path)
+            self.assertEqual(shared_paths, [r'\\account\Inbox\moved'])
+            self.assertNotEqual(thread_id, threading.get_ident())
+        self.assertEqual(len(self.sessions), 2)
+        self.assertEqual(len(set(self.sessions)), 2)
+
+    def test_error_raised_after_all_folders_finish(self):
+        finished = []
+
+        def work(folder_path, ol_folder, shared_folders):
+            if folder_path.endswith('slow'):
+                raise RuntimeError('folder failed')
+            time.sleep(0.05)
+            finished.append(folder_path)
+
+        with self.assertRaises(RuntimeError):
+            map_folders_in_sessions(work, get_folder_ids(self.folders), max_workers=2,
+                                    session_factory=self.session_factory)
+        self.assertEqual(len(finished), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+"""Tests for the trie guided folder search, using the stand-in Outlook backend."""
+
+import unittest
+
+from helpers.folder_trie import FolderPathTrie, split_folder_path
+from helpers.outlook_helpers import map_folder_structure_to_flat_dict
+from helpers.stand_in_outlook import StandInOutlook
+
+
+class TestFolderTrie(unittest.TestCase):
+
+    def setUp(self):
+        self.store = StandInOutlook().add_store('account')
+        for folder_path in (r'\\account\Inbox\Foam\old', r'\\account\Inbox\NBE', r'\\account\Inbox\Inbox copy',
+                            r'\\account\Archive\Foam', r'\\account\Sent Items'):
+            self.store.add_folder_path(folder_path)
+        self.root = self.store.GetRootFolder()
+        self.listed = []
+        folders_class = type(self.root.Folders)
+        original_iter = folders_class.__iter__
+
+        def listing_iter(folders):
+            self.listed.append(folders._parent.FolderPath)
+            return original_iter(folders)
+
+        folders_class.__iter__ = listing_iter
+        self.addCleanup(setattr, folders_class, '__iter__', original_iter)
+
+    def test_trie_nodes(self):
+        trie = FolderPathTrie([r'\\account\Inbox\Foam', r'\\account\Inbox\NBE'])
+        self.assertEqual(split_folder_path(r'\\account\Inbox'), ['account', 'Inbox'])
+        self.assertEqual(set(trie.node_for(r'\\account\Inbox').children), {'Foam', 'NBE'})
+        self.assertTrue(trie.node_for(r'\\account\Inbox\NBE').is_target)
+        self.assertFalse(trie.node_for(r'\\account\Inbox').is_target)
+        self.assertIsNone(trie.node_for(r'\\account\Inbox copy'))  # a path that only starts like a target's
+        self.assertIsNone(trie.node_for(r'\\account\Archive'))
+
+    def test_search_only_target_branches(self):
+        found = map_folder_structure_to_flat_dict(self.root, [r'\\account\Inbox\NBE', r'\\account\Inbox\Foam\old'])
+        self.assertIn(r'\\account\Inbox\Foam\old', found)
+        self.assertIn(r'\\account\Inbox\NBE', found)
+        self.assertNotIn(r'\\account\Archive', self.listed)
+        self.assertNotIn(r'\\account\Inbox\Inbox copy', self.listed)
+        self.assertNotIn(r'\\account\Inbox\NBE', self.listed)  # a target with no targets in it
+
+    def test_search_stops_when_all_found(self):
+        found = map_folder_structure_to_flat_dict(self.root, [r'\\account\Inbox'])
+        self.assertEqual(self.listed, [r'\\account'])
+        self.assertIn(r'\\account\Inbox', found)
+
+    def test_missing_target(self):
+        found = map_folder_structure_to_flat_dict(self.root, [r'\\account\Inbox\Missing', r'\\other\Inbox'])
+        self.assertNotIn(r'\\account\Inbox\Missing', found)
+        self.assertEqual(self.listed, [r'\\account', r'\\account\Inbox'])
+        self.assertEqual(map_folder_structure_to_flat_dict(self.root, []), {'error_folders': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""Tests for holding Outlook folders and items open under a budget, using the stand-in Outlook backend."""
+
+import datetime
+import unittest
+
+from helpers.handle_budget import HandleBudget, HandleRef
+from helpers.item_handles import ItemResolver
+from helpers.outlook_helpers import find_folders_in_outlook, set_follow_up_on_list
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+
+
+class TestHandleBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.outlook = StandInOutlook()
+        store = self.outlook.add_store('account')
+        self.folder_paths = [rf'\\account\Inbox\folder {n}' for n in range(5)]
+        for folder_path in self.folder_paths:
+            store.add_folder_path(folder_path)
+        self.inbox = store.add_folder_path(r'\\account\Inbox')
+        received = datetime.datetime(2023, 5, 1, 9, tzinfo=datetime.timezone.utc)
+        self.items = [self.inbox.deliver(StandInMailItem(f'mail {n}', received)) for n in range(3)]
+
+    def test_found_folders_held_under_budget(self):
+        budget = HandleBudget(self.outlook, max_open_folders=2)
+        found = find_folders_in_outlook(self.outlook, 'account', self.folder_paths, budget=budget)
+        self.assertEqual(budget.open_counts()['folder'], 2)
+        self.assertLessEqual(budget.stats['folder']['peak_open'], 2)
+        for folder_path in self.folder_paths:
+            folder = found[folder_path]
+            self.assertIsInstance(folder, HandleRef)
+            self.assertEqual(folder.FolderPath, folder_path)
+            self.assertEqual(folder.Items.Count, 0)  # re-opened from its IDs where it was released
+        self.assertGreater(budget.stats['folder']['reopened'], 0)
+        self.assertEqual(budget.open_counts()['folder'], 2)
+
+    def test_ref_passed_as_move_destination(self):
+        budget = HandleBudget(self.outlook, max_open_folders=1)
+        destination = budget.track(self.outlook.GetFolderFromID(self.inbox.Folders.Item(1).EntryID), 'folder')
+        budget.release(destination)
+        self.items[0].Move(destination)
+        self.assertEqual(self.inbox.Folders.Item(1).Items.Count, 1)
+
+    def test_items_kept_open_least_recently_used_released(self):
+        budget = HandleBudget(self.outlook, max_open_items=2)
+        resolver = ItemResolver(self.outlook, budget)
+        item_ids = [(item.EntryID, self.inbox.StoreID) for item in self.items]
+        set_follow_up_on_list(resolver.iter_items(item_ids))
+        set_follow_up_on_list(resolver.iter_items(item_ids[1:]), 'Reply', overwrite_if_set=True)
+        self.assertEqual([item.FlagRequest for item in self.items], ['Follow up', 'Reply', 'Reply'])
+        self.assertEqual(budget.stats['item'], {'opened': 3, 'reopened': 0, 'released': 1, 'peak_open': 2})
+        set_follow_up_on_list(resolver.iter_items(item_ids[:1]), 'Reply', overwrite_if_set=True)
+        self.assertEqual(budget.stats['item']['reopened'], 1)
+        budget.release_all()
+        self.assertEqual(budget.open_counts(), {'folder': 0, 'item': 0})
+
+    def test_budget_must_allow_an_open_object(self):
+        with self.assertRaises(ValueError):
+            HandleBudget(self.outlook, max_open_items=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
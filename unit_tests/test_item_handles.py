@@ -0,0 +1,65 @@
+"""Tests for carrying mail item IDs in the frames and opening the items just in time, using the stand-in Outlook."""
+
+import datetime
+import unittest
+
+from helpers.item_handles import ItemResolver, get_item_ids
+from helpers.outlook_helpers import move_mail_items_to_folder
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import process_mail_items, sort_mail_items_to_dataframes
+from tasks.mark_priority_emails import apply_priority_customer_category
+
+
+class TestItemHandles(unittest.TestCase):
+
+    def setUp(self):
+        self.outlook = StandInOutlook()
+        store = self.outlook.add_store('account')
+        self.inbox = store.add_folder_path(r'\\account\Inbox')
+        self.moved = store.add_folder_path(r'\\account\Inbox\Moved')
+        received = datetime.datetime(2023, 5, 1, 9, tzinfo=datetime.timezone.utc)
+        for n in range(3):
+            self.inbox.deliver(StandInMailItem(f'CofC 10{n} 1234-56 SO 777 LOT 2301010{n} company-a inc 12345 BP 1',
+                                               received + datetime.timedelta(minutes=n)))
+        self.inbox.deliver(StandInMailItem('Lunch order', received))
+        results, other_emails = process_mail_items(self.inbox.Items, store_id=self.inbox.StoreID)
+        self.cert_df = sort_mail_items_to_dataframes(results)
+        self.other_df = sort_mail_items_to_dataframes(other_emails)
+        self.resolver = ItemResolver(self.inbox.Session)
+
+    def test_frames_hold_ids_not_items(self):
+        self.assertNotIn('o_item', self.cert_df.columns)
+        for value in self.cert_df.to_numpy().ravel():
+            self.assertNotIsInstance(value, StandInMailItem)
+        item_ids = get_item_ids(self.cert_df)
+        self.assertEqual(len(item_ids), 3)
+        self.assertEqual({store_id for _, store_id in item_ids}, {self.inbox.StoreID})
+        self.assertEqual(self.outlook.GetItemFromID(*item_ids[0]).Subject, self.cert_df['subject'].iloc[0])
+        self.assertEqual(get_item_ids(self.other_df.iloc[:0]), [])
+
+    def test_items_opened_one_at_a_time(self):
+        apply_priority_customer_category(self.cert_df, self.resolver, follow_up=True)
+        self.assertEqual([item.FlagRequest for item in self.inbox.Items], ['Follow up'] * 3 + [''])
+        self.assertEqual(self.resolver.counts(), {'items_opened': 3, 'peak_open_items': 1})
+        self.assertEqual(self.resolver.open_count, 0)
+
+    def test_move_opened_items(self):
+        move_mail_items_to_folder(self.resolver.iter_items(get_item_ids(self.cert_df)), self.moved)
+        self.assertEqual(self.moved.Items.Count, 3)
+        self.assertEqual(self.inbox.Items.Count, 1)
+        self.assertEqual(self.resolver.peak_open, 1)
+
+    def test_open_count_released_on_error(self):
+        item_id = get_item_ids(self.other_df)[0]
+        with self.assertRaises(ValueError):
+            with self.resolver.open(item_id):
+                raise ValueError('task failed')
+        self.assertEqual(self.resolver.open_count, 0)
+        with self.assertRaises(KeyError):
+            with self.resolver.open(('missing', self.inbox.StoreID)):
+                pass
+        self.assertEqual(self.resolver.opened, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests for reading a folder's mail items in DataFrame chunks, using the stand-in Outlook backend."""
+
+import datetime
+import unittest
+
+import pandas as pd
+
+from helpers.com_tracing import ComTracer
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import concat_mail_frames, get_process_folders_dfs, iter_mail_frames, \
+    process_mail_items, sort_mail_items_to_dataframes
+
+
+class TestMailIngestion(unittest.TestCase):
+
+    def setUp(self):
+        outlook = StandInOutlook()
+        self.inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        received = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        for n in range(25):
+            self.inbox.deliver(StandInMailItem(f'CofC {100 + n} 1234-56 SO 7{n % 3} LOT 2301010{n} customer {n % 4} '
+                                               f'1234{n % 4} BP 1', received - datetime.timedelta(minutes=n)))
+            if n % 5 == 0:
+                self.inbox.deliver(StandInMailItem(f'Certificate for Delivery:{n:016d}', received))
+
+    def test_chunks_bounded_and_complete(self):
+        chunks = list(iter_mail_frames(self.inbox.Items, chunk_size=10, store_id=self.inbox.StoreID))
+        self.assertEqual([len(cert) + len(other) for cert, other in chunks], [10, 10, 10])
+        cert_df = concat_mail_frames([cert for cert, _ in chunks])
+        other_df = concat_mail_frames([other for _, other in chunks if not other.empty])
+
+        results, other_emails = process_mail_items(self.inbox.Items, store_id=self.inbox.StoreID)
+        pd.testing.assert_frame_equal(cert_df, sort_mail_items_to_dataframes(results))
+        pd.testing.assert_frame_equal(other_df, sort_mail_items_to_dataframes(other_emails))
+        self.assertEqual(str(cert_df['customer'].dtype), 'category')
+
+    def test_items_paged_with_get_first_get_next(self):
+        tracer = ComTracer(enabled=True)
+        items = tracer.wrap(self.inbox).Items
+        for _ in iter_mail_frames(items, chunk_size=7):
+            pass
+        calls = {row['member']: row['calls'] for row in tracer.summary()}
+        self.assertEqual(calls['GetFirst'], 1)
+        self.assertEqual(calls['GetNext'], 30)  # one per item after the first, and the end of the collection
+        self.assertNotIn('__iter__', calls)
+
+    def test_empty_collection(self):
+        self.assertEqual(list(iter_mail_frames(self.inbox.Folders.Add('Empty').Items, chunk_size=10)), [])
+
+    def test_folder_frames_from_chunks(self):
+        (folder_path, cert_df, other_df), = get_process_folders_dfs([self.inbox.FolderPath],
+                                                                    {self.inbox.FolderPath: self.inbox})
+        self.assertEqual((len(cert_df), len(other_df)), (25, 5))
+        self.assertTrue(cert_df['received_time'].is_monotonic_increasing)
+        self.assertEqual(list(cert_df['lot8'].iloc[:2]), ['23010102', '23010102'])
+
+    def test_batch_frames_from_its_items_only(self):
+        received = datetime.datetime.now(datetime.timezone.utc)
+        new_cert = self.inbox.deliver(StandInMailItem('CofC 300 1234-56 SO 70 LOT 23010199 customer 0 12340 BP 1',
+                                                      received))
+        new_report = self.inbox.deliver(StandInMailItem(f'Certificate for Delivery:{99:016d}', received))
+        batch = {self.inbox.FolderPath: [new_cert.EntryID, new_report.EntryID, 'a moved item']}
+        (_, cert_df, other_df), = get_process_folders_dfs([self.inbox.FolderPath], {self.inbox.FolderPath: self.inbox},
+                                                          entry_ids=batch)
+        self.assertEqual(list(cert_df['entry_id']), [new_cert.EntryID])
+        self.assertEqual(list(other_df['entry_id']), [new_report.EntryID])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Tests for the mail frame column types."""
+
+import datetime
+import unittest
+
+import pandas as pd
+
+from helpers.mail_schema import MAIL_FRAME_SCHEMA, apply_mail_schema
+from tasks.clean_foam_inbox import sort_mail_items_to_dataframes
+from tasks.mark_priority_emails import get_priority_customer_rows
+
+
+class TestMailSchema(unittest.TestCase):
+
+    def setUp(self):
+        received = datetime.datetime(2023, 5, 1, 9)
+        self.rows = [{'received_time': received - datetime.timedelta(minutes=n), 'subject': f'CofC {n}',
+                      'entry_id': f'{n:048X}', 'store_id': 'store', 'c_type': 'CofC', 'cert_number': str(100 + n),
+                      'product_number': '1234-56', 'so_number': '777', 'lot_number': f'2301010{n}',
+                      'customer': 'company-a inc' if n % 2 else 'other customer', 'c_number': '12345',
+                      'loc_number': '1'} for n in range(4)]
+
+    def test_schema_enforced_at_ingestion(self):
+        df = sort_mail_items_to_dataframes(self.rows)
+        for column, dtype in MAIL_FRAME_SCHEMA.items():
+            self.assertEqual(str(df[column].dtype), dtype, column)
+        self.assertEqual(list(df['cert_number']), ['103', '102', '101', '100'])  # sorted by received time
+        self.assertEqual(list(df['customer'].cat.categories), ['company-a inc', 'other customer'])
+
+    def test_categorical_columns_work_downstream(self):
+        df = sort_mail_items_to_dataframes(self.rows)
+        priority_rows = get_priority_customer_rows(df, {'highest': {'company-a inc': {}}})
+        self.assertEqual(sorted(priority_rows['cert_number']), ['101', '103'])
+        groups = df.groupby(['customer', 'so_number'], observed=True).size()
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(list(df['lot_number'].str[:8]), ['23010103', '23010102', '23010101', '23010100'])
+
+    def test_partial_and_empty_frames(self):
+        other_df = apply_mail_schema(pd.DataFrame(self.rows).loc[:, ['received_time', 'subject', 'entry_id']])
+        self.assertEqual(list(other_df.columns), ['received_time', 'subject', 'entry_id'])
+        self.assertEqual(str(other_df['subject'].dtype), 'string')
+        empty_df = apply_mail_schema(pd.DataFrame(columns=list(MAIL_FRAME_SCHEMA)))
+        self.assertTrue(empty_df.empty)
+        self.assertEqual(str(empty_df['received_time'].dtype), 'datetime64[ns]')
+
+    def test_bad_value_rejected(self):
+        self.rows[0]['received_time'] = 'not a date'
+        with self.assertRaises(ValueError):
+            sort_mail_items_to_dataframes(self.rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
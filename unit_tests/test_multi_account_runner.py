@@ -0,0 +1,67 @@
+"""Tests for sharding accounts across worker processes, with stand-in workers instead of main_process."""
+
+import multiprocessing
+import time
+import unittest
+from unittest import mock
+
+from helpers.watchdog import watchdog
+from multi_account_runner import account_worker, combine_run_reports, get_account_report_path, run_accounts
+
+
+def stand_in_worker(conn, acct):
+    """Report like main_process would, fail or hang, depending on the account's name."""
+    if acct['account_name'] == 'crashes':
+        raise RuntimeError('worker crashed')
+    if acct['account_name'] == 'hangs':
+        time.sleep(60)
+    conn.send(dict(account_name=acct['account_name'], ok=True, skipped=False, arrivals=2, work_seconds=0.5))
+    conn.close()
+
+
+class TestMultiAccountRunner(unittest.TestCase):
+
+    def test_failures_are_isolated(self):
+        accounts = [dict(account_name=name) for name in ('site_a', 'crashes', 'hangs', 'site_b')]
+        started = time.perf_counter()
+        reports = run_accounts(accounts, max_workers=4, account_timeout_seconds=2.0, worker=stand_in_worker)
+        self.assertLess(time.perf_counter() - started, 30)
+        self.assertEqual(list(reports), ['site_a', 'crashes', 'hangs', 'site_b'])
+        self.assertTrue(reports['site_a']['ok'])
+        self.assertTrue(reports['site_b']['ok'])
+        self.assertEqual(reports['crashes']['error'], 'worker process died')
+        self.assertEqual(reports['hangs']['error'], 'timed out')
+
+        combined = combine_run_reports(reports, 3.0)
+        self.assertFalse(combined['ok'])
+        self.assertIsNone(combined['arrivals'])
+        self.assertEqual(combined['work_seconds'], 0.5)
+
+    def test_more_accounts_than_workers(self):
+        accounts = [dict(account_name=f'site_{n}') for n in range(3)]
+        reports = run_accounts(accounts, max_workers=1, worker=stand_in_worker)
+        self.assertTrue(all(report['ok'] for report in reports.values()))
+        self.assertEqual(combine_run_reports(reports, 1.0)['arrivals'], 6)
+
+    def test_duplicate_account_names(self):
+        with self.assertRaises(ValueError):
+            run_accounts([dict(account_name='site'), dict(account_name='site')], worker=stand_in_worker)
+
+    def test_worker_does_not_kill_shared_outlook(self):
+        def run_main_process(outlook, acct):
+            self.assertIsNone(watchdog.on_timeout)  # a hung call waits for the account's timeout instead
+            return None, dict(account_name=acct['account_name'], ok=True)
+
+        conn, child_conn = multiprocessing.Pipe(duplex=False)
+        with mock.patch.object(watchdog, 'on_timeout', lambda reason: True), \
+                mock.patch('main_process.run_main_process', run_main_process):
+            account_worker(child_conn, dict(account_name='site_a'))
+        self.assertTrue(conn.recv()['ok'])
+
+    def test_account_report_path(self):
+        self.assertEqual(get_account_report_path('site_a', './logs/last_run_report.json'),
+                         './logs/last_run_report_site_a.json')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests for checking the NBE test results against their limits and the summary emails' out of limits category."""
+
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.nbe_summary_render import make_report
+from helpers.item_handles import ItemResolver
+from helpers.stand_in_outlook import StandInAttachment, StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import process_mail_items, sort_mail_items_to_dataframes
+from tasks.filing_test_reports.nbe_limit_checks import check_limits, out_of_limit_results, parse_result_numbers
+from tasks.filing_test_reports.nbe_report_emails import get_nbe_emails, process_nbe_test_reports
+
+
+def results_frame(rows):
+    return pd.DataFrame(rows, columns=['characteristic_col', 'unit_col', 'value_col', 'lower_limit_col',
+                                       'upper_limit_col', 'date_of_manufacture'], dtype='object')
+
+
+class TestNbeLimitChecks(unittest.TestCase):
+
+    def test_numbers(self):
+        cells = pd.Series(['50', '0,5', '< 5', '≥1.5', '-,25', '', None, 'n.a.', '50 µm', '0,05 mm', '5 N', '1 kg'])
+        units = pd.Series(['µm'] * len(cells))
+        np.testing.assert_allclose(parse_result_numbers(cells, units),
+                                   [50, 0.5, 5, 1.5, -0.25, np.nan, np.nan, np.nan, 50, 50, np.nan, np.nan])
+
+    def test_limits(self):
+        results_df = results_frame([
+            ('Thickness', 'µm', '120', '100', '150', '20230101'),  # in
+            ('Peel', 'N/25mm', '4,5', '5,0', '', '20230101'),  # below
+            ('Width', 'mm', '0,1 m', '', '< 90', '20230102'),  # above, 100 mm
+            ('Elongation', '%', '', '200', '', '20230102'),  # no value, not checked
+            ('Colour', '', 'blue', '', '', '20230102'),  # not a number
+            ('Weight', 'g/m²', '1 N', '10', '20', '20230102'),  # can't be converted
+        ])
+        checks = check_limits(results_df)
+        self.assertEqual(checks['below_lower'].tolist(), [False, True, False, False, False, False])
+        self.assertEqual(checks['above_upper'].tolist(), [False, False, True, False, False, False])
+        self.assertAlmostEqual(checks.loc[2, 'value'], 100.0)
+        failing = out_of_limit_results(results_df, checks)
+        self.assertEqual(failing['characteristic_col'].tolist(), ['Peel', 'Width'])
+
+
+class TestNbeSummaryCategories(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        outlook = StandInOutlook()
+        self.inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        for n in range(2):
+            self.inbox.deliver(StandInMailItem(f'Certificate for Delivery:000000000000000{n}',
+                                               attachments=[StandInAttachment(f'report{n}.pdf', f'{n}'.encode())]))
+        _, other_emails = process_mail_items(self.inbox.Items, store_id=self.inbox.StoreID)
+        self.nbe_emails = get_nbe_emails(sort_mail_items_to_dataframes(other_emails))
+        self.resolver = ItemResolver(outlook)
+        self.reports = [make_report(2, 3, seed=0), make_report(2, 3, seed=1)]
+        self.reports[1]['test_results']['results_df'].loc[1, 'value_col'] = '-1'
+
+    def parse(self, saved_report):
+        with open(saved_report[1]) as pf:
+            return self.reports[int(pf.read())]
+
+    def run_reports(self, limit_checks_enabled=True):
+        with mock.patch.dict('tasks.filing_test_reports.nbe_report_emails.NBE_PIPELINE_PARAMETERS',
+                             {'parse_workers': 0, 'max_in_flight': 2}), \
+                mock.patch.dict('tasks.filing_test_reports.nbe_report_emails.NBE_LIMIT_CHECK_PARAMETERS',
+                                {'enabled': limit_checks_enabled}), \
+                mock.patch('tasks.filing_test_reports.nbe_report_emails.parse_nbe_report', self.parse):
+            process_nbe_test_reports(self.temp_dir.name, self.nbe_emails, self.resolver)
+        return {item.Subject.split(' DN: ')[1][:16]: item.Categories for item in self.inbox.Items
+                if ' DN: ' in item.Subject}
+
+    def test_out_of_limits_summary_categorized(self):
+        self.assertEqual(self.run_reports(), {'0000000087654321': '', '0000000087654322': 'Red Category'})
+
+    def test_limit_checks_disabled(self):
+        self.assertEqual(self.run_reports(limit_checks_enabled=False), {'0000000087654321': '', '0000000087654322': ''})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Tests that the precompiled summary templates render the same HTML as DataFrame.to_html did."""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.nbe_summary_render import compose_with_to_html, make_report
+from tasks.filing_test_reports.nbe_summary_html import render_nbe_summary, render_table
+
+
+class TestNbeSummaryHtml(unittest.TestCase):
+
+    def assert_same_as_to_html(self, nbe_data):
+        self.assertEqual(render_nbe_summary(nbe_data), compose_with_to_html(nbe_data))
+
+    def test_multi_lot_report(self):
+        self.assert_same_as_to_html(make_report(n_lots=30, results_per_lot=4))
+
+    def test_escaped_and_missing_cells(self):
+        nbe_data = make_report(n_lots=2, results_per_lot=2)
+        nbe_data['lot_info']['judgement_nbe'] = None
+        nbe_data['lot_info']['customer_number_nbe'] = '<1234> & co'
+        results_df = nbe_data['test_results']['results_df']
+        results_df.iloc[0, 0] = 'Peel < 5 N & > 1 N'
+        results_df.iloc[1, 2] = None
+        results_df.iloc[2, 3] = np.nan
+        self.assert_same_as_to_html(nbe_data)
+
+    def test_report_without_results(self):
+        nbe_data = make_report(n_lots=1, results_per_lot=0)
+        self.assertTrue(nbe_data['test_results']['results_df'].empty)
+        self.assert_same_as_to_html(nbe_data)
+
+    def test_reports_one_after_another(self):
+        reports = [make_report(n_lots, 3, seed) for seed, n_lots in enumerate([1, 5, 12])]
+        self.assertEqual([render_nbe_summary(nbe_data) for nbe_data in reports],
+                         [compose_with_to_html(nbe_data) for nbe_data in reports])
+
+    def test_table(self):
+        df = pd.DataFrame({'a': ['1', 'x&y'], 'b <c>': ['', 'z']}, dtype='object')
+        self.assertEqual(render_table(df.columns, df.to_numpy()), df.to_html(index=False))
+        self.assertEqual(render_table(df.columns, df.to_numpy()[:0]), df.iloc[:0].to_html(index=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
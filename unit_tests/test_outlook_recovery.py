@@ -0,0 +1,88 @@
+"""Tests for probing Outlook until it's ready, with backoff, instead of sleeping fixed times."""
+
+import functools
+import random
+import unittest
+from unittest import mock
+
+from helpers.backoff import backoff_delays, wait_until_ready
+from helpers.com_compat import com_error
+from helpers.run_metrics import run_metrics
+from outlook_interface import OutlookSingleton
+
+
+class FakeClock:
+    """A clock that only moves when slept on."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def __call__(self):
+        return self.now
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_delays_double_up_to_max_with_jitter(self):
+        delays = backoff_delays(0.5, 4.0, jitter=0.0)
+        self.assertEqual([next(delays) for _ in range(6)], [0.5, 1.0, 2.0, 4.0, 4.0, 4.0])
+        jittered = backoff_delays(0.5, 4.0, jitter=0.5, rng=random.Random(0))
+        for delay, full_delay in zip(jittered, [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]):
+            self.assertTrue(full_delay / 2 <= delay <= full_delay)
+
+    def test_returns_as_soon_as_ready(self):
+        clock = FakeClock()
+        answers = iter([False, False, True])
+        result = wait_until_ready(lambda: next(answers), 30.0, 0.5, 5.0, jitter=0.0, sleep=clock.sleep, clock=clock)
+        self.assertEqual(result, (True, 3, 1.5))
+        self.assertEqual(clock.sleeps, [0.5, 1.0])
+
+    def test_gives_up_at_deadline(self):
+        clock = FakeClock()
+        result = wait_until_ready(lambda: False, 10.0, 1.0, 4.0, jitter=0.0, sleep=clock.sleep, clock=clock)
+        self.assertFalse(result.ready)
+        self.assertEqual(clock.sleeps, [1.0, 2.0, 4.0, 3.0])  # the last sleep is cut short to probe at the deadline
+        self.assertEqual((result.attempts, result.seconds), (5, 10.0))
+
+
+class TestOutlookRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.outlook = OutlookSingleton()
+        self.addCleanup(setattr, self.outlook, '_outlook', None)
+        run_metrics.reset()
+        self.addCleanup(run_metrics.reset)
+
+    def test_not_connected_waits_for_session(self):
+        session_errors = [com_error(-2147220995, 'not connected')] * 3
+        fake_outlook = mock.MagicMock()
+        type(fake_outlook).Session = mock.PropertyMock(side_effect=session_errors + [mock.DEFAULT])
+        self.outlook._outlook = fake_outlook
+        clock = FakeClock()
+        with mock.patch('outlook_interface.wait_until_ready', functools.partial(wait_until_ready, sleep=clock.sleep,
+                                                                                clock=clock)), \
+                mock.patch.object(OutlookSingleton, 'reset_outlook') as reset_outlook:
+            self.assertIs(self.outlook._get_outlook(), fake_outlook)
+        reset_outlook.assert_not_called()
+        self.assertEqual(len(clock.sleeps), 2)  # the Session error, then two failed probes and one that answers
+        recovery, = [span for span in run_metrics.spans if span['name'] == 'outlook_recovery']
+        self.assertEqual((recovery['reason'], recovery['ready'], recovery['attempts']), ('not_connected', True, 3))
+
+    def test_not_connected_past_deadline_restarts(self):
+        fake_outlook = mock.MagicMock()
+        type(fake_outlook).Session = mock.PropertyMock(side_effect=com_error(-2147220995, 'not connected'))
+        self.outlook._outlook = fake_outlook
+        with mock.patch.dict('outlook_interface.OUTLOOK_RECOVERY_PARAMETERS', {'deadline_seconds': 0.0}), \
+                mock.patch.object(OutlookSingleton, 'reset_outlook') as reset_outlook:
+            self.outlook._get_outlook()
+        reset_outlook.assert_called_once()
+        self.assertFalse(run_metrics.spans[0]['ready'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for the ledger of completed actions and the NBE report summaries resuming from it."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from helpers.item_handles import ItemResolver
+from helpers.processed_ledger import ProcessedLedger, file_hash
+from helpers.stand_in_outlook import StandInAttachment, StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import process_mail_items, sort_mail_items_to_dataframes
+from tasks.filing_test_reports.nbe_report_emails import get_nbe_emails, process_nbe_test_reports
+
+
+class TestProcessedLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_path = os.path.join(self.temp_dir.name, 'account', 'processed_ledger.sqlite3')
+        self.now = 1000000.0
+        self.ledger = self.open_ledger()
+
+    def open_ledger(self, retention_days=None):
+        ledger = ProcessedLedger(self.db_path, retention_days, clock=lambda: self.now)
+        self.addCleanup(ledger.close)
+        return ledger
+
+    def test_records_kept_between_runs(self):
+        self.ledger.record('id1', 'pdf_saved', 'hash1', 'report.pdf')
+        self.ledger.record('id2', 'summary_added', 'hash1')
+        self.ledger.close()
+        ledger = self.open_ledger()
+        self.assertEqual(ledger.get('id1', 'pdf_saved'), ('hash1', 'report.pdf'))
+        self.assertIsNone(ledger.get('id1', 'summary_added'))
+        self.assertEqual(ledger.completed([f'id{n}' for n in range(1000)], 'summary_added'), {'id2'})
+        self.assertTrue(ledger.has_file_hash('hash1', 'summary_added'))
+        self.assertFalse(ledger.has_file_hash('hash2', 'summary_added'))
+
+    def test_old_records_pruned(self):
+        self.ledger.record('old', 'summary_added')
+        self.now += 2 * 86400.0
+        self.ledger.record('new', 'summary_added')
+        self.assertEqual(self.open_ledger(retention_days=1.0).completed(['old', 'new'], 'summary_added'), {'new'})
+
+
+class TestNbeReportsResume(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.ledger = ProcessedLedger(os.path.join(self.temp_dir.name, 'processed_ledger.sqlite3'))
+        self.addCleanup(self.ledger.close)
+        self.outlook = StandInOutlook()
+        self.inbox = self.outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        self.reports = [self.inbox.deliver(StandInMailItem(f'Certificate for Delivery:000000000000000{n}',
+                                                           attachments=[StandInAttachment(f'report{n}.pdf', data)]))
+                        for n, data in enumerate([b'report a', b'report b', b'report a'])]
+        self.opened = []
+        self.resolver = ItemResolver(self.outlook)
+        original_open = self.resolver.open
+
+        def counting_open(item_id):
+            self.opened.append(item_id[0])
+            return original_open(item_id)
+
+        self.resolver.open = counting_open
+
+    def run_reports(self, fail_summaries=False):
+        """A run of the NBE report tasks; the summaries are stand-ins for the parsed PDFs'."""
+        def summarize(nbe_data):
+            if fail_summaries:
+                raise RuntimeError('the summary could not be composed')
+            return f'Summary of {os.path.basename(nbe_data["save_loc"])}', '<html></html>'
+
+        _, other_emails = process_mail_items(self.inbox.Items, store_id=self.inbox.StoreID)
+        nbe_emails = get_nbe_emails(sort_mail_items_to_dataframes(other_emails), self.ledger)
+        with mock.patch.dict('tasks.filing_test_reports.nbe_report_emails.NBE_PIPELINE_PARAMETERS',
+                             {'parse_workers': 0, 'max_in_flight': 4}), \
+                mock.patch.dict('tasks.filing_test_reports.nbe_report_emails.NBE_LIMIT_CHECK_PARAMETERS',
+                                {'enabled': False}), \
+                mock.patch('tasks.filing_test_reports.nbe_report_emails.parse_nbe_report',
+                           lambda saved_report: {'save_loc': saved_report[1]}), \
+                mock.patch('tasks.filing_test_reports.nbe_report_emails.compose_nbe_summary', summarize):
+            process_nbe_test_reports(self.temp_dir.name, nbe_emails, self.resolver, self.ledger)
+        return nbe_emails
+
+    def summaries(self):
+        return sorted(item.Subject for item in self.inbox.Items if item.Subject.startswith('Summary'))
+
+    def test_each_report_summarized_once(self):
+        self.assertEqual(len(self.run_reports()), 3)
+        self.assertEqual(self.summaries(), ['Summary of report0.pdf', 'Summary of report1.pdf'])  # report2 = report0
+        self.assertEqual(self.ledger.get(self.reports[2].EntryID, 'summary_added')[1], 'duplicate')
+        self.opened.clear()
+        self.assertEqual(len(self.run_reports()), 0)
+        self.assertEqual(self.opened, [])
+        self.assertEqual(len(self.summaries()), 2)
+
+    def test_resume_after_failed_run(self):
+        self.run_reports(fail_summaries=True)  # the PDFs were saved, but no summary was added
+        self.assertEqual(self.summaries(), [])
+        saved_path = os.path.join(self.temp_dir.name, 'report1.pdf')
+        self.assertEqual(self.ledger.get(self.reports[1].EntryID, 'pdf_saved'), (file_hash(saved_path), saved_path))
+        with open(os.path.join(self.temp_dir.name, 'report0.pdf'), 'wb') as rf:
+            rf.write(b'damaged')
+        self.opened.clear()
+        self.run_reports()
+        # only the damaged PDF is saved again; report2's PDF is report0's, so only the others get a summary
+        self.assertEqual(self.opened, [self.reports[0].EntryID, self.reports[0].EntryID, self.reports[1].EntryID])
+        self.assertEqual(self.summaries(), ['Summary of report0.pdf', 'Summary of report1.pdf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
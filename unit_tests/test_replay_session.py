@@ -0,0 +1,95 @@
+"""Tests for replaying a recorded main_process run, using the stand-in Outlook backend for the recording."""
+
+import contextlib
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import main_process
+from helpers.com_tracing import ComTracer
+from helpers.processed_ledger import ProcessedLedger
+from helpers.stand_in_outlook import StandInAttachment, StandInMailItem, StandInOutlook
+from helpers.watchdog import watchdog
+from replay_session import replay_main_process
+
+KEY_COLUMNS = ['product_number', 'so_number', 'lot8', 'c_number']
+
+
+class RecordingOutlook:
+    """Stands in for OutlookSingleton, handing out a traced stand-in session."""
+
+    def __init__(self, outlook: StandInOutlook, tracer: ComTracer):
+        self.outlook = outlook
+        self.tracer = tracer
+
+    def get_outlook_folders(self):
+        return self.tracer.wrap(self.outlook).GetNamespace('MAPI')
+
+    @contextlib.contextmanager
+    def thread_session(self):
+        yield self.get_outlook_folders()
+
+
+class TestReplaySession(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.state_dir = os.path.join(self.temp_dir.name, 'state')  # the account's own state
+        self.save_dir = os.path.join(self.temp_dir.name, 'local_files')  # and saved attachments
+        os.makedirs(self.save_dir)
+        for patch in [mock.patch('main_process.STATE_DIR_PATH', self.state_dir),
+                      mock.patch.dict('main_process.PROCESSED_LEDGER_PARAMETERS', {'enabled': True}),
+                      mock.patch('tasks.clean_foam_inbox.dedupe_columns', KEY_COLUMNS),
+                      mock.patch('tasks.clean_foam_inbox.dedupe_cnums', ('12341',))]:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        outlook = StandInOutlook()
+        store = outlook.add_store('account')
+        inbox = store.add_folder_path(r'\\account\Inbox')
+        self.moved = store.add_folder_path(r'\\account\Inbox\Foam Duplicate Lots')
+        received = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        for n in range(6):  # two lots of three certs; two of each lot are duplicates
+            inbox.deliver(StandInMailItem(f'CofC {100 + n} 1234-56 SO 70 LOT 2301010{n % 2} customer 1 12341 BP 1',
+                                          received - datetime.timedelta(minutes=n)))
+        inbox.deliver(StandInMailItem(f'Certificate for Delivery:{5:016d}', received,
+                                      attachments=[StandInAttachment('report.pdf', b'pdf')]))
+        self.acct = dict(account_name='account', inbox_folders=[inbox.FolderPath],
+                         target_folder_path=self.moved.FolderPath, local_save_folder_path=self.save_dir)
+
+        self.trace_path = os.path.join(self.temp_dir.name, 'outlook_session_account.trace.jsonl.gz')
+        tracer = ComTracer(enabled=True)
+        recording = RecordingOutlook(outlook, tracer)
+        tracer.start_recording(self.trace_path)
+        try:
+            found_folders, inbox_folders = main_process.get_process_ol_folders(recording, self.acct)
+            main_process.main_process_function(found_folders, inbox_folders, acct=self.acct,
+                                               session_factory=recording.thread_session)
+        finally:
+            tracer.stop_recording()
+        os.remove(os.path.join(self.save_dir, 'report.pdf'))  # saved by the recorded run
+
+    def test_replay_repeatable_and_leaves_state_alone(self):
+        self.assertEqual(self.moved.Items.Count, 4)
+        watchdog.timeouts.append(dict(name='task_graph', seconds=1.0, thread='MainThread', killed=False))
+        on_timeout = watchdog.on_timeout
+        for _ in range(2):  # the recorded run's ledger doesn't make the replays skip its work
+            with mock.patch('main_process.ProcessedLedger', wraps=ProcessedLedger) as ledger:
+                replay_result = replay_main_process(self.trace_path, self.acct)
+            ledger_path = ledger.call_args.args[0]
+            self.assertFalse(ledger_path.startswith(self.state_dir))
+            self.assertFalse(os.path.exists(ledger_path))  # removed with the replay's temp dir
+            self.assertEqual(replay_result['stages']['dedupe_moves']['items'], 4)
+            self.assertEqual(replay_result['stages']['nbe_attachments']['items'], 1)
+            self.assertFalse(replay_result['unmatched'])
+            self.assertFalse(watchdog.timeouts)
+        self.assertIs(watchdog.on_timeout, on_timeout)
+        self.assertEqual(os.listdir(self.save_dir), [])
+        self.assertEqual(self.moved.Items.Count, 4)  # the moves weren't applied
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for the Items.Restrict filter builder, evaluated by the stand-in Outlook backend."""
+
+import datetime
+import os
+import time
+import unittest
+from unittest import mock
+
+from helpers.restrict_filter import Comparison, IsNull, Like, Not, all_of, any_of, flag_not, parse_restriction, \
+    received_since, sender_in, subject_starts_with, to_restriction
+from helpers.stand_in_outlook import StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import build_mail_filter, get_process_folders_dfs
+
+NOW = datetime.datetime(2023, 5, 10, 14, 30)
+CERT = 'CofC 100 1234-56 SO 70 LOT 23010100 customer 12340 BP 1'
+
+
+class TestRestrictFilter(unittest.TestCase):
+
+    def setUp(self):
+        outlook = StandInOutlook()
+        self.inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        self.now = datetime.datetime.now()
+        for subject, days_ago, flag, sender in ((CERT, 1, '', 'certs@example.com'),
+                                                ('RE: ' + CERT, 2, '', 'certs@example.com'),
+                                                (CERT, 1, 'Follow up', 'certs@example.com'),
+                                                (CERT, 9, '', 'certs@example.com'),
+                                                ('Certificate for Delivery:0000000000000001', 0, '', 'nbe@example.com'),
+                                                ('Lunch order', 0, '', 'cafe@example.com')):
+            self.inbox.deliver(StandInMailItem(subject, self.now - datetime.timedelta(days=days_ago), flag_request=flag,
+                                               sender_email_address=sender))
+
+    def restricted(self, clause):
+        """The (subject, days ago) of the inbox items that pass the filter."""
+        items = self.inbox.Items.Restrict(to_restriction(clause))
+        return sorted((item.Subject, (self.now - item.ReceivedTime).days) for item in items)
+
+    def test_dasl_round_trip(self):
+        clause = all_of(flag_not('Follow up'), received_since(NOW), subject_starts_with(["O'Brien", 'CofC'], ['RE: ']),
+                        Not(IsNull('SenderEmailAddress')))
+        restriction = to_restriction(clause)
+        self.assertTrue(restriction.startswith('@SQL=(("urn:schemas:httpmail:messageflag" IS NULL) OR '))
+        utc_now = NOW.astimezone(datetime.timezone.utc).strftime('%m/%d/%Y %I:%M %p')
+        self.assertIn(f'"urn:schemas:httpmail:datereceived" >= \'{utc_now}\'', restriction)
+        self.assertIn("LIKE 'O''Brien%'", restriction)
+        self.assertEqual(parse_restriction(restriction), clause)
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), 'needs time.tzset to set the local time zone')
+    def test_dates_compared_in_utc(self):
+        old_tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'EST+05EDT,M3.2.0,M11.1.0'
+        time.tzset()
+
+        def restore_tz():
+            if old_tz is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = old_tz
+            time.tzset()
+
+        self.addCleanup(restore_tz)
+        since = received_since(datetime.datetime(2023, 5, 5))  # local midnight, EDT
+        self.assertIn("'05/05/2023 04:00 AM'", to_restriction(since))
+        self.assertEqual(parse_restriction(to_restriction(since)), since)
+        self.assertTrue(since.matches(StandInMailItem(CERT, datetime.datetime(2023, 5, 5, 0, 30))))
+        self.assertFalse(since.matches(StandInMailItem(CERT, datetime.datetime(2023, 5, 4, 23, 30))))
+
+    def test_unsupported_restriction(self):
+        for restriction in ('[Subject] = \'x\'', '@SQL="urn:schemas:httpmail:importance" = 1',
+                            '@SQL=("urn:schemas:httpmail:subject" = \'x\''):
+            with self.assertRaises(ValueError):
+                parse_restriction(restriction)
+
+    def test_stand_in_evaluates_filter(self):
+        self.assertEqual(len(self.restricted(flag_not('Follow up'))), 5)
+        self.assertEqual(self.restricted(all_of(received_since(self.now - datetime.timedelta(days=1, minutes=1)),
+                                                subject_starts_with(['CofC', 'Certificate for Delivery:']))),
+                         [('Certificate for Delivery:0000000000000001', 0), (CERT, 1), (CERT, 1)])
+        self.assertEqual(self.restricted(any_of(sender_in(['CAFE@example.com']), Like('Subject', 'RE: %'))),
+                         [('Lunch order', 0), ('RE: ' + CERT, 2)])
+        self.assertEqual(self.restricted(Comparison('FlagRequest', '=', 'follow up')), [(CERT, 1)])
+
+    def test_empty_predicates_left_out(self):
+        self.assertIsNone(subject_starts_with([]))
+        self.assertIsNone(sender_in([]))
+        self.assertEqual(all_of(flag_not('Follow up'), None), flag_not('Follow up'))
+        with self.assertRaises(ValueError):
+            all_of(None)
+
+    def test_folder_fetched_with_one_restriction(self):
+        with mock.patch('tasks.clean_foam_inbox.ON_DEV_NODE', False):
+            self.assertEqual(build_mail_filter(NOW).clauses[1], received_since(datetime.datetime(2023, 5, 5)))
+            items_class = type(self.inbox.Items)
+            restrict_patch = mock.patch.object(items_class, 'Restrict', autospec=True, side_effect=items_class.Restrict)
+            with restrict_patch as restrict:
+                (_, cert_df, other_df), = get_process_folders_dfs([self.inbox.FolderPath],
+                                                                  {self.inbox.FolderPath: self.inbox})
+        restrict.assert_called_once()
+        self.assertEqual(len(cert_df), 2)  # not the flagged one or the one from before the window
+        self.assertEqual(sorted(other_df['subject']), ['Certificate for Delivery:0000000000000001', 'Lunch order'])
+
+    def test_other_emails_not_restricted_to_cert_subjects(self):
+        with mock.patch('tasks.clean_foam_inbox.ON_DEV_NODE', False):
+            (_, cert_df, other_df), = get_process_folders_dfs([self.inbox.FolderPath],
+                                                              {self.inbox.FolderPath: self.inbox})
+            lunch_order, = [item for item in self.inbox.Items if item.Subject == 'Lunch order']
+            self.assertTrue(build_mail_filter().matches(lunch_order))  # nor are an event-driven batch's new items
+        self.assertIn('Lunch order', set(other_df['subject']))
+        self.assertNotIn('Lunch order', set(cert_df['subject']))
+
+
+if __name__ == '__main__':
+    unittest.main()
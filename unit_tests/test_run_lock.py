@@ -0,0 +1,120 @@
+"""Tests for the run lock shared between processes and the coalescing of ticks during a run."""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import event_driven
+import main_process
+from helpers.run_lock import RunCoalescer, RunLock, is_process_alive
+
+
+class TestRunLock(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.lock_path = os.path.join(self.temp_dir.name, 'account', 'run.lock')
+
+    def write_lock(self, **owner):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'w') as lf:
+            json.dump(owner, lf)
+
+    def test_one_holder_at_a_time(self):
+        first, second = RunLock(self.lock_path), RunLock(self.lock_path, poll_seconds=0.01)
+        self.assertTrue(first.acquire())
+        self.assertEqual(first.owner()['pid'], os.getpid())
+        self.assertFalse(second.acquire(wait_seconds=0.05))
+        self.assertEqual(second.stats['skipped'], 1)
+        self.assertGreaterEqual(second.stats['wait_seconds'], 0.05)
+        second.release()  # not held, so the first's lock stays
+        self.assertTrue(os.path.exists(self.lock_path))
+        first.release()
+        self.assertIsNone(first.owner())
+        self.assertTrue(second.acquire())
+        second.release()
+
+    def test_lock_of_dead_process_taken_over(self):
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        self.assertFalse(is_process_alive(dead.pid))
+        self.write_lock(pid=dead.pid, host=socket.gethostname(), started=time.time())
+        run_lock = RunLock(self.lock_path)
+        self.assertTrue(run_lock.acquire())
+        self.assertEqual(run_lock.stats['stale_taken_over'], 1)
+        run_lock.release()
+
+    def test_old_lock_taken_over(self):
+        self.write_lock(pid=os.getpid(), host='another host', started=1000.0)
+        self.assertFalse(RunLock(self.lock_path, stale_seconds=60.0, clock=lambda: 1030.0).acquire())
+        self.assertTrue(RunLock(self.lock_path, stale_seconds=60.0, clock=lambda: 1090.0).acquire())
+
+    def test_ticks_during_run_coalesced(self):
+        coalescer = RunCoalescer()
+        self.assertTrue(coalescer.start_tick())
+        self.assertFalse(coalescer.start_tick())
+        self.assertFalse(coalescer.start_tick())
+        self.assertTrue(coalescer.finish_run())  # one follow-up run for both ticks
+        self.assertFalse(coalescer.finish_run())
+        self.assertTrue(coalescer.start_tick())
+        self.assertEqual(coalescer.stats, dict(runs=3, coalesced_ticks=2, follow_up_runs=1))
+
+    def test_run_skipped_while_locked(self):
+        acct = dict(account_name='account', inbox_folders=[r'\\account\Inbox'])
+        with mock.patch('main_process.STATE_DIR_PATH', self.temp_dir.name), \
+                mock.patch.dict('main_process.RUN_LOCK_PARAMETERS', {'wait_seconds': 0.0}), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}), \
+                mock.patch('main_process.main_process_function') as main_process_function:
+            other_run = main_process.get_run_lock('account')
+            self.assertTrue(other_run.acquire())
+            found_folders, run_report = main_process.run_main_process(mock.MagicMock(), {'folder': 'handle'}, acct)
+            other_run.release()
+        main_process_function.assert_not_called()
+        self.assertEqual(found_folders, {'folder': 'handle'})
+        self.assertTrue(run_report['skipped'] and run_report['lock_skipped'])
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir.name, 'account')))
+
+    def test_lock_released_when_probe_skips_run(self):
+        acct = dict(account_name='account', inbox_folders=[r'\\account\Inbox'])
+        probe = dict(changed_folders=[], arrivals=0, fingerprints={})
+        with mock.patch('main_process.STATE_DIR_PATH', self.temp_dir.name), \
+                mock.patch.dict('main_process.RUN_LOCK_PARAMETERS', {'wait_seconds': 0.0}), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}), \
+                mock.patch('main_process.is_skip_allowed', return_value=True), \
+                mock.patch('main_process.probe_folder_changes', return_value=probe), \
+                mock.patch('main_process.main_process_function') as main_process_function:
+            for _ in range(2):  # the second run isn't blocked by the first's lock
+                _, run_report = main_process.run_main_process(mock.MagicMock(), {'folder': 'handle'}, acct)
+                self.assertTrue(run_report['skipped'])
+                self.assertFalse(run_report['lock_skipped'])
+            self.assertIsNone(main_process.get_run_lock('account').owner())
+        main_process_function.assert_not_called()
+
+    def test_event_batch_holds_lock(self):
+        acct = dict(account_name='account', inbox_folders=[r'\\account\Inbox'])
+        batch = {r'\\account\Inbox': ['entry id']}
+        with mock.patch('main_process.STATE_DIR_PATH', self.temp_dir.name), \
+                mock.patch.dict('main_process.RUN_LOCK_PARAMETERS', {'wait_seconds': 0.0}), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}), \
+                mock.patch('main_process.main_process_function') as main_process_function:
+            other_run = main_process.get_run_lock('account')
+            self.assertTrue(other_run.acquire())
+            event_driven.process_batch_with_main_tasks(mock.MagicMock(), {}, batch, acct)
+            main_process_function.assert_not_called()  # skipped while the scheduled run holds the lock
+            other_run.release()
+            main_process_function.side_effect = lambda *args, **kwargs: (self.assertIsNotNone(other_run.owner()),
+                                                                         dict(task_timings={}))
+            event_driven.process_batch_with_main_tasks(mock.MagicMock(), {}, batch, acct)
+            main_process_function.assert_called_once()
+            self.assertIsNone(other_run.owner())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""Tests for the run's stage timing spans and their JSON and Prometheus exports."""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from helpers.run_metrics import RunMetrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = RunMetrics(clock=self.clock)
+
+    def test_summary_per_stage(self):
+        for folder in ('inbox_a', 'inbox_b'):
+            with self.metrics.span('fetch', folder=folder) as span:
+                self.clock.now += 2.0
+                span['items'] = 10
+        with self.metrics.span('dedupe_moves'):
+            self.clock.now += 1.0
+
+        stages = self.metrics.summary()
+        self.assertEqual(list(stages), ['fetch', 'dedupe_moves'])
+        self.assertEqual(stages['fetch'], dict(seconds=4.0, calls=2, items=20, items_per_second=5.0))
+        self.assertIsNone(stages['dedupe_moves']['items'])
+        self.assertIsNone(stages['dedupe_moves']['items_per_second'])
+
+    def test_span_recorded_when_block_raises(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.span('parse', items=3):
+                self.clock.now += 1.0
+                raise ValueError('bad mail')
+        self.assertEqual(self.metrics.summary()['parse']['calls'], 1)
+
+    def test_spans_from_threads(self):
+        def record():
+            for _ in range(100):
+                with self.metrics.span('restrict', items=1):
+                    pass
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.metrics.summary()['restrict']['calls'], 400)
+
+    def test_reset(self):
+        with self.metrics.span('fetch'):
+            pass
+        self.metrics.reset()
+        self.assertEqual(self.metrics.summary(), {})
+
+    def test_write(self):
+        with self.metrics.span('fetch', items=5, folder='\\\\account\\Inbox'):
+            self.clock.now += 0.5
+        with tempfile.TemporaryDirectory() as temp_dir:
+            json_path = os.path.join(temp_dir, 'metrics', 'run_metrics_site.json')
+            prom_path = os.path.join(temp_dir, 'metrics', 'certs_inbox_site.prom')
+            self.metrics.write(json_path, prom_path, labels=dict(account='site'), ok=True)
+
+            with open(json_path) as jf:
+                written = json.load(jf)
+            self.assertTrue(written['ok'])
+            self.assertEqual(written['account'], 'site')
+            self.assertEqual(written['stages']['fetch']['items'], 5)
+            self.assertEqual(written['spans'][0]['folder'], '\\\\account\\Inbox')
+
+            with open(prom_path) as pf:
+                prom_text = pf.read()
+            self.assertIn('certs_inbox_stage_seconds{account="site",stage="fetch"} 0.5', prom_text)
+            self.assertIn('certs_inbox_stage_items_per_second{account="site",stage="fetch"} 10.0', prom_text)
+            self.assertIn('# TYPE certs_inbox_stage_items gauge', prom_text)
+            self.assertEqual(sorted(os.listdir(os.path.dirname(json_path))),
+                             ['certs_inbox_site.prom', 'run_metrics_site.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
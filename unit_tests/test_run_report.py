@@ -0,0 +1,33 @@
+"""Tests for the run report a main_process run leaves for the scheduler."""
+
+import os
+import tempfile
+import unittest
+
+from helpers.run_report import get_run_overhead, read_run_report, remove_run_report, write_run_report
+
+
+class TestRunReport(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.report_path = os.path.join(self.temp_dir.name, 'logs', 'last_run_report.json')
+
+    def test_report_read_back(self):
+        write_run_report({'work_seconds': 2.5}, self.report_path)
+        run_report = read_run_report(self.report_path)
+        self.assertEqual(run_report, {'work_seconds': 2.5})
+        self.assertEqual(get_run_overhead(4.0, run_report), 1.5)
+
+    def test_run_without_report_not_credited_with_last(self):
+        write_run_report({'work_seconds': 2.5}, self.report_path)  # the last run's
+        remove_run_report(self.report_path)  # before the next run starts; it then crashes without writing one
+        run_report = read_run_report(self.report_path)
+        self.assertIsNone(run_report)
+        self.assertIsNone(get_run_overhead(4.0, run_report))
+        remove_run_report(self.report_path)  # no report to remove
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests for the session cache of the namespace, stores and found folders, using the stand-in Outlook backend."""
+
+import unittest
+from unittest import mock
+
+from helpers.com_compat import com_error
+from helpers.outlook_helpers import find_folders_in_outlook
+from helpers.session_cache import SessionCache
+from helpers.stand_in_outlook import StandInOutlook
+from outlook_interface import OutlookSingleton
+
+
+class TestSessionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.namespace = StandInOutlook()
+        self.namespace.add_store('archive')
+        self.store = self.namespace.add_store('account')
+        self.folder_paths = [r'\\account\Inbox\Foam', r'\\account\Inbox\NBE']
+        for folder_path in self.folder_paths:
+            self.store.add_folder_path(folder_path)
+        self.cache = SessionCache()
+        self.store_scans = 0
+        self.stores = stores = list(self.namespace.Stores)
+
+        def scan_stores():
+            self.store_scans += 1
+            return stores
+
+        namespace_class = type('CountingNamespace', (StandInOutlook,), {'Stores': property(lambda ns: scan_stores())})
+        self.namespace.__class__ = namespace_class
+
+    def test_namespace_kept_until_new_application(self):
+        application = mock.MagicMock()
+        namespace = self.cache.namespace(application)
+        self.assertIs(self.cache.namespace(application), namespace)
+        application.GetNamespace.assert_called_once_with('MAPI')
+        self.cache.namespace(mock.MagicMock())
+        self.assertEqual((self.cache.generation, self.cache.stats['invalidations']), (1, 1))
+
+    def test_stores_indexed_once(self):
+        self.assertIs(self.cache.get_store('account', self.namespace), self.stores[1])
+        self.assertIs(self.cache.get_store('arch', self.namespace), self.stores[0])
+        self.assertIsNone(self.cache.get_store('missing', self.namespace))
+        self.assertEqual(self.store_scans, 1)
+
+    def test_dead_store_indexed_again(self):
+        self.assertIs(self.cache.get_store('archive', self.namespace), self.stores[0])
+        with mock.patch('helpers.session_cache._is_alive', side_effect=[False, True]):  # gone, then found again
+            self.assertIs(self.cache.get_store('archive', self.namespace), self.stores[0])
+        self.assertEqual(self.store_scans, 2)
+
+    def test_found_folders_reused(self):
+        found = find_folders_in_outlook(self.namespace, 'account', self.folder_paths, cache=self.cache)
+        with mock.patch('helpers.outlook_helpers.map_folder_structure_to_flat_dict') as folder_search:
+            found_again = find_folders_in_outlook(self.namespace, 'account', self.folder_paths, cache=self.cache)
+        folder_search.assert_not_called()
+        self.assertEqual(found_again, found)
+        self.assertEqual(self.cache.stats, dict(hits=1, misses=2, invalidations=0))
+
+    def test_dead_folder_found_again(self):
+        found = find_folders_in_outlook(self.namespace, 'account', self.folder_paths, cache=self.cache)
+        dead_folder = mock.MagicMock()
+        type(dead_folder).EntryID = mock.PropertyMock(side_effect=com_error(-2147221233, 'The item was deleted.'))
+        self.cache.put_folders('account', dict(found, **{self.folder_paths[0]: dead_folder}))
+        found_again = find_folders_in_outlook(self.namespace, 'account', self.folder_paths, cache=self.cache)
+        self.assertIs(found_again[self.folder_paths[0]], found[self.folder_paths[0]])
+        self.cache.forget_folders()
+        self.assertIsNone(self.cache.get_folders('account', self.folder_paths))
+
+    def test_reset_invalidates(self):
+        outlook = OutlookSingleton()
+        application = mock.MagicMock()
+        with mock.patch.object(outlook, '_outlook', application), \
+                mock.patch.object(outlook, 'session_cache', SessionCache()), \
+                mock.patch.object(outlook, '_wait_until_ready'), \
+                mock.patch('outlook_interface.pythoncom'):
+            namespace = outlook.get_outlook_folders()
+            self.assertIs(outlook.get_outlook_folders(), namespace)
+            outlook.terminate_outlook()
+            self.assertEqual(outlook.session_cache.generation, 1)
+            outlook._outlook = mock.MagicMock()
+            self.assertIsNot(outlook.get_outlook_folders(), namespace)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""Tests for the staged fetch/work/finish pipeline and the NBE report emails going through it."""
+
+import concurrent.futures
+import math
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from helpers.item_handles import ItemResolver
+from helpers.run_metrics import run_metrics
+from helpers.staged_pipeline import StagedPipeline, get_process_pool
+from helpers.stand_in_outlook import StandInAttachment, StandInMailItem, StandInOutlook
+from tasks.clean_foam_inbox import process_mail_items, sort_mail_items_to_dataframes
+from tasks.filing_test_reports.nbe_report_emails import get_nbe_emails, process_nbe_test_reports
+
+
+class TestStagedPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.finish_threads = set()
+
+    def fetch(self, item):
+        self.events.append(f'fetch {item}')
+        return item if item >= 0 else None
+
+    def finish(self, item, result):
+        self.finish_threads.add(threading.get_ident())
+        self.events.append(f'finish {item}={result}')
+
+    def test_backpressure(self):
+        released = {item: threading.Event() for item in range(4)}
+
+        def work(item):
+            if not released[item].wait(5):
+                raise TimeoutError(item)
+            return item * 10
+
+        released[0].set()
+        for item in (1, 2, 3):  # the other items' work is slow
+            threading.Timer(0.1, released[item].set).start()
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            stats = StagedPipeline(self.fetch, work, self.finish, executor, max_in_flight=2).run([0, 1, 2, 3])
+        # the third fetch waits until one of the first two items is finished
+        self.assertLess(self.events.index('finish 0=0'), self.events.index('fetch 2'))
+        self.assertEqual(sorted(event for event in self.events if event.startswith('finish')),
+                         ['finish 0=0', 'finish 1=10', 'finish 2=20', 'finish 3=30'])
+        self.assertEqual((stats['fetched'], stats['finished'], stats['failed']), (4, 4, 0))
+        self.assertGreaterEqual(stats['backpressure_waits'], 1)
+        self.assertLessEqual(stats['peak_work_queue'], 2)
+        self.assertEqual(self.finish_threads, {threading.get_ident()})
+
+    def test_work_in_processes(self):
+        stats = StagedPipeline(self.fetch, math.sqrt, self.finish, get_process_pool(2), max_in_flight=3).run(
+            [4, -1, 9, 16])
+        self.assertEqual(sorted(event for event in self.events if event.startswith('finish')),
+                         ['finish 16=4.0', 'finish 4=2.0', 'finish 9=3.0'])
+        self.assertEqual((stats['fetched'], stats['finished']), (3, 3))  # -1 was skipped by the fetch
+        self.assertEqual(self.finish_threads, {threading.get_ident()})
+        self.assertIs(get_process_pool(2), get_process_pool(2))
+        self.assertIsNone(get_process_pool(0))
+
+    def test_failed_items_reported(self):
+        errors = []
+
+        def work(item):
+            if item == 2:
+                raise ValueError('unreadable')
+            return item
+
+        stats = StagedPipeline(self.fetch, work, self.finish, on_error=lambda *error: errors.append(error)).run(
+            [1, 2, 3])
+        self.assertEqual([(stage, item, str(error)) for stage, item, error in errors], [('work', 2, 'unreadable')])
+        self.assertEqual((stats['finished'], stats['failed']), (2, 1))
+
+
+class TestNbeReportPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        outlook = StandInOutlook()
+        self.inbox = outlook.add_store('account').add_folder_path(r'\\account\Inbox')
+        for n in range(3):
+            self.inbox.deliver(StandInMailItem(f'Certificate for Delivery:000000000000000{n}',
+                                               attachments=[StandInAttachment(f'report{n}.pdf', f'{n}'.encode())]))
+        _, other_emails = process_mail_items(self.inbox.Items, store_id=self.inbox.StoreID)
+        self.nbe_emails = get_nbe_emails(sort_mail_items_to_dataframes(other_emails))
+        self.resolver = ItemResolver(outlook)
+        run_metrics.reset()
+        self.addCleanup(run_metrics.reset)
+
+    def test_reports_summarized(self):
+        def parse(saved_report):
+            with open(saved_report[1]) as pf:
+                report_number = pf.read()
+            if report_number == '1':
+                raise ValueError('not a PDF')
+            return report_number
+
+        with mock.patch.dict('tasks.filing_test_reports.nbe_report_emails.NBE_PIPELINE_PARAMETERS',
+                             {'parse_workers': 0, 'max_in_flight': 2}), \
+                mock.patch('tasks.filing_test_reports.nbe_report_emails.parse_nbe_report', parse), \
+                mock.patch('tasks.filing_test_reports.nbe_report_emails.compose_nbe_summary',
+                           lambda nbe_data: (f'Summary {nbe_data}', '<html></html>')):
+            stats = process_nbe_test_reports(self.temp_dir.name, self.nbe_emails, self.resolver)
+        self.assertEqual(sorted(item.Subject for item in self.inbox.Items if item.Subject.startswith('Summary')),
+                         ['Summary 0', 'Summary 2'])
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['report0.pdf', 'report1.pdf', 'report2.pdf'])
+        self.assertEqual((stats['fetched'], stats['finished'], stats['failed']), (3, 2, 1))
+        stages = run_metrics.summary()
+        self.assertEqual((stages['nbe_attachments']['calls'], stages['nbe_summary_emails']['calls']), (3, 2))
+        pipeline_span = next(span for span in run_metrics.spans if span['name'] == 'nbe_pipeline')
+        self.assertEqual((pipeline_span['items'], pipeline_span['failed']), (3, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
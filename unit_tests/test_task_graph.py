@@ -0,0 +1,79 @@
+"""Tests for the task graph executor."""
+
+import threading
+import time
+import unittest
+
+from tasks.task_graph import TaskGraph, TaskNode
+
+
+class TestTaskGraph(unittest.TestCase):
+
+    def test_outputs_flow_between_nodes(self):
+        graph = TaskGraph([TaskNode('double', lambda x: x * 2, inputs=('x',)),
+                           TaskNode('plus_one', lambda double: double + 1, inputs=('double',))])
+        outputs, timings = graph.run({'x': 5})
+        self.assertEqual(outputs, {'double': 10, 'plus_one': 11})
+        self.assertEqual(set(timings), {'double', 'plus_one'})
+
+    def test_compute_nodes_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)  # both nodes must be running at once to pass
+
+        def wait_for_other():
+            barrier.wait()
+            return True
+
+        graph = TaskGraph([TaskNode('a', wait_for_other), TaskNode('b', wait_for_other)])
+        outputs, _ = graph.run({}, max_workers=2)
+        self.assertEqual(outputs, {'a': True, 'b': True})
+
+    def test_outlook_nodes_run_serially_on_calling_thread_in_order(self):
+        calls = []
+        caller = threading.get_ident()
+
+        def outlook_work(name):
+            def work():
+                calls.append((name, threading.get_ident() == caller))
+            return work
+
+        graph = TaskGraph([TaskNode('flags', outlook_work('flags'), mutates_outlook=True),
+                           TaskNode('moves', outlook_work('moves'), after=('flags',), mutates_outlook=True),
+                           TaskNode('summaries', outlook_work('summaries'), after=('moves', 'disabled_task'),
+                                    mutates_outlook=True)])
+        graph.run({})
+        self.assertEqual(calls, [('flags', True), ('moves', True), ('summaries', True)])
+
+    def test_outlook_node_feeding_compute_work_goes_first(self):
+        calls = []
+        graph = TaskGraph([TaskNode('flags', lambda: calls.append('flags'), mutates_outlook=True),
+                           TaskNode('fetch', lambda: calls.append('fetch'), mutates_outlook=True),
+                           TaskNode('parse', lambda fetch: time.sleep(0.01), inputs=('fetch',))])
+        graph.run({})
+        self.assertEqual(calls, ['fetch', 'flags'])
+
+    def test_missing_input_raises(self):
+        graph = TaskGraph([TaskNode('a', lambda cert_df: cert_df, inputs=('cert_df',))])
+        with self.assertRaises(ValueError):
+            graph.run({})
+
+    def test_cycle_raises(self):
+        graph = TaskGraph([TaskNode('a', lambda b: b, inputs=('b',)), TaskNode('b', lambda a: a, inputs=('a',))])
+        with self.assertRaises(ValueError):
+            graph.run({})
+
+    def test_failure_stops_dependent_nodes(self):
+        calls = []
+
+        def fail():
+            raise RuntimeError('Unmatched rows found')
+
+        graph = TaskGraph([TaskNode('plan', fail),
+                           TaskNode('moves', lambda plan: calls.append(plan), inputs=('plan',),
+                                    mutates_outlook=True)])
+        with self.assertRaises(RuntimeError):
+            graph.run({})
+        self.assertEqual(calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
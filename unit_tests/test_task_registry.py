@@ -0,0 +1,66 @@
+"""Tests for the lazy task registry and the import time budget parser."""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from benchmarks.import_time_budget import parse_importtime_output, total_import_ms
+from tasks.registry import TaskRegistry, task_registry
+
+
+class TestTaskRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = TaskRegistry()
+        self.registry.register('json_task', 'json:dumps')
+        self.registry.register('csv_task', 'csv:writer')
+
+    def test_disabled_task_module_is_not_imported(self):
+        with tempfile.TemporaryDirectory() as module_dir:
+            for module_name in ('enabled_stand_in_task', 'disabled_stand_in_task'):
+                with open(os.path.join(module_dir, f'{module_name}.py'), 'w') as mf:
+                    mf.write('def task_nodes():\n    return []\n')
+            registry = TaskRegistry()
+            registry.register('enabled', 'enabled_stand_in_task:task_nodes')
+            registry.register('disabled', 'disabled_stand_in_task:task_nodes')
+            with mock.patch.object(sys, 'path', [module_dir] + sys.path), mock.patch.dict(sys.modules):
+                enabled = registry.get_enabled_tasks({'process_enabled': True, 'process_disabled': False})
+                self.assertEqual([name for name, _ in enabled], ['enabled'])
+                self.assertIn('enabled_stand_in_task', sys.modules)
+                self.assertNotIn('disabled_stand_in_task', sys.modules)
+        self.assertNotIn('enabled_stand_in_task', sys.modules)  # sys.modules is restored
+
+    def test_missing_configuration_key_is_enabled(self):
+        enabled = self.registry.get_enabled_tasks({})
+        self.assertEqual([name for name, _ in enabled], ['json_task', 'csv_task'])
+
+    def test_unknown_configuration_key_raises(self):
+        with self.assertRaises(ValueError):
+            self.registry.get_enabled_tasks({'process_typo_task': True})
+
+    def test_duplicate_registration_raises(self):
+        with self.assertRaises(ValueError):
+            self.registry.register('json_task', 'json:loads')
+
+    def test_program_tasks_run_in_original_order(self):
+        self.assertEqual(task_registry.names, ['priority_customers', 'duplicate_foam_certs', 'incoming_reports'])
+
+
+class TestImportTimeParsing(unittest.TestCase):
+
+    def test_parse_nested_imports(self):
+        stderr_text = ('import time: self [us] | cumulative | imported package\n'
+                       'import time:       100 |        100 |     _json\n'
+                       'import time:       400 |        500 |   json.decoder\n'
+                       'import time:       250 |        750 | json\n'
+                       'import time:        50 |         50 | csv\n')
+        timings = parse_importtime_output(stderr_text)
+        self.assertEqual([(t.module, t.depth) for t in timings],
+                         [('_json', 2), ('json.decoder', 1), ('json', 0), ('csv', 0)])
+        self.assertEqual(total_import_ms(timings), 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
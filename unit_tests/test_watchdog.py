@@ -0,0 +1,148 @@
+"""Tests for the watchdog's deadlines on Outlook calls and run stages."""
+
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import main_process
+import outlook_interface
+from helpers.com_compat import com_error
+from helpers.watchdog import Watchdog, WatchdogTimeout, watchdog
+
+
+class TestWatchdog(unittest.TestCase):
+
+    def setUp(self):
+        self.killed = threading.Event()
+        self.timed_out = []
+
+        def kill_outlook(name):
+            self.timed_out.append(name)
+            self.killed.set()
+            return True
+
+        self.watchdog = Watchdog(on_timeout=kill_outlook, poll_seconds=0.01)
+
+    def hung_call(self):
+        """A COM call that only returns, with an error, once Outlook is killed."""
+        if not self.killed.wait(5):
+            self.fail('The watchdog did not handle the timeout.')
+        raise com_error(-2147023174, 'The RPC server is unavailable.')
+
+    def test_hung_call_abandoned(self):
+        with self.assertRaises(WatchdogTimeout) as timeout:
+            with self.watchdog.deadline('Move', 0.05):
+                self.hung_call()
+        self.assertEqual((timeout.exception.name, timeout.exception.seconds), ('Move', 0.05))
+        self.assertIsInstance(timeout.exception.__cause__, com_error)
+        self.assertEqual(self.timed_out, ['Move'])
+        self.assertEqual(self.watchdog.timeouts, [dict(name='Move', seconds=0.05, thread='MainThread', killed=True)])
+
+    def test_timeout_not_killed_when_kill_fails(self):
+        self.watchdog.on_timeout = lambda name: self.timed_out.append(name)  # e.g. no Outlook process found
+        with self.assertRaises(WatchdogTimeout):
+            with self.watchdog.deadline('Move', 0.05):
+                time.sleep(0.2)
+        self.assertEqual(self.timed_out, ['Move'])
+        self.assertFalse(self.watchdog.timeouts[0]['killed'])
+
+    def test_call_within_deadline(self):
+        with self.watchdog.deadline('Move', 5.0):
+            pass
+        with self.assertRaises(KeyError):  # other errors pass through
+            with self.watchdog.deadline('Move', 5.0):
+                raise KeyError('missing')
+        with self.watchdog.deadline('Move', None):
+            pass
+        self.assertEqual(self.timed_out, [])
+
+    def test_inner_deadline_reported(self):
+        with self.assertRaises(WatchdogTimeout) as timeout:
+            with self.watchdog.deadline('process_folder', 5.0, blocking_call=False):
+                with self.watchdog.deadline('SaveAsFile', 0.05):
+                    self.hung_call()
+        self.assertEqual(timeout.exception.name, 'SaveAsFile')
+        self.assertEqual(self.timed_out, ['SaveAsFile'])
+
+    def test_slow_stage_cancelled_without_kill(self):
+        calls = []
+        with self.assertRaises(WatchdogTimeout) as timeout:
+            with self.watchdog.deadline('process_folder', 0.05, blocking_call=False):
+                while True:  # slow work between Outlook calls; the next call after the deadline is cancelled
+                    with self.watchdog.deadline('Move', 5.0):
+                        calls.append('Move')
+                    time.sleep(0.01)
+        self.assertEqual(timeout.exception.name, 'process_folder')
+        self.assertTrue(calls)
+        self.assertEqual(self.timed_out, [])  # Outlook wasn't killed
+        self.assertFalse(self.watchdog.timeouts[0]['killed'])
+        with self.assertRaises(WatchdogTimeout):
+            self.watchdog.check()
+        self.watchdog.reset()
+        self.watchdog.check()
+
+    def test_kill_scoped_to_session_outlook(self):
+        with mock.patch('outlook_interface.get_outlook_pid', return_value=4321), \
+                mock.patch('outlook_interface.subprocess.run') as run:
+            run.return_value.returncode = 0
+            self.assertTrue(outlook_interface.kill_outlook_process('Move'))
+            run.return_value.returncode = 128
+            self.assertFalse(outlook_interface.kill_outlook_process('Move'))
+        self.assertEqual(run.call_args.args[0], ['taskkill', '/F', '/PID', '4321'])
+        with mock.patch('outlook_interface.get_outlook_pid', return_value=None), \
+                mock.patch('outlook_interface.subprocess.run') as run, \
+                mock.patch('outlook_interface.lg') as lg:
+            self.assertFalse(outlook_interface.kill_outlook_process('Move'))
+        run.assert_not_called()
+        lg.error.assert_called_once()
+
+    def test_run_ends_and_outlook_reset(self):
+        def hung_run(*args, **kwargs):
+            with watchdog.deadline('process_folder', 5.0, blocking_call=False), watchdog.deadline('Move', 0.05):
+                self.hung_call()
+
+        outlook = mock.MagicMock()
+        acct = dict(account_name='account', inbox_folders=[r'\\account\Inbox'])
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        with mock.patch.object(watchdog, 'on_timeout', self.watchdog.on_timeout), \
+                mock.patch('main_process.STATE_DIR_PATH', state_dir.name), \
+                mock.patch.object(watchdog, 'poll_seconds', 0.01), \
+                mock.patch('main_process.is_skip_allowed', return_value=False), \
+                mock.patch('main_process.get_process_ol_folders', return_value=({}, [])), \
+                mock.patch('main_process.main_process_function', hung_run), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}):
+            found_folders, run_report = main_process.run_main_process(outlook, acct=acct)
+        self.assertIsNone(found_folders)
+        self.assertFalse(run_report['ok'])
+        self.assertEqual([timeout['name'] for timeout in run_report['timeouts']], ['Move'])
+        outlook.reset_outlook.assert_called_once()
+
+    def test_slow_run_ends_without_outlook_reset(self):
+        def slow_run(*args, **kwargs):
+            with watchdog.deadline('process_folder', 0.05, blocking_call=False):
+                time.sleep(0.2)
+
+        outlook = mock.MagicMock()
+        acct = dict(account_name='account', inbox_folders=[r'\\account\Inbox'])
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        with mock.patch.object(watchdog, 'on_timeout', self.watchdog.on_timeout), \
+                mock.patch('main_process.STATE_DIR_PATH', state_dir.name), \
+                mock.patch.object(watchdog, 'poll_seconds', 0.01), \
+                mock.patch('main_process.is_skip_allowed', return_value=False), \
+                mock.patch('main_process.get_process_ol_folders', return_value=({}, [])), \
+                mock.patch('main_process.main_process_function', slow_run), \
+                mock.patch.dict('main_process.RUN_METRICS_PARAMETERS', {'enabled': False}):
+            found_folders, run_report = main_process.run_main_process(outlook, acct=acct)
+        self.assertIsNone(found_folders)
+        self.assertFalse(run_report['ok'])
+        self.assertEqual([timeout['name'] for timeout in run_report['timeouts']], ['process_folder'])
+        self.assertEqual(self.timed_out, [])
+        outlook.reset_outlook.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,3 +35,15 @@ else:
         "target_folder_path": r'\\account\Inbox\Foam Duplicate Lots',
         "local_save_folder_path": "./local_files/",
         }
+
+# which tasks main_process runs (see tasks.registry); disabled tasks' modules and dependencies are not imported
+process_configuration_dct = {
+    'process_incoming_reports': True,
+    'process_priority_customers': True,
+    'process_duplicate_foam_certs': True,
+}
+
+# the accounts multi_account_runner.py processes, each in its own worker process with its own Outlook session and state;
+# add other sites' mailboxes as dicts with the same keys as acct_path_dct and unique account names; an account may also
+# set 'state_dir_path' to keep its processed ledger outside STATE_DIR_PATH (replay_session.py sets a temp dir)
+acct_path_dcts: List[dict] = [acct_path_dct]
@@ -0,0 +1,155 @@
+"""Settings for tuning how much work each run does and how it does it."""
+
+# where state kept between runs (folder fingerprints and the like) is saved
+STATE_DIR_PATH = './state/'
+
+# each run holds its account's lock file (in STATE_DIR_PATH) so runs can't overlap, whichever process starts them; a run
+# that can't get the lock within wait_seconds is skipped. A lock older than stale_seconds, or left by a process that
+# died, is taken over. Enabled by default: it only keeps two runs from moving the same items at once.
+RUN_LOCK_PARAMETERS = {
+    'enabled': True,
+    'wait_seconds': 30.0,
+    'stale_seconds': 1800.0,
+}
+
+# the actions completed on mail items (e.g. an NBE test report's PDF saved and its summary email added) are recorded in
+# an SQLite ledger in the account's STATE_DIR_PATH directory, so each run only does the new work and a run that stopped
+# part way resumes; records older than retention_days (longer than the days the runs look back) are pruned. Opt in.
+PROCESSED_LEDGER_PARAMETERS = {
+    'enabled': False,
+    'retention_days': 30.0,
+}
+
+# skip a run's processing when none of the processed folders changed since the last run; a full run is still done at
+# least every max_skip_seconds so that config changes and items ageing out of the date window are picked up. Opt in.
+CHANGE_PROBE_PARAMETERS = {
+    'enabled': False,
+    'max_skip_seconds': 3600.0,
+}
+
+# a folder's mail items are read chunk_size at a time into DataFrame chunks, so reading a large folder (e.g. the year
+# of mail the dev node reads) holds at most one chunk of item data outside the frames
+INGESTION_PARAMETERS = {
+    'chunk_size': 1000,
+}
+
+# each folder's items are fetched with one Items.Restrict so the store does the filtering: not flagged 'Follow up',
+# received within the last days_back days (not on the dev node) and, when not empty, from one of sender_addresses. The
+# fetch gets the cert emails and the other emails the tasks read alike, so the sender addresses must cover every email a
+# task reads; the subjects aren't restricted, the certs are told apart from the other emails by subject_pattern.
+RESTRICT_FILTER_PARAMETERS = {
+    'days_back': 5,
+    'sender_addresses': [],
+}
+
+# folders with at least external_min_rows items to fetch are deduplicated out of memory: their duplicate foam cert
+# candidates are added chunk by chunk as they are fetched, run_rows rows at a time are sorted and spilled to spill_dir
+# (None for the system temporary folder), then merged
+DEDUPE_PARAMETERS = {
+    'external_min_rows': 200000,
+    'run_rows': 50000,
+    'spill_dir': None,
+}
+
+# each folder's tasks run as a task graph; nodes that don't call Outlook run on up to max_workers threads
+TASK_GRAPH_PARAMETERS = {
+    'max_workers': 4,
+}
+
+# the NBE test report emails go through a pipeline: their PDFs are saved and the summary emails added on the Outlook
+# thread while the PDFs are parsed on parse_workers worker processes (0 parses them on the Outlook thread); at most
+# max_in_flight emails are between saving and adding, the saving waits when that many are
+NBE_PIPELINE_PARAMETERS = {
+    'parse_workers': 2,
+    'max_in_flight': 4,
+}
+
+# each NBE test report's results are checked against their limits; the summary email of a report with results out of
+# their limits gets the out_of_limits_color category (a color name from outlook_helpers.color_map). Opt in.
+NBE_LIMIT_CHECK_PARAMETERS = {
+    'enabled': False,
+    'out_of_limits_color': 'red',
+}
+
+# experimental, opt in with max_workers above 1: the processed folders are fetched and processed concurrently, each on a
+# thread with its own Outlook session; keep max_workers low, Outlook limits concurrent sessions. 1 (the default)
+# processes them one after another on the main session.
+FOLDER_POOL_PARAMETERS = {
+    'max_workers': 1,
+}
+
+# Exchange limits the folders and items a session may have open at once (500 and 250 by default); when enabled, the
+# found folders and the items the tasks change are held open up to these limits, releasing the least recently used and
+# re-opening them when they're used again, so large folder trees and folders can be processed in one run. Opt in.
+HANDLE_BUDGET_PARAMETERS = {
+    'enabled': False,
+    'max_open_folders': 100,
+    'max_open_items': 200,
+}
+
+# when enabled, the MAPI namespace, the account's store and its found folders are kept for as long as the Outlook
+# session lasts, so a process doing many runs (the warm worker, event_driven.py) doesn't look them up every run; they're
+# checked with a property get before each use and dropped when Outlook is reconnected or reset. Opt in.
+SESSION_CACHE_PARAMETERS = {
+    'enabled': False,
+}
+
+# multi_account_runner.py runs up to max_workers accounts at once, each in its own process; an account still running
+# after account_timeout_seconds is terminated and reported as failed without holding up the other accounts. The accounts
+# share one Outlook, so their watchdogs don't kill it on a hung call; account_timeout_seconds ends the hung account
+MULTI_ACCOUNT_PARAMETERS = {
+    'max_workers': 4,
+    'account_timeout_seconds': 900.0,
+}
+
+# when Outlook isn't connected to the server, or is restarted, it's probed until it answers instead of waiting fixed
+# times: first at once, then after initial_delay_seconds, doubling up to max_delay_seconds, each randomly shortened by
+# up to the jitter fraction. Not connecting within deadline_seconds restarts Outlook, and a restart not answering within
+# it fails the run; a closing Outlook is given shutdown_deadline_seconds to exit. Each wait is an 'outlook_recovery'
+# run metrics span, with its reason, number of probes and whether Outlook became ready.
+OUTLOOK_RECOVERY_PARAMETERS = {
+    'deadline_seconds': 30.0,
+    'shutdown_deadline_seconds': 10.0,
+    'initial_delay_seconds': 0.5,
+    'max_delay_seconds': 5.0,
+    'jitter': 0.5,
+}
+
+# a hung Outlook call (a modal dialog, a stuck Move, a SaveAsFile of a huge attachment) would hold up the run, and the
+# scheduler's later ticks behind it; past one of the call_seconds deadlines the watchdog kills this session's Outlook so
+# the call fails, and the run ends with an alert and resets the Outlook session. A stage past its stage_seconds deadline
+# may just be slow, so Outlook isn't killed: the run is cancelled at its next Outlook call or item and ends with an
+# alert. Calls and stages not listed have no deadline. Opt in; killing Outlook ends anything else using it.
+WATCHDOG_PARAMETERS = {
+    'enabled': False,
+    'poll_seconds': 1.0,
+    'call_seconds': {
+        'Restrict': 120.0,
+        'Move': 60.0,
+        'SaveAsFile': 120.0,
+    },
+    'stage_seconds': {
+        'change_probe': 60.0,
+        'folder_discovery': 180.0,
+        'process_folder': 600.0,
+        'fingerprint_save': 60.0,
+    },
+}
+
+# each run's stage timings (spans with item counts and rates) are written to metrics_dir as run_metrics_<account>.json
+# and as certs_inbox_<account>.prom for the Prometheus node_exporter textfile collector
+RUN_METRICS_PARAMETERS = {
+    'enabled': True,
+    'metrics_dir': './logs/metrics/',
+}
+
+# when enabled, every COM property get/set and method call made through the Outlook objects is counted and timed, and
+# the top_n slowest members are logged at the end of the run (the full trace goes to the metrics_dir); adds overhead.
+# With record, each run's Outlook session is also recorded to trace_dir for replay_session.py to play back offline;
+# record in the 'subprocess' MAIN_PROCESS_MODE so the recording includes finding the folders
+COM_TRACING_PARAMETERS = {
+    'enabled': False,
+    'top_n': 20,
+    'record': False,
+    'trace_dir': './logs/traces/',
+}
@@ -3,7 +3,7 @@ import os
 # define the relative path to the Python executable to use to call the main_process
 PYTHON_EXE_REL_PATH = 'venv/Scripts/python.exe'
 
-# define the filename of the main_process.py file
+# define the filename of the main_process.py file; 'multi_account_runner.py' runs every account in acct_path_dcts
 MAIN_PROCESS_FILENAME = 'main_process.py'
 
 # define the scheduling parameters
@@ -15,6 +15,35 @@ SCHEDULING_PARAMETERS = {
     'max_instances': 1
 }
 
+# how each tick runs main_process: 'subprocess' starts a new Python interpreter, 'warm_worker' sends the run to a
+# resident worker process that keeps its imports, Outlook session and folder handles between runs
+MAIN_PROCESS_MODE = 'subprocess'
+
+# the warm worker is recycled after max_runs runs or once its memory grows by more than max_rss_growth_mb
+WARM_WORKER_PARAMETERS = {
+    'max_runs': 100,
+    'max_rss_growth_mb': 200,
+    'run_timeout_seconds': 600,
+}
+
+# event_driven.py: new mail is processed in batches once no more has arrived for debounce_seconds, the first arrival
+# has waited max_batch_wait_seconds, or max_batch_items have arrived
+EVENT_DRIVEN_PARAMETERS = {
+    'debounce_seconds': 5.0,
+    'max_batch_wait_seconds': 30.0,
+    'max_batch_items': 200,
+    'pump_interval_seconds': 0.5,
+}
+
+# when enabled, the interval between runs widens (by widen_factor per quiet run, up to max_seconds) while nothing
+# arrives and drops back to min_seconds when mail does; SCHEDULING_PARAMETERS should then fire every min_seconds
+ADAPTIVE_INTERVAL_PARAMETERS = {
+    'enabled': False,
+    'min_seconds': 60.0,
+    'max_seconds': 900.0,
+    'widen_factor': 1.5,
+}
+
 # get the absolute path to the directory containing this module
 MODULE_DIR = os.getcwd()
 
@@ -0,0 +1,146 @@
+"""A resident worker process that keeps main_process warm between scheduler ticks.
+
+Starting a new interpreter for every tick re-imports pandas, pypdf and win32com, re-dispatches Outlook and re-walks the
+folder tree before doing a few seconds of real work. The warm worker pays those costs once: the scheduler sends it run
+requests over a pipe and it answers each with the run's report. The worker recycles itself after a number of runs, or
+if its memory grows too much, and the client starts a fresh one so the next tick is warm again.
+
+Classes:
+    WarmWorkerClient: The scheduler's side of the worker; starts, feeds and recycles the worker process.
+
+Functions:
+    worker_loop: The worker process' loop; runs main_process once per request.
+
+"""
+
+import multiprocessing
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional
+
+from helpers.process_memory import get_rss_bytes
+from helpers.run_report import get_run_overhead
+from log_setup import lg
+
+RUN_REQUEST = 'run'
+STOP_REQUEST = 'stop'
+
+
+def worker_loop(conn: Connection, max_runs: int, max_rss_growth_mb: float) -> None:
+    """The worker process' loop; runs main_process once per request.
+
+    The imports, the Outlook session and the found folders are kept between runs. After a run, the worker flags
+    itself for recycling and exits if it has done `max_runs` runs or its memory has grown by more than
+    `max_rss_growth_mb` since its first run.
+
+    :param conn: Connection, the worker's end of the pipe to the scheduler.
+    :param max_runs: int, the number of runs after which the worker recycles itself.
+    :param max_rss_growth_mb: float, the memory growth in MB after which the worker recycles itself.
+    """
+    import_start = time.perf_counter()
+    import main_process  # pay for the imports once
+    from outlook_interface import wc_outlook
+    lg.info('Warm worker ready after %.2f seconds of imports.', time.perf_counter() - import_start)
+
+    found_folders_dict: Optional[Dict[str, Any]] = None
+    baseline_rss: Optional[int] = None
+    runs = 0
+    while True:
+        request = conn.recv()
+        if request == STOP_REQUEST:
+            break
+
+        found_folders_dict, run_report = main_process.run_main_process(wc_outlook, found_folders_dict)
+        runs += 1
+
+        rss = get_rss_bytes()
+        if baseline_rss is None:  # measure growth from after the first run, once everything is loaded
+            baseline_rss = rss
+        rss_growth_mb = (rss - baseline_rss) / 2 ** 20 if rss is not None and baseline_rss is not None else 0.0
+        recycle = runs >= max_runs or rss_growth_mb > max_rss_growth_mb
+        run_report.update(worker_runs=runs, rss_growth_mb=rss_growth_mb, recycle=recycle)
+        conn.send(run_report)
+        if recycle:
+            lg.info('Warm worker recycling after %s runs with %.1f MB memory growth.', runs, rss_growth_mb)
+            break
+    conn.close()
+
+
+class WarmWorkerClient:
+    """The scheduler's side of the warm worker; starts, feeds and recycles the worker process.
+    """
+
+    def __init__(self, max_runs: int = 100, max_rss_growth_mb: float = 200, run_timeout_seconds: float = 600):
+        """
+        :param max_runs: int, the number of runs after which the worker is recycled.
+        :param max_rss_growth_mb: float, the worker's memory growth in MB after which it is recycled.
+        :param run_timeout_seconds: float, how long to wait for a run before the worker is terminated.
+        """
+        self.max_runs = max_runs
+        self.max_rss_growth_mb = max_rss_growth_mb
+        self.run_timeout_seconds = run_timeout_seconds
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn: Optional[Connection] = None
+
+    def start(self) -> None:
+        """Start a new worker process if one isn't running."""
+        if self._process is not None and self._process.is_alive():
+            return
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=worker_loop, name='main_process_warm_worker', daemon=True,
+                                                args=(child_conn, self.max_runs, self.max_rss_growth_mb))
+        self._process.start()
+        child_conn.close()  # the worker holds the only other end now
+        lg.info('Started warm worker process %s.', self._process.pid)
+
+    def stop(self) -> None:
+        """Ask the worker process to stop, terminating it if it doesn't."""
+        if self._process is None:
+            return
+        try:
+            if self._process.is_alive():
+                self._conn.send(STOP_REQUEST)
+            self._process.join(timeout=30)
+        except (OSError, EOFError):
+            pass
+        if self._process.is_alive():
+            lg.warning('Warm worker did not stop, terminating it.')
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def request_run(self) -> Optional[Dict[str, Any]]:
+        """Send a run request to the worker and wait for its report.
+
+        The report is extended with the round trip time and the overhead (round trip minus the run's own work time).
+        If the worker asked to be recycled it is replaced, so the next request goes to a warm process.
+
+        :return: dict, the run report, or None if the worker died or timed out.
+        """
+        self.start()
+        sent = time.perf_counter()
+        try:
+            self._conn.send(RUN_REQUEST)
+            if not self._conn.poll(self.run_timeout_seconds):
+                lg.error('Warm worker did not answer within %s seconds, terminating it.', self.run_timeout_seconds)
+                self._process.terminate()
+                self.stop()
+                return None
+            run_report = self._conn.recv()
+        except (OSError, EOFError):
+            lg.error('Warm worker died during a run; a new one will be started.')
+            self.stop()
+            return None
+
+        round_trip_seconds = time.perf_counter() - sent
+        run_report['round_trip_seconds'] = round_trip_seconds
+        run_report['overhead_seconds'] = get_run_overhead(round_trip_seconds, run_report)
+        lg.info('Warm worker run: %.2f seconds round trip, %.2f seconds work, %.2f seconds overhead.',
+                round_trip_seconds, run_report['work_seconds'], run_report['overhead_seconds'])
+
+        if run_report.get('recycle'):
+            self.stop()
+            self.start()  # warm the replacement up before the next tick
+        return run_report